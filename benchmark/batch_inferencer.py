@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+"""
+Compare per-subject and batched inferencer prompts on samples/case1..3.
+
+The extractor runs once per case; its subject list is then sent through both
+inferencer configs so the comparison only covers the inferencer stage. The
+completion cache is bypassed so every request really reaches the endpoint.
+
+Usage:
+    python benchmark/batch_inferencer.py
+    python benchmark/batch_inferencer.py --batch inferencer_v9-batch.json --chunk-size 8
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from typing import Any
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv  # noqa: E402
+
+from kgai import pipeline  # noqa: E402
+from kgai.client import submit_async  # noqa: E402
+
+usage = {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0}
+
+
+async def counting_submit_async(*args: Any, **kwargs: Any) -> dict[str, Any]:
+    """submit_async that accumulates request and token counts."""
+    kwargs["use_cache"] = False
+    result = await submit_async(*args, **kwargs)
+    usage["requests"] += 1
+    if result.get("usage"):
+        usage["prompt_tokens"] += result["usage"]["prompt_tokens"]
+        usage["completion_tokens"] += result["usage"]["completion_tokens"]
+    return result
+
+
+async def run_case(case: str, args: argparse.Namespace, rows: list[list[Any]]) -> None:
+    """Extract subjects once, then time both inferencer modes on them."""
+    with open(os.path.join(case, "news_content.txt"), encoding="utf-8") as file:
+        content = file.read()
+    with open(os.path.join(case, "news_title.txt"), encoding="utf-8") as file:
+        title = file.read().strip()
+    crime_keywords = open(pipeline.resolve(args.crime_keywords, pipeline.SAMPLES_DIR)).read()
+    judge_keywords = open(pipeline.resolve(args.judge_keywords, pipeline.SAMPLES_DIR)).read()
+
+    extractor = pipeline.complete(args.extractor, crime_keywords, judge_keywords, content, title)
+    subjects = await pipeline.extract_subjects(extractor)
+
+    for config in (args.single, args.batch):
+        inferencer = pipeline.complete(config, crime_keywords, judge_keywords, content, title)
+        for key in usage:
+            usage[key] = 0
+        start = time.monotonic()
+        answers = await pipeline.infer_subjects(inferencer, subjects)
+        elapsed = time.monotonic() - start
+        parsed = sum(1 for _, record in answers if record.error is None)
+        rows.append(
+            [
+                os.path.basename(case),
+                config,
+                len(subjects),
+                parsed,
+                usage["requests"],
+                usage["prompt_tokens"],
+                usage["completion_tokens"],
+                elapsed,
+            ]
+        )
+
+
+async def main(args: argparse.Namespace) -> None:
+    if args.chunk_size:
+        os.environ["INFERENCER_CHUNK_SIZE"] = str(args.chunk_size)
+    pipeline.submit_async = counting_submit_async
+
+    rows: list[list[Any]] = []
+    for case in args.cases:
+        await run_case(case, args, rows)
+
+    header = [
+        "case",
+        "inferencer",
+        "subjects",
+        "parsed",
+        "requests",
+        "prompt_tok",
+        "compl_tok",
+        "seconds",
+    ]
+    print("".join(f"{name:>26}" if i == 1 else f"{name:>11}" for i, name in enumerate(header)))
+    for row in rows:
+        print(
+            "".join(
+                (
+                    f"{value:>26}"
+                    if i == 1
+                    else (f"{value:>11.2f}" if isinstance(value, float) else f"{value:>11}")
+                )
+                for i, value in enumerate(row)
+            )
+        )
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument(
+        "cases", nargs="*", default=[os.path.join(root, "samples", f"case{i}") for i in (1, 2, 3)]
+    )
+    parser.add_argument("--extractor", default="extractor_v1-2.json")
+    parser.add_argument("--single", default="inferencer_v8-1.json")
+    parser.add_argument("--batch", default="inferencer_v9-batch.json")
+    parser.add_argument("--chunk-size", type=int, default=None)
+    parser.add_argument("--crime-keywords", default="crime_keywords.txt")
+    parser.add_argument("--judge-keywords", default="judge_keywords.txt")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+"""
+Check that per-subject passages agree with full-article inferencer answers.
+
+The extractor runs once per case; every subject is then sent to the inferencer
+twice, once with the whole article (INFERENCER_CONTEXT=full) and once with
+only the sentences relevant to it (INFERENCER_CONTEXT=passages). For each
+subject the suspected flag, crime keywords and proceeding keywords of the two
+answers are compared, next to the prompt tokens and time each mode used. The
+completion cache is bypassed so every request really reaches the endpoint.
+
+Usage:
+    python benchmark/context_agreement.py
+    python benchmark/context_agreement.py --budget 600 --window 2
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from typing import Any
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv  # noqa: E402
+
+from kgai import pipeline  # noqa: E402
+from kgai.client import submit_async  # noqa: E402
+
+usage = {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0}
+
+
+async def counting_submit_async(*args: Any, **kwargs: Any) -> dict[str, Any]:
+    """submit_async that accumulates request and token counts."""
+    kwargs["use_cache"] = False
+    result = await submit_async(*args, **kwargs)
+    usage["requests"] += 1
+    if result.get("usage"):
+        usage["prompt_tokens"] += result["usage"]["prompt_tokens"]
+        usage["completion_tokens"] += result["usage"]["completion_tokens"]
+    return result
+
+
+def jaccard(first: list[str], second: list[str]) -> float:
+    a: set[str] = set(first)
+    b: set[str] = set(second)
+    return 1.0 if not a and not b else len(a & b) / len(a | b)
+
+
+async def run_mode(
+    mode: str, inferencer_conf: str, subjects: list[str], inputs: dict[str, str]
+) -> dict[str, Any]:
+    """Run the inferencer stage for ``subjects`` with one context mode."""
+    os.environ["INFERENCER_CONTEXT"] = mode
+    content = inputs["content"]
+    inferencer = pipeline.complete(
+        inferencer_conf,
+        inputs["crime"],
+        inputs["judge"],
+        None if mode == "passages" else content,
+        inputs["title"],
+    )
+    if mode == "passages":
+        inferencer["news_content"] = content
+    for key in usage:
+        usage[key] = 0
+    start = time.monotonic()
+    answers = await pipeline.infer_subjects(inferencer, subjects)
+    return {
+        "records": [record for _, record in answers],
+        "seconds": time.monotonic() - start,
+        **usage,
+    }
+
+
+async def main(args: argparse.Namespace) -> None:
+    os.environ["INFERENCER_CONTEXT_WINDOW"] = str(args.window)
+    os.environ["INFERENCER_CONTEXT_BUDGET"] = str(args.budget)
+    pipeline.submit_async = counting_submit_async
+    crime = open(
+        pipeline.resolve(args.crime_keywords, pipeline.SAMPLES_DIR), encoding="utf-8"
+    ).read()
+    judge = open(
+        pipeline.resolve(args.judge_keywords, pipeline.SAMPLES_DIR), encoding="utf-8"
+    ).read()
+
+    print(f'{"case":<8}{"subject":<16}{"suspected":>10}{"crimes":>8}{"progress":>9}')
+    totals = {"subjects": 0, "suspected": 0, "crimes": 0.0, "progress": 0.0}
+    cost = {
+        mode: {"prompt_tokens": 0, "seconds": 0.0, "requests": 0} for mode in ("full", "passages")
+    }
+    for case in args.cases:
+        with open(os.path.join(case, "news_content.txt"), encoding="utf-8") as file:
+            content = file.read()
+        with open(os.path.join(case, "news_title.txt"), encoding="utf-8") as file:
+            title = file.read().strip()
+        inputs = {"content": content, "title": title, "crime": crime, "judge": judge}
+
+        extractor = pipeline.complete(args.extractor, crime, judge, content, title)
+        subjects = await pipeline.extract_subjects(extractor)
+        results = {
+            mode: await run_mode(mode, args.inferencer, subjects, inputs)
+            for mode in ("full", "passages")
+        }
+        for mode, result in results.items():
+            for key in cost[mode]:
+                cost[mode][key] += result[key]
+
+        for subject, full, passage in zip(
+            subjects, results["full"]["records"], results["passages"]["records"], strict=True
+        ):
+            same = full.suspected == passage.suspected
+            crimes = jaccard(full.crimes, passage.crimes)
+            progress = jaccard(full.progress, passage.progress)
+            totals["subjects"] += 1
+            totals["suspected"] += same
+            totals["crimes"] += crimes
+            totals["progress"] += progress
+            print(
+                f'{os.path.basename(case):<8}{subject[:14]:<16}{"same" if same else "DIFF":>10}'
+                f"{crimes:>8.2f}{progress:>9.2f}"
+            )
+
+    count = totals["subjects"] or 1
+    print(
+        f'\nSuspected agreement: {totals["suspected"] / count:.1%}, '
+        f'mean crimes Jaccard: {totals["crimes"] / count:.2f}, '
+        f'mean progress Jaccard: {totals["progress"] / count:.2f} ({totals["subjects"]} subjects)'
+    )
+    print(f'\n{"mode":<10}{"requests":>10}{"prompt_tok":>12}{"seconds":>10}')
+    for mode, values in cost.items():
+        print(
+            f'{mode:<10}{values["requests"]:>10}{values["prompt_tokens"]:>12}{values["seconds"]:>10.2f}'
+        )
+    if cost["full"]["prompt_tokens"]:
+        saved = 1 - cost["passages"]["prompt_tokens"] / cost["full"]["prompt_tokens"]
+        print(f"Prompt tokens saved by passages: {saved:.1%}")
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument(
+        "cases", nargs="*", default=[os.path.join(root, "samples", f"case{i}") for i in (1, 2, 3)]
+    )
+    parser.add_argument("--extractor", default="extractor_v1-2.json")
+    parser.add_argument("--inferencer", default="inferencer_v8-1.json")
+    parser.add_argument("--window", type=int, default=1, help="Neighbouring sentences per mention")
+    parser.add_argument(
+        "--budget", type=int, default=1500, help="Estimated tokens per passage (0: no limit)"
+    )
+    parser.add_argument("--crime-keywords", default="crime_keywords.txt")
+    parser.add_argument("--judge-keywords", default="judge_keywords.txt")
+    asyncio.run(main(parser.parse_args()))
@@ -1,105 +1,84 @@
 #!/usr/bin/env python
 
+# asyncio
+import asyncio
+
 # os
 import os
-# requests
-import requests
-
-# lxml
-from lxml import etree
-
-# bs4
-from bs4 import BeautifulSoup
-
-
-# url parse
-from urllib.parse import urlparse
-
-# subprocess
-import subprocess
-
-# threads
-import threading
 
-
-
-
-def get_html(url):
-    r = requests.get(url)
-    return r.text
-
-def parse_xpath(html, xpath):
-    root = etree.HTML(html)
-    result = root.xpath(xpath)
-    return result
-
-def analysis( news_url ):
-    try:
-        print('URL', news_url)
-        # get url host, not hostname
-        host = urlparse(news_url).netloc
-        # get html
-        html = get_html(news_url)
-        # parse html
-        soup = BeautifulSoup(html, 'html.parser')
-        sel = css_selector[host]
-        news_html = soup.select(sel)
-        news_content = news_html[0].text
-        # pass arguments to main.sh
-        
-        process = subprocess.Popen(['./analysis.sh', news_url], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-
-        # Pass the news_content to main.sh through the pipe
-        output, error = process.communicate(input=news_content)
-        print(output)
-    except:
-        print('Error', news_url)
-        pass
+# sys
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# keyword file lookup in samples/
+from kgai import pipeline  # noqa: E402
+
+# async fetch engine (shared connection pool, per-host limits and delay)
+from kgai.fetch import Fetcher  # noqa: E402
+
+# fetch -> parse -> prefilter -> extractor -> inferencer -> store, with bounded queues
+from kgai.flow import crawl_flow  # noqa: E402
+
+# persistent URL state: only due URLs are fetched, only changed articles analyzed
+from kgai.frontier import get_frontier  # noqa: E402
+
+# page parsing in worker processes, off the fetch event loop
+from kgai.sites import ExtractPool  # noqa: E402
+
+# indexed results store, written in batches
+from kgai.store import get_store  # noqa: E402
+
+# politeness settings, overridable from the environment
+CRAWLER_CONCURRENCY = int(os.getenv('CRAWLER_CONCURRENCY', '32'))
+CRAWLER_PER_HOST = int(os.getenv('CRAWLER_PER_HOST', '2'))
+CRAWLER_DELAY = float(os.getenv('CRAWLER_DELAY', '1.0'))
+CRAWLER_TIMEOUT = float(os.getenv('CRAWLER_TIMEOUT', '30'))
+CRAWLER_RETRIES = int(os.getenv('CRAWLER_RETRIES', '3'))
+
+# prompts and keyword files, as in ./prompt.py batch
+EXTRACTOR = 'extractor_v1-2.json'
+INFERENCER = 'inferencer_v8-1.json'
+CRIME_KEYWORDS = open(pipeline.resolve('crime_keywords.txt', pipeline.SAMPLES_DIR), encoding='utf-8').read()
+JUDGE_KEYWORDS = open(pipeline.resolve('judge_keywords.txt', pipeline.SAMPLES_DIR), encoding='utf-8').read()
+
+
+def show( item ):
+    for record in item['result']['records']:
+        print(f'{item["url"]} {record.subject}: {", ".join(record.crimes)} / {", ".join(record.progress)} {record.summary}')
+
+async def crawl(news_source, store, extract_pool, frontier):
+    # new URLs and those due for a recrawl or a retry
+    frontier.add(news_source)
+    news_source = frontier.due()
+    async with Fetcher(
+        concurrency=CRAWLER_CONCURRENCY,
+        per_host=CRAWLER_PER_HOST,
+        delay=CRAWLER_DELAY,
+        timeout=CRAWLER_TIMEOUT,
+        retries=CRAWLER_RETRIES,
+        validators=frontier.validators(news_source),
+    ) as fetcher:
+        # every stage runs concurrently; a full queue makes the stage before it wait
+        flow = crawl_flow(fetcher, store, EXTRACTOR, INFERENCER, CRIME_KEYWORDS, JUDGE_KEYWORDS,
+                          extract_pool=extract_pool, frontier=frontier)
+        await flow.run(({'url': url} for url in news_source), sink=show)
+    # throughput, queue depth and busy share per stage; the busiest one is the bottleneck
+    flow.print_report(final=True)
 
 if __name__ == "__main__":
     # read news url array from news_source.txt
-    news_source = open('news_source.txt').read().split('\n')
-    xpaths = {
-        'www.ettoday.net': '//*[@id="society"]/div[4]/div[2]/div[9]/div/div/div[1]/div[1]/article/div',
-        'www.chinatimes.com': '//*[@id="page-top"]/div/div[2]/div/div/article/div/div[1]/div[2]/div[2]/div[2]',
-        'udn.com': '/html/body/main/div/section[2]/section/article/div/section[1]',
-        'news.ltn.com.tw': '//*[@id="ltnRWD"]/div[10]/section/div[4]/div[2]',
-        'finance.ettoday.net': '//*[@id="finance"]/div[3]/div[2]/div[7]/div/div[1]/div[1]/div[2]/div[4]',
-        'ctee.com.tw': '//*[@id="post--24779"]/div[3]'
-    }
-    css_selector = {
-        'www.ettoday.net': '#society > div.wrapper_box > div.wrapper > div.container_box > div > div > div.c1 > div.part_area_1 > article > div > div.story',
-        'www.chinatimes.com': '#page-top > div > div:nth-child(2) > div > div > article > div > div:nth-child(2) > div.row > div.col-xl-11 > div.article-body',
-        'udn.com': 'body > main > div > section.wrapper-left.main-content__wrapper > section > article > div > section.article-content__editor',
-        'news.ltn.com.tw': '#ltnRWD > div.content > section > div:nth-child(16) > div.text.boxTitle.boxText',
-        'finance.ettoday.net': '#finance > div.wrapper_box > div.wrapper > div.container_box > div > div.r1.clearfix > div.c1 > div.subject_article > div.story',
-        'ctee.com.tw': 'div.entry-content.clearfix.single-post-content'
-    }
-    # check output.csv exist or not, if not create it with default header
-    if not os.path.exists('output.csv'):
-        with open('output.csv', 'w') as f:
-            f.write('新聞連結,犯罪人與公司,刑責,刑責進度,摘要\n')
-    # create threads
-    num_threads = 3
-
-    # Divide the array into chunks for each thread
-    chunk_size = len(news_source) // num_threads
-    chunks = [news_source[i:i+chunk_size] for i in range(0, len(news_source), chunk_size)]
-
-    # Create a thread for each chunk of the array
-    threads = []
-    complete = 0
-    for chunk in chunks:
-        thread = threading.Thread(target=lambda items: [analysis(item) for item in items], args=(chunk,))
-        threads.append(thread)
-        thread.start()
-
-    # Wait for all threads to finish
-    for thread in threads:
-        complete += 1
-        print(f'Progress: {complete}/{chunk_size}')
-        thread.join()
-
-    
-    # for news_url in news_source:
-        
\ No newline at end of file
+    news_source = [url for url in open('news_source.txt').read().split('\n') if url.strip()]
+    # results go to RESULTS_STORE_PATH; query them with ./prompt.py results
+    store = get_store()
+    # CRAWLER_PARSE_PROCESSES workers (default: one per CPU)
+    extract_pool = ExtractPool()
+    # FRONTIER_PATH (default: .cache/frontier.sqlite3)
+    frontier = get_frontier()
+    try:
+        asyncio.run(crawl(news_source, store, extract_pool, frontier))
+    finally:
+        extract_pool.close()
+        store.close()
+        print(frontier.summary())
+        frontier.close()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+"""
+Measure keyword prefilter throughput on a large article corpus.
+
+Scans every article for the crime and legal keywords with
+:class:`kgai.keywords.KeywordMatcher` and, for comparison, with one
+``str.find`` loop per keyword (what a straightforward implementation does).
+Both must report the same occurrences. The share of articles without any crime
+keyword is the share KEYWORD_PREFILTER=skip keeps away from the model.
+
+Articles come from the same inputs as ``prompt.py batch`` (case/post
+directories, post files, JSONL). Without inputs a synthetic corpus is built by
+mixing sentences of samples/case1..3 with keyword-free filler.
+
+Usage:
+    python benchmark/keyword_prefilter.py
+    python benchmark/keyword_prefilter.py --articles 100000
+    python benchmark/keyword_prefilter.py benchmark/posts/ outputs/articles.jsonl
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+from collections.abc import Callable
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from kgai import pipeline  # noqa: E402
+from kgai.batch import load_articles  # noqa: E402
+from kgai.keywords import KeywordMatcher, get_matcher  # noqa: E402
+
+
+def find_loop(keywords: list[str], text: str) -> list[tuple[str, int]]:
+    """Baseline: one str.find pass over the text per keyword."""
+    matches = []
+    for keyword in keywords:
+        offset = text.find(keyword)
+        while offset != -1:
+            matches.append((keyword, offset))
+            offset = text.find(keyword, offset + 1)
+    return matches
+
+
+def synthetic_corpus(count: int, matcher: KeywordMatcher, seed: int = 0) -> list[str]:
+    """Build ``count`` articles; about a quarter contain crime keywords."""
+    sentences = []
+    for case in (1, 2, 3):
+        with open(
+            os.path.join(pipeline.SAMPLES_DIR, f"case{case}", "news_content.txt"), encoding="utf-8"
+        ) as file:
+            sentences.extend(
+                part + "。" for part in re.split(r"[。\n]", file.read()) if part.strip()
+            )
+    crime = [sentence for sentence in sentences if matcher.search(sentence)]
+    filler = [sentence for sentence in sentences if not matcher.search(sentence)]
+    filler += [
+        f"{name}今日公布第{quarter}季財報，營收較去年同期成長{growth}%，毛利率維持穩定。"
+        for name in ("台積電", "鴻海", "聯發科", "國泰金", "中華電")
+        for quarter in range(1, 5)
+        for growth in range(1, 30, 7)
+    ]
+    generator = random.Random(seed)
+    corpus = []
+    for _ in range(count):
+        article = generator.choices(filler, k=generator.randint(15, 40))
+        if generator.random() < 0.25:
+            article[generator.randrange(len(article))] = generator.choice(crime)
+        corpus.append("".join(article))
+    return corpus
+
+
+def measure(name: str, scan: Callable[[str], object], corpus: list[str], size: int) -> list[object]:
+    start = time.perf_counter()
+    results = [scan(text) for text in corpus]
+    elapsed = time.perf_counter() - start
+    print(f"{name:<28}{elapsed:>9.3f}{size / elapsed / 1e6:>12.1f}{len(corpus) / elapsed:>14.0f}")
+    return results
+
+
+def main(args: argparse.Namespace) -> None:
+    crime_content = open(
+        pipeline.resolve(args.crime_keywords, pipeline.SAMPLES_DIR), encoding="utf-8"
+    ).read()
+    judge_content = open(
+        pipeline.resolve(args.judge_keywords, pipeline.SAMPLES_DIR), encoding="utf-8"
+    ).read()
+
+    start = time.perf_counter()
+    crime = get_matcher(crime_content)
+    judge = get_matcher(judge_content)
+    build = time.perf_counter() - start
+    keywords = crime.keywords + judge.keywords
+
+    if args.inputs:
+        corpus = [article["content"] for article in load_articles(args.inputs)]
+    else:
+        corpus = synthetic_corpus(args.articles, crime)
+    size = sum(len(text.encode("utf-8")) for text in corpus)
+    print(
+        f"{len(corpus)} articles, {size / 1e6:.1f} MB, {len(keywords)} keywords "
+        f"(matchers built in {build * 1000:.1f} ms)\n"
+    )
+
+    print(f'{"scanner":<28}{"seconds":>9}{"MB/s":>12}{"articles/s":>14}')
+    found = measure(
+        "KeywordMatcher.find", lambda text: crime.find(text) + judge.find(text), corpus, size
+    )
+    measure("KeywordMatcher.search", crime.search, corpus, size)
+    expected = measure("str.find per keyword", lambda text: find_loop(keywords, text), corpus, size)
+
+    mismatches = sum(
+        1 for got, want in zip(found, expected, strict=True) if sorted(got) != sorted(want)
+    )
+    no_crime = sum(1 for text in corpus if not crime.search(text))
+    print(
+        f"\nOccurrences: {sum(len(matches) for matches in found)} "
+        f'({"identical" if not mismatches else f"{mismatches} articles differ"} between scanners)'
+    )
+    print(
+        f"Articles without crime keywords: {no_crime} ({no_crime / len(corpus):.1%}); "
+        f"KEYWORD_PREFILTER=skip saves their extractor call and every inferencer call"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument(
+        "inputs", nargs="*", help="Same inputs as prompt.py batch (default: synthetic corpus)"
+    )
+    parser.add_argument("--articles", type=int, default=20000, help="Synthetic corpus size")
+    parser.add_argument("--crime-keywords", default="crime_keywords.txt")
+    parser.add_argument("--judge-keywords", default="judge_keywords.txt")
+    main(parser.parse_args())
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+"""
+Measure how page parsing scales with the worker processes of ExtractPool.
+
+Parses a corpus of saved pages the way the crawl flow's parse stage does:
+from an event loop, ``2 x processes`` pages in flight, through
+:class:`kgai.sites.ExtractPool`. For every pool size it prints pages per
+second, the speedup over parsing in a thread (``0`` processes), and the worst
+delay of a 10 ms timer on the event loop, which is what fetches waiting on
+the loop would see. ``inline`` parses on the event loop itself.
+
+The corpus is a directory with an ``index.tsv`` of ``URL<TAB>file`` lines
+next to the saved pages, e.g. one written by ``--save-corpus`` or by hand from
+``post-download.py`` output. Without ``--corpus`` a synthetic corpus is
+generated so the benchmark runs offline.
+
+Usage:
+    python benchmark/parse_pool.py
+    python benchmark/parse_pool.py --pages 400 --processes 0 1 2 4 8
+    python benchmark/parse_pool.py --save-corpus corpus/ --pages 200
+    python benchmark/parse_pool.py --corpus saved/ --sites sites.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from xpath import SYNTHETIC_SITES, synthetic_page  # noqa: E402
+
+from kgai.sites import ExtractPool, get_sites  # noqa: E402
+
+Page = tuple[str, bytes]
+
+
+def save_corpus(directory: str, pages: int) -> str:
+    """Write a synthetic corpus and its site configuration; returns the sites.json path."""
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, "index.tsv"), "w", encoding="utf-8") as index:
+        for number in range(pages):
+            filename = f"{number:05d}.html"
+            with open(os.path.join(directory, filename), "wb") as file:
+                # vary the article length like real pages do
+                file.write(synthetic_page(100 + number % 7 * 100))
+            index.write(f"https://bench.example/news/{number}\t{filename}\n")
+    path = os.path.join(directory, "sites.json")
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(SYNTHETIC_SITES, file, ensure_ascii=False, indent=2)
+    return path
+
+
+def load_corpus(directory: str) -> list[Page]:
+    pages = []
+    with open(os.path.join(directory, "index.tsv"), encoding="utf-8") as index:
+        for line in index:
+            if line.strip():
+                url, filename = line.rstrip("\n").split("\t", 1)
+                with open(os.path.join(directory, filename), "rb") as file:
+                    pages.append((url, file.read()))
+    return pages
+
+
+async def parse_all(
+    pages: list[Page], pool: ExtractPool | None, in_flight: int, sites_path: str
+) -> tuple[float, float, int]:
+    """Parse every page; returns (seconds, worst timer delay, articles extracted)."""
+    sites = get_sites(sites_path)
+    limit = asyncio.Semaphore(in_flight)
+    worst_delay = 0.0
+    done = asyncio.Event()
+
+    async def ticker() -> None:
+        nonlocal worst_delay
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(0.01)
+            worst_delay = max(worst_delay, time.perf_counter() - start - 0.01)
+
+    async def one(url: str, html: bytes) -> bool:
+        async with limit:
+            if pool is None:
+                article = sites.extract(url, html)
+                # let the ticker run between pages, as fetch workers would
+                await asyncio.sleep(0)
+            else:
+                article = await pool.extract(url, html)
+        return bool(article and article["content"])
+
+    timer = asyncio.create_task(ticker())
+    start = time.perf_counter()
+    extracted = await asyncio.gather(*(one(url, html) for url, html in pages))
+    seconds = time.perf_counter() - start
+    done.set()
+    await timer
+    return seconds, worst_delay, sum(extracted)
+
+
+def main(args: argparse.Namespace) -> None:
+    with tempfile.TemporaryDirectory() as scratch:
+        if args.corpus:
+            sites_path = args.sites or os.path.join(args.corpus, "sites.json")
+            if not os.path.exists(sites_path):
+                sites_path = args.sites
+            pages = load_corpus(args.corpus)
+        else:
+            sites_path = save_corpus(args.save_corpus or scratch, args.pages)
+            pages = load_corpus(args.save_corpus or scratch)
+        sites_path = sites_path or os.getenv("CRAWLER_SITES") or "sites.json"
+
+        cpus = os.cpu_count() or 1
+        counts = args.processes
+        if counts is None:
+            counts = [0] + sorted({count for count in (1, 2, 4, 8, 16, cpus) if count <= cpus})
+        print(
+            f"{len(pages)} pages, {sum(len(html) for _, html in pages) / 2 ** 20:.1f} MiB, {cpus} CPUs"
+        )
+        print(f'{"processes":<11}{"pages/s":>9}{"speedup":>9}{"worst loop delay":>18}  extracted')
+
+        baseline = None
+        for count in ["inline"] + counts:
+            if count == "inline":
+                seconds, delay, extracted = asyncio.run(parse_all(pages, None, 1, sites_path))
+            else:
+                with ExtractPool(processes=count, path=sites_path) as pool:
+                    # start the workers outside the timing
+                    asyncio.run(parse_all(pages[: count * 2], pool, count * 2, sites_path))
+                    seconds, delay, extracted = asyncio.run(
+                        parse_all(pages, pool, max(4, count * 2), sites_path)
+                    )
+            rate = len(pages) / seconds
+            if count == 0:
+                baseline = rate
+            speedup = f"{rate / baseline:.2f}x" if baseline else "-"
+            print(f"{count!s:<11}{rate:>9.1f}{speedup:>9}{delay * 1000:>15.1f} ms  {extracted}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument(
+        "--corpus", default=None, help="Directory with index.tsv and the saved pages"
+    )
+    parser.add_argument(
+        "--sites",
+        default=None,
+        help="Site configuration (default: the corpus sites.json, " "CRAWLER_SITES or sites.json)",
+    )
+    parser.add_argument("--pages", type=int, default=200, help="Synthetic corpus size")
+    parser.add_argument(
+        "--save-corpus", default=None, help="Keep the synthetic corpus in this directory"
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        nargs="+",
+        default=None,
+        help="Pool sizes to time (default: 0, 1, 2, 4, ... up to the CPU count)",
+    )
+    main(parser.parse_args())
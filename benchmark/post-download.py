@@ -1,131 +1,111 @@
 #!/usr/bin/env python
 
-# os
-import os
-# requests
-import requests
-
-# lxml
-from lxml import etree
-
-# bs4
-from bs4 import BeautifulSoup
+# asyncio
+import asyncio
 
+# for md5
+import hashlib
 
-# url parse
-from urllib.parse import urlparse
-
-# subprocess
-import subprocess
+# os
+import os
 
-# threads
-import threading
+# sys
+import sys
 
-# for md5
-import hashlib
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+# async fetch engine (shared connection pool, per-host limits and delay)
+from kgai.fetch import Fetcher  # noqa: E402
 
+# persistent URL state: due times, backoff, validators and content hashes
+from kgai.frontier import get_frontier  # noqa: E402
 
+# per-host selectors from sites.json, compiled once in each parse worker process
+from kgai.sites import ExtractPool  # noqa: E402
 
-def get_html(url):
-    r = requests.get(url)
-    return r.text
+# politeness settings, overridable from the environment
+CRAWLER_CONCURRENCY = int(os.getenv('CRAWLER_CONCURRENCY', '32'))
+CRAWLER_PER_HOST = int(os.getenv('CRAWLER_PER_HOST', '2'))
+CRAWLER_DELAY = float(os.getenv('CRAWLER_DELAY', '1.0'))
+CRAWLER_TIMEOUT = float(os.getenv('CRAWLER_TIMEOUT', '30'))
+CRAWLER_RETRIES = int(os.getenv('CRAWLER_RETRIES', '3'))
 
-def parse_xpath(html, xpath):
-    root = etree.HTML(html)
-    result = root.xpath(xpath)
-    return result
 
 def md5(string):
     md5_hash = hashlib.md5()
     md5_hash.update(string.encode('utf-8'))
     return md5_hash.hexdigest()
 
-def analysis( news_url ):
-    try:
-        print('URL', news_url)
-        # get url host, not hostname
-        host = urlparse(news_url).netloc
-        # get html
-        html = get_html(news_url)
-        # parse html
-        soup = BeautifulSoup(html, 'html.parser')
-        sel = css_selector[host]
-        news_html = soup.select(sel)
-        news_content = news_html[0].text
-        # pass arguments to main.sh
-
-        # process = subprocess.Popen(['./analysis.sh', news_url], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-
-        # Pass the news_content to main.sh through the pipe
-        # output, error = process.communicate(input=news_content)
-        # print(output)
-        return news_content
-    except:
-        print('Error', news_url)
-        pass
+async def analysis( pool, news_url, html, encoding ):
+    print('URL', news_url)
+    # one lxml parse in a worker process; the event loop keeps fetching meanwhile
+    # (the charset of the Content-Type header wins over the page's own)
+    article = await pool.extract(news_url, html, encoding)
+    if article is None:
+        print('Error', news_url, 'no site configuration for this host')
+        return None
+    if not article['content']:
+        print('Error', news_url, 'no content selector matched')
+        return None
+    return article['content']
+
+async def save( pool, frontier, news_url, html, encoding ):
+    content = await analysis(pool, news_url, html, encoding)
+    if content is None:
+        return
+    # same extracted text as the saved post: nothing to re-analyze
+    digest = frontier.changed(news_url, content)
+    if digest is None:
+        print('Unchanged', news_url)
+        return
+    # save post in posts/md5(news_url).md
+    with open('posts/' + md5(news_url) + '.md', 'w') as f:
+        f.write(content + '\n')
+        f.write(f'Reference: {news_url}\n')
+    frontier.analyzed(news_url, digest)
+
+async def download(news_source, frontier):
+    os.makedirs('posts', exist_ok=True)
+    # new URLs and those due for a recrawl or a retry; the rest were fetched recently
+    frontier.add(news_source)
+    news_source = frontier.due()
+    complete = 0
+    parsing = []
+    # CRAWLER_PARSE_PROCESSES workers (default: one per CPU)
+    with ExtractPool() as pool:
+        async with Fetcher(
+            concurrency=CRAWLER_CONCURRENCY,
+            per_host=CRAWLER_PER_HOST,
+            delay=CRAWLER_DELAY,
+            timeout=CRAWLER_TIMEOUT,
+            retries=CRAWLER_RETRIES,
+            # ETag / Last-Modified from the last fetch, for conditional GETs
+            validators=frontier.validators(news_source),
+        ) as fetcher:
+            # results arrive as each host delivers them; a slow host only delays its own URLs
+            async for result in fetcher.fetch_all(news_source):
+                complete += 1
+                print(f'Progress: {complete}/{len(news_source)} {result.url} ({result.status}, {result.elapsed:.1f}s)')
+                # failures are retried on later runs with exponential backoff
+                if frontier.record_fetch(result) == 'not_modified':
+                    continue
+                if not result.ok:
+                    print('Error', result.url, result.error)
+                    continue
+                parsing.append(asyncio.create_task(save(pool, frontier, result.url, result.body, result.encoding), name=result.url))
+        # one bad page must not keep the others from being saved
+        for task, result in zip(parsing, await asyncio.gather(*parsing, return_exceptions=True), strict=True):
+            if isinstance(result, Exception):
+                print('Error', task.get_name(), f'{type(result).__name__}: {result}')
 
 if __name__ == "__main__":
     # read news url array from news_source.txt
-    news_source = open('news_source.txt').read().split('\n')
-    xpaths = {
-        'www.ettoday.net': '//*[@id="society"]/div[4]/div[2]/div[9]/div/div/div[1]/div[1]/article/div',
-        'www.chinatimes.com': '//*[@id="page-top"]/div/div[2]/div/div/article/div/div[1]/div[2]/div[2]/div[2]',
-        'udn.com': '/html/body/main/div/section[2]/section/article/div/section[1]',
-        'news.ltn.com.tw': '//*[@id="ltnRWD"]/div[10]/section/div[4]/div[2]',
-        'finance.ettoday.net': '//*[@id="finance"]/div[3]/div[2]/div[7]/div/div[1]/div[1]/div[2]/div[4]',
-        'ctee.com.tw': '//*[@id="post--24779"]/div[3]'
-    }
-    css_selector = {
-        'www.ettoday.net': '#society > div.wrapper_box > div.wrapper > div.container_box > div > div > div.c1 > div.part_area_1 > article > div > div.story',
-        'www.chinatimes.com': '#page-top > div > div:nth-child(2) > div > div > article > div > div:nth-child(2) > div.row > div.col-xl-11 > div.article-body',
-        'udn.com': 'body > main > div > section.wrapper-left.main-content__wrapper > section > article > div > section.article-content__editor',
-        'news.ltn.com.tw': '#ltnRWD > div.content > section > div:nth-child(16) > div.text.boxTitle.boxText',
-        'finance.ettoday.net': '#finance > div.wrapper_box > div.wrapper > div.container_box > div > div.r1.clearfix > div.c1 > div.subject_article > div.story',
-        'ctee.com.tw': 'div.entry-content.clearfix.single-post-content'
-    }
-    for news in news_source:
-        try:
-            print(news)
-            host = urlparse(news).netloc
-            print(host)
-            print(xpaths[host])
-            print(css_selector[host])
-            print('-----------------------')
-            result = analysis(news)
-            # html = get_html(news)
-            # save post in posts/md5(news_url).md
-            with open('posts/' + md5(news) + '.md', 'w') as f:
-                    f.write(result + '\n')
-                    f.write(f'Reference: {news}\n')
-                    f.close()
-        except:
-            pass
-    # check output.csv exist or not, if not create it with default header
-    # if not os.path.exists('output.csv'):
-    #     with open('output.csv', 'w') as f:
-    #         f.write('新聞連結,犯罪人與公司,刑責,刑責進度,摘要\n')
-    # create threads
-    # num_threads = 3
-
-    # Divide the array into chunks for each thread
-    # chunk_size = len(news_source) // num_threads
-    # chunks = [news_source[i:i+chunk_size] for i in range(0, len(news_source), chunk_size)]
-
-    # # Create a thread for each chunk of the array
-    # threads = []
-    # complete = 0
-    # for chunk in chunks:
-    #     thread = threading.Thread(target=lambda items: [analysis(item) for item in items], args=(chunk,))
-    #     threads.append(thread)
-    #     thread.start()
-
-    # # Wait for all threads to finish
-    # for thread in threads:
-    #     complete += 1
-    #     print(f'Progress: {complete}/{chunk_size}')
-    #     thread.join()
-
-
-    # for news_url in news_source:
+    news_source = [url for url in open('news_source.txt').read().split('\n') if url.strip()]
 
+    # FRONTIER_PATH (default: .cache/frontier.sqlite3)
+    frontier = get_frontier()
+    try:
+        asyncio.run(download(news_source, frontier))
+    finally:
+        print(frontier.summary())
+        frontier.close()
@@ -0,0 +1,357 @@
+#!/usr/bin/env python
+"""
+Compare every extractor/inferencer config on the sample cases.
+
+Each (extractor, inferencer, case) combination runs the full pipeline
+concurrently against a local record/replay endpoint (:mod:`kgai.replay`), so
+once a cassette is recorded the benchmark runs offline and gives the same
+answers every time. For each prompt version it reports:
+
+- Subject precision/recall/F1 of the extractor against ``samples/caseN/target_*.txt``
+  (an extracted subject matches a target when one contains the other, e.g.
+  ``林姓`` and ``林姓男子``)
+- The share of subjects whose inferencer answer could be parsed
+- Suspected-flag accuracy and crime-keyword Jaccard against
+  ``samples/caseN/expected.json`` when a case has one
+  (``{"subject": {"suspected": true, "crimes": ["詐欺"]}}``), otherwise
+  agreement with the ``--reference`` inferencer on the same subjects
+- Tokens, seconds and cost (METRICS_PRICES) per article
+
+Rows are sorted from cheapest to most expensive; ``ok`` marks the versions
+that keep quality (``--min-f1``, ``--min-agreement``).
+
+Recording talks to the endpoint in OPENAI_BASE_URL/OPENAI_API_KEY; replaying
+needs no network or key.
+
+Usage:
+    python benchmark/prompt_versions.py --mode auto        # record what is missing
+    python benchmark/prompt_versions.py                    # replay offline
+    python benchmark/prompt_versions.py --inferencers inferencer_v8-1.json inferencer_v9-batch.json --speed 0
+"""
+
+import argparse
+import asyncio
+import glob
+import json
+import os
+import sys
+from typing import Any
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv  # noqa: E402
+
+from kgai import pipeline  # noqa: E402
+from kgai.dedup import normalize  # noqa: E402
+from kgai.metrics import track_article  # noqa: E402
+from kgai.registry import get_registry  # noqa: E402
+from kgai.replay import ReplayServer  # noqa: E402
+
+DEFAULT_CASSETTE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "cassettes", "prompt_versions.jsonl"
+)
+
+
+def load_case(dirname: str, crime: str, judge: str) -> dict[str, Any]:
+    """Read a sample case; case-level keyword files override the shared ones."""
+
+    def read(name: str, default: str | None = None) -> str | None:
+        path = os.path.join(dirname, name)
+        if not os.path.exists(path):
+            return default
+        with open(path, encoding="utf-8") as file:
+            return file.read()
+
+    targets = []
+    for path in sorted(glob.glob(os.path.join(dirname, "target_*.txt"))):
+        with open(path, encoding="utf-8") as file:
+            targets.append(file.read().strip())
+    expected = read("expected.json")
+    return {
+        "name": os.path.basename(os.path.normpath(dirname)),
+        "content": read("news_content.txt"),
+        "title": (read("news_title.txt") or "").strip() or None,
+        "crime": read("crime_keywords.txt", crime),
+        "judge": read("judge_keywords.txt", judge),
+        "targets": [target for target in targets if target],
+        "expected": json.loads(expected) if expected else None,
+    }
+
+
+def same_subject(first: str, second: str) -> bool:
+    a, b = normalize(first), normalize(second)
+    return bool(a and b) and (a in b or b in a)
+
+
+def subject_scores(subjects: list[str], targets: list[str]) -> tuple[float, float]:
+    """Return (precision, recall) of extracted subjects against the targets."""
+    if not subjects or not targets:
+        return float(not subjects), float(not targets)
+    precision = sum(any(same_subject(s, t) for t in targets) for s in subjects) / len(subjects)
+    recall = sum(any(same_subject(s, t) for s in subjects) for t in targets) / len(targets)
+    return precision, recall
+
+
+def jaccard(first: list[str], second: list[str]) -> float:
+    a: set[str] = set(first)
+    b: set[str] = set(second)
+    return 1.0 if not a and not b else len(a & b) / len(a | b)
+
+
+def agreement(records: list[Any], expected: dict[str, dict[str, Any]]) -> tuple[int, int, float]:
+    """Return (compared subjects, suspected matches, crime Jaccard sum) against expected answers."""
+    compared = matches = 0
+    crimes = 0.0
+    for record in records:
+        want = next(
+            (value for subject, value in expected.items() if same_subject(subject, record.subject)),
+            None,
+        )
+        if want is None or record.error:
+            continue
+        compared += 1
+        matches += record.suspected == want.get("suspected")
+        crimes += jaccard(record.crimes, want.get("crimes", []))
+    return compared, matches, crimes
+
+
+async def run_one(
+    extractor: str, inferencer: str, case: dict[str, Any], limit: asyncio.Semaphore
+) -> dict[str, Any]:
+    """Analyze one case with one prompt pair and keep its records and usage."""
+    async with limit:
+        with track_article(case["name"], extractor=extractor, inferencer=inferencer) as usage:
+            try:
+                result = await pipeline.analyze_async(
+                    extractor,
+                    inferencer,
+                    case["crime"],
+                    case["judge"],
+                    case["content"],
+                    case["title"],
+                )
+                error = None
+            except Exception as exception:
+                result, error = None, f"{type(exception).__name__}: {exception}"
+    return {
+        "extractor": extractor,
+        "inferencer": inferencer,
+        "case": case,
+        "result": result,
+        "error": error,
+        "usage": usage,
+    }
+
+
+def expected_for(
+    run: dict[str, Any], reference: dict[tuple[str, str], dict[str, Any]]
+) -> dict[str, dict[str, Any]]:
+    """Expected answers for a run: the case's labels, else the reference inferencer's answers."""
+    case = run["case"]
+    if case["expected"] is not None:
+        return case["expected"]
+    baseline = reference.get((run["extractor"], case["name"]))
+    if baseline is None or baseline["result"] is None or baseline is run:
+        return {}
+    return {
+        record.subject: {"suspected": record.suspected, "crimes": record.crimes}
+        for record in baseline["result"]["records"]
+        if not record.error
+    }
+
+
+def summarize(runs: list[dict[str, Any]], reference_conf: str) -> list[dict[str, Any]]:
+    """Aggregate the runs of each prompt pair into one report row."""
+    reference = {
+        (run["extractor"], run["case"]["name"]): run
+        for run in runs
+        if run["inferencer"] == reference_conf
+    }
+    rows: dict[tuple[str, str], dict[str, Any]] = {}
+    for run in runs:
+        row = rows.setdefault(
+            (run["extractor"], run["inferencer"]),
+            {
+                "extractor": run["extractor"],
+                "inferencer": run["inferencer"],
+                "cases": 0,
+                "failed": 0,
+                "precision": 0.0,
+                "recall": 0.0,
+                "subjects": 0,
+                "parsed": 0,
+                "compared": 0,
+                "suspected": 0,
+                "crimes": 0.0,
+                "tokens": 0,
+                "seconds": 0.0,
+                "cost": None,
+                "errors": [],
+            },
+        )
+        row["cases"] += 1
+        usage = run["usage"]
+        row["tokens"] += usage.total_tokens
+        row["seconds"] += usage.elapsed
+        if usage.cost is not None:
+            row["cost"] = (row["cost"] or 0.0) + usage.cost
+        if run["result"] is None:
+            row["failed"] += 1
+            row["errors"].append(f"{run['case']['name']}: {run['error']}")
+            continue
+        records = run["result"]["records"]
+        # Score what the extractor listed, before variants were merged
+        extracted = run["result"]["subjects"] + [
+            alias for aliases in run["result"].get("aliases", {}).values() for alias in aliases
+        ]
+        precision, recall = subject_scores(extracted, run["case"]["targets"])
+        row["precision"] += precision
+        row["recall"] += recall
+        row["subjects"] += len(records)
+        row["parsed"] += sum(1 for record in records if not record.error)
+        compared, suspected, crimes = agreement(records, expected_for(run, reference))
+        row["compared"] += compared
+        row["suspected"] += suspected
+        row["crimes"] += crimes
+
+    for row in rows.values():
+        cases = row["cases"]
+        done = cases - row["failed"]
+        precision = row["precision"] / done if done else 0.0
+        recall = row["recall"] / done if done else 0.0
+        row.update(
+            {
+                "precision": precision,
+                "recall": recall,
+                "f1": 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+                "parsed": row["parsed"] / row["subjects"] if row["subjects"] else 0.0,
+                "suspected": row["suspected"] / row["compared"] if row["compared"] else None,
+                "crimes": row["crimes"] / row["compared"] if row["compared"] else None,
+                "tokens": row["tokens"] / cases,
+                "seconds": row["seconds"] / cases,
+                "cost": row["cost"] / cases if row["cost"] is not None else None,
+            }
+        )
+    return sorted(
+        rows.values(), key=lambda row: (row["failed"] > 0, row["cost"] or 0.0, row["tokens"])
+    )
+
+
+def fmt(value: float | None, spec: str) -> str:
+    return "-" if value is None else format(value, spec)
+
+
+async def main(args: argparse.Namespace) -> None:
+    registry = get_registry(pipeline.PROMPTS_DIR)
+    extractors = args.extractors or registry.names("extractor")
+    inferencers = args.inferencers or registry.names("inferencer")
+    if args.reference not in inferencers:
+        inferencers.append(args.reference)
+    with open(
+        pipeline.resolve(args.crime_keywords, pipeline.SAMPLES_DIR), encoding="utf-8"
+    ) as file:
+        crime = file.read()
+    with open(
+        pipeline.resolve(args.judge_keywords, pipeline.SAMPLES_DIR), encoding="utf-8"
+    ) as file:
+        judge = file.read()
+    cases = [load_case(case, crime, judge) for case in args.cases]
+
+    server = ReplayServer(
+        args.cassette,
+        mode=args.mode,
+        upstream=os.getenv("OPENAI_BASE_URL"),
+        api_key=os.getenv("OPENAI_API_KEY"),
+        speed=args.speed,
+    )
+    async with server:
+        # Every request must reach the replay endpoint: no completion cache
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+        os.environ["OPENAI_API_KEY"] = os.getenv("OPENAI_API_KEY") or "replay"
+        os.environ["OPENAI_CACHE"] = "false"
+        print(
+            f"{len(extractors)} extractor(s) x {len(inferencers)} inferencer(s) x {len(cases)} case(s), "
+            f"{args.mode} from {os.path.relpath(args.cassette)} ({len(server.cassette)} recorded)\n"
+        )
+        limit = asyncio.Semaphore(max(1, args.concurrency))
+        runs = await asyncio.gather(
+            *(
+                run_one(extractor, inferencer, case, limit)
+                for extractor in extractors
+                for inferencer in inferencers
+                for case in cases
+            )
+        )
+
+    rows = summarize(list(runs), args.reference)
+    for row in rows:
+        quality = row["suspected"] if row["suspected"] is not None else 1.0
+        row["ok"] = not row["failed"] and row["f1"] >= args.min_f1 and quality >= args.min_agreement
+
+    print(
+        f'{"extractor":<22}{"inferencer":<24}{"F1":>6}{"parsed":>8}{"suspect":>9}{"crimes":>8}'
+        f'{"tokens":>8}{"sec":>7}{"$/art":>9}  ok'
+    )
+    for row in rows:
+        print(
+            f'{row["extractor"]:<22}{row["inferencer"]:<24}{row["f1"]:>6.2f}{row["parsed"]:>8.0%}'
+            f'{fmt(row["suspected"], ".0%"):>9}{fmt(row["crimes"], ".2f"):>8}{row["tokens"]:>8.0f}'
+            f'{row["seconds"]:>7.2f}{fmt(row["cost"], ".4f"):>9}  {"yes" if row["ok"] else "no"}'
+        )
+    for row in rows:
+        for error in row["errors"]:
+            print(f'{row["extractor"]} + {row["inferencer"]} failed on {error}')
+
+    cheapest = next((row for row in rows if row["ok"]), None)
+    if cheapest is not None:
+        print(
+            f'\nCheapest pair keeping quality: {cheapest["extractor"]} + {cheapest["inferencer"]}'
+        )
+    print(
+        f'Endpoint: {server.stats["replayed"]} replayed, {server.stats["recorded"]} recorded, '
+        f'{server.stats["missing"]} missing from the cassette'
+    )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(rows, file, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument(
+        "cases", nargs="*", default=sorted(glob.glob(os.path.join(root, "samples", "case*")))
+    )
+    parser.add_argument(
+        "--extractors", nargs="+", help="Extractor configs (default: all in prompts/)"
+    )
+    parser.add_argument(
+        "--inferencers", nargs="+", help="Inferencer configs (default: all in prompts/)"
+    )
+    parser.add_argument(
+        "--reference",
+        default="inferencer_v8-1.json",
+        help="Inferencer whose answers are expected for cases without expected.json",
+    )
+    parser.add_argument(
+        "--mode",
+        choices=("replay", "record", "auto"),
+        default="replay",
+        help="replay (offline), record (refresh from the endpoint) or auto (record missing)",
+    )
+    parser.add_argument("--cassette", default=DEFAULT_CASSETTE)
+    parser.add_argument(
+        "--speed", type=float, default=1.0, help="Replay latency multiplier (0: no waiting)"
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=8, help="Articles analyzed at the same time"
+    )
+    parser.add_argument("--min-f1", type=float, default=0.8)
+    parser.add_argument(
+        "--min-agreement", type=float, default=0.9, help="Minimum suspected-flag accuracy"
+    )
+    parser.add_argument("--crime-keywords", default="crime_keywords.txt")
+    parser.add_argument("--judge-keywords", default="judge_keywords.txt")
+    parser.add_argument("--output", "-o", help="Write the report rows as JSON")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+"""
+Measure results store insert throughput and query latency at scale.
+
+Fills a fresh store with synthetic analyses (random names, crime and legal
+proceeding keywords drawn from samples/*_keywords.txt, article text mixed
+from samples/case1..3), then times the lookups reviewers make: articles about
+a name, subjects by crime and stage, and full-text search. Each query is run
+for several values, including rare and common ones, and the slowest run is
+reported next to the target.
+
+Usage:
+    python benchmark/results_store.py
+    python benchmark/results_store.py --articles 1000000 --store /tmp/results.sqlite3
+"""
+
+import argparse
+import os
+import random
+import re
+import statistics
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from typing import Any
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from kgai import pipeline  # noqa: E402
+from kgai.keywords import parse_keywords  # noqa: E402
+from kgai.store import ResultStore  # noqa: E402
+
+_SURNAMES = "陳林黃張李王吳劉蔡楊許鄭謝郭洪曾邱廖賴周徐蘇葉莊呂江何蕭羅高"
+_GIVEN = "柏宽志明建宏俊雄淑芬美玲家豪冠宇怡君承翰欣怡宗翰雅婷文彬"
+
+
+def keywords(name: str) -> list[str]:
+    with open(pipeline.resolve(name, pipeline.SAMPLES_DIR), encoding="utf-8") as file:
+        return parse_keywords(file.read())
+
+
+def sentences() -> list[str]:
+    parts = []
+    for case in (1, 2, 3):
+        with open(
+            os.path.join(pipeline.SAMPLES_DIR, f"case{case}", "news_content.txt"), encoding="utf-8"
+        ) as file:
+            parts.extend(part + "。" for part in re.split(r"[。\n]", file.read()) if part.strip())
+    return parts
+
+
+def fill(store: ResultStore, count: int, seed: int = 0) -> float:
+    """Add ``count`` synthetic articles; returns articles per second."""
+    generator = random.Random(seed)
+    crimes = keywords("crime_keywords.txt")
+    stages = keywords("judge_keywords.txt")
+    text = sentences()
+    # Few crimes are common, most are rare, as in real coverage
+    crime_weights = [1 / (rank + 1) for rank in range(len(crimes))]
+    start = time.perf_counter()
+    for index in range(count):
+        subjects = []
+        for _ in range(generator.randint(1, 4)):
+            name = generator.choice(_SURNAMES) + "".join(generator.choices(_GIVEN, k=2))
+            subjects.append(
+                {
+                    "subject": name,
+                    "suspected": generator.random() < 0.6,
+                    "crimes": generator.choices(crimes, crime_weights, k=generator.randint(0, 3)),
+                    "progress": generator.sample(stages, generator.randint(0, 2)),
+                    "summary": f"{name}涉案遭檢方偵辦。",
+                }
+            )
+        body = "".join(generator.choices(text, k=generator.randint(5, 15)))
+        names = "、".join(subject["subject"] for subject in subjects)
+        store.add(
+            {
+                "id": f"synthetic-{index}",
+                "url": None,
+                "title": f"{names}案",
+                "content": names + body,
+            },
+            {"records": subjects},
+        )
+        if (index + 1) % 100000 == 0:
+            print(f"  {index + 1} articles")
+    store.flush()
+    return count / (time.perf_counter() - start)
+
+
+def timed(query: Callable[[], list[Any]], repeat: int = 3) -> dict[str, float]:
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = query()
+        runs.append(time.perf_counter() - start)
+    return {"median": statistics.median(runs), "max": max(runs), "rows": len(rows)}
+
+
+def main(args: argparse.Namespace) -> None:
+    path = args.store or os.path.join(tempfile.mkdtemp(), "results.sqlite3")
+    if os.path.exists(path):
+        sys.exit(f"{path} exists; the benchmark needs a fresh store")
+    store = ResultStore(path, batch_size=args.batch_size, flush_interval=float("inf"))
+    print(f"Filling {path} with {args.articles} articles")
+    rate = fill(store, args.articles)
+    stats = store.stats()
+    size = os.path.getsize(path) / 1e6
+    print(
+        f'{stats["articles"]} articles, {stats["subjects"]} subjects, {size:.0f} MB, '
+        f"inserted at {rate:.0f} articles/s (batches of {args.batch_size})\n"
+    )
+
+    crimes = keywords("crime_keywords.txt")
+    stages = keywords("judge_keywords.txt")
+    queries = {
+        "articles_mentioning(名字)": [
+            lambda name=name: store.articles_mentioning(name, args.limit)
+            for name in ("陳柏宽", "林志明", "張三豐")
+        ],
+        "find_subjects(crime, progress)": [
+            lambda crime=crime, stage=stage: store.find_subjects(
+                crime=crime, progress=stage, limit=args.limit
+            )
+            for crime, stage in ((crimes[0], stages[0]), ("洗錢", "起訴"), (crimes[-1], stages[-1]))
+        ],
+        "find_subjects(subject)": [
+            lambda: store.find_subjects(subject="陳柏宽", limit=args.limit),
+        ],
+        "search(text)": [
+            lambda text=text: store.search(text, args.limit) for text in ("董事長", "不存在的字串")
+        ],
+    }
+    print(f'{"query":<34}{"median ms":>11}{"max ms":>10}{"rows":>7}')
+    worst = 0.0
+    for name, runs in queries.items():
+        results = [timed(query) for query in runs]
+        slowest = max(results, key=lambda result: result["max"])
+        worst = max(worst, slowest["max"])
+        print(
+            f'{name:<34}{slowest["median"] * 1000:>11.1f}{slowest["max"] * 1000:>10.1f}{slowest["rows"]:>7}'
+        )
+    print(
+        f"\nSlowest query: {worst * 1000:.1f} ms (target {args.target:.0f} ms: "
+        f'{"met" if worst * 1000 <= args.target else "missed"})'
+    )
+    store.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--articles", type=int, default=200000, help="Synthetic articles to store")
+    parser.add_argument(
+        "--store", default=None, help="Store file to create (default: temporary file)"
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=1000, help="Articles per insert transaction"
+    )
+    parser.add_argument("--limit", type=int, default=100, help="Rows per query")
+    parser.add_argument("--target", type=float, default=100.0, help="Query latency target in ms")
+    main(parser.parse_args())
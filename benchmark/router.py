@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+"""
+Exercise the multi-endpoint router against local stub endpoints.
+
+Starts OpenAI-compatible stub servers on 127.0.0.1, each with its own latency,
+slow-tail share and failure mode, and sends concurrent requests through
+:mod:`kgai.router` in four scenarios:
+
+- balance: requests spread by least outstanding requests per weight
+- tail: one endpoint answers some requests very slowly; p99 latency with and
+  without hedging
+- failover: one endpoint fails every request; its circuit opens and every
+  request is still answered
+- extractor: extractor calls go to a small model, inferencer calls do not
+
+Each scenario checks its expectation and prints ``ok`` or ``FAILED``; the
+exit status is 1 when any scenario failed. The same behaviors are covered at
+a small scale by ``tests/test_router.py``.
+
+Usage:
+    python benchmark/router.py
+    python benchmark/router.py --requests 400 --concurrency 32
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+from typing import Any
+
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from kgai.client import submit_async  # noqa: E402
+from kgai.metrics import labels  # noqa: E402
+from kgai.router import Router, use_router  # noqa: E402
+
+
+class Stub:
+    """One stub endpoint; ``behavior`` keys: delay, tail, tail_delay, status."""
+
+    def __init__(self, port: int, **behavior: Any):
+        self.port = port
+        self.behavior = behavior
+        self.models: dict[str, int] = {}
+        self._runner: web.AppRunner | None = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/v1"
+
+    async def chat(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        self.models[body["model"]] = self.models.get(body["model"], 0) + 1
+        status = self.behavior.get("status")
+        if status:
+            return web.json_response({"error": {"message": "stub failure"}}, status=status)
+        delay = self.behavior.get("delay", 0.02)
+        if random.random() < self.behavior.get("tail", 0.0):
+            delay = self.behavior.get("tail_delay", 1.0)
+        await asyncio.sleep(delay)
+        return web.json_response(
+            {
+                "id": "stub",
+                "object": "chat.completion",
+                "created": 0,
+                "model": body["model"],
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": "ok"},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": {"prompt_tokens": 10, "completion_tokens": 1, "total_tokens": 11},
+            }
+        )
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self.chat)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, "127.0.0.1", self.port).start()
+
+    async def stop(self) -> None:
+        await self._runner.cleanup()
+
+
+def endpoint(name: str, stub: Stub, model: str = "stub-large", **options: Any) -> dict[str, Any]:
+    return {"name": name, "base_url": stub.url, "api_key": "stub", "model": model, **options}
+
+
+async def run(requests: int, concurrency: int, stage: str = "inferencer") -> list[float]:
+    """Send ``requests`` requests, ``concurrency`` at a time; returns their latencies."""
+    limit = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+
+    async def one(index: int) -> None:
+        async with limit:
+            start = time.monotonic()
+            with labels(stage=stage):
+                await submit_async("system", f"request {index} {random.random()}", use_cache=False)
+            latencies.append(time.monotonic() - start)
+
+    await asyncio.gather(*(one(index) for index in range(requests)))
+    return latencies
+
+
+def p99(latencies: list[float]) -> float:
+    return statistics.quantiles(latencies, n=100)[98]
+
+
+def report(name: str, ok: bool, detail: str) -> bool:
+    print(f'{name:<10} {"ok" if ok else "FAILED":<7} {detail}')
+    return ok
+
+
+async def balance(args: argparse.Namespace, port: int) -> bool:
+    stubs = [Stub(port + index, delay=0.05) for index in range(3)]
+    for stub in stubs:
+        await stub.start()
+    router = Router(
+        {
+            "endpoints": [
+                endpoint("a", stubs[0]),
+                endpoint("b", stubs[1]),
+                endpoint("c", stubs[2], weight=2),
+            ],
+            "hedge": False,
+        }
+    )
+    use_router(router)
+    await run(args.requests, args.concurrency)
+    for stub in stubs:
+        await stub.stop()
+    counts = [row["requests"] for row in router.stats()]
+    share = counts[2] / sum(counts)
+    return report("balance", 0.4 <= share <= 0.6, f"requests per endpoint {counts} (weights 1:1:2)")
+
+
+async def tail(args: argparse.Namespace, port: int) -> bool:
+    stubs = [Stub(port, delay=0.02, tail=0.05, tail_delay=1.0), Stub(port + 1, delay=0.02)]
+    for stub in stubs:
+        await stub.start()
+    results = {}
+    for hedge in (False, {"percentile": 90, "min_samples": 20, "budget": 0.2}):
+        router = Router(
+            {
+                "endpoints": [endpoint("slow-tail", stubs[0]), endpoint("steady", stubs[1])],
+                "hedge": hedge,
+            }
+        )
+        use_router(router)
+        results[bool(hedge)] = (
+            p99(await run(args.requests, args.concurrency)),
+            sum(row["hedges"] for row in router.stats()),
+        )
+    for stub in stubs:
+        await stub.stop()
+    (plain, _), (hedged, hedges) = results[False], results[True]
+    return report(
+        "tail",
+        hedged < plain / 2,
+        f"p99 {plain * 1000:.0f} ms without hedging, {hedged * 1000:.0f} ms with ({hedges} hedges)",
+    )
+
+
+async def failover(args: argparse.Namespace, port: int) -> bool:
+    stubs = [Stub(port, status=503), Stub(port + 1, delay=0.02)]
+    for stub in stubs:
+        await stub.start()
+    router = Router(
+        {
+            "endpoints": [endpoint("down", stubs[0]), endpoint("up", stubs[1])],
+            "hedge": False,
+            "breaker": {"failures": 3, "cooldown": 60},
+        }
+    )
+    use_router(router)
+    latencies = await run(args.requests, args.concurrency)
+    for stub in stubs:
+        await stub.stop()
+    down = router.stats()[0]
+    return report(
+        "failover",
+        len(latencies) == args.requests and down["state"] == "open",
+        f'{len(latencies)}/{args.requests} answered, {down["requests"]} sent to the failing endpoint, '
+        f'circuit {down["state"]}',
+    )
+
+
+async def extractor(args: argparse.Namespace, port: int) -> bool:
+    stubs = [Stub(port, delay=0.02), Stub(port + 1, delay=0.01)]
+    for stub in stubs:
+        await stub.start()
+    use_router(
+        Router(
+            {
+                "endpoints": [
+                    endpoint("large", stubs[0]),
+                    endpoint("small", stubs[1], model="stub-small", stages=["extractor"]),
+                ],
+                "hedge": False,
+            }
+        )
+    )
+    await run(args.requests // 2, args.concurrency, stage="extractor")
+    await run(args.requests // 2, args.concurrency, stage="inferencer")
+    for stub in stubs:
+        await stub.stop()
+    return report(
+        "extractor",
+        stubs[1].models == {"stub-small": args.requests // 2},
+        f"large endpoint models {stubs[0].models}, small endpoint models {stubs[1].models}",
+    )
+
+
+async def main(args: argparse.Namespace) -> int:
+    # Cancelled hedges drop their connections mid-request; the stubs need not log it
+    logging.getLogger("aiohttp.server").setLevel(logging.CRITICAL)
+    ok = True
+    for index, scenario in enumerate((balance, tail, failover, extractor)):
+        ok = await scenario(args, args.port + index * 10) and ok
+    use_router(None)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--requests", type=int, default=400, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16, help="Requests in flight")
+    parser.add_argument("--port", type=int, default=18500, help="First stub port")
+    sys.exit(asyncio.run(main(parser.parse_args())))
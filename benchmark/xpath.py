@@ -1,23 +1,137 @@
 #!/usr/bin/env python
-from lxml import etree
+"""
+Compare BeautifulSoup and the compiled lxml site extractor.
+
+The BeautifulSoup path is what the crawler scripts used to do: parse with the
+pure-Python ``html.parser`` and run the host's CSS selector on every page.
+The lxml path is ``kgai.sites``: one ``lxml.html`` parse and selectors
+compiled once per host, extracting title, content, reporter and extra fields.
+
+Pages are given as ``URL=file.html`` (a saved page and the URL it came from)
+or as plain URLs, which are downloaded once before timing. Without pages a
+synthetic article is generated so the benchmark runs offline.
+
+Usage:
+    python benchmark/xpath.py
+    python benchmark/xpath.py https://udn.com/news/story/7321/7346166 --iterations 50
+    python benchmark/xpath.py https://udn.com/news/story/1=saved/udn.html
+"""
+
+import argparse
+import asyncio
+import os
 import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup  # noqa: E402
+
+from kgai.fetch import Fetcher  # noqa: E402
+from kgai.sites import Selector, SiteConfig, SiteRegistry, get_sites  # noqa: E402
+
+SYNTHETIC_URL = 'https://bench.example/news/1'
+SYNTHETIC_SITES = {
+    'bench.example': {
+        'title': ['h1.headline', '//title'],
+        'content': ['#main > article > div.story', '//article/div'],
+        'reporter': 'span.author',
+        'extra_publish_date': '//time/@datetime',
+    },
+}
+
+
+def synthetic_page(paragraphs: int = 400) -> bytes:
+    """Build a news-like page with navigation noise around the article."""
+    noise = ''.join(
+        f'<li><a href="/news/{i}">相關新聞 {i}</a><span class="tag">社會</span></li>' for i in range(300)
+    )
+    body = ''.join(
+        f'<p>第{i}段：檢方指出被告涉嫌詐欺與洗錢，案件仍在偵查中。</p>' for i in range(paragraphs)
+    )
+    return (
+        '<html><head><meta charset="utf-8"><title>測試新聞</title></head><body>'
+        f'<nav><ul>{noise}</ul></nav><div id="main"><article>'
+        '<h1 class="headline">測試新聞標題</h1><span class="author">記者王小明</span>'
+        '<time datetime="2024-01-01T00:00:00+08:00">2024-01-01</time>'
+        f'<div class="story">{body}</div></article></div><footer><ul>{noise}</ul></footer>'
+        '</body></html>'
+    ).encode()
+
+
+def first_css(site: SiteConfig) -> Selector:
+    """Return the first CSS content selector (the one the old scripts used)."""
+    for selector in site.fields['content']:
+        if selector.kind == 'css':
+            return selector
+    raise ValueError(f'{site.host}: no CSS content selector to compare against')
+
+
+def bs4_extract(html: bytes, css: str) -> str:
+    soup = BeautifulSoup(html, 'html.parser')
+    return soup.select(css)[0].text.strip()
+
 
-# read from stdin
-html = sys.stdin.read()
-xpath = sys.argv[1]
+def timed(function, iterations: int) -> tuple[float, object]:
+    result = None
+    start = time.perf_counter()
+    for _ in range(iterations):
+        result = function()
+    return (time.perf_counter() - start) / iterations, result
 
 
-# html = sys.argv[0]
-# xpath= sys.argv[1]
-# print(html)
+async def download(urls: list[str]) -> list[tuple[str, bytes]]:
+    pages = []
+    async with Fetcher() as fetcher:
+        async for result in fetcher.fetch_all(urls):
+            if result.ok:
+                pages.append((result.url, result.body))
+            else:
+                print(f'Skipping {result.url}: {result.error}')
+    return pages
 
-# root = etree.fromstring(html)
-print('xpath',xpath)
-# root = etree.HTML(html)
-# result = root.xpath(xpath)
 
-# result = root.xpath(xpath)
+def main(args: argparse.Namespace) -> None:
+    if args.pages:
+        sites = get_sites(args.sites)
+        pages = []
+        urls = []
+        for page in args.pages:
+            if '=' in page:
+                url, path = page.split('=', 1)
+                with open(path, 'rb') as file:
+                    pages.append((url, file.read()))
+            else:
+                urls.append(page)
+        if urls:
+            pages.extend(asyncio.run(download(urls)))
+    else:
+        sites = SiteRegistry(SYNTHETIC_SITES)
+        pages = [(SYNTHETIC_URL, synthetic_page())]
 
-# print(result)
+    header = f'{"host":<24}{"KiB":>8}{"bs4 ms":>10}{"lxml ms":>10}{"speedup":>9}  same'
+    print(header)
+    for url, html in pages:
+        site = sites.for_url(url)
+        if site is None:
+            print(f'Skipping {url}: no site configuration')
+            continue
+        css = first_css(site).expression
+        try:
+            bs4_seconds, bs4_content = timed(lambda html=html, css=css: bs4_extract(html, css),
+                                          args.iterations)
+        except IndexError:
+            bs4_seconds, bs4_content = float('nan'), None
+        lxml_seconds, article = timed(lambda site=site, html=html: site.extract(html),
+                                      args.iterations)
+        same = 'yes' if bs4_content == article['content'] else 'no'
+        print(f'{site.host:<24}{len(html) / 1024:>8.1f}{bs4_seconds * 1000:>10.2f}'
+              f'{lxml_seconds * 1000:>10.2f}{bs4_seconds / lxml_seconds:>8.1f}x  {same}')
 
 
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('pages', nargs='*', help='URL or URL=saved.html (default: synthetic page)')
+    parser.add_argument('--sites', default=None, help='Site configuration (default: sites.json)')
+    parser.add_argument('--iterations', type=int, default=20)
+    main(parser.parse_args())
@@ -4,15 +4,78 @@ Demo Web Interface for News Inferencer.
 
 Provides a Gradio-based web interface for interactive legal analysis of news articles.
 Users can select extractor/inferencer configurations, provide keywords, and paste
-news content to receive structured analysis results.
+news content to receive structured analysis results. Results are streamed: the
+subject list appears once the extractor answers, and each subject's answer is
+shown token by token until it is parsed.
 """
 
+import html
 import os
+from collections.abc import Iterator
+
 import gradio as gr
-import prompt
-import json
-import re
-from typing import Dict, List, Any
+
+import prompt  # noqa: F401  (loads .env)
+from kgai import pipeline
+from kgai.client import iterate_sync
+from kgai.parser import InferenceRecord
+from kgai.registry import get_registry
+
+# Markdown label for each parsed inferencer field, in display order
+DISPLAY_FIELDS = [
+    ('主體', 'subject'),
+    ('是否有嫌疑', 'suspected'),
+    ('刑責', 'crimes'),
+    ('刑責進度', 'progress'),
+    ('事件摘要', 'summary'),
+]
+
+
+def render(
+    users: list[str],
+    records: dict[str, InferenceRecord],
+    streamed: dict[str, str] | None = None,
+    aliases: dict[str, list[str]] | None = None
+) -> str:
+    """
+    Format the subjects and their results as Markdown.
+
+    Args:
+        users: Subjects in extractor order
+        records: Parsed record per finished subject
+        streamed: Answer text received so far per unfinished subject
+        aliases: Other names of merged subjects
+
+    Returns:
+        Markdown; subjects still being analyzed show their partial answer
+    """
+    streamed = streamed or {}
+    aliases = aliases or {}
+    user_list = ""
+    analysis_result = ""
+    for user in users:
+        also = f"（{'、'.join(aliases[user])}）" if user in aliases else ''
+        user_list += f'\n- {user}{also}\n'
+        record = records.get(user)
+        if record is None:
+            text = html.escape(streamed.get(user, ''))
+            analysis_result += f'\n### {user}\n<details open>\n<pre>{text}▌</pre>\n</details>\n'
+            continue
+        if record.error:
+            output = f"- 解析失敗: {record.error}\n<br>\n"
+        else:
+            output = "".join(
+                f"- {label}: {record.raw[name]}\n<br>\n" for label, name in DISPLAY_FIELDS
+            )
+        analysis_result += f'\n### {user}\n<details>\n{output}</details>\n'
+    return f"""
+    # 檢測結果
+    ## 檢測主體:
+    {user_list}
+
+    ## 檢測結果:
+    {analysis_result}
+    """
 
 
 def analysis(
@@ -21,13 +84,18 @@ def analysis(
     crime_keywords_file: str,
     judge_keywords_file: str,
     news_content: str
-) -> str:
+) -> Iterator[str]:
     """
     Main analysis pipeline that extracts subjects and infers legal liability.
     
     This function orchestrates the two-stage analysis:
-    1. Extract all subjects mentioned in the news article
-    2. For each subject, analyze their legal liability
+    1. Extract all subjects mentioned in the news article, merging
+       variants of the same name (``厲害科技`` / ``厲害科技股份有限公司``)
+    2. For each subject, analyze their legal liability (requests are sent
+       concurrently, bounded by OPENAI_MAX_CONCURRENCY)
+
+    It is a generator: Gradio re-renders the output with every yielded value,
+    so the page fills in while the answers stream.
     
     Args:
         extractor_conf: Extractor configuration filename (from prompts/)
@@ -36,146 +104,49 @@ def analysis(
         judge_keywords_file: Legal proceeding keywords filename (from samples/)
         news_content: Raw news article text
         
-    Returns:
+    Yields:
         Markdown-formatted analysis results with detected subjects and
-        their legal liability assessments
+        their legal liability assessments, the last one complete
     """
     dirname = os.path.dirname(__file__)
     crime_keywords = open(os.path.join(dirname, 'samples', crime_keywords_file)).read()
     judge_keywords = open(os.path.join(dirname, 'samples', judge_keywords_file)).read()
-    extractor = complete(extractor_conf, crime_keywords, judge_keywords, news_content)
-    inferencer = complete(inferencer_conf, crime_keywords, judge_keywords, news_content)
-    print(extractor, inferencer)
-    
-    # Execute the pipeline
-    extractor_result = prompt.submit(
-        system_content=extractor['files']['system'],
-        user_content=extractor['files']['user']
-    )
-    
-    # users = get_users(response['choices'][0]['message']['content'])
-    # convert users array to string
-    # Only support extractor_v1-1.json, extractor_v1-2.json
-    users = extractor_result['choices'][0]['message']['content'].split(': ')[1].split(',')
-    # replace each user whitespaces
-    users = [user.strip() for user in users]
-    print(users)
 
-    user_list = ""
-    analysis_result = ""
-    for user in users:
-        user_list += f'\n- {user}\n'
-        print(inferencer['files']['user'].replace('$target', user))
-        inferencer_result = prompt.submit(
-            system_content=inferencer['files']['system'],
-            user_content=inferencer['files']['user'].replace('$target', user)
-        )
-        print()
-        user_result = inferencer_result['choices'][0]['message']['content'].split("### 輸出格式\n").pop()
-        keys = ['主體', '是否有嫌疑', '刑責', '刑責進度', '事件摘要']
-        progress = 0
-        output = ""
-        print(user_result.split('\n'))
-        for res in user_result.split("\n"):
-            content = res.split(": ")
-            output += f"- {keys[progress]}: {content[1]}\n<br>\n"
-            progress += 1
-
-        # hardcoded
-        ## Regex
-        ## 討論的主體(target): (.*)
-        ## 是否涉及任何刑責關鍵字(是或否): (是|否)
-        ## 涉及刑責關鍵字(逗號分割): (.*)
-        ## 涉及刑責進度關鍵字(逗號分割): (.*)
-        # ## 事件摘要(50字): (.*)
-
-        # match = re.search(pattern, user_result, re.DOTALL)
-        # if match:
-        #     target = match.group(1)
-        #     involves_crime = match.group(2)
-        #     crime_keywords = match.group(3)
-        #     crime_progress = match.group(4)
-        #     summary = match.group(5)
-
-        #     print("Target:", target)
-        #     print("Involves Crime:", involves_crime)
-        #     print("Crime Keywords:", crime_keywords)
-        #     print("Crime Progress:", crime_progress)
-        #     print("Summary:", summary)
-        # else:
-        #     target = 'Unknow'
-        #     involves_crime = 'Unknow'
-        #     crime_keywords = 'Unknow'
-        #     crime_progress = 'Unknow'
-        #     summary = 'Unknow'
-        # # hardcode end
-        # print(user_result)
-        print(output)
-        print("=" * 10)
-        analysis_result += f'\n### {user}\n<details>\n{output}</details>\n'
-    return f"""
+    yield "# 檢測結果\n主體解析中…"
+    users: list[str] = []
+    aliases: dict[str, list[str]] = {}
+    records: dict[str, InferenceRecord] = {}
+    streamed: dict[str, str] = {}
+    events = iterate_sync(pipeline.analyze_stream_async(
+        extractor_conf, inferencer_conf, crime_keywords, judge_keywords, news_content
+    ))
+    for event in events:
+        kind = event[0]
+        if kind == 'subjects':
+            _, users, aliases = event
+            print(users)
+        elif kind == 'delta':
+            _, user, text = event
+            streamed[user] = '' if text is None else streamed.get(user, '') + text
+        elif kind == 'record':
+            _, user, _, record = event
+            records[user] = record
+            streamed.pop(user, None)
+        elif kind == 'result':
+            if event[1].get('prefilter') == 'skip':
+                yield """
     # 檢測結果
-    ## 檢測主體:
-    {user_list}
-
-    ## 檢測結果:
-    {analysis_result}
-    """
-
-
-def read_config(config_file: str) -> Dict[str, Any]:
-    """
-    Load JSON configuration file.
-    
-    Args:
-        config_file: Path to JSON configuration file
-        
-    Returns:
-        Parsed configuration dictionary
+    未發現任何刑責關鍵字，略過分析。
     """
-    with open(config_file) as file:
-        config = json.load(file)
-    return config
+                return
+            records = dict(zip(users, event[1]['records'], strict=True))
+        yield render(users, records, streamed, aliases)
 
 
-def complete(
-    conf_file: str,
-    crime_keywords: str,
-    judge_keywords: str,
-    news_content: str
-) -> Dict[str, Any]:
-    """
-    Load configuration and prepare prompts with variable substitution.
-    
-    Args:
-        conf_file: Configuration filename (relative to prompts/)
-        crime_keywords: Crime keywords content
-        judge_keywords: Legal proceeding keywords content
-        news_content: News article content
-        
-    Returns:
-        Configuration dictionary with prompts ready for submission
-    """
-    inputs = {
-        'crime_keywords': crime_keywords,
-        'judge_keywords': judge_keywords,
-        'news_content': news_content
-    }
-    dirname = os.path.dirname(__file__)
-    conf = read_config(os.path.join(dirname, 'prompts', conf_file))
-    for file in conf['files']:
-        prompt_text = open(os.path.join(dirname, 'prompts', conf['files'][file])).read()
-        for key in conf['inputs']:
-            if key in inputs:
-                prompt_text = prompt_text.replace(f'${key}', inputs[key])
-            else:
-                print("Can not find the key: ", key)
-        conf['files'][file] = prompt_text
-    return conf
-
-    
-_ExtractorList = [file for file in os.listdir('./prompts') if file.startswith('extractor') and file.endswith('.json')]
-_InferencerList = [file for file in os.listdir('./prompts') if file.startswith('inferencer') and file.endswith('.json')]
+# Every prompt config is loaded and validated once at startup
+_Prompts = get_registry(pipeline.PROMPTS_DIR)
+_ExtractorList = _Prompts.names('extractor')
+_InferencerList = _Prompts.names('inferencer')
 _CrimeKeywords = [file for file in os.listdir('./samples') if file.startswith('crime') and file.endswith('.txt')]
 _JudgeKeywords = [file for file in os.listdir('./samples') if file.startswith('judge') and file.endswith('.txt')]
 
@@ -213,7 +184,7 @@ demo = gr.Interface(
             placeholder='請輸入新聞內容',
             lines=10,
         ),
-        
+
         # gr.Textbox(
         #     label='新聞內容',
         #     placeholder='請輸入新聞內容',
@@ -222,7 +193,7 @@ demo = gr.Interface(
     outputs=gr.Markdown('# 檢測結果\n範例主體: <details>更多細節</details>'),
     examples=[
         [
-           'extractor_v1-1.json', 
+           'extractor_v1-1.json',
            'inferencer_v8-1.json',
             'crime_keywords.txt',
             'judge_keywords.txt',
@@ -233,4 +204,7 @@ demo = gr.Interface(
     css="footer {visibility: hidden}"
 )
 
+# Queue requests so streamed outputs work and concurrent users share the
+# OpenAI limits instead of each opening their own burst of requests
+demo.queue(default_concurrency_limit=int(os.getenv('GRADIO_CONCURRENCY_LIMIT', '8')))
 demo.launch()
@@ -0,0 +1,597 @@
+"""
+Batch analysis over a directory or JSONL file of articles.
+
+Runs the full extractor -> inferencer pipeline for many articles with a pool
+of asyncio workers, streams results to JSONL or CSV as they finish and records
+finished article ids in a checkpoint file so an interrupted run can resume.
+With ``--store`` results are also added to the queryable results store
+(:mod:`kgai.store`). With ``--incremental`` stage outputs are kept in the
+stage store (:mod:`kgai.stages`) and a re-run only recomputes the stages
+whose inputs changed; ``--dry-run`` reports what that would cost.
+Near-duplicate articles (the same wire story on several sites) reuse the
+analysis stored for the first copy instead of calling the model again.
+
+Usage:
+    ./prompt.py batch samples/case1 samples/case2 --output outputs/results.jsonl
+    ./prompt.py batch benchmark/posts/ --output outputs/results.csv --rpm 500 --tpm 200000
+    ./prompt.py batch benchmark/posts/ --inferencer inferencer_v8-1.json --incremental --dry-run
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import os
+import time
+from collections.abc import Iterator
+from typing import Any, TextIO
+
+from kgai import pipeline
+from kgai.client import stage_model
+from kgai.dedup import DuplicateIndex, analysis_key, get_index
+from kgai.metrics import get_metrics
+from kgai.parser import InferenceRecord
+from kgai.router import get_router
+from kgai.stages import StageStore, get_stage_store
+from kgai.store import ResultStore, get_store
+
+CSV_HEADER = ["新聞連結", "犯罪人與公司", "是否有嫌疑", "刑責", "刑責進度", "摘要"]
+
+
+def _read(path: str) -> str:
+    with open(path, encoding="utf-8") as file:
+        return file.read()
+
+
+def _load_case(dirname: str) -> dict[str, Any]:
+    """Load a samples/caseN style directory (news_content.txt + news_title.txt)."""
+    title_file = os.path.join(dirname, "news_title.txt")
+    return {
+        "id": os.path.normpath(dirname),
+        "url": None,
+        "title": _read(title_file).strip() if os.path.exists(title_file) else None,
+        "content": _read(os.path.join(dirname, "news_content.txt")),
+    }
+
+
+def _load_post(filename: str) -> dict[str, Any]:
+    """Load a post saved by benchmark/post-download.py (body + 'Reference: <url>')."""
+    lines = _read(filename).rstrip("\n").split("\n")
+    url = None
+    if lines and lines[-1].startswith("Reference: "):
+        url = lines.pop()[len("Reference: ") :].strip()
+    return {
+        "id": os.path.splitext(os.path.basename(filename))[0],
+        "url": url,
+        "title": None,
+        "content": "\n".join(lines),
+    }
+
+
+def load_articles(paths: list[str]) -> Iterator[dict[str, Any]]:
+    """
+    Yield articles from case directories, post directories, files or JSONL.
+
+    Accepted inputs:
+        - A directory containing ``news_content.txt`` (one article)
+        - A directory of such case directories and/or ``.md``/``.txt`` posts
+        - A single post file
+        - A ``.jsonl`` file with ``content`` (and optional ``id``, ``url``,
+          ``title``) per line
+
+    Args:
+        paths: Input paths
+
+    Yields:
+        Article dictionaries with id, url, title and content
+    """
+    for path in paths:
+        if path.endswith(".jsonl"):
+            with open(path, encoding="utf-8") as file:
+                for number, line in enumerate(file):
+                    if not line.strip():
+                        continue
+                    record = json.loads(line)
+                    yield {
+                        "id": str(record.get("id") or record.get("url") or f"{path}:{number}"),
+                        "url": record.get("url"),
+                        "title": record.get("title"),
+                        "content": record.get("content") or record["news_content"],
+                    }
+        elif os.path.isdir(path):
+            if os.path.exists(os.path.join(path, "news_content.txt")):
+                yield _load_case(path)
+                continue
+            for name in sorted(os.listdir(path)):
+                entry = os.path.join(path, name)
+                if os.path.isdir(entry) and os.path.exists(os.path.join(entry, "news_content.txt")):
+                    yield _load_case(entry)
+                elif os.path.isfile(entry) and name.endswith((".md", ".txt")):
+                    yield _load_post(entry)
+        else:
+            yield _load_post(path)
+
+
+def _to_stored(result: dict[str, Any]) -> dict[str, Any]:
+    """Convert a pipeline result into the JSON stored in the duplicate index."""
+    return {**result, "records": [record.to_dict() for record in result["records"]]}
+
+
+def _from_stored(stored: dict[str, Any]) -> dict[str, Any]:
+    """Rebuild a pipeline result from its stored JSON."""
+    return {**stored, "records": [InferenceRecord(**record) for record in stored["records"]]}
+
+
+def read_checkpoint(checkpoint: str) -> set[str]:
+    """
+    Return the ids of articles finished by a previous run.
+
+    Args:
+        checkpoint: Checkpoint file path
+
+    Returns:
+        Set of finished article ids (empty if the file does not exist)
+    """
+    if not os.path.exists(checkpoint):
+        return set()
+    with open(checkpoint, encoding="utf-8") as file:
+        return {line.rstrip("\n") for line in file if line.strip()}
+
+
+class ResultWriter:
+    """
+    Append analysis results to a JSONL or CSV file and to the checkpoint.
+
+    Each result is flushed before its id is checkpointed, so a crash never
+    marks an article as done without its output on disk. With a results
+    store, ids are checkpointed once the store has written their batch.
+    """
+
+    def __init__(
+        self,
+        output: str,
+        checkpoint: str,
+        store: ResultStore | None = None,
+        extractor: str | None = None,
+        inferencer: str | None = None,
+    ):
+        self.csv = output.endswith(".csv")
+        self.store = store
+        self._configs = {"extractor": extractor, "inferencer": inferencer}
+        self._unstored: list[str] = []
+        dirname = os.path.dirname(output)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        new_file = not os.path.exists(output) or os.path.getsize(output) == 0
+        self._output: TextIO = open(output, "a", encoding="utf-8", newline="")
+        self._checkpoint: TextIO = open(checkpoint, "a", encoding="utf-8")
+        if self.csv:
+            self._csv = csv.writer(self._output)
+            if new_file:
+                self._csv.writerow(CSV_HEADER)
+
+    def write(self, article: dict[str, Any], result: dict[str, Any]) -> None:
+        """
+        Write one article's result and mark it as finished.
+
+        Args:
+            article: Article dictionary from :func:`load_articles`
+            result: Pipeline result from :func:`kgai.pipeline.analyze_async`
+        """
+        link = article["url"] or article["id"]
+        # Each record is written under the subject it was requested for
+        subjects = result["subjects"]
+        if self.csv:
+            for subject, record in zip(subjects, result["records"], strict=True):
+                self._csv.writerow(
+                    [
+                        link,
+                        subject,
+                        record.raw.get("suspected", ""),
+                        ", ".join(record.crimes),
+                        ", ".join(record.progress),
+                        record.summary,
+                    ]
+                )
+        else:
+            record = {
+                "id": article["id"],
+                "url": article["url"],
+                "title": article["title"],
+                **result,
+                "records": [
+                    {**record.to_dict(), "subject": subject}
+                    for subject, record in zip(subjects, result["records"], strict=True)
+                ],
+            }
+            self._output.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._output.flush()
+        self._unstored.append(article["id"])
+        if self.store is None or self.store.add(article, result, **self._configs):
+            self._mark_done()
+
+    def _mark_done(self) -> None:
+        """Checkpoint the articles whose results are on disk."""
+        for article_id in self._unstored:
+            self._checkpoint.write(article_id + "\n")
+        self._checkpoint.flush()
+        self._unstored = []
+
+    def close(self) -> None:
+        """Write buffered results, then close the output, checkpoint and store."""
+        if self.store is not None:
+            self.store.close()
+        self._mark_done()
+        self._output.close()
+        self._checkpoint.close()
+
+
+async def run_batch(
+    articles: list[dict[str, Any]],
+    writer: ResultWriter,
+    extractor_conf: str,
+    inferencer_conf: str,
+    crime_keywords: str,
+    judge_keywords: str,
+    workers: int = 4,
+    dedup: DuplicateIndex | None = None,
+    stages: StageStore | None = None,
+) -> dict[str, Any]:
+    """
+    Analyze ``articles`` with ``workers`` concurrent pipelines.
+
+    With a duplicate index, each article is fingerprinted first; a
+    near-duplicate of an article analyzed with the same prompts and keywords
+    (in this run or an earlier one) reuses that analysis, and its result gets
+    ``duplicate_of`` and ``similarity`` keys.
+
+    Args:
+        articles: Articles to analyze
+        writer: Destination for finished results
+        extractor_conf: Extractor configuration filename
+        inferencer_conf: Inferencer configuration filename
+        crime_keywords: Crime keywords content
+        judge_keywords: Legal proceeding keywords content
+        workers: Number of articles analyzed at the same time
+        dedup: Optional near-duplicate index
+        stages: Optional stage store for incremental re-analysis
+
+    Returns:
+        Summary with done, failed, duplicates, elapsed seconds and
+        articles_per_second
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    for article in articles:
+        queue.put_nowait(article)
+    total = len(articles)
+    stats = {"done": 0, "failed": 0, "duplicates": 0}
+    start = time.monotonic()
+    key = analysis_key(
+        extractor_conf,
+        inferencer_conf,
+        crime_keywords,
+        judge_keywords,
+        pipeline.prefilter_mode(),
+        str(pipeline.matched_only()),
+        # Another model or temperature gives another answer
+        stage_model("extractor"),
+        stage_model("inferencer"),
+        os.getenv("OPENAI_TEMPERATURE", "0.0"),
+    )
+    # Articles of this run still being analyzed; their copies wait for them
+    pending: dict[str, asyncio.Event] = {}
+
+    def report(article: dict[str, Any]) -> None:
+        elapsed = time.monotonic() - start
+        finished = stats["done"] + stats["failed"]
+        print(
+            f"[{finished}/{total}] {article['id']} " f"({stats['done'] / elapsed:.2f} articles/s)"
+        )
+
+    async def reuse(article: dict[str, Any], signature: list[int]) -> dict[str, Any] | None:
+        """Return the stored analysis of a near-duplicate, indexing the article otherwise."""
+        match = dedup.query(signature, exclude=article["id"])
+        if match is None:
+            dedup.add(article["id"], signature)
+            pending[article["id"]] = asyncio.Event()
+            return None
+        original, score = match
+        if original in pending:
+            await pending[original].wait()
+        stored = dedup.get_analysis(original, key)
+        if stored is None:
+            # The original failed or was analyzed with other prompts
+            dedup.add(article["id"], signature)
+            pending[article["id"]] = asyncio.Event()
+            return None
+        return {**_from_stored(stored), "duplicate_of": original, "similarity": score}
+
+    async def worker() -> None:
+        while True:
+            try:
+                article = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            if dedup is not None:
+                reused = await reuse(article, dedup.signature(article["content"]))
+                if reused is not None:
+                    writer.write(article, reused)
+                    stats["done"] += 1
+                    stats["duplicates"] += 1
+                    print(
+                        f"Reusing analysis of {reused['duplicate_of']} for {article['id']} "
+                        f"(similarity {reused['similarity']:.2f})"
+                    )
+                    report(article)
+                    continue
+            try:
+                result = await pipeline.analyze_async(
+                    extractor_conf,
+                    inferencer_conf,
+                    crime_keywords,
+                    judge_keywords,
+                    article["content"],
+                    article["title"],
+                    article_id=article["id"],
+                    stages=stages,
+                )
+                if dedup is not None:
+                    dedup.put_analysis(article["id"], key, _to_stored(result))
+            except Exception as error:
+                stats["failed"] += 1
+                print(f"Error {article['id']}: {type(error).__name__}: {error}")
+                continue
+            finally:
+                if article["id"] in pending:
+                    pending.pop(article["id"]).set()
+            writer.write(article, result)
+            stats["done"] += 1
+            report(article)
+
+    await asyncio.gather(*(worker() for _ in range(max(1, workers))))
+    elapsed = time.monotonic() - start
+    return {
+        **stats,
+        "elapsed": elapsed,
+        "articles_per_second": stats["done"] / elapsed if elapsed else 0.0,
+    }
+
+
+def plan_batch(
+    articles: list[dict[str, Any]],
+    stages: StageStore,
+    extractor_conf: str,
+    inferencer_conf: str,
+    crime_keywords: str,
+    judge_keywords: str,
+) -> dict[str, Any]:
+    """
+    Add up :func:`kgai.pipeline.plan` over ``articles``.
+
+    Articles never analyzed before have no known subjects; their inferencer
+    calls are estimated from the mean number of stored answers per article
+    (one call per subject).
+
+    Returns:
+        Summary with articles, extractor and inferencer calls,
+        estimated_inferencer (calls for articles with unknown subjects, None
+        when the store has nothing to estimate from), prompt_tokens and
+        reasons
+    """
+    totals: dict[str, Any] = {
+        "articles": len(articles),
+        "extractor": 0,
+        "inferencer": 0,
+        "estimated_inferencer": 0.0,
+        "prompt_tokens": 0,
+        "reasons": {},
+    }
+    unknown = 0
+    for article in articles:
+        planned = pipeline.plan(
+            extractor_conf,
+            inferencer_conf,
+            crime_keywords,
+            judge_keywords,
+            article["content"],
+            article["title"],
+            article["id"],
+            stages,
+        )
+        totals["extractor"] += planned["extractor"]
+        totals["inferencer"] += planned["inferencer"]
+        totals["prompt_tokens"] += planned["prompt_tokens"]
+        for reason, count in planned["reasons"].items():
+            totals["reasons"][reason] = totals["reasons"].get(reason, 0) + count
+        unknown += not planned["subjects_known"]
+    if unknown:
+        stored = stages.stats()
+        totals["estimated_inferencer"] = (
+            unknown * stored["infer"] / stored["extract"] if stored["extract"] else None
+        )
+    return totals
+
+
+def print_plan(planned: dict[str, Any]) -> None:
+    """Print the summary of :func:`plan_batch`."""
+    calls = planned["extractor"] + planned["inferencer"]
+    print("=== Dry run ===")
+    print(
+        f"{planned['articles']} article(s): {planned['extractor']} extractor call(s), "
+        f"{planned['inferencer']} inferencer call(s), ~{planned['prompt_tokens']} prompt tokens"
+    )
+    estimated = planned["estimated_inferencer"]
+    if estimated is None:
+        print(
+            "Inferencer calls for articles not analyzed before cannot be estimated (empty stage store)"
+        )
+    elif estimated:
+        calls += estimated
+        print(f"~{estimated:.0f} more inferencer call(s) for articles not analyzed before")
+    price = get_metrics().cost(
+        os.getenv("OPENAI_MODEL", "gpt-3.5-turbo"), planned["prompt_tokens"], 0
+    )
+    if price is not None:
+        print(f"Prompt cost of the counted calls: ${price:.4f}")
+    print(f"Total: ~{calls:.0f} call(s)")
+    for reason, count in sorted(planned["reasons"].items(), key=lambda item: -item[1]):
+        print(f"  {count:>6}  {reason}")
+
+
+def main(argv: list[str] | None = None) -> int:
+    """
+    Command-line entry point for ``prompt.py batch``.
+
+    Args:
+        argv: Arguments after ``batch`` (defaults to sys.argv)
+
+    Returns:
+        Process exit code
+    """
+    parser = argparse.ArgumentParser(
+        prog="prompt.py batch",
+        description="Analyze a directory or JSONL file of news articles",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "inputs", nargs="+", help="Case/post directories, post files or .jsonl files"
+    )
+    parser.add_argument(
+        "--output", "-o", help="Result file (.jsonl or .csv); required unless --dry-run"
+    )
+    parser.add_argument(
+        "--extractor", default="extractor_v1-2.json", help="Extractor config (from prompts/)"
+    )
+    parser.add_argument(
+        "--inferencer", default="inferencer_v8-1.json", help="Inferencer config (from prompts/)"
+    )
+    parser.add_argument(
+        "--crime-keywords", default="crime_keywords.txt", help="Crime keywords file (from samples/)"
+    )
+    parser.add_argument(
+        "--judge-keywords",
+        default="judge_keywords.txt",
+        help="Legal proceeding keywords file (from samples/)",
+    )
+    parser.add_argument("--workers", type=int, default=4, help="Articles analyzed concurrently")
+    parser.add_argument(
+        "--rpm", type=float, default=None, help="Requests per minute limit (overrides OPENAI_RPM)"
+    )
+    parser.add_argument(
+        "--tpm", type=float, default=None, help="Tokens per minute limit (overrides OPENAI_TPM)"
+    )
+    parser.add_argument(
+        "--checkpoint", default=None, help="Checkpoint file (default: <output>.checkpoint)"
+    )
+    parser.add_argument("--no-resume", action="store_true", help="Ignore an existing checkpoint")
+    parser.add_argument(
+        "--no-dedup", action="store_true", help="Analyze near-duplicate articles separately"
+    )
+    parser.add_argument(
+        "--dedup-index",
+        default=None,
+        help="Near-duplicate index (default: DEDUP_INDEX_PATH or .cache/dedup.sqlite3)",
+    )
+    parser.add_argument(
+        "--dedup-threshold",
+        type=float,
+        default=None,
+        help="Similarity above which articles are duplicates (default: DEDUP_THRESHOLD or 0.8)",
+    )
+    parser.add_argument(
+        "--store",
+        nargs="?",
+        const="",
+        default=None,
+        help="Also add results to the results store (default file: RESULTS_STORE_PATH)",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Reuse stored stage outputs whose inputs are unchanged",
+    )
+    parser.add_argument(
+        "--stage-store",
+        default=None,
+        help="Stage output store (default: STAGE_STORE_PATH or .cache/stages.sqlite3)",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Report the model calls an incremental run would make, without making them",
+    )
+    args = parser.parse_args(argv)
+    if args.output is None and not args.dry_run:
+        parser.error("--output is required")
+
+    # Endpoints read their limits from the environment when first used
+    if args.rpm is not None:
+        os.environ["OPENAI_RPM"] = str(args.rpm)
+    if args.tpm is not None:
+        os.environ["OPENAI_TPM"] = str(args.tpm)
+
+    checkpoint = args.checkpoint or (args.output or "") + ".checkpoint"
+    finished = set() if args.no_resume or args.output is None else read_checkpoint(checkpoint)
+    articles = [article for article in load_articles(args.inputs) if article["id"] not in finished]
+    print(f"{len(articles)} article(s) to analyze, {len(finished)} already done")
+
+    crime_keywords = _read(pipeline.resolve(args.crime_keywords, pipeline.SAMPLES_DIR))
+    judge_keywords = _read(pipeline.resolve(args.judge_keywords, pipeline.SAMPLES_DIR))
+
+    stages = get_stage_store(args.stage_store) if args.incremental or args.dry_run else None
+    if args.dry_run:
+        try:
+            planned = plan_batch(
+                articles, stages, args.extractor, args.inferencer, crime_keywords, judge_keywords
+            )
+        finally:
+            stages.close()
+        print_plan(planned)
+        return 0
+
+    dedup = None if args.no_dedup else get_index(args.dedup_index, args.dedup_threshold)
+    store = None if args.store is None else get_store(args.store or None)
+    writer = ResultWriter(args.output, checkpoint, store, args.extractor, args.inferencer)
+    try:
+        summary = asyncio.run(
+            run_batch(
+                articles,
+                writer,
+                args.extractor,
+                args.inferencer,
+                crime_keywords,
+                judge_keywords,
+                workers=args.workers,
+                dedup=dedup,
+                stages=stages,
+            )
+        )
+    finally:
+        writer.close()
+        if dedup is not None:
+            dedup.close()
+        if stages is not None:
+            print(f"Stage outputs reused: {stages.reused}, computed: {stages.stored}")
+            stages.close()
+
+    print("=== Batch finished ===")
+    print(
+        f"Done: {summary['done']} ({summary['duplicates']} near-duplicates reused), "
+        f"failed: {summary['failed']}, "
+        f"{summary['elapsed']:.1f}s, {summary['articles_per_second']:.2f} articles/s"
+    )
+    for row in get_metrics().summary():
+        print(
+            f"{row['inferencer']}: {row['articles']} article(s), "
+            f"{row['tokens_per_article']:.0f} tokens/article, ${row['cost_per_article']:.4f}/article"
+        )
+    router = get_router()
+    for row in router.stats() if router is not None else []:
+        latency = (
+            f", p50 {row['p50']:.2f}s, p95 {row['p95']:.2f}s" if row["p50"] is not None else ""
+        )
+        print(
+            f"{row['name']} ({row['model']}): {row['requests']} request(s), {row['failures']} failed, "
+            f"{row['hedges']} hedge(s), circuit {row['state']}{latency}"
+        )
+    return 1 if summary["failed"] else 0
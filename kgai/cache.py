@@ -0,0 +1,215 @@
+"""
+Content-addressed on-disk cache for chat completions.
+
+Responses are stored in SQLite under a SHA-256 key of the model, temperature
+and rendered messages, so re-analyzing an article (or a crawler retry) with the
+same prompts does not pay for the same completion twice.
+
+Environment variables:
+    OPENAI_CACHE: Set to 0/false/off to bypass the cache (default: on)
+    OPENAI_CACHE_PATH: SQLite file (default: .cache/completions.sqlite3)
+    OPENAI_CACHE_MAX_ENTRIES: Least recently used entries beyond this are
+        evicted (default: 100000)
+    OPENAI_CACHE_MAX_AGE: Entries older than this many seconds are ignored
+        and evicted (default: no limit)
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS completions (
+    key TEXT PRIMARY KEY,
+    response TEXT NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS completions_accessed ON completions (accessed);
+"""
+
+# A hit refreshes an entry's access time (for LRU eviction) only when the
+# stored one is older than this many seconds, so hits do not all write
+ACCESS_INTERVAL = 60.0
+
+
+def make_key(
+    model: str,
+    temperature: float,
+    messages: list[dict[str, str]],
+    options: dict[str, Any] | None = None,
+) -> str:
+    """
+    Build the content address for a completion request.
+
+    Args:
+        model: Model name
+        temperature: Sampling temperature
+        messages: Rendered chat messages
+        options: Other request parameters that change the answer
+            (e.g. response_format)
+
+    Returns:
+        Hex SHA-256 digest identifying the request
+    """
+    request: dict[str, Any] = {"model": model, "temperature": temperature, "messages": messages}
+    if options:
+        request["options"] = options
+    payload = json.dumps(request, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    SQLite-backed completion cache with LRU/age eviction and hit counters.
+
+    Safe to share between threads; access is serialized with a lock.
+    Async callers run :meth:`get` and :meth:`put` with ``asyncio.to_thread``
+    so SQLite I/O does not block the event loop.
+
+    Attributes:
+        path: SQLite database file
+        max_entries: Maximum number of stored responses (None for unlimited)
+        max_age: Maximum entry age in seconds (None for unlimited)
+        hits: Number of successful lookups since creation
+        misses: Number of failed lookups since creation
+    """
+
+    def __init__(self, path: str, max_entries: int | None = None, max_age: float | None = None):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        dirname = os.path.dirname(path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._count = self._conn.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+
+    def get(self, key: str) -> dict[str, Any] | None:
+        """
+        Look up a cached response.
+
+        Args:
+            key: Key from :func:`make_key`
+
+        Returns:
+            The stored response dictionary, or None on a miss or expired entry
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created, accessed FROM completions WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or (self.max_age is not None and now - row[1] > self.max_age):
+                self.misses += 1
+                return None
+            if now - row[2] > ACCESS_INTERVAL:
+                self._conn.execute("UPDATE completions SET accessed = ? WHERE key = ?", (now, key))
+                self._conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, response: dict[str, Any]) -> None:
+        """
+        Store a response, evicting old entries when the cache is over its limits.
+
+        Args:
+            key: Key from :func:`make_key`
+            response: Completion response dictionary
+        """
+        now = time.time()
+        with self._lock:
+            exists = self._conn.execute(
+                "SELECT 1 FROM completions WHERE key = ?", (key,)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO completions (key, response, created, accessed) "
+                "VALUES (?, ?, ?, ?)",
+                (key, json.dumps(response, ensure_ascii=False), now, now),
+            )
+            if exists is None:
+                self._count += 1
+            # Evict in batches (10% headroom) so puts stay O(1) amortized
+            if self.max_entries is not None and self._count > self.max_entries * 1.1:
+                self._evict(now)
+            self._conn.commit()
+
+    def evict(self) -> None:
+        """Remove expired entries and trim the cache down to ``max_entries``."""
+        with self._lock:
+            self._evict(time.time())
+            self._conn.commit()
+
+    def _evict(self, now: float) -> None:
+        if self.max_age is not None:
+            self._conn.execute("DELETE FROM completions WHERE created < ?", (now - self.max_age,))
+        if self.max_entries is not None:
+            self._conn.execute(
+                "DELETE FROM completions WHERE key IN ("
+                "SELECT key FROM completions ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+        self._count = self._conn.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+
+    def clear(self) -> None:
+        """Delete every cached response and reset the counters."""
+        with self._lock:
+            self._conn.execute("DELETE FROM completions")
+            self._conn.commit()
+            self._count = 0
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Return cache counters.
+
+        Returns:
+            Dictionary with entries, hits, misses and hit_rate
+        """
+        lookups = self.hits + self.misses
+        return {
+            "entries": self._count,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+_default_cache: ResponseCache | None = None
+_default_lock = threading.Lock()
+
+
+def cache_enabled() -> bool:
+    """Return False when OPENAI_CACHE disables the cache."""
+    return os.getenv("OPENAI_CACHE", "1").lower() not in ("0", "false", "off", "no")
+
+
+def get_cache() -> ResponseCache:
+    """
+    Return the process-wide cache configured from the environment.
+
+    Returns:
+        Shared ResponseCache instance
+    """
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            max_age = os.getenv("OPENAI_CACHE_MAX_AGE")
+            _default_cache = ResponseCache(
+                path=os.getenv("OPENAI_CACHE_PATH", os.path.join(".cache", "completions.sqlite3")),
+                max_entries=int(os.getenv("OPENAI_CACHE_MAX_ENTRIES", "100000")),
+                max_age=float(max_age) if max_age else None,
+            )
+    return _default_cache
@@ -0,0 +1,874 @@
+"""
+Asynchronous, connection-pooled client layer for OpenAI-compatible endpoints.
+
+Every endpoint (base URL + API key) gets one ``AsyncOpenAI`` client backed by a
+keep-alive HTTP connection pool and an ``asyncio.Semaphore`` that caps the
+number of requests in flight. Synchronous callers share a single background
+event loop, so threads calling :func:`submit` reuse the same pool instead of
+opening a connection each.
+
+Environment variables:
+    OPENAI_API_KEY: API key for the default endpoint
+    OPENAI_BASE_URL: Base URL for the default endpoint (official API if unset)
+    OPENAI_MODEL: Model name (default: gpt-3.5-turbo)
+    OPENAI_TEMPERATURE: Sampling temperature (default: 0.0)
+    OPENAI_MAX_CONCURRENCY: Requests in flight per endpoint (default: 8)
+    OPENAI_MAX_CONNECTIONS: Pooled connections per endpoint
+        (default: OPENAI_MAX_CONCURRENCY)
+    OPENAI_TIMEOUT: Request timeout in seconds (default: 600)
+    OPENAI_RPM: Requests per minute per endpoint (default: unlimited)
+    OPENAI_TPM: Tokens per minute per endpoint (default: unlimited)
+    OPENAI_MAX_RETRIES: Retries on 429/5xx/connection errors (default: 5)
+    OPENAI_ROUTER: Spread requests over several endpoints (see :mod:`kgai.router`)
+    TOKEN_LONG_MODEL: Model for requests too long for OPENAI_MODEL's context
+        window (see ``min_context`` of :func:`submit_async`)
+
+Completions are served from :mod:`kgai.cache` when an identical request has
+been answered before (see OPENAI_CACHE). Passing ``on_delta`` streams the
+completion (``stream=True``) and hands each piece of text to the callback as
+it arrives; the returned dictionary has the same shape either way.
+
+A request identical to one already in flight waits for that answer instead of
+being sent again (streamed requests and ``use_cache=False`` excepted). Every
+call is reported to :mod:`kgai.metrics` (tokens, latency, time to first token,
+retries, cache hits).
+
+With OPENAI_ROUTER set, each request goes to the endpoint :mod:`kgai.router`
+picks for its pipeline stage, slow requests are hedged on a second endpoint,
+and failed ones are retried on another endpoint before backing off.
+"""
+
+import asyncio
+import os
+import queue
+import random
+import threading
+import time
+import weakref
+from collections.abc import AsyncIterator, Callable, Coroutine, Iterator
+from typing import Any
+
+import httpx
+import openai
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+from kgai.cache import cache_enabled, get_cache, make_key
+from kgai.metrics import current_labels, record_call
+from kgai.ratelimit import TokenBucket
+from kgai.router import Backend, Router, get_router
+from kgai.tokens import context_limit, measure_tokens
+
+# Errors worth retrying: 429, 5xx, timeouts and dropped connections
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.InternalServerError,
+    openai.APIConnectionError,
+)
+
+
+class Endpoint:
+    """
+    Pooled client and concurrency limit for one OpenAI-compatible endpoint.
+
+    Instances are bound to the event loop they were created on, because both
+    the HTTP connection pool and the semaphore belong to that loop.
+
+    Attributes:
+        base_url: Endpoint base URL (None for the official API)
+        client: AsyncOpenAI client sharing a keep-alive connection pool
+        semaphore: Limits concurrent requests to ``max_concurrency``
+        requests: Requests-per-minute bucket
+        tokens: Tokens-per-minute bucket
+    """
+
+    def __init__(
+        self,
+        base_url: str | None,
+        api_key: str | None,
+        max_concurrency: int,
+        max_connections: int,
+        timeout: float,
+        rpm: float | None = None,
+        tpm: float | None = None,
+    ):
+        self.base_url = base_url
+        self.max_concurrency = max_concurrency
+        self.client = AsyncOpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            timeout=timeout,
+            # Retries are handled by submit_async so they respect the rate limits
+            max_retries=0,
+            http_client=DefaultAsyncHttpxClient(
+                timeout=timeout,
+                limits=httpx.Limits(
+                    max_connections=max_connections,
+                    max_keepalive_connections=max_connections,
+                    keepalive_expiry=60.0,
+                ),
+            ),
+        )
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+
+    async def aclose(self) -> None:
+        """Close the underlying connection pool."""
+        await self.client.close()
+
+
+# Endpoints per event loop: {loop: {(base_url, api_key): Endpoint}}
+_endpoints: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[tuple, Endpoint]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+# Requests in flight per event loop, for coalescing: {loop: {cache key: Future}}
+_inflight: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[str, asyncio.Future]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+_background_loop: asyncio.AbstractEventLoop | None = None
+_background_lock = threading.Lock()
+
+
+def get_endpoint(
+    base_url: str | None = None,
+    api_key: str | None = None,
+    max_concurrency: int | None = None,
+    max_connections: int | None = None,
+    rpm: float | None = None,
+    tpm: float | None = None,
+) -> Endpoint:
+    """
+    Return the pooled endpoint for the running event loop, creating it on first use.
+
+    Args:
+        base_url: Endpoint base URL (defaults to OPENAI_BASE_URL)
+        api_key: API key (defaults to OPENAI_API_KEY)
+        max_concurrency: Requests in flight (defaults to OPENAI_MAX_CONCURRENCY)
+        max_connections: Pooled connections (defaults to OPENAI_MAX_CONNECTIONS)
+        rpm: Requests per minute (defaults to OPENAI_RPM)
+        tpm: Tokens per minute (defaults to OPENAI_TPM)
+
+    Returns:
+        Endpoint shared by every coroutine on the current loop
+    """
+    loop = asyncio.get_running_loop()
+    base_url = base_url or os.getenv("OPENAI_BASE_URL")
+    api_key = api_key or os.getenv("OPENAI_API_KEY")
+    if max_concurrency is None:
+        max_concurrency = int(os.getenv("OPENAI_MAX_CONCURRENCY", "8"))
+    if max_connections is None:
+        max_connections = int(os.getenv("OPENAI_MAX_CONNECTIONS", str(max_concurrency)))
+    if rpm is None:
+        rpm = float(os.getenv("OPENAI_RPM", "0"))
+    if tpm is None:
+        tpm = float(os.getenv("OPENAI_TPM", "0"))
+
+    endpoints = _endpoints.setdefault(loop, {})
+    key = (base_url, api_key, max_concurrency, max_connections, rpm, tpm)
+    if key not in endpoints:
+        endpoints[key] = Endpoint(
+            base_url=base_url,
+            api_key=api_key,
+            max_concurrency=max_concurrency,
+            max_connections=max_connections,
+            timeout=float(os.getenv("OPENAI_TIMEOUT", "600")),
+            rpm=rpm,
+            tpm=tpm,
+        )
+    return endpoints[key]
+
+
+def stage_model(stage: str | None = None) -> str:
+    """
+    Return the model name requests of a pipeline stage are made with.
+
+    Args:
+        stage: Pipeline stage (defaults to the current ``stage`` metrics label)
+
+    Returns:
+        The router's model for the stage when OPENAI_ROUTER is set (see
+        :meth:`kgai.router.Router.model`), OPENAI_MODEL otherwise
+    """
+    router = get_router()
+    if router is None:
+        return os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+    if stage is None:
+        stage = current_labels().get("stage", "")
+    return router.model(stage)
+
+
+def stage_context(stage: str | None = None) -> int | None:
+    """
+    Return the context window, in tokens, requests of a pipeline stage get.
+
+    Args:
+        stage: Pipeline stage (defaults to the current ``stage`` metrics label)
+
+    Returns:
+        The smallest ``context`` of the stage's preferred router endpoints when
+        OPENAI_ROUTER is set, the window of :func:`stage_model` otherwise;
+        None when the window is unknown
+    """
+    router = get_router()
+    if router is None:
+        return context_limit(stage_model(stage))
+    if stage is None:
+        stage = current_labels().get("stage", "")
+    return router.context(stage)
+
+
+def context_model(tokens: int, stage: str | None = None) -> str | None:
+    """
+    Return the model a request of ``tokens`` tokens (answer included) fits.
+
+    Args:
+        tokens: Tokens the context window must hold
+        stage: Pipeline stage (defaults to the current ``stage`` metrics label)
+
+    Returns:
+        The stage's model when it is large enough, else TOKEN_LONG_MODEL (with
+        OPENAI_ROUTER: the models of the endpoints whose ``context`` is large
+        enough), or None when nothing fits
+    """
+    router = get_router()
+    if router is not None:
+        if stage is None:
+            stage = current_labels().get("stage", "")
+        return router.model(stage, tokens) if router.fits(stage, tokens) else None
+    for model in (stage_model(stage), os.getenv("TOKEN_LONG_MODEL")):
+        if model:
+            limit = context_limit(model)
+            if limit is None or limit >= tokens:
+                return model
+    return None
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Token count used to admit requests under OPENAI_TPM.
+
+    Counted with the local tokenizer (:mod:`kgai.tokens`); the bucket is
+    corrected with the real usage once the response arrives.
+
+    Args:
+        text: Prompt text
+
+    Returns:
+        Number of tokens
+    """
+    return measure_tokens(text)
+
+
+def retry_delay(attempt: int, error: Exception) -> float:
+    """
+    Return how long to wait before retry number ``attempt`` (starting at 0).
+
+    Honors a ``Retry-After`` header when the server sends one, otherwise uses
+    exponential backoff with full jitter capped at 60 seconds.
+
+    Args:
+        attempt: Zero-based retry counter
+        error: The error that triggered the retry
+
+    Returns:
+        Delay in seconds
+    """
+    response = getattr(error, "response", None)
+    if response is not None:
+        retry_after = response.headers.get("retry-after")
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+    return random.uniform(0, min(60.0, 2.0**attempt))
+
+
+def _get_background_loop() -> asyncio.AbstractEventLoop:
+    """Start (once) and return the event loop that serves synchronous callers."""
+    global _background_loop
+    with _background_lock:
+        if _background_loop is None:
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name="kgai-client-loop", daemon=True)
+            thread.start()
+            _background_loop = loop
+    return _background_loop
+
+
+def run_sync(coro: Coroutine[Any, Any, Any]) -> Any:
+    """
+    Run a coroutine on the shared background event loop and wait for its result.
+
+    Safe to call from any thread, including threads that already run their own
+    event loop (e.g. a Gradio worker).
+
+    Args:
+        coro: Coroutine to execute
+
+    Returns:
+        The coroutine's return value
+    """
+    return asyncio.run_coroutine_threadsafe(coro, _get_background_loop()).result()
+
+
+def iterate_sync(iterator: AsyncIterator[Any]) -> Iterator[Any]:
+    """
+    Consume an async iterator on the shared background event loop.
+
+    Lets synchronous generators (e.g. a Gradio handler) forward items as they
+    are produced instead of waiting for the whole iteration.
+
+    Args:
+        iterator: Async iterator to drain
+
+    Yields:
+        Each item, in order; an exception raised by the iterator is re-raised
+    """
+    items: queue.Queue = queue.Queue()
+    done = object()
+
+    async def drain() -> None:
+        try:
+            async for item in iterator:
+                items.put((True, item))
+        except BaseException as error:
+            items.put((False, error))
+        finally:
+            items.put((True, done))
+
+    future = asyncio.run_coroutine_threadsafe(drain(), _get_background_loop())
+    try:
+        while True:
+            ok, item = items.get()
+            if not ok:
+                raise item
+            if item is done:
+                return
+            yield item
+    finally:
+        future.cancel()
+
+
+async def _stream_completion(
+    endpoint: Endpoint,
+    model: str,
+    messages: list[dict[str, str]],
+    temperature: float,
+    options: dict[str, Any],
+    on_delta: Callable[[str | None], None],
+) -> dict[str, Any]:
+    """Stream one completion into ``on_delta`` and return it as a regular response."""
+    stream = await endpoint.client.chat.completions.create(
+        model=model,
+        messages=messages,
+        temperature=temperature,
+        stream=True,
+        # Usage arrives in a final chunk without choices
+        stream_options={"include_usage": True},
+        **options,
+    )
+    parts: list[str] = []
+    result: dict[str, Any] = {
+        "id": None,
+        "object": "chat.completion",
+        "model": model,
+        "usage": None,
+    }
+    finish_reason = None
+    async for chunk in stream:
+        result["id"] = chunk.id
+        result["model"] = chunk.model or model
+        if getattr(chunk, "usage", None):
+            result["usage"] = chunk.usage.model_dump()
+        if not chunk.choices:
+            continue
+        choice = chunk.choices[0]
+        if choice.delta.content:
+            parts.append(choice.delta.content)
+            on_delta(choice.delta.content)
+        if choice.finish_reason:
+            finish_reason = choice.finish_reason
+    result["choices"] = [
+        {
+            "index": 0,
+            "message": {"role": "assistant", "content": "".join(parts)},
+            "finish_reason": finish_reason,
+        }
+    ]
+    return result
+
+
+async def submit_async(
+    system_content: str,
+    user_content: str,
+    model: str | None = None,
+    temperature: float | None = None,
+    use_cache: bool | None = None,
+    response_format: dict[str, Any] | None = None,
+    on_delta: Callable[[str | None], None] | None = None,
+    min_context: int | None = None,
+) -> dict[str, Any]:
+    """
+    Send prompts to the chat completion API without blocking the event loop.
+
+    Args:
+        system_content: System role prompt defining AI behavior and expertise
+        user_content: User prompt containing the specific task and input data
+        model: Model name (defaults to OPENAI_MODEL or gpt-3.5-turbo; with
+            OPENAI_ROUTER, to the model of the endpoint the request is sent to)
+        temperature: Sampling temperature (defaults to OPENAI_TEMPERATURE or 0.0)
+        use_cache: Read and write the completion cache (defaults to OPENAI_CACHE);
+            pass False to force a fresh completion
+        response_format: Optional response format, e.g. ``{"type": "json_object"}``
+            for endpoints that support JSON mode
+        on_delta: Stream the completion and call this with each piece of text
+            as it arrives (once with the whole text for a cache hit). It is
+            called with None when a retry discards the text streamed so far.
+        min_context: Tokens the model's context window must hold; without a
+            ``model``, a request the stage's model cannot hold goes to
+            :func:`context_model`'s model instead
+
+    Returns:
+        Dictionary containing the OpenAI API response (choices, usage, model)
+    """
+    # A routed request without a model is made with its endpoint's model
+    requested = model
+    if model is None:
+        model = stage_model()
+        if min_context is not None:
+            model = context_model(min_context) or model
+    if temperature is None:
+        temperature = float(os.getenv("OPENAI_TEMPERATURE", "0.0"))
+    # An explicit use_cache=False asks for a fresh answer: never share one
+    fresh = use_cache is False
+    if use_cache is None:
+        use_cache = cache_enabled()
+
+    messages = [
+        {"role": "system", "content": system_content},
+        {"role": "user", "content": user_content},
+    ]
+    options: dict[str, Any] = {}
+    if response_format is not None:
+        options["response_format"] = response_format
+    start = time.monotonic()
+    key = make_key(model, temperature, messages, options)
+    if use_cache:
+        # SQLite I/O runs off the event loop
+        cache = await asyncio.to_thread(get_cache)
+        cached = await asyncio.to_thread(cache.get, key)
+        if cached is not None:
+            if on_delta is not None:
+                on_delta(cached["choices"][0]["message"]["content"])
+            record_call(model, cached.get("usage"), time.monotonic() - start, cache_hit=True)
+            return cached
+
+    # Identical requests already in flight on this loop share their answer
+    coalesce = on_delta is None and not fresh
+    if coalesce:
+        loop = asyncio.get_running_loop()
+        inflight = _inflight.setdefault(loop, {})
+        while key in inflight:
+            shared = inflight[key]
+            try:
+                result = await asyncio.shield(shared)
+            except asyncio.CancelledError:
+                if not shared.cancelled():
+                    raise
+                continue  # the request we joined was cancelled; make our own
+            record_call(model, result.get("usage"), time.monotonic() - start, cache_hit=True)
+            return result
+        future = inflight[key] = loop.create_future()
+        # Retrieve the exception even when nobody joined, to keep asyncio quiet
+        future.add_done_callback(lambda done: done.cancelled() or done.exception())
+
+    first_token: float | None = None
+    if on_delta is not None:
+        stream_to = on_delta
+
+        def on_delta(text: str | None) -> None:
+            nonlocal first_token
+            if text and first_token is None:
+                first_token = time.monotonic() - start
+            stream_to(text)
+
+    try:
+        result, retries, model = await _request(
+            requested or model,
+            requested is None,
+            messages,
+            temperature,
+            options,
+            on_delta,
+            start,
+            min_context or 0,
+        )
+    except asyncio.CancelledError:
+        if coalesce:
+            future.cancel()
+        raise
+    except BaseException as error:
+        if coalesce:
+            future.set_exception(error)
+        raise
+    else:
+        if coalesce:
+            future.set_result(result)
+    finally:
+        if coalesce:
+            inflight.pop(key, None)
+    record_call(
+        model, result.get("usage"), time.monotonic() - start, ttft=first_token, retries=retries
+    )
+
+    if use_cache:
+        await asyncio.to_thread(cache.put, key, result)
+    return result
+
+
+async def _complete(
+    endpoint: Endpoint,
+    model: str,
+    messages: list[dict[str, str]],
+    temperature: float,
+    options: dict[str, Any],
+    on_delta: Callable[[str | None], None] | None,
+    estimate: int,
+) -> dict[str, Any]:
+    """Send one completion attempt to ``endpoint`` within its rate and concurrency limits."""
+    await endpoint.requests.acquire()
+    await endpoint.tokens.acquire(estimate)
+    async with endpoint.semaphore:
+        if on_delta is None:
+            response = await endpoint.client.chat.completions.create(
+                model=model, messages=messages, temperature=temperature, **options
+            )
+            result = response.model_dump()
+        else:
+            result = await _stream_completion(
+                endpoint, model, messages, temperature, options, on_delta
+            )
+    if result.get("usage"):
+        endpoint.tokens.adjust(result["usage"]["total_tokens"] - estimate)
+    return result
+
+
+async def _request(
+    model: str,
+    routed_model: bool,
+    messages: list[dict[str, str]],
+    temperature: float,
+    options: dict[str, Any],
+    on_delta: Callable[[str | None], None] | None,
+    start: float,
+    tokens: int = 0,
+) -> tuple[dict[str, Any], int, str]:
+    """
+    Send one completion request with rate limiting and retries.
+
+    Returns (response, retries, model the answer came from); ``routed_model``
+    lets the router replace ``model`` with its endpoint's, picked among those
+    whose context holds ``tokens``.
+    """
+    router = get_router()
+    if router is not None:
+        return await _routed_request(
+            router,
+            None if routed_model else model,
+            messages,
+            temperature,
+            options,
+            on_delta,
+            start,
+            tokens,
+        )
+    endpoint = get_endpoint()
+    estimate = sum(estimate_tokens(message["content"]) for message in messages)
+    max_retries = int(os.getenv("OPENAI_MAX_RETRIES", "5"))
+    attempt = 0
+    while True:
+        try:
+            result = await _complete(
+                endpoint, model, messages, temperature, options, on_delta, estimate
+            )
+            break
+        except RETRYABLE_ERRORS as error:
+            if attempt >= max_retries:
+                record_call(model, None, time.monotonic() - start, retries=attempt, error=error)
+                raise
+            if on_delta is not None:
+                on_delta(None)
+            delay = retry_delay(attempt, error)
+            print(
+                f"Retrying in {delay:.1f}s after {type(error).__name__} ({attempt + 1}/{max_retries})"
+            )
+            attempt += 1
+            await asyncio.sleep(delay)
+        except openai.APIError as error:
+            record_call(model, None, time.monotonic() - start, retries=attempt, error=error)
+            raise
+    return result, attempt, model
+
+
+async def _send(
+    router: Router,
+    backend: Backend,
+    stage: str,
+    model: str | None,
+    messages: list[dict[str, str]],
+    temperature: float,
+    options: dict[str, Any],
+    on_delta: Callable[[str | None], None] | None,
+    estimate: int,
+) -> dict[str, Any]:
+    """Send one attempt to a routed endpoint and report its outcome to the router."""
+    endpoint = get_endpoint(
+        backend.base_url,
+        backend.api_key,
+        backend.max_concurrency,
+        backend.max_connections,
+        backend.rpm,
+        backend.tpm,
+    )
+    sent = time.monotonic()
+    try:
+        result = await _complete(
+            endpoint, model or backend.model, messages, temperature, options, on_delta, estimate
+        )
+    except RETRYABLE_ERRORS:
+        router.finished(backend, stage, failed=True)
+        raise
+    except BaseException:
+        router.finished(backend, stage)
+        raise
+    router.finished(backend, stage, latency=time.monotonic() - sent)
+    return result
+
+
+async def _hedged(
+    router: Router,
+    primary: Backend,
+    stage: str,
+    tried: list[Backend],
+    model: str | None,
+    messages: list[dict[str, str]],
+    temperature: float,
+    options: dict[str, Any],
+    estimate: int,
+    tokens: int = 0,
+) -> tuple[dict[str, Any], Backend]:
+    """
+    Send a request to ``primary`` and, if it is slow, to a second endpoint.
+
+    Returns the first successful answer and the endpoint it came from; the
+    other attempt is cancelled. When every attempt fails, the primary's error
+    is raised.
+    """
+    attempts = {
+        asyncio.ensure_future(
+            _send(router, primary, stage, model, messages, temperature, options, None, estimate)
+        ): primary
+    }
+    try:
+        delay = router.hedge_delay(primary, stage)
+        if delay is not None:
+            done, _ = await asyncio.wait(attempts, timeout=delay)
+            backup = None if done else router.hedge(primary, stage, tokens)
+            if backup is not None:
+                tried.append(backup)
+                attempts[
+                    asyncio.ensure_future(
+                        _send(
+                            router,
+                            backup,
+                            stage,
+                            model,
+                            messages,
+                            temperature,
+                            options,
+                            None,
+                            estimate,
+                        )
+                    )
+                ] = backup
+        pending = set(attempts)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result(), attempts[task]
+        first = next(iter(attempts))
+        raise first.exception()
+    finally:
+        for task in attempts:
+            task.cancel()
+
+
+async def _routed_request(
+    router: Router,
+    model: str | None,
+    messages: list[dict[str, str]],
+    temperature: float,
+    options: dict[str, Any],
+    on_delta: Callable[[str | None], None] | None,
+    start: float,
+    tokens: int = 0,
+) -> tuple[dict[str, Any], int, str]:
+    """Send a request through the router with failover, hedging and retries."""
+    stage = current_labels().get("stage", "")
+    estimate = sum(estimate_tokens(message["content"]) for message in messages)
+    max_retries = int(os.getenv("OPENAI_MAX_RETRIES", "5"))
+    tried: list[Backend] = []
+    attempt = 0
+    while True:
+        backend = router.choose(stage, exclude=tried, tokens=tokens)
+        tried.append(backend)
+        try:
+            if on_delta is None:
+                result, backend = await _hedged(
+                    router,
+                    backend,
+                    stage,
+                    tried,
+                    model,
+                    messages,
+                    temperature,
+                    options,
+                    estimate,
+                    tokens,
+                )
+            else:
+                result = await _send(
+                    router,
+                    backend,
+                    stage,
+                    model,
+                    messages,
+                    temperature,
+                    options,
+                    on_delta,
+                    estimate,
+                )
+            return result, attempt, model or backend.model
+        except RETRYABLE_ERRORS as error:
+            if attempt >= max_retries:
+                record_call(
+                    model or backend.model,
+                    None,
+                    time.monotonic() - start,
+                    retries=attempt,
+                    error=error,
+                )
+                raise
+            if on_delta is not None:
+                on_delta(None)
+            attempt += 1
+            untried = [
+                item
+                for item in router.candidates(stage, tokens)
+                if item not in tried and item.available()
+            ]
+            if untried:
+                print(
+                    f"Retrying after {type(error).__name__} from {backend.name} "
+                    f"on another endpoint ({attempt}/{max_retries})"
+                )
+                continue
+            delay = retry_delay(attempt - 1, error)
+            print(
+                f"Retrying in {delay:.1f}s after {type(error).__name__} from {backend.name} "
+                f"({attempt}/{max_retries})"
+            )
+            tried.clear()
+            await asyncio.sleep(delay)
+        except openai.APIError as error:
+            record_call(
+                model or backend.model, None, time.monotonic() - start, retries=attempt, error=error
+            )
+            raise
+
+
+async def submit_many_async(
+    prompts: list[tuple[str, str]], max_concurrency: int | None = None
+) -> list[dict[str, Any]]:
+    """
+    Submit several prompt pairs concurrently and return responses in input order.
+
+    Args:
+        prompts: List of (system_content, user_content) pairs
+        max_concurrency: Optional extra cap for this batch, on top of the
+            per-endpoint limit
+
+    Returns:
+        List of response dictionaries in the same order as ``prompts``
+    """
+    if max_concurrency is None:
+        return list(await asyncio.gather(*(submit_async(*pair) for pair in prompts)))
+
+    limit = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def bounded(pair: tuple[str, str]) -> dict[str, Any]:
+        async with limit:
+            return await submit_async(*pair)
+
+    return list(await asyncio.gather(*(bounded(pair) for pair in prompts)))
+
+
+def submit(
+    system_content: str,
+    user_content: str,
+    use_cache: bool | None = None,
+    on_delta: Callable[[str | None], None] | None = None,
+) -> dict[str, Any]:
+    """
+    Send prompts to OpenAI API and get completion response.
+
+    Synchronous wrapper around :func:`submit_async`. The request runs on the
+    shared background event loop, so concurrent callers from many threads share
+    one connection pool and one concurrency limit per endpoint.
+
+    Args:
+        system_content: System role prompt defining AI behavior and expertise
+        user_content: User prompt containing the specific task and input data
+        use_cache: Read and write the completion cache (defaults to OPENAI_CACHE)
+        on_delta: Stream the completion (``stream=True``) and call this with
+            each piece of text as it arrives; it runs on the client's
+            background thread
+
+    Returns:
+        Dictionary containing OpenAI API response with structure:
+            - choices: List of completion choices with messages
+            - usage: Token usage statistics
+            - model: Model used for completion
+
+    Example:
+        >>> response = submit(
+        ...     system_content="You are a legal analyst.",
+        ...     user_content="Analyze this article..."
+        ... )
+        >>> result = response['choices'][0]['message']['content']
+    """
+    return run_sync(
+        submit_async(system_content, user_content, use_cache=use_cache, on_delta=on_delta)
+    )
+
+
+def submit_many(
+    prompts: list[tuple[str, str]], max_workers: int | None = None
+) -> list[dict[str, Any]]:
+    """
+    Synchronous wrapper around :func:`submit_many_async`.
+
+    Args:
+        prompts: List of (system_content, user_content) pairs
+        max_workers: Optional extra concurrency cap for this batch
+
+    Returns:
+        List of response dictionaries in the same order as ``prompts``
+    """
+    if not prompts:
+        return []
+    return run_sync(submit_many_async(prompts, max_concurrency=max_workers))
@@ -0,0 +1,336 @@
+"""
+Per-subject context windows for the inferencer.
+
+Long articles often mention a subject in one or two paragraphs, yet the
+inferencer prompt inlines the whole article for every subject. This module
+splits an article into sentences, finds the sentences that mention a subject
+(by full name, by the surname forms Taiwanese news uses such as ``陳姓``,
+``陳男`` or ``陳嫌``, or by a company name without its legal suffix), adds
+the sentences around them and the lead sentence, and trims the result to a
+token budget.
+
+For long articles, :func:`chunk_article` groups the sentences into
+overlapping chunks of a token size. The extractor runs on each chunk, and
+:meth:`Chunks.context` gives a subject only the chunks that mention it.
+
+Example:
+    >>> build_context(article, ['洪姓會計'], window=1, budget=800)
+    >>> chunks = chunk_article(article, tokens=2000, overlap=200)
+    >>> chunks.context(['洪姓會計'])
+"""
+
+import re
+from collections.abc import Sequence
+from dataclasses import dataclass
+
+from kgai.client import estimate_tokens
+from kgai.tokens import get_tokenizer, measure_tokens, split_tokens
+
+# Sentence ends at 。！？!?； or a line break, keeping closing quotes/brackets
+_SENTENCE = re.compile(r"[^。！？!?；;\n]*(?:[。！？!?；;]+[」』”’）)]*|\n+|$)")
+
+# Suffixes that follow a surname in anonymized references (陳姓, 陳男, 陳嫌 ...)
+_SURNAME_SUFFIXES = "姓嫌男女婦翁嫗母父妻夫員"
+_SURNAME_FORM = re.compile(r"^([一-鿿]{1,2})[" + _SURNAME_SUFFIXES + r"]")
+_COMPOUND_SURNAMES = {
+    "歐陽",
+    "司馬",
+    "諸葛",
+    "上官",
+    "東方",
+    "皇甫",
+    "尉遲",
+    "公孫",
+    "慕容",
+    "長孫",
+    "司徒",
+    "令狐",
+    "張簡",
+    "范姜",
+    "左丘",
+    "端木",
+    "夏侯",
+    "軒轅",
+    "鍾離",
+    "宇文",
+}
+_COMPANY_SUFFIXES = (
+    "股份有限公司",
+    "有限公司",
+    "公司",
+    "集團",
+    "企業",
+    "銀行",
+    "事務所",
+    "基金會",
+    "協會",
+)
+_CJK_NAME = re.compile(r"^[一-鿿]{2,4}$")
+_QUOTES = re.compile(r'[「」『』"“”]')
+
+
+def split_sentences(text: str) -> list[str]:
+    """
+    Split an article into sentences.
+
+    Sentences keep their terminating punctuation (and closing quotes), so
+    joining the list gives back the original text.
+
+    Args:
+        text: Article text
+
+    Returns:
+        Non-empty sentences in order
+    """
+    return [sentence for sentence in _SENTENCE.findall(text) if sentence]
+
+
+def mention_forms(subject: str) -> list[str]:
+    """
+    Return the strings that count as a mention of ``subject``.
+
+    - The subject itself (``王俊雄``, ``洪姓會計``, ``仙宗興業公司``)
+    - For anonymized subjects (``洪姓會計``): ``洪姓``, ``洪嫌``, ``洪男`` ...
+    - For 2-4 character personal names: the surname forms of the surname
+    - For organizations: the name without its legal suffix (``仙宗興業``)
+
+    Args:
+        subject: Subject name from the extractor
+
+    Returns:
+        Mention strings, longest first
+    """
+    subject = _QUOTES.sub("", subject).strip()
+    forms: set[str] = {subject}
+    surname: str | None = None
+
+    match = _SURNAME_FORM.match(subject)
+    if match:
+        surname = match.group(1) if match.group(1) in _COMPOUND_SURNAMES else match.group(1)[0]
+    for suffix in _COMPANY_SUFFIXES:
+        if subject.endswith(suffix) and len(subject) > len(suffix) + 1:
+            forms.add(subject[: -len(suffix)])
+            break
+    else:
+        if surname is None and _CJK_NAME.match(subject):
+            surname = subject[:2] if subject[:2] in _COMPOUND_SURNAMES else subject[0]
+
+    if surname:
+        forms.update(surname + suffix for suffix in _SURNAME_SUFFIXES)
+    return sorted(forms, key=len, reverse=True)
+
+
+def find_mentions(sentences: Sequence[str], subjects: Sequence[str]) -> list[int]:
+    """
+    Return the indexes of the sentences that mention any of ``subjects``.
+
+    Args:
+        sentences: Sentences from :func:`split_sentences`
+        subjects: Subject names
+
+    Returns:
+        Sorted sentence indexes
+    """
+    forms = [form for subject in subjects for form in mention_forms(subject)]
+    pattern = re.compile("|".join(re.escape(form) for form in forms), re.IGNORECASE)
+    return [index for index, sentence in enumerate(sentences) if pattern.search(sentence)]
+
+
+def _select(
+    sentences: Sequence[str], mentions: list[int], window: int, budget: int | None
+) -> list[int]:
+    """Pick sentence indexes by priority (mentions, lead, neighbours) within the budget."""
+    priority: list[int] = list(mentions)
+    priority.append(0)
+    for distance in range(1, window + 1):
+        for index in mentions:
+            priority.extend((index - distance, index + distance))
+
+    chosen: set[int] = set()
+    used = 0
+    for index in priority:
+        if index in chosen or not 0 <= index < len(sentences):
+            continue
+        cost = estimate_tokens(sentences[index])
+        if budget is not None and chosen and used + cost > budget:
+            continue
+        chosen.add(index)
+        used += cost
+    return sorted(chosen)
+
+
+def build_context(
+    content: str, subjects: Sequence[str], window: int = 1, budget: int | None = None
+) -> tuple[str, bool]:
+    """
+    Build the passage of ``content`` relevant to ``subjects``.
+
+    Sentences mentioning a subject come first, then the article's lead
+    sentence, then up to ``window`` sentences on each side of every mention,
+    each added only while the estimated token count stays within ``budget``.
+    The chosen sentences are returned in article order; gaps are marked
+    with ``……``.
+
+    Args:
+        content: Full article text
+        subjects: Subjects the passage is for (several for batch-mode requests)
+        window: Neighbouring sentences to add around each mention
+        budget: Maximum estimated tokens (None for no limit)
+
+    Returns:
+        (context text, whether it was reduced). When no sentence mentions a
+        subject, the full content is returned unreduced so the inferencer can
+        still judge from the whole article.
+    """
+    sentences = split_sentences(content)
+    mentions = find_mentions(sentences, subjects)
+    if not mentions:
+        return content, False
+
+    chosen = _select(sentences, mentions, window, budget)
+    if len(chosen) == len(sentences):
+        return content, False
+
+    parts: list[str] = []
+    previous = -1
+    for index in chosen:
+        if previous >= 0 and index != previous + 1:
+            parts.append("……\n")
+        parts.append(sentences[index])
+        previous = index
+    return "".join(parts).strip(), True
+
+
+def chunk_sentences(
+    sentences: Sequence[str], tokens: int, overlap: int = 0
+) -> list[tuple[int, int]]:
+    """
+    Group sentences into chunks of at most ``tokens`` tokens.
+
+    Every chunk after the first starts with the last sentences of the chunk
+    before it, up to ``overlap`` tokens (at most half of ``tokens``), so a
+    name introduced at the end of one chunk is seen again with the sentences
+    that follow it. A sentence longer than ``tokens`` makes a chunk of its own.
+
+    Args:
+        sentences: Sentences from :func:`split_sentences`
+        tokens: Token size of a chunk; 0 puts every sentence in one chunk
+        overlap: Tokens repeated from the previous chunk
+
+    Returns:
+        ``(start, end)`` sentence index ranges (end excluded), in order
+    """
+    if tokens <= 0 or not sentences:
+        return [(0, len(sentences))]
+    overlap = min(overlap, tokens // 2)
+    costs = [measure_tokens(sentence) for sentence in sentences]
+    spans: list[tuple[int, int]] = []
+    start = 0
+    while True:
+        end, used = start, 0
+        while end < len(sentences) and (end == start or used + costs[end] <= tokens):
+            used += costs[end]
+            end += 1
+        spans.append((start, end))
+        if end == len(sentences):
+            return spans
+        # Step back over the overlap, leaving room for at least one new sentence
+        start, carried = end, 0
+        while (
+            start - 1 > spans[-1][0]
+            and carried + costs[start - 1] <= overlap
+            and carried + costs[start - 1] + costs[end] <= tokens
+        ):
+            start -= 1
+            carried += costs[start]
+
+
+@dataclass
+class Chunks:
+    """
+    An article split into overlapping chunks of sentences.
+
+    Attributes:
+        sentences: Article sentences; sentences longer than ``tokens`` are
+            cut into pieces that fit
+        spans: ``(start, end)`` sentence ranges of the chunks
+        tokens: Token size of a chunk (0: the whole article is one chunk)
+        overlap: Tokens each chunk repeats from the one before it
+    """
+
+    sentences: list[str]
+    spans: list[tuple[int, int]]
+    tokens: int
+    overlap: int
+
+    def __len__(self) -> int:
+        return len(self.spans)
+
+    def texts(self) -> list[str]:
+        """Return the text of every chunk."""
+        return ["".join(self.sentences[start:end]) for start, end in self.spans]
+
+    def context(self, subjects: Sequence[str], budget: int | None = None) -> tuple[str, bool]:
+        """
+        Join the chunks that mention any of ``subjects``.
+
+        Overlapping chunks are joined without repeating the shared sentences;
+        gaps between chunks are marked with ``……``.
+
+        Args:
+            subjects: Subjects the passage is for (several for batch-mode requests)
+            budget: Maximum tokens; chunks past it are left out, and a first
+                chunk longer than it is cut (None for no limit)
+
+        Returns:
+            (context text, whether it was reduced). When no chunk mentions a
+            subject, the first chunk is returned, which carries the lead.
+        """
+        mentions = find_mentions(self.sentences, subjects)
+        spans = [
+            span for span in self.spans if any(span[0] <= index < span[1] for index in mentions)
+        ]
+        chosen: set[int] = set()
+        used = 0
+        for start, end in spans or self.spans[:1]:
+            added = [index for index in range(start, end) if index not in chosen]
+            cost = sum(measure_tokens(self.sentences[index]) for index in added)
+            if budget is not None and chosen and used + cost > budget:
+                break
+            chosen.update(added)
+            used += cost
+        if len(chosen) == len(self.sentences):
+            return "".join(self.sentences), False
+
+        parts: list[str] = []
+        previous = -1
+        for index in sorted(chosen):
+            if previous >= 0 and index != previous + 1:
+                parts.append("……\n")
+            parts.append(self.sentences[index])
+            previous = index
+        text = "".join(parts).strip()
+        if budget is not None and used > budget:
+            text = get_tokenizer().truncate(text, budget)
+        return text, True
+
+
+def chunk_article(content: str, tokens: int, overlap: int = 0) -> Chunks:
+    """
+    Split an article into overlapping, sentence-aligned chunks.
+
+    Args:
+        content: Full article text
+        tokens: Token size of a chunk; 0 for a single chunk
+        overlap: Tokens each chunk repeats from the one before it
+
+    Returns:
+        Chunks, see :func:`chunk_sentences`
+    """
+    sentences: list[str] = []
+    for sentence in split_sentences(content):
+        if tokens > 0 and measure_tokens(sentence) > tokens:
+            sentences.extend(split_tokens(sentence, tokens, [sentence]))
+        else:
+            sentences.append(sentence)
+    return Chunks(sentences, chunk_sentences(sentences, tokens, overlap), tokens, overlap)
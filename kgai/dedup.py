@@ -0,0 +1,401 @@
+"""
+Near-duplicate detection for syndicated news articles.
+
+The same wire story is published by several outlets with small edits
+(bylines, a different first line, punctuation). Articles are normalized,
+cut into overlapping character shingles and summarized by a MinHash
+signature; a banded locality-sensitive hashing (LSH) index finds candidate
+matches with a few indexed lookups, and the estimated Jaccard similarity of
+the signatures decides whether a candidate is a near-duplicate.
+
+The index lives in SQLite, next to the analysis stored for each article, so
+a copy seen in a later run reuses the analysis of the first one instead of
+calling the model again.
+
+Environment variables:
+    DEDUP_INDEX_PATH: SQLite file (default: .cache/dedup.sqlite3)
+    DEDUP_THRESHOLD: Minimum estimated similarity (default: 0.8)
+
+Example:
+    >>> index = DuplicateIndex('.cache/dedup.sqlite3', threshold=0.8)
+    >>> signature = index.signature(article_text)
+    >>> match = index.query(signature)   # (article_id, similarity) or None
+    >>> index.add('udn-7346166', signature)
+"""
+
+import hashlib
+import json
+import os
+import random
+import re
+import sqlite3
+import struct
+import threading
+import time
+import unicodedata
+import zlib
+from array import array
+from typing import Any
+
+# Mersenne prime for the (a * x + b) mod p permutation family
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+# Everything except letters and digits (CJK characters are letters)
+_NOISE = re.compile(r"[\W_]+", re.UNICODE)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS signatures (
+    id TEXT PRIMARY KEY,
+    signature BLOB NOT NULL,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS buckets (
+    band INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    id TEXT NOT NULL,
+    PRIMARY KEY (band, bucket, id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS analyses (
+    id TEXT NOT NULL,
+    key TEXT NOT NULL,
+    result TEXT NOT NULL,
+    created REAL NOT NULL,
+    PRIMARY KEY (id, key)
+) WITHOUT ROWID;
+"""
+
+
+def normalize(text: str) -> str:
+    """
+    Normalize article text for fingerprinting.
+
+    Applies NFKC (full-width to half-width), lowercases and removes
+    whitespace and punctuation, so layout differences between outlets do not
+    change the shingles.
+
+    Args:
+        text: Article text
+
+    Returns:
+        Normalized text
+    """
+    return _NOISE.sub("", unicodedata.normalize("NFKC", text).lower())
+
+
+def shingles(text: str, size: int = 5) -> list[int]:
+    """
+    Return the 32-bit hashes of the distinct character shingles of ``text``.
+
+    Args:
+        text: Normalized text
+        size: Characters per shingle
+
+    Returns:
+        Shingle hashes (a single shingle for texts shorter than ``size``)
+    """
+    if len(text) <= size:
+        return [zlib.crc32(text.encode("utf-8"))]
+    return list(
+        {zlib.crc32(text[i : i + size].encode("utf-8")) for i in range(len(text) - size + 1)}
+    )
+
+
+def choose_bands(num_perm: int, threshold: float) -> tuple[int, int]:
+    """
+    Choose LSH bands and rows per band for a similarity threshold.
+
+    The candidate probability curve ``1 - (1 - s**rows)**bands`` rises
+    steeply around ``(1 / bands) ** (1 / rows)``; the divisor pair whose
+    midpoint is closest to (but not above) the threshold is used, so pairs
+    at the threshold are very likely to become candidates.
+
+    Args:
+        num_perm: Signature length
+        threshold: Target similarity
+
+    Returns:
+        (bands, rows) with bands * rows == num_perm
+    """
+    best = (num_perm, 1)
+    best_distance = float("inf")
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        midpoint = (1 / bands) ** (1 / rows)
+        if midpoint <= threshold and threshold - midpoint < best_distance:
+            best, best_distance = (bands, rows), threshold - midpoint
+    return best
+
+
+def similarity(first: list[int], second: list[int]) -> float:
+    """
+    Estimate the Jaccard similarity of two articles from their signatures.
+
+    Args:
+        first: MinHash signature
+        second: MinHash signature of the same length
+
+    Returns:
+        Fraction of equal signature positions
+    """
+    return sum(1 for a, b in zip(first, second, strict=True) if a == b) / len(first)
+
+
+class DuplicateIndex:
+    """
+    Persistent MinHash/LSH index with stored analyses.
+
+    Safe to share between threads; access is serialized with a lock. The
+    signature parameters are stored in the database; reopening it with
+    different ones raises ValueError, since old signatures would no longer
+    be comparable.
+
+    Attributes:
+        path: SQLite database file
+        threshold: Minimum estimated similarity for a near-duplicate
+        num_perm: Signature length
+        shingle_size: Characters per shingle
+        bands: LSH bands
+        rows: Signature values per band
+    """
+
+    def __init__(
+        self,
+        path: str,
+        threshold: float = 0.8,
+        num_perm: int = 128,
+        shingle_size: int = 5,
+        seed: int = 1,
+    ):
+        self.path = path
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.bands, self.rows = choose_bands(num_perm, threshold)
+        self._lock = threading.Lock()
+
+        generator = random.Random(seed)
+        self._permutations = [
+            (generator.randrange(1, _PRIME), generator.randrange(0, _PRIME))
+            for _ in range(num_perm)
+        ]
+
+        dirname = os.path.dirname(path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._check_meta({"num_perm": num_perm, "shingle_size": shingle_size, "seed": seed})
+
+    def _check_meta(self, params: dict[str, int]) -> None:
+        stored = dict(self._conn.execute("SELECT key, value FROM meta").fetchall())
+        for key, value in params.items():
+            if key in stored and stored[key] != str(value):
+                raise ValueError(f"{self.path} was built with {key}={stored[key]}, not {value}")
+        # Bands follow the threshold; existing signatures are re-bucketed when it changes
+        bands = f"{self.bands}x{self.rows}"
+        if stored.get("bands", bands) != bands:
+            self._rebuild_buckets()
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+            [(key, str(value)) for key, value in {**params, "bands": bands}.items()],
+        )
+        self._conn.commit()
+
+    def _rebuild_buckets(self) -> None:
+        print(f"Rebuilding LSH buckets in {self.path} for {self.bands} bands of {self.rows} rows")
+        self._conn.execute("DELETE FROM buckets")
+        for article_id, blob in self._conn.cursor().execute("SELECT id, signature FROM signatures"):
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO buckets (band, bucket, id) VALUES (?, ?, ?)",
+                [(band, bucket, article_id) for band, bucket in self._buckets(self._unpack(blob))],
+            )
+
+    def signature(self, text: str) -> list[int]:
+        """
+        Compute the MinHash signature of an article.
+
+        Args:
+            text: Article text (normalized internally)
+
+        Returns:
+            ``num_perm`` minimum hash values
+        """
+        hashes = shingles(normalize(text), self.shingle_size)
+        return [
+            min((a * x + b) % _PRIME for x in hashes) & _MAX_HASH for a, b in self._permutations
+        ]
+
+    def _buckets(self, signature: list[int]) -> list[tuple[int, int]]:
+        buckets = []
+        for band in range(self.bands):
+            values = signature[band * self.rows : (band + 1) * self.rows]
+            digest = hashlib.blake2b(struct.pack(f"<{self.rows}I", *values), digest_size=8).digest()
+            buckets.append((band, int.from_bytes(digest, "little", signed=True)))
+        return buckets
+
+    @staticmethod
+    def _pack(signature: list[int]) -> bytes:
+        return array("I", signature).tobytes()
+
+    @staticmethod
+    def _unpack(blob: bytes) -> list[int]:
+        values = array("I")
+        values.frombytes(blob)
+        return values.tolist()
+
+    def query(self, signature: list[int], exclude: str | None = None) -> tuple[str, float] | None:
+        """
+        Find the most similar indexed article above the threshold.
+
+        Args:
+            signature: Signature from :meth:`signature`
+            exclude: Article id to ignore (e.g. the article itself)
+
+        Returns:
+            (article_id, estimated similarity), or None when nothing is close
+        """
+        with self._lock:
+            candidates = set()
+            for band, bucket in self._buckets(signature):
+                candidates.update(
+                    row[0]
+                    for row in self._conn.execute(
+                        "SELECT id FROM buckets WHERE band = ? AND bucket = ?", (band, bucket)
+                    )
+                )
+            candidates.discard(exclude)
+            best = None
+            for article_id in candidates:
+                row = self._conn.execute(
+                    "SELECT signature FROM signatures WHERE id = ?", (article_id,)
+                ).fetchone()
+                score = similarity(signature, self._unpack(row[0]))
+                if score >= self.threshold and (best is None or score > best[1]):
+                    best = (article_id, score)
+            return best
+
+    def add(self, article_id: str, signature: list[int]) -> None:
+        """
+        Index an article's signature (replacing any previous one).
+
+        Args:
+            article_id: Article identifier (e.g. URL or batch id)
+            signature: Signature from :meth:`signature`
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT signature FROM signatures WHERE id = ?", (article_id,)
+            ).fetchone()
+            if row is not None:
+                self._conn.executemany(
+                    "DELETE FROM buckets WHERE band = ? AND bucket = ? AND id = ?",
+                    [
+                        (band, bucket, article_id)
+                        for band, bucket in self._buckets(self._unpack(row[0]))
+                    ],
+                )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO signatures (id, signature, created) VALUES (?, ?, ?)",
+                (article_id, self._pack(signature), time.time()),
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO buckets (band, bucket, id) VALUES (?, ?, ?)",
+                [(band, bucket, article_id) for band, bucket in self._buckets(signature)],
+            )
+            self._conn.commit()
+
+    def get_analysis(self, article_id: str, key: str) -> dict[str, Any] | None:
+        """
+        Return the analysis stored for an article under ``key``.
+
+        Args:
+            article_id: Indexed article id
+            key: Analysis key from :func:`analysis_key` (prompts, keywords and models)
+
+        Returns:
+            Stored analysis dictionary, or None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result FROM analyses WHERE id = ? AND key = ?", (article_id, key)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put_analysis(self, article_id: str, key: str, result: dict[str, Any]) -> None:
+        """
+        Store an article's analysis for reuse by its near-duplicates.
+
+        Args:
+            article_id: Indexed article id
+            key: Analysis key from :func:`analysis_key`
+            result: JSON-serializable analysis
+        """
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO analyses (id, key, result, created) VALUES (?, ?, ?, ?)",
+                (article_id, key, json.dumps(result, ensure_ascii=False), time.time()),
+            )
+            self._conn.commit()
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Return index counters.
+
+        Returns:
+            Dictionary with articles, analyses, bands and rows
+        """
+        with self._lock:
+            articles = self._conn.execute("SELECT COUNT(*) FROM signatures").fetchone()[0]
+            analyses = self._conn.execute("SELECT COUNT(*) FROM analyses").fetchone()[0]
+        return {"articles": articles, "analyses": analyses, "bands": self.bands, "rows": self.rows}
+
+    def close(self) -> None:
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
+
+
+def analysis_key(*parts: str) -> str:
+    """
+    Identify what an analysis depends on (prompt configs, keyword lists,
+    models and temperature).
+
+    Analyses are only reused between near-duplicates when they were made with
+    the same prompts, keywords and models.
+
+    Args:
+        parts: Strings the analysis depends on
+
+    Returns:
+        Hex SHA-256 digest
+    """
+    payload = json.dumps(parts, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def get_index(path: str | None = None, threshold: float | None = None) -> DuplicateIndex:
+    """
+    Open the duplicate index configured from the environment.
+
+    Args:
+        path: SQLite file (default: DEDUP_INDEX_PATH or .cache/dedup.sqlite3)
+        threshold: Similarity threshold (default: DEDUP_THRESHOLD or 0.8)
+
+    Returns:
+        DuplicateIndex
+    """
+    return DuplicateIndex(
+        path=path or os.getenv("DEDUP_INDEX_PATH", os.path.join(".cache", "dedup.sqlite3")),
+        threshold=(
+            threshold if threshold is not None else float(os.getenv("DEDUP_THRESHOLD", "0.8"))
+        ),
+    )
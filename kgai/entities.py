@@ -0,0 +1,217 @@
+"""
+Entity resolution for extracted subject names.
+
+The extractor writes the same company or person differently from one article
+to the next, and sometimes within one article: ``厲害科技股份有限公司``,
+``厲害科技``, ``厲害公司``, ``厲害科技 (股)公司``. :func:`entity_key` reduces a
+name to a resolution key:
+
+- NFKC normalization (full-width letters, digits and brackets become
+  half-width), lowercase, whitespace and quotes removed
+- legal forms removed (``股份有限公司``, ``有限公司``, ``(股)``, ``公司``,
+  ``Co., Ltd.`` ...), as long as at least two characters remain
+
+Words that describe the business (``科技``, ``電子``, ``工業`` ...) are kept:
+``中華電子`` and ``中華工業`` are different companies.
+
+Personal names only go through normalization: ``陳柏宽`` and ``陳男`` are not
+merged, since a surname form may stand for several people.
+
+:class:`AliasIndex` adds curated aliases on top of the rules (ENTITY_ALIASES,
+a JSON file of ``{"canonical name": ["alias", ...]}``), e.g. ``台積電`` for
+``台灣積體電路製造股份有限公司``.
+
+:func:`merge_subjects` folds the variants within one article into one
+subject before the inferencer fan-out. Within an article, a shorter name
+whose key is the start of, or contained in, one longer name's key (and in no
+unrelated one) is also taken for that name (``厲害公司`` for ``厲害科技股份有限公司``).
+:mod:`kgai.store` records every subject's key so the same entity is linked
+across articles.
+
+Environment variables:
+    ENTITY_MERGE: Set to 0/false/off to ask the inferencer about every
+        variant separately (default: on)
+    ENTITY_ALIASES: JSON alias file (default: none)
+
+Example:
+    >>> entity_key('厲害科技股份有限公司') == entity_key('厲害科技')
+    True
+    >>> merge_subjects(['厲害公司', '王大明', '厲害科技股份有限公司'])
+    (['厲害科技股份有限公司', '王大明'], {'厲害科技股份有限公司': ['厲害公司']})
+"""
+
+import json
+import os
+import re
+import threading
+import unicodedata
+from collections.abc import Iterable
+
+# Legal forms, longest first so 股份有限公司 is not cut down to 股份有限
+LEGAL_SUFFIXES = (
+    "股份有限公司",
+    "有限責任公司",
+    "有限公司",
+    "股份公司",
+    "(股)公司",
+    "(股)",
+    "公司",
+)
+
+# English legal forms, matched as separate words before whitespace is removed
+_LATIN_LEGAL = re.compile(r"[\s,]+(?:co\.?,?\s*ltd|inc|corp|corporation|ltd|limited|llc)\.?$")
+
+# Brackets and quotes the extractor sometimes wraps names in
+_QUOTES = re.compile(r'["\'「」『』“”‘’《》〈〉]')
+_SPACE = re.compile(r"[\s　·・]+")
+
+# Shortest core left after removing suffixes
+_MIN_CORE = 2
+
+
+def normalize_name(name: str) -> str:
+    """
+    Normalize a name's characters without changing its words.
+
+    Args:
+        name: Subject name as extracted
+
+    Returns:
+        NFKC-normalized, lowercased name without whitespace or quotes
+    """
+    name = unicodedata.normalize("NFKC", name)
+    return _SPACE.sub("", _QUOTES.sub("", name)).lower()
+
+
+def _strip(name: str, suffixes: Iterable[str]) -> str:
+    """Remove ``suffixes`` from the end of ``name`` while a core remains."""
+    changed = True
+    while changed:
+        changed = False
+        for suffix in suffixes:
+            if name.endswith(suffix) and len(name) - len(suffix) >= _MIN_CORE:
+                name = name[: -len(suffix)]
+                changed = True
+                break
+    return name
+
+
+def entity_key(name: str) -> str:
+    """
+    Return the resolution key of a subject name.
+
+    Args:
+        name: Subject name as extracted
+
+    Returns:
+        Key shared by the variants of the same name (see the module docstring)
+    """
+    name = _LATIN_LEGAL.sub("", unicodedata.normalize("NFKC", name).lower().strip())
+    return _strip(normalize_name(name), LEGAL_SUFFIXES)
+
+
+class AliasIndex:
+    """
+    Map subject names to entity keys, with curated aliases.
+
+    Attributes:
+        aliases: Entity key of each alias key, from the alias file
+    """
+
+    def __init__(self, aliases: dict[str, list[str]] | None = None):
+        self.aliases: dict[str, str] = {}
+        for canonical, names in (aliases or {}).items():
+            key = entity_key(canonical)
+            for name in names:
+                self.aliases[entity_key(name)] = key
+
+    @classmethod
+    def load(cls, path: str) -> "AliasIndex":
+        """
+        Load an alias file.
+
+        Args:
+            path: JSON file of ``{"canonical name": ["alias", ...]}``
+
+        Returns:
+            AliasIndex
+        """
+        with open(path, encoding="utf-8") as file:
+            return cls(json.load(file))
+
+    def resolve(self, name: str) -> str:
+        """
+        Return the entity key of ``name``.
+
+        Args:
+            name: Subject name as extracted
+
+        Returns:
+            The curated entity's key for a known alias, :func:`entity_key`
+            otherwise
+        """
+        key = entity_key(name)
+        return self.aliases.get(key, key)
+
+
+_index: AliasIndex | None = None
+_index_lock = threading.Lock()
+
+
+def get_alias_index() -> AliasIndex:
+    """Return the process-wide alias index loaded from ENTITY_ALIASES."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            path = os.getenv("ENTITY_ALIASES")
+            _index = AliasIndex.load(path) if path else AliasIndex()
+        return _index
+
+
+def merge_enabled() -> bool:
+    """Return whether subject variants are merged within an article (ENTITY_MERGE)."""
+    return os.getenv("ENTITY_MERGE", "true").lower() not in ("0", "false", "no", "off")
+
+
+def merge_subjects(
+    subjects: list[str], index: AliasIndex | None = None
+) -> tuple[list[str], dict[str, list[str]]]:
+    """
+    Fold the variants of the same entity into one subject.
+
+    Names with the same key (or curated alias) are variants. A key that is
+    the start of, or contained in, the keys of longer names that all belong
+    to one of them is a short form of that name; a key found in two unrelated
+    longer names (``台灣`` in ``台灣科技`` and ``台灣電子``) is left alone.
+    The longest variant (usually the full legal name) represents the entity,
+    at the position where the entity was first listed.
+
+    Args:
+        subjects: Subject names from the extractor
+        index: Alias index (default: :func:`get_alias_index`)
+
+    Returns:
+        (merged subjects, the other variants of each merged subject that had
+        any)
+    """
+    index = index or get_alias_index()
+    keys = [index.resolve(subject) for subject in subjects]
+    parents: dict[str, str] = {}
+    for key in set(keys):
+        containers = [other for other in set(keys) if len(other) > len(key) and key in other]
+        if len(key) >= _MIN_CORE and containers:
+            longest = max(containers, key=len)
+            if all(container in longest for container in containers):
+                parents[key] = longest
+    groups: dict[str, list[str]] = {}
+    for subject, key in zip(subjects, keys, strict=True):
+        groups.setdefault(parents.get(key, key), []).append(subject)
+    merged: list[str] = []
+    aliases: dict[str, list[str]] = {}
+    for variants in groups.values():
+        canonical = max(variants, key=len)
+        merged.append(canonical)
+        others = [variant for variant in variants if variant != canonical]
+        if others:
+            aliases[canonical] = others
+    return merged, aliases
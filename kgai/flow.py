@@ -0,0 +1,593 @@
+"""
+Streaming crawl pipeline: fetch -> parse -> prefilter -> extractor -> inferencer -> store.
+
+Every stage runs its own pool of workers and hands articles to the next one
+through a bounded ``asyncio.Queue``. When a queue is full, the stage feeding it
+waits. A slow LLM endpoint therefore slows down fetching instead of piling up
+pages in memory. Articles stay in memory from the fetch until they reach the
+results store (:mod:`kgai.store`), with no ``posts/*.md`` round trip.
+
+Each stage counts the items it received, passed on, dropped and failed on. It
+also records its busy time, the time it was blocked on a full output queue,
+and the depth of its input queue. :meth:`Flow.run` prints these every
+FLOW_REPORT_INTERVAL seconds and at the end. The stage with the highest
+utilization is the bottleneck. Stages before it show a full input queue
+downstream and a high ``blocked`` share.
+
+Environment variables:
+    FLOW_QUEUE_SIZE: Items each queue between stages holds (default: 16)
+    FLOW_PARSE_WORKERS: Pages parsed at once (default: 4, or twice the
+        worker processes of the extract pool when that is larger)
+    FLOW_EXTRACT_WORKERS: Articles in the extractor stage at once (default: 8)
+    FLOW_INFER_WORKERS: Articles in the inferencer stage at once (default: 8)
+    FLOW_REPORT_INTERVAL: Seconds between progress reports (default: 10;
+        0 reports only at the end)
+
+With a crawl frontier (:mod:`kgai.frontier`), only due URLs are fetched.
+Pages answering 304 or whose extracted content is unchanged are dropped
+before the prefilter, so they never reach the LLM.
+
+Example:
+    >>> async with Fetcher() as fetcher:
+    ...     flow = crawl_flow(fetcher, store, 'extractor_v1-2.json', 'inferencer_v8-1.json', crime, judge)
+    ...     await flow.run({'url': url} for url in urls)
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from collections.abc import Awaitable, Callable, Iterable
+from dataclasses import dataclass
+from typing import Any
+
+from kgai import pipeline
+from kgai.fetch import Fetcher
+from kgai.frontier import Frontier, get_frontier
+from kgai.metrics import ArticleUsage, article_usage, get_metrics
+from kgai.sites import ExtractPool, get_sites
+from kgai.stages import StageStore
+from kgai.store import ResultStore, get_store
+
+# Marks the end of a queue's items, once per worker reading it
+_DONE = object()
+
+Handler = Callable[[dict[str, Any]], Awaitable[dict[str, Any] | None]]
+
+
+@dataclass
+class StageStats:
+    """
+    Counters of one stage.
+
+    Attributes:
+        name: Stage name
+        workers: Concurrent workers
+        received: Items taken from the input queue
+        emitted: Items passed to the next stage
+        dropped: Items the handler filtered out
+        failed: Items whose handler raised
+        busy: Seconds spent in the handler, summed over workers
+        blocked: Seconds spent waiting for room in the output queue
+        depth: Current input queue depth
+        max_depth: Largest input queue depth seen
+        depth_sum: Sum of the depths seen, for the mean
+    """
+
+    name: str
+    workers: int
+    received: int = 0
+    emitted: int = 0
+    dropped: int = 0
+    failed: int = 0
+    busy: float = 0.0
+    blocked: float = 0.0
+    depth: int = 0
+    max_depth: int = 0
+    depth_sum: int = 0
+
+    def row(self, elapsed: float) -> dict[str, Any]:
+        """
+        Return the counters with the derived rates.
+
+        Args:
+            elapsed: Seconds since the flow started
+
+        Returns:
+            Dictionary with the counters plus ``rate`` (items passed on per
+            second), ``utilization`` and ``blocked_share`` (of the workers'
+            time) and ``mean_depth``
+        """
+        capacity = self.workers * elapsed if elapsed else 0.0
+        return {
+            "stage": self.name,
+            "workers": self.workers,
+            "received": self.received,
+            "emitted": self.emitted,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "rate": self.emitted / elapsed if elapsed else 0.0,
+            "utilization": self.busy / capacity if capacity else 0.0,
+            "blocked_share": self.blocked / capacity if capacity else 0.0,
+            "depth": self.depth,
+            "max_depth": self.max_depth,
+            "mean_depth": self.depth_sum / self.received if self.received else 0.0,
+        }
+
+
+class Stage:
+    """
+    One step of a :class:`Flow`.
+
+    The handler gets an item (a dictionary) and returns the item for the next
+    stage, or None to drop it (the handler reports why).
+
+    Attributes:
+        name: Stage name used in reports
+        handler: Coroutine function processing one item
+        workers: Items processed concurrently
+        stats: Counters
+    """
+
+    def __init__(self, name: str, handler: Handler, workers: int = 1):
+        self.name = name
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.stats = StageStats(name, self.workers)
+
+
+class Flow:
+    """
+    Stages connected by bounded queues, all running concurrently.
+
+    Attributes:
+        stages: Stages in order
+        queue_size: Capacity of each queue
+        report_interval: Seconds between progress reports (0: only at the end)
+    """
+
+    def __init__(self, stages: list[Stage], queue_size: int = 16, report_interval: float = 10.0):
+        self.stages = stages
+        self.queue_size = queue_size
+        self.report_interval = report_interval
+        self._start: float | None = None
+        self._queues: list[asyncio.Queue] = []
+
+    @property
+    def elapsed(self) -> float:
+        """Seconds since :meth:`run` started."""
+        return time.monotonic() - self._start if self._start is not None else 0.0
+
+    async def run(
+        self, items: Iterable[dict[str, Any]], sink: Callable[[dict[str, Any]], None] | None = None
+    ) -> list[dict[str, Any]]:
+        """
+        Push ``items`` through every stage and wait until all are done.
+
+        Args:
+            items: Items for the first stage, consumed as the first queue has
+                room
+            sink: Called with every item the last stage passes on
+
+        Returns:
+            :meth:`StageStats.row` per stage
+        """
+        self._start = time.monotonic()
+        queues = self._queues = [asyncio.Queue(self.queue_size) for _ in self.stages]
+        remaining = [stage.workers for stage in self.stages]
+
+        async def work(index: int) -> None:
+            stage, inbox = self.stages[index], queues[index]
+            outbox = queues[index + 1] if index + 1 < len(queues) else None
+            stats = stage.stats
+            while True:
+                item = await inbox.get()
+                if item is _DONE:
+                    break
+                # Depth as the item arrived, itself included
+                stats.depth = inbox.qsize() + 1
+                stats.received += 1
+                stats.depth_sum += stats.depth
+                stats.max_depth = max(stats.max_depth, stats.depth)
+                start = time.monotonic()
+                try:
+                    item = await stage.handler(item)
+                except Exception as error:
+                    stats.failed += 1
+                    print(
+                        f"Error in {stage.name} for {_label(item)}: {type(error).__name__}: {error}"
+                    )
+                    continue
+                finally:
+                    stats.busy += time.monotonic() - start
+                if item is None:
+                    stats.dropped += 1
+                    continue
+                stats.emitted += 1
+                if index == len(self.stages) - 1:
+                    if sink is not None:
+                        sink(item)
+                    continue
+                start = time.monotonic()
+                await outbox.put(item)
+                stats.blocked += time.monotonic() - start
+            # The last worker out tells every worker of the next stage
+            remaining[index] -= 1
+            if remaining[index] == 0 and outbox is not None:
+                for _ in range(self.stages[index + 1].workers):
+                    await outbox.put(_DONE)
+
+        async def feed() -> None:
+            for item in items:
+                await queues[0].put(item)
+            for _ in range(self.stages[0].workers):
+                await queues[0].put(_DONE)
+
+        async def report() -> None:
+            while True:
+                await asyncio.sleep(self.report_interval)
+                self.print_report()
+
+        workers = [
+            asyncio.ensure_future(work(index))
+            for index, stage in enumerate(self.stages)
+            for _ in range(stage.workers)
+        ]
+        reporter = asyncio.ensure_future(report()) if self.report_interval > 0 else None
+        try:
+            await asyncio.gather(feed(), *workers)
+        finally:
+            for task in workers:
+                task.cancel()
+            if reporter is not None:
+                reporter.cancel()
+        return self.report()
+
+    def report(self) -> list[dict[str, Any]]:
+        """Return :meth:`StageStats.row` per stage, as of now."""
+        elapsed = self.elapsed
+        for stage, queue in zip(self.stages, self._queues, strict=True):
+            stage.stats.depth = queue.qsize()
+        return [stage.stats.row(elapsed) for stage in self.stages]
+
+    def print_report(self, final: bool = False) -> None:
+        """Print one line per stage and name the bottleneck."""
+        rows = self.report()
+        print(f"=== Flow {'finished' if final else 'progress'} after {self.elapsed:.1f}s ===")
+        for row in rows:
+            print(
+                f"{row['stage']:<10} in {row['received']:>6}  out {row['emitted']:>6}  "
+                f"dropped {row['dropped']:>5}  failed {row['failed']:>4}  {row['rate']:>7.2f}/s  "
+                f"busy {row['utilization']:>4.0%}  blocked {row['blocked_share']:>4.0%}  "
+                f"queue {row['depth']}/{self.queue_size} (max {row['max_depth']}, mean {row['mean_depth']:.1f})"
+            )
+        busiest = max(rows, key=lambda row: row["utilization"])
+        if busiest["utilization"] > 0:
+            print(
+                f"Bottleneck: {busiest['stage']} ({busiest['utilization']:.0%} busy "
+                f"with {busiest['workers']} worker(s))"
+            )
+
+
+def _label(item: Any) -> str:
+    """Name an item in error messages."""
+    if isinstance(item, dict):
+        return str(item.get("url") or item.get("id") or "?")
+    return repr(item)
+
+
+def crawl_flow(
+    fetcher: Fetcher,
+    store: ResultStore | None,
+    extractor_conf: str,
+    inferencer_conf: str,
+    crime_keywords: str,
+    judge_keywords: str,
+    stages: StageStore | None = None,
+    extract_pool: ExtractPool | None = None,
+    frontier: Frontier | None = None,
+    parse_workers: int | None = None,
+    extract_workers: int | None = None,
+    infer_workers: int | None = None,
+    queue_size: int | None = None,
+    report_interval: float | None = None,
+) -> Flow:
+    """
+    Build the crawl -> analysis -> store flow.
+
+    Items are ``{'url': url}`` dictionaries. Pages that fail to fetch, hosts
+    without a ``sites.json`` entry and pages without content are dropped, as
+    are pages the frontier reports unchanged.
+    Articles the prefilter skips go straight to the store.
+
+    Args:
+        fetcher: Open :class:`kgai.fetch.Fetcher`; the fetch stage runs
+            ``fetcher.concurrency`` workers, and per-host limits still apply
+        store: Results store the last stage writes to (None: results are
+            only passed to the flow's sink)
+        extractor_conf: Extractor configuration filename (from prompts/)
+        inferencer_conf: Inferencer configuration filename (from prompts/)
+        crime_keywords: Crime keywords content
+        judge_keywords: Legal proceeding keywords content
+        stages: Reuse stage outputs whose inputs are unchanged
+        extract_pool: Parse pages in these worker processes (None: parse in
+            threads of this process)
+        frontier: Record fetches, drop unchanged pages and mark analyzed
+            content in this crawl frontier. A page is marked once its
+            article is committed to ``store`` (closing the store commits the
+            rest), and only when none of its subjects failed.
+        parse_workers: Pages parsed at once (default: FLOW_PARSE_WORKERS, or 4
+            and at least twice the pool's processes so none of them idles)
+        extract_workers: Articles in the extractor at once
+            (default: FLOW_EXTRACT_WORKERS or 8)
+        infer_workers: Articles in the inferencer at once
+            (default: FLOW_INFER_WORKERS or 8)
+        queue_size: Queue capacity (default: FLOW_QUEUE_SIZE or 16)
+        report_interval: Seconds between reports (default: FLOW_REPORT_INTERVAL or 10)
+
+    Returns:
+        Flow; each finished item carries ``article`` and ``result``
+    """
+    sites = get_sites()
+    labels = {
+        "extractor": os.path.basename(extractor_conf),
+        "inferencer": os.path.basename(inferencer_conf),
+    }
+
+    async def fetch(item: dict[str, Any]) -> dict[str, Any] | None:
+        result = await fetcher.fetch(item["url"])
+        if frontier is not None:
+            frontier.record_fetch(result)
+        if result.not_modified:
+            return None
+        if not result.ok:
+            print("Error", item["url"], result.error or f"HTTP {result.status}")
+            return None
+        item["html"] = result.body
+        item["encoding"] = result.encoding
+        return item
+
+    async def parse(item: dict[str, Any]) -> dict[str, Any] | None:
+        if extract_pool is not None:
+            article = await extract_pool.extract(
+                item["url"], item.pop("html"), item.pop("encoding")
+            )
+        else:
+            article = await asyncio.to_thread(
+                sites.extract, item["url"], item.pop("html"), item.pop("encoding")
+            )
+        if article is None or not article["content"]:
+            print("Error", item["url"], "no content extracted")
+            return None
+        if frontier is not None:
+            item["hash"] = frontier.changed(item["url"], article["content"])
+            if item["hash"] is None:
+                return None
+        item["article"] = {**article, "id": item["url"], "url": item["url"]}
+        return item
+
+    async def prefilter(item: dict[str, Any]) -> dict[str, Any]:
+        article = item["article"]
+        item["analysis"] = pipeline.prepare(
+            crime_keywords, judge_keywords, article["content"], article.get("title"), article["id"]
+        )
+        item["usage"] = ArticleUsage(article=article["id"], labels=labels)
+        item["start"] = time.monotonic()
+        return item
+
+    async def extract(item: dict[str, Any]) -> dict[str, Any]:
+        with article_usage(item["usage"]):
+            await pipeline.run_extractor(item["analysis"], extractor_conf, stages)
+        return item
+
+    async def infer(item: dict[str, Any]) -> dict[str, Any]:
+        with article_usage(item["usage"]):
+            await pipeline.run_inferencer(item["analysis"], inferencer_conf, stages)
+        return item
+
+    # Content hashes wait here until the store has committed their article
+    unsaved: dict[str, str] = {}
+
+    def saved(ids: list[str]) -> None:
+        for url in ids:
+            digest = unsaved.pop(url, None)
+            if digest is not None:
+                frontier.analyzed(url, digest)
+
+    if frontier is not None and store is not None:
+        store.on_write.append(saved)
+
+    async def persist(item: dict[str, Any]) -> dict[str, Any]:
+        item["result"] = item.pop("analysis").result()
+        digest = item.pop("hash", None)
+        # An answer that failed is analyzed again on the next crawl
+        if any(record.error for record in item["result"]["records"]):
+            digest = None
+        if frontier is not None and digest is not None:
+            if store is None:
+                frontier.analyzed(item["url"], digest)
+            else:
+                unsaved[item["url"]] = digest
+        if store is not None:
+            await asyncio.to_thread(
+                store.add, item["article"], item["result"], extractor_conf, inferencer_conf
+            )
+        usage = item.pop("usage")
+        usage.elapsed = time.monotonic() - item.pop("start")
+        get_metrics().record_article(usage)
+        return item
+
+    def setting(value: float | None, name: str, default: str) -> float:
+        return value if value is not None else float(os.getenv(name, default))
+
+    default_parse_workers = max(4, 2 * extract_pool.processes) if extract_pool is not None else 4
+
+    return Flow(
+        [
+            Stage("fetch", fetch, fetcher.concurrency),
+            Stage(
+                "parse",
+                parse,
+                int(setting(parse_workers, "FLOW_PARSE_WORKERS", str(default_parse_workers))),
+            ),
+            Stage("prefilter", prefilter, 1),
+            Stage("extract", extract, int(setting(extract_workers, "FLOW_EXTRACT_WORKERS", "8"))),
+            Stage("infer", infer, int(setting(infer_workers, "FLOW_INFER_WORKERS", "8"))),
+            Stage("store", persist, 1),
+        ],
+        queue_size=int(setting(queue_size, "FLOW_QUEUE_SIZE", "16")),
+        report_interval=setting(report_interval, "FLOW_REPORT_INTERVAL", "10"),
+    )
+
+
+def _print_records(item: dict[str, Any]) -> None:
+    """Sink printing each finished article's records."""
+    for record in item["result"]["records"]:
+        print(
+            f"{item['url']} {record.subject}: {', '.join(record.crimes)} / {', '.join(record.progress)} "
+            f"{record.summary}"
+        )
+
+
+async def crawl(
+    args: argparse.Namespace, urls: list[str], crime_keywords: str, judge_keywords: str
+) -> Flow:
+    """Run :func:`crawl_flow` for the ``prompt.py crawl`` arguments."""
+    frontier = None if args.no_frontier else get_frontier(args.frontier)
+    if frontier is not None:
+        added = frontier.add(urls, priority=args.priority)
+        urls = frontier.due(limit=args.limit, now=float("inf") if args.all else None)
+        print(f"{added} new URL(s) in the frontier, {len(urls)} due")
+    elif args.limit is not None:
+        urls = urls[: args.limit]
+    print(f"{len(urls)} URL(s) to crawl")
+
+    store = None if args.no_store else get_store(args.store)
+    extract_pool = ExtractPool(args.parse_processes)
+    try:
+        async with Fetcher(
+            concurrency=int(os.getenv("CRAWLER_CONCURRENCY", "32")),
+            per_host=int(os.getenv("CRAWLER_PER_HOST", "2")),
+            delay=float(os.getenv("CRAWLER_DELAY", "1.0")),
+            timeout=float(os.getenv("CRAWLER_TIMEOUT", "30")),
+            retries=int(os.getenv("CRAWLER_RETRIES", "3")),
+            validators=frontier.validators(urls) if frontier is not None else None,
+        ) as fetcher:
+            flow = crawl_flow(
+                fetcher,
+                store,
+                args.extractor,
+                args.inferencer,
+                crime_keywords,
+                judge_keywords,
+                extract_pool=extract_pool,
+                frontier=frontier,
+                extract_workers=args.extract_workers,
+                infer_workers=args.infer_workers,
+                queue_size=args.queue_size,
+            )
+            await flow.run(({"url": url} for url in urls), sink=_print_records)
+    finally:
+        extract_pool.close()
+        if store is not None:
+            store.close()
+        if frontier is not None:
+            print(frontier.summary())
+            frontier.close()
+    return flow
+
+
+def main(argv: list[str] | None = None) -> int:
+    """
+    Command-line entry point for ``prompt.py crawl``.
+
+    Args:
+        argv: Arguments after ``crawl`` (defaults to sys.argv)
+
+    Returns:
+        Process exit code
+    """
+    parser = argparse.ArgumentParser(
+        prog="prompt.py crawl",
+        description="Fetch, analyze and store news articles in one streaming pass",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "sources",
+        nargs="?",
+        default=None,
+        help="File with one article URL per line (optional with a frontier: crawl the due URLs)",
+    )
+    parser.add_argument(
+        "--extractor", default="extractor_v1-2.json", help="Extractor config (from prompts/)"
+    )
+    parser.add_argument(
+        "--inferencer", default="inferencer_v8-1.json", help="Inferencer config (from prompts/)"
+    )
+    parser.add_argument(
+        "--crime-keywords", default="crime_keywords.txt", help="Crime keywords file (from samples/)"
+    )
+    parser.add_argument(
+        "--judge-keywords",
+        default="judge_keywords.txt",
+        help="Legal proceeding keywords file (from samples/)",
+    )
+    parser.add_argument("--store", default=None, help="Results store (default: RESULTS_STORE_PATH)")
+    parser.add_argument("--no-store", action="store_true", help="Only print the results")
+    parser.add_argument("--frontier", default=None, help="Crawl frontier (default: FRONTIER_PATH)")
+    parser.add_argument(
+        "--no-frontier",
+        action="store_true",
+        help="Fetch every source URL, changed or not, without recording it",
+    )
+    parser.add_argument(
+        "--priority", type=int, default=0, help="Frontier priority of the source URLs"
+    )
+    parser.add_argument(
+        "--all", action="store_true", help="Fetch every frontier URL now, due or not"
+    )
+    parser.add_argument("--limit", type=int, default=None, help="Most URLs to fetch in this run")
+    parser.add_argument(
+        "--parse-processes",
+        type=int,
+        default=None,
+        help="Processes parsing pages (default: CRAWLER_PARSE_PROCESSES or one per CPU; 0: none)",
+    )
+    parser.add_argument(
+        "--extract-workers",
+        type=int,
+        default=None,
+        help="Articles in the extractor at once (default: FLOW_EXTRACT_WORKERS or 8)",
+    )
+    parser.add_argument(
+        "--infer-workers",
+        type=int,
+        default=None,
+        help="Articles in the inferencer at once (default: FLOW_INFER_WORKERS or 8)",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=None,
+        help="Items each queue between stages holds (default: FLOW_QUEUE_SIZE or 16)",
+    )
+    args = parser.parse_args(argv)
+    if args.sources is None and args.no_frontier:
+        parser.error("sources are required with --no-frontier")
+
+    urls = []
+    if args.sources is not None:
+        with open(args.sources, encoding="utf-8") as file:
+            urls = [line.strip() for line in file if line.strip()]
+    with open(
+        pipeline.resolve(args.crime_keywords, pipeline.SAMPLES_DIR), encoding="utf-8"
+    ) as file:
+        crime_keywords = file.read()
+    with open(
+        pipeline.resolve(args.judge_keywords, pipeline.SAMPLES_DIR), encoding="utf-8"
+    ) as file:
+        judge_keywords = file.read()
+
+    flow = asyncio.run(crawl(args, urls, crime_keywords, judge_keywords))
+    flow.print_report(final=True)
+    return 1 if any(row["failed"] for row in flow.report()) else 0
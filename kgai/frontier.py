@@ -0,0 +1,363 @@
+"""
+Persistent crawl frontier: which URLs to fetch, when, and whether they changed.
+
+Every URL the crawler has seen is kept in SQLite with its fetch status, the
+validators for a conditional GET, the hash of its extracted content, its
+failure count and the time it is next due. A crawl asks the frontier for the
+due URLs instead of refetching a whole source list:
+
+- new URLs are due at once; URLs with a higher priority come first, and hosts
+  are interleaved so one large site does not fill the run
+- a fetched URL is due again after its recrawl interval. The interval doubles
+  each time the article is found unchanged (up to FRONTIER_MAX_RECRAWL) and
+  drops back to FRONTIER_RECRAWL when it changes
+- a failing URL is retried after an exponential backoff; 404 and 410 responses
+  are only rechecked after the longest backoff
+- a page whose extracted content hashes the same as last time is not
+  analyzed again (:meth:`Frontier.changed`)
+
+A daily crawl therefore fetches the new URLs and the few old ones that are
+due, most of which answer 304 or hash unchanged, and analyzes only new and
+changed articles.
+
+Environment variables:
+    FRONTIER_PATH: SQLite file (default: .cache/frontier.sqlite3)
+    FRONTIER_RECRAWL: Seconds before a fetched URL is due again (default: 86400)
+    FRONTIER_MAX_RECRAWL: Longest recrawl interval for unchanged URLs
+        (default: 2592000, 30 days)
+    FRONTIER_BACKOFF: Seconds before the first retry of a failed URL (default: 300)
+    FRONTIER_MAX_BACKOFF: Longest retry backoff (default: 86400)
+
+Example:
+    >>> frontier = get_frontier()
+    >>> frontier.add(urls)
+    >>> for url in frontier.due(limit=1000):
+    ...     result = await fetcher.fetch(url)
+    ...     frontier.record_fetch(result)
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections.abc import Iterable
+from urllib.parse import urlparse
+
+from kgai.fetch import FetchResult
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS urls (
+    url TEXT PRIMARY KEY,
+    host TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'new',
+    etag TEXT,
+    last_modified TEXT,
+    content_hash TEXT,
+    added REAL NOT NULL,
+    last_fetch REAL,
+    last_change REAL,
+    failures INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    interval REAL,
+    next_due REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS urls_due ON urls (next_due);
+"""
+
+# Responses after which a URL is not retried on the short backoff
+GONE_STATUSES = {404, 410}
+
+
+def content_hash(content: str) -> str:
+    """Return the hash the frontier compares extracted article text by."""
+    return hashlib.sha256(content.strip().encode("utf-8")).hexdigest()
+
+
+class Frontier:
+    """
+    SQLite-backed crawl frontier, one row per URL.
+
+    URL statuses: ``new`` (never fetched), ``fetched``, ``failed`` (retried
+    with backoff) and ``gone`` (404/410). Safe to share between threads;
+    access is serialized with a lock.
+
+    Attributes:
+        path: SQLite database file
+        recrawl: Seconds before a fetched URL is due again
+        max_recrawl: Longest recrawl interval for unchanged URLs
+        backoff: Seconds before the first retry of a failed URL
+        max_backoff: Longest retry backoff
+        counts: Outcomes recorded since creation (new, changed, unchanged,
+            not_modified, failed, gone)
+    """
+
+    def __init__(
+        self,
+        path: str,
+        recrawl: float = 86400,
+        max_recrawl: float = 30 * 86400,
+        backoff: float = 300,
+        max_backoff: float = 86400,
+    ):
+        self.path = path
+        self.recrawl = recrawl
+        self.max_recrawl = max_recrawl
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.counts = dict.fromkeys(
+            ("new", "changed", "unchanged", "not_modified", "failed", "gone"), 0
+        )
+        self._lock = threading.Lock()
+
+        dirname = os.path.dirname(path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def add(self, urls: Iterable[str], priority: int = 0) -> int:
+        """
+        Add URLs to the frontier; known URLs keep their state.
+
+        Args:
+            urls: URLs to crawl
+            priority: Higher priorities are fetched first; a known URL's
+                priority is raised to this, never lowered
+
+        Returns:
+            Number of URLs that were not known before
+        """
+        now = time.time()
+        rows = [(url, urlparse(url).netloc, priority, now, now) for url in urls]
+        with self._lock:
+            before = self._conn.execute("SELECT COUNT(*) FROM urls").fetchone()[0]
+            self._conn.executemany(
+                "INSERT INTO urls (url, host, priority, added, next_due) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (url) DO UPDATE SET priority = MAX(priority, excluded.priority)",
+                rows,
+            )
+            self._conn.commit()
+            after = self._conn.execute("SELECT COUNT(*) FROM urls").fetchone()[0]
+        return after - before
+
+    def due(self, limit: int | None = None, now: float | None = None) -> list[str]:
+        """
+        Return the URLs due for a fetch, best first.
+
+        Within each host, URLs are ordered by priority, never-fetched first,
+        then by how long they have been due. Hosts are interleaved: every
+        host's first URL, then every host's second one, and so on.
+
+        Args:
+            limit: Most URLs to return (None: all due URLs)
+            now: Time to compare due times with (default: now)
+
+        Returns:
+            URLs in fetch order
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT url FROM ("
+                "  SELECT url, priority, next_due, ROW_NUMBER() OVER ("
+                "    PARTITION BY host ORDER BY priority DESC, last_fetch IS NOT NULL, next_due"
+                "  ) AS turn FROM urls WHERE next_due <= ?"
+                ") ORDER BY turn, priority DESC, next_due LIMIT ?",
+                (time.time() if now is None else now, -1 if limit is None else limit),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def validators(self, urls: Iterable[str]) -> dict[str, tuple[str | None, str | None]]:
+        """
+        Return the known (etag, last_modified) per URL, for ``Fetcher(validators=...)``.
+
+        Args:
+            urls: URLs about to be fetched
+
+        Returns:
+            Validators of the URLs that have any
+        """
+        found = {}
+        with self._lock:
+            for url in urls:
+                row = self._conn.execute(
+                    "SELECT etag, last_modified FROM urls WHERE url = ?", (url,)
+                ).fetchone()
+                if row is not None and (row[0] or row[1]):
+                    found[url] = (row[0], row[1])
+        return found
+
+    def record_fetch(self, result: FetchResult) -> str:
+        """
+        Record a fetch and schedule the URL's next one.
+
+        Args:
+            result: Fetch result (URLs not in the frontier are added)
+
+        Returns:
+            ``fetched`` (a body to parse), ``not_modified`` (304; nothing to
+            do), ``failed`` or ``gone``
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT failures, interval FROM urls WHERE url = ?", (result.url,)
+            ).fetchone()
+            if row is None:
+                self._conn.execute(
+                    "INSERT INTO urls (url, host, added, next_due) VALUES (?, ?, ?, ?)",
+                    (result.url, urlparse(result.url).netloc, now, now),
+                )
+                row = (0, None)
+            failures, interval = row
+            interval = interval or self.recrawl
+
+            if result.not_modified:
+                outcome = "not_modified"
+                interval = min(interval * 2, self.max_recrawl)
+                self._conn.execute(
+                    "UPDATE urls SET status = ?, last_fetch = ?, failures = 0, last_error = NULL, "
+                    "interval = ?, next_due = ? WHERE url = ?",
+                    ("fetched", now, interval, now + interval, result.url),
+                )
+            elif result.ok:
+                # The interval is settled once the content is compared (changed/analyzed)
+                outcome = "fetched"
+                self._conn.execute(
+                    "UPDATE urls SET status = ?, etag = ?, last_modified = ?, last_fetch = ?, failures = 0, "
+                    "last_error = NULL, interval = ?, next_due = ? WHERE url = ?",
+                    (
+                        "fetched",
+                        result.etag,
+                        result.last_modified,
+                        now,
+                        interval,
+                        now + interval,
+                        result.url,
+                    ),
+                )
+            else:
+                failures += 1
+                outcome = "gone" if result.status in GONE_STATUSES else "failed"
+                delay = (
+                    self.max_backoff
+                    if outcome == "gone"
+                    else min(self.backoff * 2 ** (failures - 1), self.max_backoff)
+                )
+                self._conn.execute(
+                    "UPDATE urls SET status = ?, last_fetch = ?, failures = ?, last_error = ?, next_due = ? "
+                    "WHERE url = ?",
+                    (
+                        outcome,
+                        now,
+                        failures,
+                        result.error or f"HTTP {result.status}",
+                        now + delay,
+                        result.url,
+                    ),
+                )
+            self._conn.commit()
+            if outcome != "fetched":
+                self.counts[outcome] += 1
+        return outcome
+
+    def changed(self, url: str, content: str) -> str | None:
+        """
+        Compare a page's extracted content with the last analyzed version.
+
+        An unchanged page has its recrawl interval doubled. A changed one is
+        not marked until :meth:`analyzed`, so a failed analysis is retried on
+        the next crawl.
+
+        Args:
+            url: Page URL
+            content: Extracted article text
+
+        Returns:
+            The content hash to pass to :meth:`analyzed` when the page is new
+            or changed, None when it is unchanged
+        """
+        digest = content_hash(content)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content_hash, interval FROM urls WHERE url = ?", (url,)
+            ).fetchone()
+            if row is None or row[0] != digest:
+                self.counts["changed" if row is not None and row[0] else "new"] += 1
+                return digest
+            interval = min((row[1] or self.recrawl) * 2, self.max_recrawl)
+            self._conn.execute(
+                "UPDATE urls SET interval = ?, next_due = ? WHERE url = ?",
+                (interval, now + interval, url),
+            )
+            self._conn.commit()
+            self.counts["unchanged"] += 1
+        return None
+
+    def analyzed(self, url: str, digest: str) -> None:
+        """
+        Record that a page's content has been analyzed.
+
+        Args:
+            url: Page URL
+            digest: Hash returned by :meth:`changed`
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE urls SET content_hash = ?, last_change = ?, interval = ?, next_due = ? WHERE url = ?",
+                (digest, now, self.recrawl, now + self.recrawl, url),
+            )
+            self._conn.commit()
+
+    def stats(self, now: float | None = None) -> dict[str, int]:
+        """Return the number of URLs per status, and how many are due now."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) FROM urls GROUP BY status"
+            ).fetchall()
+            due = self._conn.execute(
+                "SELECT COUNT(*) FROM urls WHERE next_due <= ?",
+                (time.time() if now is None else now,),
+            ).fetchone()[0]
+        return {"new": 0, "fetched": 0, "failed": 0, "gone": 0, **dict(rows), "due": due}
+
+    def summary(self) -> str:
+        """Describe this run's outcomes and the frontier's state in one line."""
+        counts = self.counts
+        stats = self.stats()
+        return (
+            f"Frontier: {counts['new']} new, {counts['changed']} changed, "
+            f"{counts['unchanged'] + counts['not_modified']} unchanged "
+            f"({counts['not_modified']} not modified), {counts['failed']} failed, {counts['gone']} gone; "
+            f"{sum(stats[status] for status in ('new', 'fetched', 'failed', 'gone'))} URLs known, "
+            f"{stats['due']} due now"
+        )
+
+    def close(self) -> None:
+        """Close the database."""
+        with self._lock:
+            self._conn.close()
+
+
+def get_frontier(path: str | None = None) -> Frontier:
+    """
+    Open the crawl frontier configured from the environment.
+
+    Args:
+        path: SQLite file (default: FRONTIER_PATH or .cache/frontier.sqlite3)
+
+    Returns:
+        Frontier
+    """
+    return Frontier(
+        path or os.getenv("FRONTIER_PATH", os.path.join(".cache", "frontier.sqlite3")),
+        recrawl=float(os.getenv("FRONTIER_RECRAWL", "86400")),
+        max_recrawl=float(os.getenv("FRONTIER_MAX_RECRAWL", str(30 * 86400))),
+        backoff=float(os.getenv("FRONTIER_BACKOFF", "300")),
+        max_backoff=float(os.getenv("FRONTIER_MAX_BACKOFF", "86400")),
+    )
@@ -0,0 +1,199 @@
+"""
+Multi-pattern keyword matching for the crime/legal keyword lists.
+
+The keyword files (``samples/crime_keywords.txt``, ``samples/judge_keywords.txt``)
+are ``|``/``｜``-separated lists. :class:`KeywordMatcher` compiles a list once into
+an Aho–Corasick automaton and a trie-shaped regular expression, then scans an
+article in a single pass over its characters regardless of how many keywords
+there are, reporting every occurrence (overlapping ones included) with its
+offset.
+
+The pipeline uses it to skip (or run the extractor only for) articles that
+contain no crime keyword, and to pass only the keywords an article actually
+contains into the prompts.
+
+Example:
+    >>> matcher = get_matcher('詐欺 |洗錢 |詐騙')
+    >>> matcher.find('涉嫌詐欺及洗錢')
+    [('詐欺', 2), ('洗錢', 5)]
+"""
+
+import re
+from collections import deque
+from collections.abc import Iterable
+from functools import lru_cache
+from typing import Any
+
+KEYWORD_SEPARATOR = " |"
+_SEPARATORS = re.compile(r"[|｜\n]")
+
+
+def parse_keywords(content: str) -> list[str]:
+    """
+    Split a keyword file into keywords.
+
+    Args:
+        content: ``|`` or ``｜``-separated (or one-per-line) keyword list
+
+    Returns:
+        Stripped, non-empty keywords in file order, without duplicates
+    """
+    keywords = (keyword.strip() for keyword in _SEPARATORS.split(content))
+    return list(dict.fromkeys(keyword for keyword in keywords if keyword))
+
+
+def format_keywords(keywords: Iterable[str]) -> str:
+    """
+    Join keywords back into the keyword file format used by the prompts.
+
+    Args:
+        keywords: Keywords
+
+    Returns:
+        Text such as ``詐欺 |洗錢``
+    """
+    return KEYWORD_SEPARATOR.join(keywords)
+
+
+def _trie_pattern(node: dict[str, Any]) -> str:
+    """Regex for a keyword trie node; longer keywords are tried first."""
+    branches = [re.escape(char) + _trie_pattern(child) for char, child in node.items() if char]
+    if not branches:
+        return ""
+    if len(branches) == 1 and "" not in node:
+        return branches[0]
+    return "(?:" + "|".join(branches) + (")?" if "" in node else ")")
+
+
+class KeywordMatcher:
+    """
+    Multi-pattern matcher over a keyword list.
+
+    The keywords are merged into a trie, which is used twice:
+
+    - compiled into one regular expression, which the regex engine (C code)
+      uses to skip ahead to the next position where a whole keyword starts;
+    - turned into an Aho–Corasick automaton (failure links between trie
+      nodes), which reads the text from there one character at a time and
+      reports every keyword ending at each character, overlapping and nested
+      ones included (``詐騙`` and ``詐騙集團`` in ``詐騙集團``).
+
+    Once the automaton falls back to its root no match is in progress, so the
+    regex skips to the next keyword again. No character is read twice by the
+    automaton, so reporting costs O(text length + occurrences); the regex
+    skip itself may try up to the longest keyword's length at each position
+    it passes over.
+
+    Attributes:
+        keywords: Keywords in their original order
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords: list[str] = list(dict.fromkeys(keyword for keyword in keywords if keyword))
+        trie: dict[str, Any] = {}
+        # Automaton node i: its transitions, failure link and the keywords
+        # ending there (its own, then those of its failure chain, longest first)
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._output: list[list[str]] = [[]]
+        for keyword in self.keywords:
+            node = trie
+            state = 0
+            for char in keyword:
+                node = node.setdefault(char, {})
+                if char not in self._goto[state]:
+                    self._goto[state][char] = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                state = self._goto[state][char]
+            node[""] = keyword
+            self._output[state].append(keyword)
+        # Breadth-first, so each failure target is complete before it is used
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0) if state else 0
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+        self._pattern = re.compile(_trie_pattern(trie)) if self.keywords else None
+
+    def find(self, text: str) -> list[tuple[str, int]]:
+        """
+        Return every keyword occurrence in ``text``.
+
+        Overlapping occurrences are all reported (``詐騙`` and ``詐騙集團``
+        both match in ``詐騙集團``).
+
+        Args:
+            text: Text to scan
+
+        Returns:
+            (keyword, start offset) pairs ordered by offset, longest first
+            at the same offset
+        """
+        if self._pattern is None:
+            return []
+        skip = self._pattern.search
+        goto, fail, output = self._goto, self._fail, self._output
+        matches = []
+        state = 0
+        position = 0
+        end = len(text)
+        while position < end:
+            if not state:
+                match = skip(text, position)
+                if match is None:
+                    break
+                position = match.start()
+            char = text[position]
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for keyword in output[state]:
+                matches.append((keyword, position - len(keyword) + 1))
+            position += 1
+        matches.sort(key=lambda match: (match[1], -len(match[0])))
+        return matches
+
+    def search(self, text: str) -> bool:
+        """
+        Return True if ``text`` contains any keyword (stops at the first one).
+
+        Args:
+            text: Text to scan
+
+        Returns:
+            Whether any keyword occurs
+        """
+        return self._pattern is not None and self._pattern.search(text) is not None
+
+    def matched(self, text: str) -> list[str]:
+        """
+        Return the distinct keywords found in ``text``.
+
+        Args:
+            text: Text to scan
+
+        Returns:
+            Keywords in order of first occurrence
+        """
+        return list(dict.fromkeys(keyword for keyword, _ in self.find(text)))
+
+
+@lru_cache(maxsize=32)
+def get_matcher(content: str) -> KeywordMatcher:
+    """
+    Return the matcher for a keyword file's content, building it on first use.
+
+    Args:
+        content: Keyword file content
+
+    Returns:
+        Shared KeywordMatcher
+    """
+    return KeywordMatcher(parse_keywords(content))
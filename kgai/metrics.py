@@ -0,0 +1,639 @@
+"""
+Token, latency and cache accounting for every LLM call.
+
+:func:`kgai.client.submit_async` reports each call (cache hits included) to the
+process-wide :class:`Metrics`, labelled with the stage and prompt config the
+pipeline is running (:func:`labels`) and the model. Calls made while
+:func:`track_article` is active are also summed into a per-article rollup, so
+prompt versions can be compared by what one article costs.
+
+Metrics are exposed as Prometheus text (:meth:`Metrics.render`, served over
+HTTP when METRICS_PORT is set) and, when METRICS_TRACE_PATH is set, appended to
+a JSONL trace with one ``call`` line per request and one ``article`` line per
+analyzed article.
+
+Environment variables:
+    METRICS_TRACE_PATH: JSONL trace file (default: no trace)
+    METRICS_PORT: Serve ``/metrics`` on this port (default: not served)
+    METRICS_HOST: Address the metrics server binds to (default: 127.0.0.1)
+    METRICS_PRICES: JSON object mapping model names to
+        ``[prompt, completion]`` USD prices per million tokens, used for
+        the cost figures (default: cost not computed)
+
+Example:
+    >>> with track_article('udn-7346166', inferencer='inferencer_v8-1.json') as usage:
+    ...     result = await pipeline.analyze_async(...)
+    >>> usage.total_tokens
+"""
+
+import json
+import os
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Optional
+
+# Upper bounds of the histogram buckets
+LATENCY_BUCKETS = (0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120)
+ARTICLE_TOKEN_BUCKETS = (1000, 2000, 4000, 8000, 16000, 32000, 64000, 128000)
+
+_labels: ContextVar[dict[str, str] | None] = ContextVar("kgai_metrics_labels", default=None)
+_article: ContextVar[Optional["ArticleUsage"]] = ContextVar("kgai_metrics_article", default=None)
+
+
+@dataclass
+class CallRecord:
+    """
+    One chat completion request as seen by the client.
+
+    Attributes:
+        model: Model name
+        stage: Pipeline stage (``extractor``, ``inferencer``) or empty
+        config: Prompt config filename or empty
+        article: Article id when the call belongs to a tracked article
+        prompt_tokens: Prompt tokens billed (0 for cache hits)
+        completion_tokens: Completion tokens billed (0 for cache hits)
+        latency: Seconds from submission to the full answer, retries included
+        ttft: Seconds to the first streamed token (None when not streamed)
+        retries: Retried attempts after 429/5xx/connection errors
+        cache_hit: Whether the answer came from the completion cache or from
+            an identical request already in flight
+        cost: USD cost from METRICS_PRICES (None when the model has no price)
+        error: Exception type name when the call failed
+        timestamp: Unix time the call finished
+    """
+
+    model: str
+    stage: str = ""
+    config: str = ""
+    article: str | None = None
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    latency: float = 0.0
+    ttft: float | None = None
+    retries: int = 0
+    cache_hit: bool = False
+    cost: float | None = None
+    error: str | None = None
+    timestamp: float = field(default_factory=time.time)
+
+
+@dataclass
+class ArticleUsage:
+    """
+    Sum of the calls made while analyzing one article.
+
+    Attributes:
+        article: Article id (may be None for ad-hoc analyses)
+        labels: Article-level labels such as the extractor/inferencer configs
+        calls: Requests made, cache hits included
+        cache_hits: Requests answered from the cache
+        retries: Retried attempts
+        errors: Requests that failed after all retries
+        prompt_tokens: Prompt tokens billed
+        completion_tokens: Completion tokens billed
+        cost: USD cost (None when no model used had a price)
+        elapsed: Wall-clock seconds the article took
+    """
+
+    article: str | None
+    labels: dict[str, str] = field(default_factory=dict)
+    calls: int = 0
+    cache_hits: int = 0
+    retries: int = 0
+    errors: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost: float | None = None
+    elapsed: float = 0.0
+
+    @property
+    def total_tokens(self) -> int:
+        """Prompt plus completion tokens."""
+        return self.prompt_tokens + self.completion_tokens
+
+    def add(self, call: CallRecord) -> None:
+        """Add one call to the rollup."""
+        self.calls += 1
+        self.cache_hits += call.cache_hit
+        self.retries += call.retries
+        self.errors += call.error is not None
+        self.prompt_tokens += call.prompt_tokens
+        self.completion_tokens += call.completion_tokens
+        if call.cost is not None:
+            self.cost = (self.cost or 0.0) + call.cost
+
+
+class _Histogram:
+    """Cumulative-bucket histogram in the Prometheus layout."""
+
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values, strict=True)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def load_prices() -> dict[str, tuple[float, float]]:
+    """
+    Read METRICS_PRICES.
+
+    Returns:
+        ``{model: (prompt price, completion price)}`` in USD per million tokens
+
+    Raises:
+        ValueError: If METRICS_PRICES is not a JSON object of two-number lists
+    """
+    raw = os.getenv("METRICS_PRICES")
+    if not raw:
+        return {}
+    try:
+        return {
+            model: (float(prompt), float(completion))
+            for model, (prompt, completion) in json.loads(raw).items()
+        }
+    except (TypeError, ValueError) as error:
+        raise ValueError(
+            f"METRICS_PRICES must map models to [prompt, completion] prices: {error}"
+        ) from error
+
+
+class Metrics:
+    """
+    Thread-safe aggregate of LLM calls and article rollups.
+
+    Calls are counted per (stage, config, model); articles per
+    (extractor, inferencer). Every record is also appended to the JSONL trace
+    when one is configured.
+
+    Attributes:
+        trace_path: JSONL trace file or None
+        prices: Model prices used for cost figures (see :func:`load_prices`)
+    """
+
+    CALL_LABELS = ("stage", "config", "model")
+    ARTICLE_LABELS = ("extractor", "inferencer")
+
+    def __init__(
+        self, trace_path: str | None = None, prices: dict[str, tuple[float, float]] | None = None
+    ):
+        self.trace_path = trace_path
+        self.prices = prices or {}
+        self._lock = threading.Lock()
+        self._trace = None
+        if trace_path:
+            dirname = os.path.dirname(trace_path)
+            if dirname:
+                os.makedirs(dirname, exist_ok=True)
+            self._trace = open(trace_path, "a", encoding="utf-8")
+        self._calls: dict[tuple[str, ...], dict[str, float]] = {}
+        self._latency: dict[tuple[str, ...], _Histogram] = {}
+        self._ttft: dict[tuple[str, ...], _Histogram] = {}
+        self._articles: dict[tuple[str, ...], dict[str, float]] = {}
+        self._article_tokens: dict[tuple[str, ...], _Histogram] = {}
+        self._article_seconds: dict[tuple[str, ...], _Histogram] = {}
+
+    def cost(self, model: str, prompt_tokens: int, completion_tokens: int) -> float | None:
+        """
+        Return the USD cost of a call, or None when the model has no price.
+
+        Args:
+            model: Model name
+            prompt_tokens: Prompt tokens billed
+            completion_tokens: Completion tokens billed
+        """
+        if model not in self.prices:
+            return None
+        prompt_price, completion_price = self.prices[model]
+        return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1e6
+
+    def record(self, call: CallRecord) -> None:
+        """
+        Count one call and append it to the trace.
+
+        Args:
+            call: Finished (or failed) call
+        """
+        key = (call.stage, call.config, call.model)
+        with self._lock:
+            totals = self._calls.setdefault(
+                key,
+                {
+                    "requests": 0,
+                    "cache_hits": 0,
+                    "errors": 0,
+                    "retries": 0,
+                    "prompt_tokens": 0,
+                    "completion_tokens": 0,
+                    "cost": 0.0,
+                },
+            )
+            totals["requests"] += 1
+            totals["cache_hits"] += call.cache_hit
+            totals["errors"] += call.error is not None
+            totals["retries"] += call.retries
+            totals["prompt_tokens"] += call.prompt_tokens
+            totals["completion_tokens"] += call.completion_tokens
+            totals["cost"] += call.cost or 0.0
+            if not call.cache_hit:
+                self._latency.setdefault(key, _Histogram(LATENCY_BUCKETS)).observe(call.latency)
+                if call.ttft is not None:
+                    self._ttft.setdefault(key, _Histogram(LATENCY_BUCKETS)).observe(call.ttft)
+            self._write({"type": "call", **asdict(call)})
+
+    def record_article(self, usage: ArticleUsage) -> None:
+        """
+        Count one finished article and append its rollup to the trace.
+
+        Args:
+            usage: Rollup from :func:`track_article`
+        """
+        key = tuple(usage.labels.get(name, "") for name in self.ARTICLE_LABELS)
+        with self._lock:
+            totals = self._articles.setdefault(
+                key,
+                {
+                    "articles": 0,
+                    "prompt_tokens": 0,
+                    "completion_tokens": 0,
+                    "cost": 0.0,
+                },
+            )
+            totals["articles"] += 1
+            totals["prompt_tokens"] += usage.prompt_tokens
+            totals["completion_tokens"] += usage.completion_tokens
+            totals["cost"] += usage.cost or 0.0
+            self._article_tokens.setdefault(key, _Histogram(ARTICLE_TOKEN_BUCKETS)).observe(
+                usage.total_tokens
+            )
+            self._article_seconds.setdefault(key, _Histogram(LATENCY_BUCKETS)).observe(
+                usage.elapsed
+            )
+            self._write({"type": "article", **asdict(usage), "timestamp": time.time()})
+
+    def _write(self, entry: dict[str, Any]) -> None:
+        if self._trace is not None:
+            self._trace.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._trace.flush()
+
+    def summary(self) -> list[dict[str, Any]]:
+        """
+        Return per-inferencer article totals, most expensive per article first.
+
+        Returns:
+            One dictionary per (extractor, inferencer) with articles, average
+            tokens and average cost per article
+        """
+        with self._lock:
+            rows = [
+                {
+                    **dict(zip(self.ARTICLE_LABELS, key, strict=True)),
+                    "articles": int(totals["articles"]),
+                    "tokens_per_article": (totals["prompt_tokens"] + totals["completion_tokens"])
+                    / totals["articles"],
+                    "cost_per_article": totals["cost"] / totals["articles"],
+                }
+                for key, totals in self._articles.items()
+            ]
+        return sorted(
+            rows, key=lambda row: (row["cost_per_article"], row["tokens_per_article"]), reverse=True
+        )
+
+    def render(self) -> str:
+        """
+        Return every metric in the Prometheus text exposition format.
+
+        Returns:
+            Text for a ``/metrics`` response
+        """
+        lines: list[str] = []
+
+        def counters(
+            name: str,
+            help_text: str,
+            names: tuple[str, ...],
+            table: dict[tuple[str, ...], dict[str, float]],
+            column: str,
+        ) -> None:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for key, totals in sorted(table.items()):
+                lines.append(f"{name}{_format_labels(names, key)} {totals[column]:g}")
+
+        def histograms(
+            name: str,
+            help_text: str,
+            names: tuple[str, ...],
+            table: dict[tuple[str, ...], _Histogram],
+        ) -> None:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for key, histogram in sorted(table.items()):
+                bounds = [f"{bound:g}" for bound in histogram.buckets] + ["+Inf"]
+                for bound, count in zip(bounds, histogram.counts + [histogram.count], strict=True):
+                    lines.append(
+                        f'{name}_bucket{_format_labels(names, key, "le=" + json.dumps(bound))} {count}'
+                    )
+                lines.append(f"{name}_sum{_format_labels(names, key)} {histogram.sum:g}")
+                lines.append(f"{name}_count{_format_labels(names, key)} {histogram.count}")
+
+        calls, articles = self.CALL_LABELS, self.ARTICLE_LABELS
+        with self._lock:
+            counters(
+                "kgai_llm_requests_total",
+                "Chat completion requests, cache hits included.",
+                calls,
+                self._calls,
+                "requests",
+            )
+            counters(
+                "kgai_llm_cache_hits_total",
+                "Requests answered from the completion cache.",
+                calls,
+                self._calls,
+                "cache_hits",
+            )
+            counters(
+                "kgai_llm_errors_total",
+                "Requests that failed after all retries.",
+                calls,
+                self._calls,
+                "errors",
+            )
+            counters(
+                "kgai_llm_retries_total",
+                "Attempts retried after 429/5xx/connection errors.",
+                calls,
+                self._calls,
+                "retries",
+            )
+            counters(
+                "kgai_llm_prompt_tokens_total",
+                "Prompt tokens billed.",
+                calls,
+                self._calls,
+                "prompt_tokens",
+            )
+            counters(
+                "kgai_llm_completion_tokens_total",
+                "Completion tokens billed.",
+                calls,
+                self._calls,
+                "completion_tokens",
+            )
+            counters(
+                "kgai_llm_cost_usd_total",
+                "Cost in USD from METRICS_PRICES.",
+                calls,
+                self._calls,
+                "cost",
+            )
+            histograms(
+                "kgai_llm_request_duration_seconds",
+                "Time to the full answer, retries included.",
+                calls,
+                self._latency,
+            )
+            histograms(
+                "kgai_llm_time_to_first_token_seconds",
+                "Time to the first streamed token.",
+                calls,
+                self._ttft,
+            )
+            counters(
+                "kgai_articles_total", "Articles analyzed.", articles, self._articles, "articles"
+            )
+            counters(
+                "kgai_article_cost_usd_total",
+                "Cost in USD of analyzed articles.",
+                articles,
+                self._articles,
+                "cost",
+            )
+            histograms(
+                "kgai_article_tokens", "Tokens billed per article.", articles, self._article_tokens
+            )
+            histograms(
+                "kgai_article_duration_seconds",
+                "Wall-clock time per article.",
+                articles,
+                self._article_seconds,
+            )
+        return "\n".join(lines) + "\n"
+
+    def close(self) -> None:
+        """Close the trace file."""
+        with self._lock:
+            if self._trace is not None:
+                self._trace.close()
+                self._trace = None
+
+
+@contextmanager
+def labels(**values: str) -> Iterator[None]:
+    """
+    Label the calls made inside the block (and tasks started from it).
+
+    Args:
+        **values: ``stage`` and/or ``config`` values
+
+    Example:
+        >>> with labels(stage='extractor', config='extractor_v1-2.json'):
+        ...     subjects = await extract_subjects(extractor)
+    """
+    token = _labels.set({**current_labels(), **values})
+    try:
+        yield
+    finally:
+        _labels.reset(token)
+
+
+def current_labels() -> dict[str, str]:
+    """Return the labels set by the enclosing :func:`labels` blocks."""
+    return _labels.get() or {}
+
+
+@contextmanager
+def track_article(article: str | None = None, **article_labels: str) -> Iterator[ArticleUsage]:
+    """
+    Sum the calls made inside the block into a per-article rollup.
+
+    The rollup is recorded (and traced) when the block exits, also on errors.
+    Nested blocks are ignored, so an article is counted once.
+
+    Args:
+        article: Article id
+        **article_labels: ``extractor`` and ``inferencer`` config names
+
+    Yields:
+        The :class:`ArticleUsage` being filled in
+    """
+    current = _article.get()
+    if current is not None:
+        yield current
+        return
+    usage = ArticleUsage(article=article, labels=article_labels)
+    token = _article.set(usage)
+    start = time.monotonic()
+    try:
+        yield usage
+    finally:
+        _article.reset(token)
+        usage.elapsed = time.monotonic() - start
+        get_metrics().record_article(usage)
+
+
+@contextmanager
+def article_usage(usage: ArticleUsage) -> Iterator[ArticleUsage]:
+    """
+    Sum the calls made inside the block into an existing rollup, without recording it.
+
+    For articles whose stages run in different tasks (:mod:`kgai.flow`): each
+    stage enters the block with the article's rollup, and the last one passes
+    it to :meth:`Metrics.record_article`.
+
+    Args:
+        usage: Rollup to add to
+
+    Yields:
+        ``usage``
+    """
+    token = _article.set(usage)
+    try:
+        yield usage
+    finally:
+        _article.reset(token)
+
+
+def record_call(
+    model: str,
+    usage: dict[str, Any] | None,
+    latency: float,
+    ttft: float | None = None,
+    retries: int = 0,
+    cache_hit: bool = False,
+    error: BaseException | None = None,
+) -> CallRecord:
+    """
+    Record one call with the current labels and article.
+
+    Args:
+        model: Model name
+        usage: ``usage`` block of the response (None when missing or failed)
+        latency: Seconds to the full answer
+        ttft: Seconds to the first streamed token
+        retries: Retried attempts
+        cache_hit: Whether the cache answered
+        error: Exception the call failed with
+
+    Returns:
+        The recorded CallRecord
+    """
+    metrics = get_metrics()
+    current = current_labels()
+    article = _article.get()
+    prompt_tokens = completion_tokens = 0
+    if usage and not cache_hit:
+        prompt_tokens = usage.get("prompt_tokens") or 0
+        completion_tokens = usage.get("completion_tokens") or 0
+    call = CallRecord(
+        model=model,
+        stage=current.get("stage", ""),
+        config=current.get("config", ""),
+        article=article.article if article is not None else None,
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        latency=latency,
+        ttft=ttft,
+        retries=retries,
+        cache_hit=cache_hit,
+        cost=None if cache_hit else metrics.cost(model, prompt_tokens, completion_tokens),
+        error=type(error).__name__ if error is not None else None,
+    )
+    metrics.record(call)
+    if article is not None:
+        article.add(call)
+    return call
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    """Serve :meth:`Metrics.render` at ``/metrics``."""
+
+    def do_GET(self) -> None:
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = get_metrics().render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+def serve_metrics(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """
+    Serve ``/metrics`` from a daemon thread.
+
+    Args:
+        port: TCP port (0 picks a free one)
+        host: Bind address
+
+    Returns:
+        The running server (``server.server_address`` has the actual port)
+    """
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="kgai-metrics", daemon=True).start()
+    print(f"Serving metrics on http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+
+_default_metrics: Metrics | None = None
+_default_lock = threading.Lock()
+
+
+def get_metrics() -> Metrics:
+    """
+    Return the process-wide metrics configured from the environment.
+
+    The first call opens METRICS_TRACE_PATH and, when METRICS_PORT is set,
+    starts the ``/metrics`` server.
+
+    Returns:
+        Shared Metrics instance
+    """
+    global _default_metrics
+    with _default_lock:
+        if _default_metrics is None:
+            _default_metrics = Metrics(
+                trace_path=os.getenv("METRICS_TRACE_PATH") or None, prices=load_prices()
+            )
+            port = os.getenv("METRICS_PORT")
+            if port:
+                serve_metrics(int(port), os.getenv("METRICS_HOST", "127.0.0.1"))
+    return _default_metrics
@@ -0,0 +1,286 @@
+"""
+Tolerant parsers for extractor and inferencer responses.
+
+Responses are first read as JSON (JSON-mode endpoints, or models that answer
+with a JSON object anyway) and otherwise matched line by line with precompiled
+regular expressions, so an extra line, a full-width colon or a numbered list
+no longer breaks parsing.
+"""
+
+import json
+import re
+from dataclasses import asdict, dataclass, field
+from typing import Any
+
+
+class ParseError(ValueError):
+    """Raised when a response does not contain the expected fields."""
+
+
+@dataclass
+class InferenceRecord:
+    """
+    Parsed inferencer answer for one subject.
+
+    Attributes:
+        subject: Subject the answer was requested for
+        suspected: Whether the subject is linked to any crime keyword
+        crimes: Crime keywords involved
+        progress: Legal proceeding keywords involved
+        summary: Short event summary
+        raw: Field text exactly as the model wrote it, keyed by field name
+        error: Parse error message when the answer could not be parsed
+    """
+
+    subject: str
+    suspected: bool | None = None
+    crimes: list[str] = field(default_factory=list)
+    progress: list[str] = field(default_factory=list)
+    summary: str = ""
+    raw: dict[str, str] = field(default_factory=dict)
+    error: str | None = None
+
+    def to_dict(self) -> dict[str, Any]:
+        """Return the record as a JSON-serializable dictionary."""
+        return asdict(self)
+
+
+FIELDS = ["subject", "suspected", "crimes", "progress", "summary"]
+
+# Field labels used by the inferencer prompts (v6 - v8-1), longest first
+_FIELD_LABELS = {
+    "subject": ["討論的主體", "犯罪主體", "主體", "target"],
+    "suspected": ["是否涉及任何刑責關鍵字", "是否有嫌疑", "是否涉及刑責"],
+    "crimes": ["涉及刑責關鍵字", "刑責關鍵字", "刑責"],
+    "progress": ["涉及刑責進度關鍵字", "刑責進度關鍵字", "刑責進度"],
+    "summary": ["事件摘要", "摘要"],
+}
+
+# "<bullet> <label>(<hint>): <value>" with ASCII or full-width punctuation
+_FIELD_PATTERNS = {
+    name: re.compile(
+        r"^[ \t]*(?:[-*•]|\d+[.)、])?[ \t]*(?:" + "|".join(map(re.escape, labels)) + r")"
+        r"[ \t]*(?:[(（][^)）\n]*[)）])?[ \t]*[:：][ \t]*(.*?)[ \t]*$",
+        re.MULTILINE,
+    )
+    for name, labels in _FIELD_LABELS.items()
+}
+
+_SUBJECTS_PATTERN = re.compile(
+    r"^[ \t]*(?:[-*•]|\d+[.)、])?[ \t]*(?:文章提起的主體|犯罪人與公司|犯罪主體|主體)"
+    r"[ \t]*[:：][ \t]*(.*?)[ \t]*$",
+    re.MULTILINE,
+)
+_SPLIT_PATTERN = re.compile(r"[,，、;；]")
+_JSON_PATTERN = re.compile(r"\{.*\}", re.DOTALL)
+_YES = ("是", "yes", "true", "y")
+_NO = ("否", "no", "false", "n")
+
+# JSON keys accepted for each field (JSON mode answers)
+_JSON_KEYS = {
+    "subject": ["subject", "target", "主體"],
+    "suspected": ["suspected", "是否有嫌疑"],
+    "crimes": ["crimes", "刑責"],
+    "progress": ["progress", "刑責進度"],
+    "summary": ["summary", "事件摘要"],
+}
+
+# Appended to prompts when the endpoint runs in JSON mode
+INFERENCER_JSON_INSTRUCTION = (
+    "\n\n請以 JSON 物件輸出答案，格式: "
+    '{"subject": "討論的主體", "suspected": "是或否", "crimes": ["涉及刑責關鍵字"], '
+    '"progress": ["涉及刑責進度關鍵字"], "summary": "事件摘要(50字)"}'
+)
+EXTRACTOR_JSON_INSTRUCTION = '\n\n請以 JSON 物件輸出答案，格式: {"subjects": ["主體"]}'
+BATCH_JSON_INSTRUCTION = (
+    '\n\n請以 JSON 物件輸出答案，依目標清單順序，格式: {"results": [{"subject": "討論的主體", '
+    '"suspected": "是或否", "crimes": ["涉及刑責關鍵字"], "progress": ["涉及刑責進度關鍵字"], '
+    '"summary": "事件摘要(50字)"}]}'
+)
+
+
+def split_list(text: str) -> list[str]:
+    """
+    Split a comma-separated model answer into stripped, non-empty items.
+
+    Args:
+        text: Text such as ``詐欺, 洗錢`` or ``詐欺、洗錢``
+
+    Returns:
+        List of items (empty for 無/none answers)
+    """
+    items = [item.strip(" \t。.「」") for item in _SPLIT_PATTERN.split(text)]
+    return [item for item in items if item and item not in ("無", "none", "None", "N/A")]
+
+
+def _parse_bool(text: str) -> bool | None:
+    value = text.strip().lower()
+    if value.startswith(_YES):
+        return True
+    if value.startswith(_NO):
+        return False
+    return None
+
+
+def _load_json(text: str) -> dict[str, Any] | None:
+    """Return the JSON object embedded in ``text``, if any."""
+    match = _JSON_PATTERN.search(text)
+    if not match:
+        return None
+    try:
+        value = json.loads(match.group(0))
+    except json.JSONDecodeError:
+        return None
+    return value if isinstance(value, dict) else None
+
+
+def _as_text(value: Any) -> str:
+    if isinstance(value, list):
+        return ", ".join(str(item) for item in value)
+    if isinstance(value, bool):
+        return "是" if value else "否"
+    return str(value)
+
+
+def parse_subjects(content: str) -> list[str]:
+    """
+    Parse the subject list from an extractor response.
+
+    Args:
+        content: Extractor response text (``文章提起的主體: A, B, C`` or JSON)
+
+    Returns:
+        Subject names in the order the extractor listed them, without
+        duplicates; empty when the answer says there are none
+        (``主體: 無``, ``{"subjects": []}``)
+
+    Raises:
+        ParseError: If no subject list can be found
+    """
+    data = _load_json(content)
+    if data is not None and isinstance(data.get("subjects"), list):
+        subjects = [str(subject).strip() for subject in data["subjects"]]
+    else:
+        matches = _SUBJECTS_PATTERN.findall(content)
+        if matches:
+            line = matches[-1]
+        else:
+            # Fall back to the last "label: values" line of the answer
+            lines = [line for line in content.splitlines() if re.search(r"[:：]", line)]
+            if not lines:
+                raise ParseError(f"No subject list in extractor response: {content!r}")
+            line = re.split(r"[:：]", lines[-1], maxsplit=1)[1]
+        if not line.strip(" \t。."):
+            raise ParseError(f"Empty subject list in extractor response: {content!r}")
+        # 無 / none leave nothing: the article names no subject
+        subjects = split_list(line)
+
+    return list(dict.fromkeys(subject for subject in subjects if subject))
+
+
+def parse_inference(content: str, target: str) -> InferenceRecord:
+    """
+    Parse an inferencer response into an :class:`InferenceRecord`.
+
+    Only the text after the last ``### 輸出格式`` heading is considered when the
+    model echoes it; the last occurrence of each field wins.
+
+    Args:
+        content: Inferencer response text
+        target: Subject the request was about; it is the record's subject.
+            The name the model echoes, which may be paraphrased, is kept in
+            ``raw['subject']`` (the target when the model omits it)
+
+    Returns:
+        Parsed record
+
+    Raises:
+        ParseError: If any field other than the subject is missing
+    """
+    raw: dict[str, str] = {}
+    data = _load_json(content)
+    if data is not None:
+        for name, keys in _JSON_KEYS.items():
+            for key in keys:
+                if key in data:
+                    raw[name] = _as_text(data[key])
+                    break
+    # A JSON object without the answer fields (e.g. quoted in the reasoning)
+    # is not the answer; read the fields from the text instead
+    if any(name not in raw for name in FIELDS[1:]):
+        raw = {}
+        answer = content.split("### 輸出格式\n").pop()
+        for name, pattern in _FIELD_PATTERNS.items():
+            matches = pattern.findall(answer)
+            if matches:
+                raw[name] = matches[-1]
+
+    raw.setdefault("subject", target)
+    missing = [name for name in FIELDS if name not in raw]
+    if missing:
+        raise ParseError(f'Missing {", ".join(missing)} for {target!r}')
+
+    return InferenceRecord(
+        subject=target,
+        suspected=_parse_bool(raw["suspected"]),
+        crimes=split_list(raw["crimes"]),
+        progress=split_list(raw["progress"]),
+        summary=raw["summary"],
+        raw={name: raw[name] for name in FIELDS},
+    )
+
+
+def _match_target(subject: str, targets: list[str]) -> str | None:
+    """Map the subject named in an answer block back to a requested target."""
+    subject = subject.strip()
+    if subject in targets:
+        return subject
+    for target in targets:
+        if target in subject or subject in target:
+            return target
+    return None
+
+
+def parse_inference_batch(content: str, targets: list[str]) -> dict[str, tuple[str, Any]]:
+    """
+    Split a multi-subject inferencer answer into one result per target.
+
+    The answer is cut into blocks at each ``討論的主體(target):`` line (or read
+    from a JSON ``results`` list); each block is parsed with
+    :func:`parse_inference` and matched back to its target by name.
+
+    Args:
+        content: Inferencer response text covering several targets
+        targets: Targets the request asked about
+
+    Returns:
+        Mapping of target to (block text, InferenceRecord or ParseError).
+        Targets the answer does not cover are absent from the mapping.
+    """
+    results: dict[str, tuple[str, Any]] = {}
+
+    data = _load_json(content)
+    if data is not None and isinstance(data.get("results"), list):
+        blocks = [
+            (json.dumps(item, ensure_ascii=False), str(item.get("subject", item.get("target", ""))))
+            for item in data["results"]
+            if isinstance(item, dict)
+        ]
+    else:
+        matches = list(_FIELD_PATTERNS["subject"].finditer(content))
+        blocks = []
+        for index, match in enumerate(matches):
+            end = matches[index + 1].start() if index + 1 < len(matches) else len(content)
+            blocks.append((content[match.start() : end], match.group(1)))
+
+    for block, subject in blocks:
+        target = _match_target(subject, targets)
+        if target is None:
+            continue
+        try:
+            results[target] = (block, parse_inference(block, target))
+        except ParseError as error:
+            # A later, complete block for the same target still wins
+            if target not in results or isinstance(results[target][1], ParseError):
+                results[target] = (block, error)
+    return results
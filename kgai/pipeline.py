@@ -0,0 +1,1357 @@
+"""
+Two-stage analysis pipeline shared by the demo, the CLI and batch jobs.
+
+Stage 1 runs the extractor prompt to list every subject named in an article;
+stage 2 runs the inferencer prompt once per subject, concurrently, or once per
+chunk of subjects for configs with ``"mode": "batch"``. Answers are
+parsed with :mod:`kgai.parser`; a subject whose answer cannot be parsed is
+re-asked on its own (OPENAI_PARSE_RETRIES times) instead of failing the article.
+
+Before any request, the article is scanned for the crime and legal keywords
+(:mod:`kgai.keywords`). KEYWORD_PREFILTER decides what happens to articles
+without a crime keyword, and KEYWORD_MATCHED_ONLY passes only the keywords an
+article contains into the prompts.
+
+Variants of the same name in the extractor's list (``厲害科技`` and
+``厲害科技股份有限公司``) are merged into one subject before the inferencer
+runs (:mod:`kgai.entities`, ENTITY_MERGE).
+
+With INFERENCER_CONTEXT=passages the inferencer receives, instead of the whole
+article, only the sentences that mention its subject(s) plus their neighbours
+(:mod:`kgai.context`).
+
+Articles longer than EXTRACTOR_CHUNK_TOKENS are split into overlapping chunks
+(EXTRACTOR_CHUNK_OVERLAP tokens shared between neighbours). The extractor
+runs on the chunks concurrently, and their subject lists are merged in order
+of first appearance. With INFERENCER_CONTEXT=chunks, each subject's
+inferencer request gets only the chunks that mention it.
+
+Every prompt is measured with the local tokenizer (:mod:`kgai.tokens`)
+before it is sent. When an article would not fit the model's context window
+(less TOKEN_RESERVE for the answer), TOKEN_BUDGET_STRATEGY decides what
+happens (:func:`fit_article`): ``truncate`` cuts the article to fit,
+``chunk`` runs the extractor on consecutive pieces that fit and gives the
+inferencer each subject's passages, ``route`` sends the request to a model
+with a larger window (TOKEN_LONG_MODEL, or router endpoints with a large
+enough ``context``), and ``off`` sends it as it is.
+
+With a :class:`kgai.stages.StageStore`, :func:`analyze_async` reuses the
+stored subject list and per-subject answers whose inputs (article, prompt
+template, keywords, model) are unchanged, and :func:`plan` counts the calls
+a re-run would make without making them.
+
+:func:`analyze_stream_async` runs the same analysis but yields events as it
+goes (subject list, inferencer tokens as they stream, each finished record)
+for interfaces that show partial results.
+
+Requests are labelled with their stage and prompt config, and each article's
+calls are rolled up, in :mod:`kgai.metrics`.
+"""
+
+import asyncio
+import json
+import os
+from collections.abc import AsyncIterator, Callable
+from contextlib import AbstractContextManager
+from dataclasses import dataclass, field
+from typing import Any
+
+from kgai.client import (
+    context_model,
+    estimate_tokens,
+    run_sync,
+    stage_context,
+    stage_model,
+    submit_async,
+)
+from kgai.context import Chunks, build_context, chunk_article
+from kgai.entities import merge_enabled, merge_subjects
+from kgai.keywords import format_keywords, get_matcher
+from kgai.metrics import labels, track_article
+from kgai.parser import (
+    BATCH_JSON_INSTRUCTION,
+    EXTRACTOR_JSON_INSTRUCTION,
+    INFERENCER_JSON_INSTRUCTION,
+    InferenceRecord,
+    ParseError,
+    parse_inference,
+    parse_inference_batch,
+    parse_subjects,
+)
+from kgai.registry import PromptConfig, get_registry
+from kgai.stages import StageStore, changed_inputs, text_hash
+from kgai.tokens import get_tokenizer, measure_tokens, prompt_tokens, token_reserve
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROMPTS_DIR = os.path.join(ROOT_DIR, "prompts")
+SAMPLES_DIR = os.path.join(ROOT_DIR, "samples")
+
+
+def resolve(path: str, base_dir: str) -> str:
+    """
+    Resolve a file given either as a path or as a name inside ``base_dir``.
+
+    Args:
+        path: File path or bare filename
+        base_dir: Directory searched when ``path`` does not exist as given
+
+    Returns:
+        Path to the file
+    """
+    if os.path.isfile(path):
+        return path
+    return os.path.join(base_dir, path)
+
+
+def get_config(conf_file: str) -> PromptConfig:
+    """
+    Return a prompt configuration from the shared registry.
+
+    Args:
+        conf_file: Configuration filename (relative to prompts/) or path
+
+    Returns:
+        Loaded (and, if changed on disk, reloaded) PromptConfig
+    """
+    path = resolve(conf_file, PROMPTS_DIR)
+    return get_registry(os.path.dirname(path)).get(os.path.basename(path))
+
+
+def complete(
+    conf_file: str,
+    crime_keywords: str,
+    judge_keywords: str,
+    news_content: str | None,
+    news_title: str | None = None,
+) -> dict[str, Any]:
+    """
+    Load configuration and prepare prompts with variable substitution.
+
+    Article-level inputs are bound once here; per-subject placeholders
+    (``$target``/``$targets``) stay open in ``templates`` and are rendered for
+    each request.
+
+    Args:
+        conf_file: Configuration filename (relative to prompts/) or path
+        crime_keywords: Crime keywords content
+        judge_keywords: Legal proceeding keywords content
+        news_content: News article content (left as ``$news_content`` when
+            None, e.g. to render a per-subject passage later)
+        news_title: News title (left as ``$news_title`` when not given)
+
+    Returns:
+        Configuration dictionary with:
+            - name, inputs and any extra config keys (e.g. mode, chunk_size)
+            - templates: Template per role with article inputs bound
+            - files: Rendered text per role (unbound placeholders kept)
+    """
+    inputs = {
+        "crime_keywords": crime_keywords,
+        "judge_keywords": judge_keywords,
+    }
+    if news_content is not None:
+        inputs["news_content"] = news_content
+    if news_title is not None:
+        inputs["news_title"] = news_title
+    config = get_config(conf_file)
+    templates = {role: template.bind(inputs) for role, template in config.templates.items()}
+    return {
+        **config.options,
+        "name": config.name,
+        "inputs": config.inputs,
+        "templates": templates,
+        "files": {role: template.render({}) for role, template in templates.items()},
+    }
+
+
+def json_mode() -> bool:
+    """Return True when OPENAI_JSON_MODE asks for JSON-mode responses."""
+    return os.getenv("OPENAI_JSON_MODE", "false").lower() in ("1", "true", "yes", "on")
+
+
+async def _ask(
+    system_content: str,
+    user_content: str,
+    instruction: str,
+    attempt: int,
+    on_delta: Callable[[str | None], None] | None = None,
+    min_context: int | None = None,
+) -> str:
+    """Submit one prompt pair, in JSON mode when enabled, and return the answer text."""
+    response_format = None
+    if json_mode():
+        system_content += instruction
+        response_format = {"type": "json_object"}
+    result = await submit_async(
+        system_content=system_content,
+        user_content=user_content,
+        # A re-ask must not be answered with the cached response that failed to parse
+        use_cache=None if attempt == 0 else False,
+        response_format=response_format,
+        on_delta=on_delta,
+        min_context=min_context,
+    )
+    return result["choices"][0]["message"]["content"]
+
+
+async def extract_subjects(extractor: dict[str, Any]) -> list[str]:
+    """
+    Run the extractor prompt and parse its subject list, re-asking on parse errors.
+
+    Args:
+        extractor: Rendered extractor configuration from :func:`complete`
+
+    Returns:
+        Subject names in extractor order
+
+    Raises:
+        ParseError: If no attempt produced a parseable subject list
+    """
+    retries = int(os.getenv("OPENAI_PARSE_RETRIES", "2"))
+    for attempt in range(retries + 1):
+        content = await _ask(
+            extractor["files"]["system"],
+            extractor["files"]["user"],
+            EXTRACTOR_JSON_INSTRUCTION,
+            attempt,
+            min_context=extractor.get("min_context"),
+        )
+        try:
+            return parse_subjects(content)
+        except ParseError as error:
+            print(f"Extractor answer could not be parsed ({attempt + 1}/{retries + 1}): {error}")
+            last_error = error
+    raise last_error
+
+
+def context_mode() -> str:
+    """
+    Return how much of the article the inferencer receives.
+
+    Returns:
+        ``full`` (whole article), ``passages`` (sentences relevant to the
+        subject(s) of each request, see :func:`kgai.context.build_context`)
+        or ``chunks`` (the article chunks that mention the subject(s), see
+        :meth:`kgai.context.Chunks.context`)
+    """
+    mode = os.getenv("INFERENCER_CONTEXT", "full").lower()
+    if mode not in ("full", "passages", "chunks"):
+        raise ValueError(f"INFERENCER_CONTEXT must be full, passages or chunks, not {mode!r}")
+    return mode
+
+
+def chunk_settings() -> tuple[int, int]:
+    """
+    Return the chunking of long articles.
+
+    Returns:
+        (EXTRACTOR_CHUNK_TOKENS, EXTRACTOR_CHUNK_OVERLAP). A chunk size of 0
+        (default) sends articles to the extractor whole.
+    """
+    return int(os.getenv("EXTRACTOR_CHUNK_TOKENS", "0")), int(
+        os.getenv("EXTRACTOR_CHUNK_OVERLAP", "200")
+    )
+
+
+def _content_values(inferencer: dict[str, Any], subjects: list[str]) -> dict[str, str]:
+    """Return the ``news_content`` value for a request about ``subjects``, if left open."""
+    content = inferencer.get("news_content")
+    if content is None:
+        return {}
+    aliases = inferencer.get("aliases", {})
+    names = subjects + [alias for subject in subjects for alias in aliases.get(subject, [])]
+    chunks = inferencer.get("chunks")
+    if chunks is not None:
+        passage, _ = chunks.context(names, inferencer.get("context_budget"))
+        return {"news_content": passage}
+    budget = inferencer.get("context_budget", int(os.getenv("INFERENCER_CONTEXT_BUDGET", "1500")))
+    passage, _ = build_context(
+        content,
+        names,
+        window=int(os.getenv("INFERENCER_CONTEXT_WINDOW", "1")),
+        budget=budget if budget > 0 else None,
+    )
+    return {"news_content": passage}
+
+
+async def infer_subject(
+    inferencer: dict[str, Any], subject: str, on_delta: Callable[[str | None], None] | None = None
+) -> tuple[str, InferenceRecord]:
+    """
+    Run the inferencer prompt for one subject, re-asking only this subject on parse errors.
+
+    Args:
+        inferencer: Rendered inferencer configuration from :func:`complete`
+        subject: Subject rendered into ``$target``
+        on_delta: Stream the answer into this callback (see
+            :func:`kgai.client.submit_async`); it also receives None before
+            a re-ask, since the new answer replaces the old one
+
+    Returns:
+        Tuple of (last answer text, parsed record). When every attempt fails
+        the record carries the parse error instead of raising.
+    """
+    retries = int(os.getenv("OPENAI_PARSE_RETRIES", "2"))
+    values = {"target": subject, **_content_values(inferencer, [subject])}
+    files = {role: template.render(values) for role, template in inferencer["templates"].items()}
+    for attempt in range(retries + 1):
+        if attempt and on_delta is not None:
+            on_delta(None)
+        content = await _ask(
+            files["system"],
+            files["user"],
+            INFERENCER_JSON_INSTRUCTION,
+            attempt,
+            on_delta,
+            inferencer.get("min_context"),
+        )
+        try:
+            return content, parse_inference(content, subject)
+        except ParseError as error:
+            print(
+                f"Inferencer answer for {subject} could not be parsed "
+                f"({attempt + 1}/{retries + 1}): {error}"
+            )
+            last_error = error
+    return content, InferenceRecord(subject=subject, error=str(last_error))
+
+
+async def infer_chunk(
+    inferencer: dict[str, Any], subjects: list[str]
+) -> list[tuple[str, InferenceRecord]]:
+    """
+    Ask about several subjects in one batch-mode inferencer request.
+
+    Subjects missing from the answer, or whose block cannot be parsed, are
+    re-asked on their own (a chunk of one), up to OPENAI_PARSE_RETRIES times.
+
+    Args:
+        inferencer: Rendered batch-mode inferencer configuration
+        subjects: Subjects substituted for ``$targets``, one per line
+
+    Returns:
+        (answer block, record) per subject, in the order of ``subjects``
+    """
+    retries = int(os.getenv("OPENAI_PARSE_RETRIES", "2"))
+    answers: dict[str, tuple[str, InferenceRecord]] = {}
+    pending = list(subjects)
+    for attempt in range(retries + 1):
+        chunks = [pending] if attempt == 0 else [[subject] for subject in pending]
+        values = [
+            {
+                "targets": "\n".join(f"- {subject}" for subject in chunk),
+                **_content_values(inferencer, chunk),
+            }
+            for chunk in chunks
+        ]
+        contents = await asyncio.gather(
+            *(
+                _ask(
+                    inferencer["templates"]["system"].render(chunk_values),
+                    inferencer["templates"]["user"].render(chunk_values),
+                    BATCH_JSON_INSTRUCTION,
+                    attempt,
+                    min_context=inferencer.get("min_context"),
+                )
+                for chunk_values in values
+            )
+        )
+        failed = []
+        for chunk, content in zip(chunks, contents, strict=True):
+            parsed = parse_inference_batch(content, chunk)
+            for subject in chunk:
+                block, result = parsed.get(
+                    subject, (content, ParseError(f"No answer for {subject!r}"))
+                )
+                if isinstance(result, ParseError):
+                    failed.append(subject)
+                    answers[subject] = (block, InferenceRecord(subject=subject, error=str(result)))
+                else:
+                    answers[subject] = (block, result)
+        if failed:
+            print(
+                f"Batch inferencer answer incomplete for {', '.join(failed)} "
+                f"({attempt + 1}/{retries + 1})"
+            )
+        pending = failed
+        if not pending:
+            break
+    return [answers[subject] for subject in subjects]
+
+
+async def infer_subjects(
+    inferencer: dict[str, Any], subjects: list[str]
+) -> list[tuple[str, InferenceRecord]]:
+    """
+    Run the inferencer stage for every subject, concurrently.
+
+    Per-subject configs send one request per subject. Configs with
+    ``"mode": "batch"`` send one request per ``chunk_size`` subjects
+    (INFERENCER_CHUNK_SIZE overrides the config), which shares the article,
+    keywords and instructions between subjects.
+
+    Args:
+        inferencer: Rendered inferencer configuration from :func:`complete`.
+            When it carries the article under ``news_content`` (and
+            ``$news_content`` was left open), each request gets the passage
+            relevant to its subject(s) instead of the whole article.
+        subjects: Subjects from the extractor
+
+    Returns:
+        (answer text, record) per subject, in the order of ``subjects``
+    """
+    if inferencer.get("mode") != "batch":
+        return list(
+            await asyncio.gather(*(infer_subject(inferencer, subject) for subject in subjects))
+        )
+
+    chunk_size = _chunk_size(inferencer)
+    chunks = [subjects[i : i + chunk_size] for i in range(0, len(subjects), chunk_size)]
+    results = await asyncio.gather(*(infer_chunk(inferencer, chunk) for chunk in chunks))
+    return [answer for chunk_answers in results for answer in chunk_answers]
+
+
+def _chunk_size(inferencer: dict[str, Any]) -> int:
+    """Subjects per request of a batch-mode inferencer."""
+    return max(1, int(os.getenv("INFERENCER_CHUNK_SIZE", inferencer.get("chunk_size", 5))))
+
+
+def budget_strategy() -> str:
+    """
+    Return what to do with an article too long for a stage's context window.
+
+    Returns:
+        ``truncate`` (default), ``chunk``, ``route`` or ``off``
+    """
+    strategy = os.getenv("TOKEN_BUDGET_STRATEGY", "truncate").lower()
+    if strategy not in ("off", "truncate", "chunk", "route"):
+        raise ValueError(
+            f"TOKEN_BUDGET_STRATEGY must be off, truncate, chunk or route, not {strategy!r}"
+        )
+    return strategy
+
+
+@dataclass
+class Budget:
+    """
+    How an article fits into one stage's prompt.
+
+    Attributes:
+        strategy: ``fits`` when the whole article fits, otherwise the
+            strategy applied (``truncate``, ``chunk``, ``route`` or ``off``)
+        content: Article text to render (cut to fit for ``truncate``)
+        available: Article tokens the prompt has room for (0 when the
+            model's context window is unknown)
+        needed: Context the prompt with the whole article needs, answer
+            reserve included
+        min_context: Context window to route the request to (``route``)
+    """
+
+    strategy: str
+    content: str
+    available: int
+    needed: int
+    min_context: int | None = None
+
+
+def fit_article(
+    conf_file: str,
+    crime_keywords: str,
+    judge_keywords: str,
+    news_content: str,
+    news_title: str | None = None,
+    stage: str = "extractor",
+    report: bool = True,
+) -> Budget:
+    """
+    Check an article against a stage's context window and apply TOKEN_BUDGET_STRATEGY.
+
+    The template with the keywords bound is the same for every article, so
+    its token count comes from the tokenizer's cache; only the article and
+    title are counted each time.
+
+    Args:
+        conf_file: Configuration filename (from prompts/)
+        crime_keywords: Crime keywords content
+        judge_keywords: Legal proceeding keywords content
+        news_content: News article content
+        news_title: Optional news title
+        stage: Stage whose model's window applies (``extractor``/``inferencer``)
+        report: Print what was done to an article that does not fit
+
+    Returns:
+        Budget; ``route`` falls back to ``truncate`` when no model is large
+        enough, and a template that leaves no room at all is sent as it is.
+        Articles for a model whose window is unknown always ``fits``.
+    """
+    model = stage_model(stage)
+    limit = stage_context(stage)
+    static = prompt_tokens(
+        *complete(conf_file, crime_keywords, judge_keywords, None, None)["files"].values()
+    )
+    if news_title:
+        static += measure_tokens(news_title)
+    tokens = measure_tokens(news_content)
+    needed = static + tokens + token_reserve()
+    if limit is None:
+        # Unknown window (context_limit warns once): send the article whole
+        return Budget("fits", news_content, 0, needed)
+    available = limit - token_reserve() - static
+    if tokens <= available:
+        return Budget("fits", news_content, available, needed)
+
+    strategy = budget_strategy()
+    if strategy == "route":
+        routed = context_model(needed, stage)
+        if routed is not None:
+            if report:
+                print(
+                    f"Article of {tokens} tokens does not fit the {stage} prompt "
+                    f"({model}: {limit} tokens); sent to {routed}"
+                )
+            return Budget("route", news_content, available, needed, min_context=needed)
+    if strategy == "route" or (strategy == "chunk" and available <= 0):
+        strategy = "truncate"
+    if available <= 0:
+        strategy = "off"
+    if report:
+        action = {
+            "truncate": f"truncated to {available}",
+            "chunk": f"split into pieces of up to {available}",
+            "off": "sent whole",
+        }[strategy]
+        print(
+            f"Article of {tokens} tokens does not fit the {stage} prompt "
+            f"({model}: {limit} tokens, {limit - available} for the template and answer); {action}"
+        )
+    if strategy == "truncate":
+        news_content = get_tokenizer().truncate(news_content, available)
+    return Budget(strategy, news_content, available, needed)
+
+
+def extractor_chunks(
+    conf_file: str,
+    crime_keywords: str,
+    judge_keywords: str,
+    news_content: str,
+    news_title: str | None = None,
+    report: bool = True,
+) -> tuple[Budget, Chunks | None]:
+    """
+    Decide whether the extractor sees an article whole or in chunks.
+
+    Args:
+        conf_file: Extractor configuration filename (from prompts/)
+        crime_keywords: Crime keywords content
+        judge_keywords: Legal proceeding keywords content
+        news_content: News article content
+        news_title: Optional news title
+        report: Print how the article is split
+
+    Returns:
+        (extractor budget, chunks or None). Chunks are no larger than the
+        room the extractor prompt has for the article.
+    """
+    tokens, overlap = chunk_settings()
+    if tokens > 0 and measure_tokens(news_content) > tokens:
+        budget = fit_article(
+            conf_file,
+            crime_keywords,
+            judge_keywords,
+            news_content,
+            news_title,
+            "extractor",
+            report=False,
+        )
+        if budget.available > 0:
+            tokens = min(tokens, budget.available)
+        chunks = chunk_article(news_content, tokens, overlap)
+        if report:
+            print(f"Extracting subjects from {len(chunks)} chunks of up to {tokens} tokens")
+        return budget, chunks
+    # fit_article reports the chunk strategy itself
+    budget = fit_article(
+        conf_file,
+        crime_keywords,
+        judge_keywords,
+        news_content,
+        news_title,
+        "extractor",
+        report=report,
+    )
+    if budget.strategy != "chunk":
+        return budget, None
+    return budget, chunk_article(news_content, budget.available, overlap)
+
+
+async def extract_article(
+    conf_file: str,
+    crime_keywords: str,
+    judge_keywords: str,
+    news_content: str,
+    news_title: str | None = None,
+    failed: list[BaseException] | None = None,
+) -> list[str]:
+    """
+    Run the extractor on an article within the extractor model's context window.
+
+    Articles longer than EXTRACTOR_CHUNK_TOKENS, and articles too long for
+    the window under the ``chunk`` strategy, are split into overlapping
+    chunks (:func:`extractor_chunks`). The extractor runs on the chunks
+    concurrently and the subject lists are merged in order of first
+    appearance. A chunk that names nobody adds nothing; a chunk whose
+    answer still fails after the retries is skipped with a message, and
+    the article fails only when every chunk failed.
+
+    Args:
+        conf_file: Extractor configuration filename (from prompts/)
+        crime_keywords: Crime keywords content
+        judge_keywords: Legal proceeding keywords content
+        news_content: News article content
+        news_title: Optional news title
+        failed: Collects the errors of the chunks that were skipped
+
+    Returns:
+        Subject names in extractor order
+    """
+    budget, chunks = extractor_chunks(
+        conf_file, crime_keywords, judge_keywords, news_content, news_title
+    )
+    if chunks is not None:
+        lists = await asyncio.gather(
+            *(
+                extract_subjects(
+                    complete(conf_file, crime_keywords, judge_keywords, piece, news_title)
+                )
+                for piece in chunks.texts()
+            ),
+            return_exceptions=True,
+        )
+        errors = [result for result in lists if isinstance(result, BaseException)]
+        if len(errors) == len(lists):
+            raise errors[0]
+        for number, result in enumerate(lists, 1):
+            if isinstance(result, BaseException):
+                print(
+                    f"Extractor failed on chunk {number}/{len(lists)}: {type(result).__name__}: {result}"
+                )
+        if failed is not None:
+            failed.extend(errors)
+        return list(
+            dict.fromkeys(
+                subject
+                for subjects in lists
+                if not isinstance(subjects, BaseException)
+                for subject in subjects
+            )
+        )
+    extractor = complete(conf_file, crime_keywords, judge_keywords, budget.content, news_title)
+    extractor["min_context"] = budget.min_context
+    return await extract_subjects(extractor)
+
+
+def prefilter_mode() -> str:
+    """
+    Return what to do with articles that contain no crime keyword.
+
+    Returns:
+        ``off`` (analyze normally), ``skip`` (no requests at all) or
+        ``downgrade`` (extractor only; every subject is recorded as not
+        suspected without asking the inferencer)
+    """
+    mode = os.getenv("KEYWORD_PREFILTER", "off").lower()
+    if mode not in ("off", "skip", "downgrade"):
+        raise ValueError(f"KEYWORD_PREFILTER must be off, skip or downgrade, not {mode!r}")
+    return mode
+
+
+def matched_only() -> bool:
+    """Return True when KEYWORD_MATCHED_ONLY limits prompts to matched keywords."""
+    return os.getenv("KEYWORD_MATCHED_ONLY", "false").lower() in ("1", "true", "yes", "on")
+
+
+def match_keywords(
+    crime_keywords: str, judge_keywords: str, news_content: str, news_title: str | None = None
+) -> dict[str, list[tuple[str, int]]]:
+    """
+    Find every crime and legal keyword occurrence in an article.
+
+    Args:
+        crime_keywords: Crime keywords content
+        judge_keywords: Legal proceeding keywords content
+        news_content: News article content
+        news_title: Optional news title (scanned too; offsets count from the
+            start of the title, followed by a newline and the content)
+
+    Returns:
+        ``{'crime': [(keyword, offset), ...], 'judge': [...]}``
+    """
+    text = f"{news_title}\n{news_content}" if news_title else news_content
+    return {
+        "crime": get_matcher(crime_keywords).find(text),
+        "judge": get_matcher(judge_keywords).find(text),
+    }
+
+
+def _unsuspected(subject: str) -> tuple[str, InferenceRecord]:
+    """Record for a subject of an article without any crime keyword."""
+    raw = {"subject": subject, "suspected": "否", "crimes": "無", "progress": "無", "summary": ""}
+    return "", InferenceRecord(subject=subject, suspected=False, raw=raw)
+
+
+async def analyze_async(
+    extractor_conf: str,
+    inferencer_conf: str,
+    crime_keywords: str,
+    judge_keywords: str,
+    news_content: str,
+    news_title: str | None = None,
+    article_id: str | None = None,
+    stages: StageStore | None = None,
+) -> dict[str, Any]:
+    """
+    Run the extractor, then the inferencer for every subject concurrently.
+
+    Args:
+        extractor_conf: Extractor configuration filename (from prompts/)
+        inferencer_conf: Inferencer configuration filename (from prompts/)
+        crime_keywords: Crime keywords content
+        judge_keywords: Legal proceeding keywords content
+        news_content: Raw news article text
+        news_title: Optional news title
+        article_id: Article id for the per-article metrics rollup and the
+            stage store (default: a hash of the article)
+        stages: Reuse stage outputs whose inputs are unchanged, and store
+            new ones
+
+    Returns:
+        Dictionary with:
+            - subjects: Subject names in extractor order, variants of the
+              same entity merged
+            - aliases: The merged-away variants of each subject that had any
+            - inferences: Inferencer response text per subject, same order
+              (empty for subjects recorded without asking the inferencer)
+            - records: Parsed :class:`InferenceRecord` per subject, same order
+            - keywords: Distinct crime and legal keywords found in the article
+            - prefilter: ``skip`` or ``downgrade`` when the article had no
+              crime keyword and KEYWORD_PREFILTER applied, otherwise None
+    """
+    with _track(article_id, extractor_conf, inferencer_conf):
+        analysis = prepare(crime_keywords, judge_keywords, news_content, news_title, article_id)
+        if analysis.mode != "skip":
+            await run_extractor(analysis, extractor_conf, stages)
+            await run_inferencer(analysis, inferencer_conf, stages)
+        return analysis.result()
+
+
+@dataclass
+class Analysis:
+    """
+    One article on its way through the pipeline stages.
+
+    :func:`analyze_async` runs :func:`prepare`, :func:`run_extractor` and
+    :func:`run_inferencer` in a row; :mod:`kgai.flow` runs them as separate
+    stages with queues in between.
+
+    Attributes:
+        news_content: Article text
+        news_title: Article title
+        article_id: Article id (None: keyed by a hash of the article)
+        crime_keywords: Crime keywords content put into the prompts
+        judge_keywords: Legal proceeding keywords content put into the prompts
+        found: Distinct crime and legal keywords found in the article
+        mode: Prefilter outcome (``off``, ``skip`` or ``downgrade``)
+        subjects: Merged subjects, once the extractor ran
+        aliases: Merged-away variants per subject
+        answers: (response text, record) per subject, once the inferencer ran
+    """
+
+    news_content: str
+    news_title: str | None
+    article_id: str | None
+    crime_keywords: str
+    judge_keywords: str
+    found: dict[str, list[str]]
+    mode: str
+    subjects: list[str] = field(default_factory=list)
+    aliases: dict[str, list[str]] = field(default_factory=dict)
+    answers: list[tuple[str, InferenceRecord]] = field(default_factory=list)
+
+    def result(self) -> dict[str, Any]:
+        """Return the :func:`analyze_async` result for the stages run so far."""
+        return _result(self.subjects, self.answers, self.found, self.mode, self.aliases)
+
+
+def prepare(
+    crime_keywords: str,
+    judge_keywords: str,
+    news_content: str,
+    news_title: str | None = None,
+    article_id: str | None = None,
+) -> Analysis:
+    """
+    Scan an article for keywords and apply KEYWORD_PREFILTER, without any request.
+
+    Args:
+        crime_keywords: Crime keywords content
+        judge_keywords: Legal proceeding keywords content
+        news_content: Raw news article text
+        news_title: Optional news title
+        article_id: Article id for the stage store
+
+    Returns:
+        Analysis; the LLM stages have nothing to do when ``mode`` is ``skip``
+    """
+    found, mode, crime_keywords, judge_keywords = _prefilter(
+        crime_keywords, judge_keywords, news_content, news_title
+    )
+    return Analysis(
+        news_content, news_title, article_id, crime_keywords, judge_keywords, found, mode
+    )
+
+
+async def run_extractor(
+    analysis: Analysis, extractor_conf: str, stages: StageStore | None = None
+) -> None:
+    """
+    Fill in ``analysis.subjects`` and ``aliases`` from the extractor (or the stage store).
+
+    Args:
+        analysis: Article from :func:`prepare`
+        extractor_conf: Extractor configuration filename (from prompts/)
+        stages: Reuse the stored subject list when its inputs are unchanged
+    """
+    if analysis.mode == "skip":
+        return
+    content, title = analysis.news_content, analysis.news_title
+    article, inputs, extracted = "", {}, None
+    if stages is not None:
+        # Fingerprinting measures the article; without a stage store it is not needed
+        article = _article_key(analysis.article_id, content, title)
+        inputs = _extract_inputs(
+            extractor_conf, analysis.crime_keywords, analysis.judge_keywords, content, title
+        )
+        extracted = stages.get(article, "extract", "", inputs)
+    if extracted is None:
+        failed: list[BaseException] = []
+        with _stage("extractor", extractor_conf):
+            extracted = await extract_article(
+                extractor_conf,
+                analysis.crime_keywords,
+                analysis.judge_keywords,
+                content,
+                title,
+                failed,
+            )
+        # A list missing a failed chunk's subjects is asked for again next run
+        if stages is not None and not failed:
+            stages.put(article, "extract", "", inputs, extracted)
+    analysis.subjects, analysis.aliases = _merge(extracted)
+
+
+async def run_inferencer(
+    analysis: Analysis, inferencer_conf: str, stages: StageStore | None = None
+) -> None:
+    """
+    Fill in ``analysis.answers`` for every subject, concurrently.
+
+    Args:
+        analysis: Article after :func:`run_extractor`
+        inferencer_conf: Inferencer configuration filename (from prompts/)
+        stages: Reuse stored answers whose inputs are unchanged
+    """
+    if analysis.mode == "skip":
+        return
+    if analysis.mode == "downgrade":
+        analysis.answers = [_unsuspected(subject) for subject in analysis.subjects]
+        return
+    crime_keywords, judge_keywords = analysis.crime_keywords, analysis.judge_keywords
+    content, title, aliases = analysis.news_content, analysis.news_title, analysis.aliases
+    inferencer = _render_inferencer(inferencer_conf, crime_keywords, judge_keywords, content, title)
+    inferencer["aliases"] = aliases
+    with _stage("inferencer", inferencer_conf):
+        if stages is None:
+            analysis.answers = await infer_subjects(inferencer, analysis.subjects)
+        else:
+            article = _article_key(analysis.article_id, content, title)
+            analysis.answers = await _infer_stored(
+                inferencer,
+                analysis.subjects,
+                stages,
+                article,
+                lambda subject: (
+                    _infer_inputs(
+                        inferencer_conf,
+                        crime_keywords,
+                        judge_keywords,
+                        content,
+                        title,
+                        subject,
+                        aliases,
+                    )
+                ),
+            )
+
+
+async def _infer_stored(
+    inferencer: dict[str, Any],
+    subjects: list[str],
+    stages: StageStore,
+    article: str,
+    inputs_for: Callable[[str], dict[str, Any]],
+) -> list[tuple[str, InferenceRecord]]:
+    """Run :func:`infer_subjects` for the subjects without a current stored answer."""
+    answers: dict[str, tuple[str, InferenceRecord]] = {}
+    inputs = {subject: inputs_for(subject) for subject in subjects}
+    stale = []
+    for subject in subjects:
+        stored = stages.get(article, "infer", subject, inputs[subject])
+        if stored is None:
+            stale.append(subject)
+        else:
+            answers[subject] = (stored["content"], InferenceRecord(**stored["record"]))
+    if stale:
+        for subject, (content, record) in zip(
+            stale, await infer_subjects(inferencer, stale), strict=True
+        ):
+            answers[subject] = (content, record)
+            # Unparsed answers are asked again on the next run
+            if record.error is None:
+                stages.put(
+                    article,
+                    "infer",
+                    subject,
+                    inputs[subject],
+                    {"content": content, "record": record.to_dict()},
+                )
+    return [answers[subject] for subject in subjects]
+
+
+def _article_key(article_id: str | None, news_content: str, news_title: str | None) -> str:
+    """Key of an article in the stage store."""
+    return article_id or "sha256:" + text_hash(news_title, news_content)
+
+
+def prompt_hash(conf_file: str) -> str:
+    """
+    Return a hash of a prompt configuration's templates and options.
+
+    Args:
+        conf_file: Configuration filename (from prompts/) or path
+
+    Returns:
+        Hash that changes whenever the prompts sent for the config would
+    """
+    config = get_config(conf_file)
+    return text_hash(
+        json.dumps(config.render({}), ensure_ascii=False, sort_keys=True),
+        json.dumps(config.options, ensure_ascii=False, sort_keys=True, default=str),
+    )
+
+
+def _extract_inputs(
+    conf_file: str,
+    crime_keywords: str,
+    judge_keywords: str,
+    news_content: str,
+    news_title: str | None,
+    stage: str = "extractor",
+) -> dict[str, Any]:
+    """Fingerprint inputs of the extractor stage, shared by the inferencer's."""
+    used = set().union(*(template.used for template in get_config(conf_file).templates.values()))
+    inputs = {
+        "article": text_hash(news_title, news_content),
+        "prompt": prompt_hash(conf_file),
+        # Keywords the prompt does not show cannot change the answer
+        "keywords": text_hash(
+            crime_keywords if "crime_keywords" in used else None,
+            judge_keywords if "judge_keywords" in used else None,
+        ),
+        "model": stage_model(stage),
+        "temperature": float(os.getenv("OPENAI_TEMPERATURE", "0.0")),
+        "json": json_mode(),
+    }
+    budget = fit_article(
+        conf_file, crime_keywords, judge_keywords, news_content, news_title, stage, report=False
+    )
+    if budget.strategy != "fits":
+        # What the model saw depends on how the article was made to fit
+        inputs["budget"] = [budget.strategy, budget.available]
+    if stage == "extractor":
+        _, chunks = extractor_chunks(
+            conf_file, crime_keywords, judge_keywords, news_content, news_title, report=False
+        )
+        if chunks is not None:
+            inputs["chunks"] = [chunks.tokens, chunks.overlap]
+    return inputs
+
+
+def _infer_inputs(
+    conf_file: str,
+    crime_keywords: str,
+    judge_keywords: str,
+    news_content: str,
+    news_title: str | None,
+    subject: str,
+    aliases: dict[str, list[str]],
+) -> dict[str, Any]:
+    """Fingerprint inputs of one subject's inferencer answer."""
+    inputs = _extract_inputs(
+        conf_file, crime_keywords, judge_keywords, news_content, news_title, "inferencer"
+    )
+    inputs["subject"] = subject
+    inputs["aliases"] = aliases.get(subject, [])
+    if context_mode() == "passages":
+        inputs["context"] = [
+            int(os.getenv("INFERENCER_CONTEXT_WINDOW", "1")),
+            int(os.getenv("INFERENCER_CONTEXT_BUDGET", "1500")),
+        ]
+    elif context_mode() == "chunks":
+        inputs["context"] = ["chunks", *chunk_settings()]
+    return inputs
+
+
+def plan(
+    extractor_conf: str,
+    inferencer_conf: str,
+    crime_keywords: str,
+    judge_keywords: str,
+    news_content: str,
+    news_title: str | None,
+    article_id: str | None,
+    stages: StageStore,
+) -> dict[str, Any]:
+    """
+    Count the model calls ``analyze_async(..., stages=stages)`` would make.
+
+    Nothing is sent. When the extractor has to run again, the stored subject
+    list (if any) stands in for the one it will return.
+
+    Args:
+        Same as :func:`analyze_async`
+
+    Returns:
+        Dictionary with:
+            - extractor: Extractor calls (0, 1, or one per chunk)
+            - inferencer: Inferencer calls for the known subjects
+            - subjects_known: False when the subjects cannot be known
+              before the extractor runs (no stored subject list)
+            - prompt_tokens: Estimated prompt tokens of those calls
+            - reasons: ``{"<stage>: <changed inputs>": count}`` for every
+              stale output
+    """
+    found, mode, crime_keywords, judge_keywords = _prefilter(
+        crime_keywords, judge_keywords, news_content, news_title
+    )
+    result: dict[str, Any] = {
+        "extractor": 0,
+        "inferencer": 0,
+        "subjects_known": True,
+        "prompt_tokens": 0,
+        "reasons": {},
+    }
+    if mode == "skip":
+        return result
+
+    def stale(stage: str, item: str, inputs: dict[str, Any]) -> tuple[bool, Any]:
+        stored = stages.lookup(article, stage, item)
+        changed = changed_inputs(None if stored is None else stored.inputs, inputs)
+        if changed:
+            reason = f"{stage}: {', '.join(changed)}"
+            result["reasons"][reason] = result["reasons"].get(reason, 0) + 1
+        return bool(changed), None if stored is None else stored.output
+
+    article = _article_key(article_id, news_content, news_title)
+    extract_stale, extracted = stale(
+        "extract",
+        "",
+        _extract_inputs(extractor_conf, crime_keywords, judge_keywords, news_content, news_title),
+    )
+    if extract_stale:
+        budget, chunks = extractor_chunks(
+            extractor_conf, crime_keywords, judge_keywords, news_content, news_title, report=False
+        )
+        for piece in [budget.content] if chunks is None else chunks.texts():
+            extractor = complete(extractor_conf, crime_keywords, judge_keywords, piece, news_title)
+            result["extractor"] += 1
+            result["prompt_tokens"] += estimate_tokens(
+                extractor["files"]["system"] + extractor["files"]["user"]
+            )
+    if extracted is None:
+        result["subjects_known"] = False
+        return result
+    if mode == "downgrade":
+        return result
+
+    subjects, aliases = _merge(extracted, report=False)
+    inferencer = _render_inferencer(
+        inferencer_conf, crime_keywords, judge_keywords, news_content, news_title
+    )
+    inferencer["aliases"] = aliases
+    pending = [
+        subject
+        for subject in subjects
+        if stale(
+            "infer",
+            subject,
+            _infer_inputs(
+                inferencer_conf,
+                crime_keywords,
+                judge_keywords,
+                news_content,
+                news_title,
+                subject,
+                aliases,
+            ),
+        )[0]
+    ]
+    if inferencer.get("mode") == "batch":
+        chunk_size = _chunk_size(inferencer)
+        chunks = [pending[i : i + chunk_size] for i in range(0, len(pending), chunk_size)]
+        requests = [
+            {
+                "targets": "\n".join(f"- {subject}" for subject in chunk),
+                **_content_values(inferencer, chunk),
+            }
+            for chunk in chunks
+        ]
+    else:
+        requests = [
+            {"target": subject, **_content_values(inferencer, [subject])} for subject in pending
+        ]
+    result["inferencer"] = len(requests)
+    for values in requests:
+        result["prompt_tokens"] += sum(
+            estimate_tokens(template.render(values))
+            for template in inferencer["templates"].values()
+        )
+    return result
+
+
+def _merge(subjects: list[str], report: bool = True) -> tuple[list[str], dict[str, list[str]]]:
+    """Merge variants of the same entity unless ENTITY_MERGE is off."""
+    if not merge_enabled():
+        return subjects, {}
+    merged, aliases = merge_subjects(subjects)
+    if aliases and report:
+        print(
+            f"Merged {len(subjects) - len(merged)} subject variant(s): "
+            + ", ".join(
+                f"{subject} <- {', '.join(variants)}" for subject, variants in aliases.items()
+            )
+        )
+    return merged, aliases
+
+
+def _stage(stage: str, conf_file: str) -> AbstractContextManager[None]:
+    """Label the requests made inside the block with their stage and config."""
+    return labels(stage=stage, config=os.path.basename(conf_file))
+
+
+def _track(
+    article_id: str | None, extractor_conf: str, inferencer_conf: str
+) -> AbstractContextManager[Any]:
+    """Roll up the requests made inside the block for one article."""
+    return track_article(
+        article_id,
+        extractor=os.path.basename(extractor_conf),
+        inferencer=os.path.basename(inferencer_conf),
+    )
+
+
+def _prefilter(
+    crime_keywords: str, judge_keywords: str, news_content: str, news_title: str | None
+) -> tuple[dict[str, list[str]], str, str, str]:
+    """Return (keywords found, prefilter mode, crime keywords, judge keywords) for an article."""
+    matches = match_keywords(crime_keywords, judge_keywords, news_content, news_title)
+    found = {
+        kind: list(dict.fromkeys(keyword for keyword, _ in hits)) for kind, hits in matches.items()
+    }
+    mode = prefilter_mode() if not found["crime"] else "off"
+    if matched_only():
+        # An empty list would leave the prompt without any keyword to judge against
+        if found["crime"]:
+            crime_keywords = format_keywords(found["crime"])
+        if found["judge"]:
+            judge_keywords = format_keywords(found["judge"])
+    return found, mode, crime_keywords, judge_keywords
+
+
+def _render_inferencer(
+    inferencer_conf: str,
+    crime_keywords: str,
+    judge_keywords: str,
+    news_content: str,
+    news_title: str | None,
+) -> dict[str, Any]:
+    """Render the inferencer configuration for the current INFERENCER_CONTEXT and token budget."""
+    mode = context_mode()
+    budget = fit_article(
+        inferencer_conf,
+        crime_keywords,
+        judge_keywords,
+        news_content,
+        news_title,
+        "inferencer",
+        report=mode == "full",
+    )
+    if mode == "full" and budget.strategy != "chunk":
+        inferencer = complete(
+            inferencer_conf, crime_keywords, judge_keywords, budget.content, news_title
+        )
+        inferencer["min_context"] = budget.min_context
+        return inferencer
+    # Leave $news_content open; each request renders its own passage
+    inferencer = complete(inferencer_conf, crime_keywords, judge_keywords, None, news_title)
+    inferencer["news_content"] = news_content
+    if mode == "chunks":
+        inferencer["chunks"] = chunk_article(news_content, *chunk_settings())
+        if budget.strategy != "fits" and budget.available > 0:
+            inferencer["context_budget"] = budget.available
+    elif mode == "full":
+        # chunk: each subject gets as much of its passages as the prompt holds
+        inferencer["context_budget"] = budget.available
+    elif budget.strategy != "fits":
+        configured = int(os.getenv("INFERENCER_CONTEXT_BUDGET", "1500"))
+        inferencer["context_budget"] = (
+            min(configured, budget.available) if configured > 0 else budget.available
+        )
+    return inferencer
+
+
+def _result(
+    subjects: list[str],
+    answers: list[tuple[str, InferenceRecord]],
+    found: dict[str, list[str]],
+    mode: str,
+    aliases: dict[str, list[str]] | None = None,
+) -> dict[str, Any]:
+    """Assemble the dictionary returned by :func:`analyze_async`."""
+    return {
+        "subjects": subjects,
+        "aliases": aliases or {},
+        "inferences": [content for content, _ in answers],
+        "records": [record for _, record in answers],
+        "keywords": found,
+        "prefilter": None if mode == "off" else mode,
+    }
+
+
+async def analyze_stream_async(
+    extractor_conf: str,
+    inferencer_conf: str,
+    crime_keywords: str,
+    judge_keywords: str,
+    news_content: str,
+    news_title: str | None = None,
+    article_id: str | None = None,
+) -> AsyncIterator[tuple[Any, ...]]:
+    """
+    Run :func:`analyze_async`, yielding progress events as they happen.
+
+    Per-subject inferencer requests are streamed, so their text arrives token
+    by token; batch-mode chunks report their subjects when the chunk is done.
+    Closing the generator early cancels the requests still running.
+
+    Args:
+        Same as :func:`analyze_async`
+
+    Yields:
+        Event tuples, in this order:
+            - ``('subjects', subjects, aliases)`` once the extractor has
+              answered, variants merged as in :func:`analyze_async`
+            - ``('delta', subject, text)`` for each piece of streamed answer
+              text; ``text`` is None when the answer so far is discarded
+              (a retry or re-ask starts over)
+            - ``('record', subject, content, record)`` as each subject finishes
+            - ``('result', result)`` last, the :func:`analyze_async` result
+    """
+    with _track(article_id, extractor_conf, inferencer_conf):
+        async for event in _stream_events(
+            extractor_conf,
+            inferencer_conf,
+            crime_keywords,
+            judge_keywords,
+            news_content,
+            news_title,
+        ):
+            yield event
+
+
+async def _stream_events(
+    extractor_conf: str,
+    inferencer_conf: str,
+    crime_keywords: str,
+    judge_keywords: str,
+    news_content: str,
+    news_title: str | None,
+) -> AsyncIterator[tuple[Any, ...]]:
+    """Event generator behind :func:`analyze_stream_async`."""
+    found, mode, crime_keywords, judge_keywords = _prefilter(
+        crime_keywords, judge_keywords, news_content, news_title
+    )
+    if mode == "skip":
+        yield ("result", _result([], [], found, mode))
+        return
+
+    with _stage("extractor", extractor_conf):
+        subjects, aliases = _merge(
+            await extract_article(
+                extractor_conf, crime_keywords, judge_keywords, news_content, news_title
+            )
+        )
+    yield ("subjects", subjects, aliases)
+    if mode == "downgrade":
+        answers = [_unsuspected(subject) for subject in subjects]
+        for subject, (content, record) in zip(subjects, answers, strict=True):
+            yield ("record", subject, content, record)
+        yield ("result", _result(subjects, answers, found, mode, aliases))
+        return
+
+    inferencer = _render_inferencer(
+        inferencer_conf, crime_keywords, judge_keywords, news_content, news_title
+    )
+    inferencer["aliases"] = aliases
+    events: asyncio.Queue = asyncio.Queue()
+
+    async def run_subject(subject: str) -> list[tuple[str, InferenceRecord]]:
+        answer = await infer_subject(
+            inferencer, subject, on_delta=lambda text: events.put_nowait(("delta", subject, text))
+        )
+        events.put_nowait(("record", subject, *answer))
+        return [answer]
+
+    async def run_chunk(chunk: list[str]) -> list[tuple[str, InferenceRecord]]:
+        answers = await infer_chunk(inferencer, chunk)
+        for subject, answer in zip(chunk, answers, strict=True):
+            events.put_nowait(("record", subject, *answer))
+        return answers
+
+    # Tasks inherit the stage labels from the context they are created in
+    with _stage("inferencer", inferencer_conf):
+        if inferencer.get("mode") == "batch":
+            chunk_size = _chunk_size(inferencer)
+            tasks = [
+                asyncio.ensure_future(run_chunk(subjects[i : i + chunk_size]))
+                for i in range(0, len(subjects), chunk_size)
+            ]
+        else:
+            tasks = [asyncio.ensure_future(run_subject(subject)) for subject in subjects]
+    done = asyncio.gather(*tasks)
+    done.add_done_callback(lambda _: events.put_nowait(None))
+    try:
+        while True:
+            event = await events.get()
+            if event is None:
+                break
+            yield event
+        answers = [answer for task_answers in done.result() for answer in task_answers]
+    finally:
+        for task in tasks:
+            task.cancel()
+    yield ("result", _result(subjects, answers, found, mode, aliases))
+
+
+def analyze(*args: Any, **kwargs: Any) -> dict[str, Any]:
+    """Synchronous wrapper around :func:`analyze_async`."""
+    return run_sync(analyze_async(*args, **kwargs))
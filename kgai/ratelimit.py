@@ -0,0 +1,76 @@
+"""
+Asynchronous token-bucket rate limiting.
+
+Used by :mod:`kgai.client` to keep each endpoint under its requests-per-minute
+and tokens-per-minute quotas instead of running into 429 responses.
+"""
+
+import asyncio
+import time
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at ``rate_per_minute``.
+
+    ``acquire`` waits until enough capacity is available. The bucket may go
+    into debt via :meth:`adjust` when the real cost of a request turns out to be
+    higher than the estimate it was admitted with.
+
+    Attributes:
+        rate_per_minute: Refill rate; 0 or None disables limiting
+        capacity: Maximum burst size (defaults to one minute of quota)
+    """
+
+    def __init__(self, rate_per_minute: float | None, capacity: float | None = None):
+        self.rate_per_minute = rate_per_minute or 0
+        self.capacity = capacity if capacity is not None else self.rate_per_minute
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        """Return True when the bucket enforces a limit."""
+        return self.rate_per_minute > 0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated) * self.rate_per_minute / 60.0
+        )
+        self._updated = now
+
+    async def acquire(self, amount: float = 1.0) -> None:
+        """
+        Wait until ``amount`` tokens are available and take them.
+
+        Requests larger than the bucket capacity are admitted once the bucket
+        is full, so they cannot block forever.
+
+        Args:
+            amount: Number of tokens to take
+        """
+        if not self.enabled:
+            return
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+                deficit = amount - self._tokens
+                await asyncio.sleep(deficit * 60.0 / self.rate_per_minute)
+
+    def adjust(self, amount: float) -> None:
+        """
+        Take (positive) or return (negative) tokens without waiting.
+
+        Args:
+            amount: Correction between the actual and the estimated cost
+        """
+        if not self.enabled:
+            return
+        self._refill()
+        self._tokens = min(self.capacity, self._tokens - amount)
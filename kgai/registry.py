@@ -0,0 +1,314 @@
+"""
+Prompt template registry.
+
+Loads every ``prompts/*.json`` configuration once, validates it, and keeps its
+templates pre-split into literal and ``$placeholder`` segments so a prompt is
+rendered with a single join instead of one ``str.replace`` pass per variable.
+Configurations are reloaded automatically when the JSON file or one of its
+template files changes on disk.
+"""
+
+import json
+import os
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Any
+
+# A placeholder is "$" followed by an ASCII identifier; "$target" in "$target中"
+# is still the "target" placeholder, while "$targets" is a different one
+_PLACEHOLDER = re.compile(r"\$([A-Za-z_][A-Za-z0-9_]*)")
+
+
+class Template:
+    """
+    Prompt template pre-split into literal text and placeholder segments.
+
+    Only names in ``variables`` are placeholders; any other ``$name`` is kept as
+    literal text. Placeholders without a value at render time are also kept
+    as ``$name`` so they can be bound later (e.g. ``$target`` per subject).
+
+    Attributes:
+        variables: Placeholder names that can be substituted
+        used: Every ``$name`` found in the text, declared or not
+    """
+
+    def __init__(self, text: str, variables: set[str] | None = None):
+        self.used: set[str] = set(_PLACEHOLDER.findall(text))
+        self.variables: set[str] = self.used if variables is None else self.used & set(variables)
+
+        # literals[i] precedes names[i]; literals has one more element than names
+        literals: list[str] = []
+        names: list[str] = []
+        position = 0
+        buffer = ""
+        for match in _PLACEHOLDER.finditer(text):
+            if match.group(1) not in self.variables:
+                continue
+            buffer += text[position : match.start()]
+            literals.append(buffer)
+            names.append(match.group(1))
+            buffer = ""
+            position = match.end()
+        literals.append(buffer + text[position:])
+        self._literals = literals
+        self._names = names
+
+    def render(self, values: dict[str, str]) -> str:
+        """
+        Substitute ``values`` into the template.
+
+        Args:
+            values: Placeholder values keyed by name
+
+        Returns:
+            Rendered text; placeholders without a value stay as ``$name``
+        """
+        parts = [self._literals[0]]
+        for name, literal in zip(self._names, self._literals[1:], strict=True):
+            parts.append(values[name] if name in values else f"${name}")
+            parts.append(literal)
+        return "".join(parts)
+
+    def bind(self, values: dict[str, str]) -> "Template":
+        """
+        Return a template with ``values`` substituted and the rest left open.
+
+        Args:
+            values: Placeholder values to fix now
+
+        Returns:
+            New Template whose remaining placeholders can be rendered later
+        """
+        bound = Template.__new__(Template)
+        bound.used = self.used
+        bound.variables = self.variables - set(values)
+        literals = [self._literals[0]]
+        names: list[str] = []
+        for name, literal in zip(self._names, self._literals[1:], strict=True):
+            if name in values:
+                literals[-1] += values[name] + literal
+            else:
+                names.append(name)
+                literals.append(literal)
+        bound._literals = literals
+        bound._names = names
+        return bound
+
+
+@dataclass
+class PromptConfig:
+    """
+    A loaded prompt configuration.
+
+    Attributes:
+        filename: Configuration filename (e.g. ``inferencer_v8-1.json``)
+        path: Full path of the JSON file
+        name: Human-readable name from the config
+        inputs: Declared input variables and their descriptions
+        templates: Template per role (``system``/``user``, or ``prompt`` for
+            single-file configs)
+        options: Remaining config keys (e.g. ``mode``, ``chunk_size``)
+        problems: Validation messages found at load time
+    """
+
+    filename: str
+    path: str
+    name: str
+    inputs: dict[str, str]
+    templates: dict[str, Template]
+    options: dict[str, Any] = field(default_factory=dict)
+    problems: list[str] = field(default_factory=list)
+    mtimes: dict[str, float] = field(default_factory=dict)
+
+    def render(self, values: dict[str, str]) -> dict[str, str]:
+        """
+        Render every template of the configuration.
+
+        Args:
+            values: Placeholder values keyed by name
+
+        Returns:
+            Rendered text per role
+        """
+        return {role: template.render(values) for role, template in self.templates.items()}
+
+    def changed(self) -> bool:
+        """Return True when the JSON file or a template file changed on disk."""
+        for path, mtime in self.mtimes.items():
+            try:
+                if os.path.getmtime(path) != mtime:
+                    return True
+            except OSError:
+                return True
+        return False
+
+
+def load_config(path: str) -> PromptConfig:
+    """
+    Load and validate one prompt configuration file.
+
+    Template files are resolved relative to the configuration's directory.
+    Variables used in a template but not declared in ``inputs``, and declared
+    inputs that no template uses, are recorded in ``problems``.
+
+    Args:
+        path: Path to the JSON configuration
+
+    Returns:
+        Loaded PromptConfig
+
+    Raises:
+        ValueError: If the configuration has no ``files``/``file`` entry
+        OSError: If a template file cannot be read
+    """
+    dirname = os.path.dirname(path)
+    mtimes = {path: os.path.getmtime(path)}
+    with open(path, encoding="utf-8") as file:
+        raw = json.load(file)
+
+    if "files" in raw:
+        files = dict(raw["files"])
+    elif "file" in raw:
+        files = {"prompt": raw["file"]}
+    else:
+        raise ValueError(f'{path}: missing "files" or "file"')
+
+    inputs = raw.get("inputs", {})
+    if isinstance(inputs, list):
+        inputs = dict.fromkeys(inputs, "")
+
+    templates = {}
+    used: set[str] = set()
+    for role, filename in files.items():
+        template_path = os.path.join(dirname, filename)
+        mtimes[template_path] = os.path.getmtime(template_path)
+        with open(template_path, encoding="utf-8") as file:
+            template = Template(file.read(), set(inputs))
+        templates[role] = template
+        used |= template.used
+
+    problems = []
+    undeclared = sorted(used - set(inputs))
+    if undeclared:
+        problems.append(f'undeclared variables kept as literal text: {", ".join(undeclared)}')
+    unused = sorted(set(inputs) - used)
+    if unused:
+        problems.append(f'declared inputs not used by any template: {", ".join(unused)}')
+
+    options = {
+        key: value for key, value in raw.items() if key not in ("name", "files", "file", "inputs")
+    }
+    return PromptConfig(
+        filename=os.path.basename(path),
+        path=path,
+        name=raw.get("name", os.path.basename(path)),
+        inputs=inputs,
+        templates=templates,
+        options=options,
+        problems=problems,
+        mtimes=mtimes,
+    )
+
+
+class PromptRegistry:
+    """
+    All prompt configurations of a directory, loaded once and hot-reloaded.
+
+    Attributes:
+        directory: Directory scanned for ``*.json`` configurations
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._configs: dict[str, PromptConfig] = {}
+        self._errors: dict[str, str] = {}
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self) -> None:
+        """(Re)load every configuration and report validation problems."""
+        with self._lock:
+            self._configs.clear()
+            self._errors.clear()
+            for filename in sorted(os.listdir(self.directory)):
+                if filename.endswith(".json"):
+                    self._load(filename)
+
+    def _load(self, filename: str) -> PromptConfig | None:
+        try:
+            config = load_config(os.path.join(self.directory, filename))
+        except (OSError, ValueError) as error:
+            self._errors[filename] = str(error)
+            self._configs.pop(filename, None)
+            print(f"Prompt config {filename} could not be loaded: {error}")
+            return None
+        for problem in config.problems:
+            print(f"Prompt config {filename}: {problem}")
+        self._configs[filename] = config
+        return config
+
+    def names(self, prefix: str = "") -> list[str]:
+        """
+        Return loaded configuration filenames, optionally filtered by prefix.
+
+        Args:
+            prefix: e.g. ``extractor`` or ``inferencer``
+
+        Returns:
+            Sorted configuration filenames
+        """
+        with self._lock:
+            return sorted(name for name in self._configs if name.startswith(prefix))
+
+    def get(self, filename: str) -> PromptConfig:
+        """
+        Return a configuration, reloading it first if its files changed.
+
+        Args:
+            filename: Configuration filename inside the registry directory
+
+        Returns:
+            The loaded PromptConfig
+
+        Raises:
+            KeyError: If the configuration does not exist or failed to load
+        """
+        with self._lock:
+            config = self._configs.get(filename)
+            if config is None or config.changed():
+                if not os.path.exists(os.path.join(self.directory, filename)):
+                    raise KeyError(filename)
+                config = self._load(filename)
+                if config is None:
+                    raise KeyError(f"{filename}: {self._errors[filename]}")
+            return config
+
+    def problems(self) -> list[tuple[str, str]]:
+        """Return (filename, message) for every load error and validation problem."""
+        with self._lock:
+            found = [(name, error) for name, error in self._errors.items()]
+            for name, config in self._configs.items():
+                found.extend((name, problem) for problem in config.problems)
+            return found
+
+
+_registries: dict[str, PromptRegistry] = {}
+_registries_lock = threading.Lock()
+
+
+def get_registry(directory: str) -> PromptRegistry:
+    """
+    Return the shared registry for ``directory``, loading it on first use.
+
+    Args:
+        directory: Prompt configuration directory
+
+    Returns:
+        PromptRegistry for that directory
+    """
+    directory = os.path.abspath(directory)
+    with _registries_lock:
+        if directory not in _registries:
+            _registries[directory] = PromptRegistry(directory)
+        return _registries[directory]
@@ -0,0 +1,252 @@
+"""
+Record/replay endpoint for running the pipeline offline.
+
+:class:`ReplayServer` is a local OpenAI-compatible ``/v1/chat/completions``
+server backed by a cassette file. In ``record`` mode it forwards each request
+to the real endpoint and appends the response, with the time it took, to the
+cassette (re-recording entries already there, once per server run); in
+``replay`` mode it answers from the cassette (waiting the recorded time,
+scaled by ``speed``) and rejects requests it has not seen; ``auto`` replays
+what it has and records the rest. Point OPENAI_BASE_URL at
+:attr:`ReplayServer.base_url` and the pipeline runs unchanged.
+
+Requests are matched with :func:`kgai.cache.make_key` (model, temperature,
+messages and other answer-changing options). Streamed requests are recorded
+as regular completions and replayed as server-sent events.
+
+Example:
+    >>> async with ReplayServer('benchmark/cassettes/prompts.jsonl', mode='replay') as server:
+    ...     os.environ['OPENAI_BASE_URL'] = server.base_url
+    ...     result = await pipeline.analyze_async(...)
+"""
+
+import asyncio
+import json
+import os
+import time
+from typing import Any
+
+import aiohttp
+from aiohttp import web
+
+from kgai.cache import make_key
+
+MODES = ("record", "replay", "auto")
+
+# Request fields that do not change the answer
+_TRANSPORT_FIELDS = ("model", "messages", "temperature", "stream", "stream_options")
+
+
+def request_key(body: dict[str, Any]) -> str:
+    """
+    Return the cassette key of a chat completion request body.
+
+    Args:
+        body: JSON body of a ``/chat/completions`` request
+
+    Returns:
+        Same key :func:`kgai.cache.make_key` gives the client's request
+    """
+    options = {name: value for name, value in body.items() if name not in _TRANSPORT_FIELDS}
+    return make_key(body["model"], body.get("temperature", 1.0), body["messages"], options)
+
+
+class Cassette:
+    """
+    Recorded responses kept in a JSONL file, one ``{key, response, latency}`` per line.
+
+    Attributes:
+        path: Cassette file
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._entries: dict[str, tuple[dict[str, Any], float]] = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as file:
+                for line in file:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._entries[entry["key"]] = (entry["response"], entry["latency"])
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> tuple[dict[str, Any], float] | None:
+        """Return the (response, latency) recorded for ``key``, if any."""
+        return self._entries.get(key)
+
+    def put(self, key: str, response: dict[str, Any], latency: float) -> None:
+        """Record a response and append it to the file."""
+        self._entries[key] = (response, latency)
+        dirname = os.path.dirname(self.path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as file:
+            entry = {"key": key, "response": response, "latency": latency}
+            file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+class ReplayServer:
+    """
+    Local OpenAI-compatible endpoint that records or replays completions.
+
+    Attributes:
+        cassette: Recorded responses
+        mode: ``record``, ``replay`` or ``auto``
+        upstream: Base URL requests are recorded from
+        speed: Multiplier for the recorded latencies (0 answers immediately)
+        stats: Counts of ``replayed``, ``recorded`` and ``missing`` requests
+    """
+
+    def __init__(
+        self,
+        cassette: str,
+        mode: str = "replay",
+        upstream: str | None = None,
+        api_key: str | None = None,
+        speed: float = 1.0,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        if mode not in MODES:
+            raise ValueError(f'mode must be one of {", ".join(MODES)}, not {mode!r}')
+        self.cassette = Cassette(cassette)
+        self.mode = mode
+        self.upstream = (upstream or "https://api.openai.com/v1").rstrip("/")
+        self.api_key = api_key
+        self.speed = speed
+        self.host = host
+        self.port = port
+        self.stats = {"replayed": 0, "recorded": 0, "missing": 0}
+        self._runner: web.AppRunner | None = None
+        self._session: aiohttp.ClientSession | None = None
+        # One upstream request per key, even when identical requests arrive together
+        self._recording: dict[str, asyncio.Future] = {}
+        # Keys recorded by this server run, replayed in every mode
+        self._fresh: set[str] = set()
+
+    @property
+    def base_url(self) -> str:
+        """Base URL to use as OPENAI_BASE_URL."""
+        return f"http://{self.host}:{self.port}/v1"
+
+    async def start(self) -> str:
+        """
+        Start serving.
+
+        Returns:
+            :attr:`base_url`
+        """
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self._chat)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        self.port = self._runner.addresses[0][1]
+        if self.mode != "replay":
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=600))
+        return self.base_url
+
+    async def close(self) -> None:
+        """Stop serving and close the upstream session."""
+        if self._session is not None:
+            await self._session.close()
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def __aenter__(self) -> "ReplayServer":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+
+    async def _record(self, key: str, body: dict[str, Any]) -> tuple[int, dict[str, Any], float]:
+        """Forward a request upstream; successful answers are added to the cassette."""
+        forward = {
+            name: value for name, value in body.items() if name not in ("stream", "stream_options")
+        }
+        headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+        start = time.monotonic()
+        async with self._session.post(
+            f"{self.upstream}/chat/completions", json=forward, headers=headers
+        ) as response:
+            status = response.status
+            payload = await response.json(content_type=None)
+        latency = time.monotonic() - start
+        if status == 200:
+            self.cassette.put(key, payload, latency)
+            self._fresh.add(key)
+            self.stats["recorded"] += 1
+        return status, payload, latency
+
+    async def _chat(self, request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        key = request_key(body)
+        recorded = self.cassette.get(key)
+        if recorded is not None and (self.mode != "record" or key in self._fresh):
+            payload, latency = recorded
+            self.stats["replayed"] += 1
+            await asyncio.sleep(latency * self.speed)
+        elif self.mode == "replay":
+            self.stats["missing"] += 1
+            return web.json_response(
+                {
+                    "error": {
+                        "message": f"Request {key[:12]} is not in {self.cassette.path}",
+                        "type": "not_recorded",
+                    }
+                },
+                status=404,
+            )
+        else:
+            future = self._recording.get(key)
+            if future is None:
+                future = self._recording[key] = asyncio.ensure_future(self._record(key, body))
+                future.add_done_callback(lambda _: self._recording.pop(key, None))
+            status, payload, _ = await asyncio.shield(future)
+            if status != 200:
+                return web.json_response(payload, status=status)
+        if body.get("stream"):
+            return await self._stream(request, body, payload)
+        return web.json_response(payload)
+
+    async def _stream(
+        self, request: web.Request, body: dict[str, Any], payload: dict[str, Any]
+    ) -> web.StreamResponse:
+        """Send a recorded completion as server-sent events."""
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        choice = payload["choices"][0]
+        content = choice["message"].get("content") or ""
+        base = {
+            "id": payload.get("id"),
+            "object": "chat.completion.chunk",
+            "created": payload.get("created", 0),
+            "model": payload.get("model", body["model"]),
+        }
+        chunks = [
+            {
+                **base,
+                "choices": [
+                    {"index": 0, "delta": {"content": content[i : i + 16]}, "finish_reason": None}
+                ],
+            }
+            for i in range(0, len(content), 16)
+        ]
+        chunks.append(
+            {
+                **base,
+                "choices": [
+                    {"index": 0, "delta": {}, "finish_reason": choice.get("finish_reason")}
+                ],
+            }
+        )
+        if (body.get("stream_options") or {}).get("include_usage") and payload.get("usage"):
+            chunks.append({**base, "choices": [], "usage": payload["usage"]})
+        for chunk in chunks:
+            await response.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode())
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
@@ -0,0 +1,487 @@
+"""
+Route completions across several OpenAI-compatible endpoints.
+
+OPENAI_ROUTER names a JSON file listing the endpoints to use instead of the
+single OPENAI_BASE_URL endpoint:
+
+.. code-block:: json
+
+    {
+      "endpoints": [
+        {"name": "hosted", "base_url": "https://api.openai.com/v1",
+         "api_key_env": "OPENAI_API_KEY", "model": "gpt-4o-mini",
+         "rpm": 500, "tpm": 200000},
+        {"name": "vllm", "base_url": "http://gpu1:8000/v1", "api_key": "EMPTY",
+         "model": "Qwen2.5-72B-Instruct", "weight": 3, "max_concurrency": 32},
+        {"name": "small", "base_url": "http://gpu2:8000/v1", "api_key": "EMPTY",
+         "model": "Qwen2.5-7B-Instruct", "stages": ["extractor"]}
+      ],
+      "hedge": {"percentile": 95, "min_samples": 20, "budget": 0.1},
+      "breaker": {"failures": 5, "cooldown": 30}
+    }
+
+Each request goes to the endpoint with the fewest outstanding requests per
+unit of ``weight``. An endpoint with ``stages`` only serves those pipeline
+stages (the ``stage`` label of :mod:`kgai.metrics`), so the cheap extractor
+calls can go to a smaller model; the endpoints without ``stages`` serve
+everything else and take over when the dedicated ones are unavailable.
+
+A request that is still unanswered after the ``percentile`` latency of its
+endpoint and stage is sent a second time to another endpoint (a hedge), and
+the first answer wins. Hedges are capped at ``budget`` of the requests, so a
+slow fleet is not flooded with duplicates; streamed requests are not hedged.
+
+After ``failures`` consecutive 429/5xx/connection errors an endpoint's
+circuit opens and it gets no requests for ``cooldown`` seconds. Then a single
+probe request is let through: success closes the circuit, failure opens it
+again. Failed requests are retried on another endpoint right away.
+
+A request that needs a long context (see TOKEN_BUDGET_STRATEGY=route in
+:mod:`kgai.pipeline`) only goes to endpoints whose ``context`` window holds
+it.
+
+Endpoint fields: ``name``, ``base_url``, ``api_key`` or ``api_key_env``,
+``model``, and optionally ``weight`` (default 1), ``stages``, ``context``
+(default: the model's window from :func:`kgai.tokens.context_limit`),
+``max_concurrency``, ``max_connections``, ``rpm`` and ``tpm`` (defaults from
+the OPENAI_* variables).
+
+Environment variables:
+    OPENAI_ROUTER: Router configuration file (default: single endpoint)
+"""
+
+import json
+import math
+import os
+import random
+import threading
+import time
+from collections import deque
+from collections.abc import Iterable
+from typing import Any
+
+from kgai.tokens import context_limit
+
+# Recent latencies kept per endpoint and stage for the hedge delay
+LATENCY_WINDOW = 200
+
+
+class Backend:
+    """
+    One routed endpoint with its load, latency and circuit state.
+
+    Attributes:
+        name: Endpoint name used in logs and stats
+        base_url: Endpoint base URL
+        api_key: API key
+        model: Model served by the endpoint
+        weight: Share of the load relative to the other endpoints
+        stages: Stages the endpoint is dedicated to (None: general purpose)
+        context: Context window of the model, in tokens (None when unknown)
+        max_concurrency: Requests in flight
+        max_connections: Pooled connections
+        rpm: Requests per minute (0: unlimited)
+        tpm: Tokens per minute (0: unlimited)
+        outstanding: Requests in flight, hedges included
+        requests: Requests sent
+        failures: Requests failed with a retryable error
+        hedges: Hedge requests sent to this endpoint
+        opened_until: Monotonic time the open circuit lets a probe through
+            (None while closed)
+    """
+
+    def __init__(self, config: dict[str, Any]):
+        self.name = config["name"]
+        self.base_url = config["base_url"]
+        api_key_env = config.get("api_key_env")
+        self.api_key = os.getenv(api_key_env) if api_key_env else config.get("api_key")
+        self.model = config["model"]
+        self.weight = float(config.get("weight", 1))
+        stages = config.get("stages")
+        self.stages = tuple(stages) if stages else None
+        self.context: int | None = (
+            int(config["context"]) if "context" in config else context_limit(self.model)
+        )
+        self.max_concurrency = int(
+            config.get("max_concurrency", os.getenv("OPENAI_MAX_CONCURRENCY", "8"))
+        )
+        self.max_connections = int(config.get("max_connections", self.max_concurrency))
+        self.rpm = float(config.get("rpm", os.getenv("OPENAI_RPM", "0")))
+        self.tpm = float(config.get("tpm", os.getenv("OPENAI_TPM", "0")))
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.hedges = 0
+        self.opened_until: float | None = None
+        self._consecutive = 0
+        self._probing = False
+        self._latencies: dict[str, deque[float]] = {}
+
+    def serves(self, stage: str) -> bool:
+        """Return whether the endpoint is dedicated to ``stage``."""
+        return self.stages is not None and stage in self.stages
+
+    def holds(self, tokens: int) -> bool:
+        """Return whether a ``tokens``-token request fits the context window (unknown windows fit)."""
+        return self.context is None or self.context >= tokens
+
+    @property
+    def state(self) -> str:
+        """Circuit state: ``closed``, ``open`` or ``half-open``."""
+        if self.opened_until is None:
+            return "closed"
+        return "open" if time.monotonic() < self.opened_until else "half-open"
+
+    def available(self) -> bool:
+        """Return whether a request may be sent now (closed, or half-open without a probe)."""
+        state = self.state
+        return state == "closed" or (state == "half-open" and not self._probing)
+
+    def latency(self, stage: str, percentile: float) -> tuple[float | None, int]:
+        """Return (``percentile`` latency or None, number of samples) for ``stage``."""
+        samples = sorted(self._latencies.get(stage, ()))
+        if not samples:
+            return None, 0
+        index = min(len(samples) - 1, max(0, math.ceil(percentile / 100 * len(samples)) - 1))
+        return samples[index], len(samples)
+
+
+class Router:
+    """
+    Pick endpoints for completions and track their health.
+
+    Shared by every event loop in the process; the bookkeeping is guarded by a
+    lock, while the pooled clients stay per loop (:func:`kgai.client.get_endpoint`).
+
+    Attributes:
+        backends: Configured endpoints, in file order
+        hedge_percentile: Latency percentile after which a request is hedged
+            (None disables hedging)
+        hedge_min_samples: Latencies needed before an endpoint is hedged
+        hedge_budget: Largest share of requests that may be hedged
+        breaker_failures: Consecutive failures that open a circuit
+        breaker_cooldown: Seconds an open circuit rejects requests
+    """
+
+    def __init__(self, config: dict[str, Any]):
+        endpoints = config.get("endpoints") or []
+        if not endpoints:
+            raise ValueError('router: no "endpoints"')
+        self.backends = [Backend(endpoint) for endpoint in endpoints]
+        names = [backend.name for backend in self.backends]
+        if len(set(names)) != len(names):
+            raise ValueError("router: endpoint names must be unique")
+        if all(backend.stages is not None for backend in self.backends):
+            raise ValueError('router: at least one endpoint must have no "stages"')
+
+        hedge = config.get("hedge", {})
+        if hedge is False:
+            self.hedge_percentile: float | None = None
+            hedge = {}
+        else:
+            self.hedge_percentile = float(hedge.get("percentile", 95))
+        self.hedge_min_samples = int(hedge.get("min_samples", 20))
+        self.hedge_budget = float(hedge.get("budget", 0.1))
+        breaker = config.get("breaker", {})
+        self.breaker_failures = int(breaker.get("failures", 5))
+        self.breaker_cooldown = float(breaker.get("cooldown", 30))
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str) -> "Router":
+        """
+        Load a router configuration file.
+
+        Args:
+            path: JSON file (see the module docstring)
+
+        Returns:
+            Router
+
+        Raises:
+            ValueError: If the configuration is invalid
+            OSError: If the file cannot be read
+        """
+        with open(path, encoding="utf-8") as file:
+            config = json.load(file)
+        try:
+            return cls(config)
+        except (KeyError, TypeError, ValueError) as error:
+            raise ValueError(f"{path}: {error}") from error
+
+    def _pools(self, stage: str, tokens: int = 0) -> tuple[list[Backend], list[Backend]]:
+        """Return (dedicated endpoints, general endpoints) for ``stage`` that hold ``tokens``."""
+        dedicated = [backend for backend in self.backends if backend.serves(stage)]
+        general = [backend for backend in self.backends if backend.stages is None]
+        if tokens and any(backend.holds(tokens) for backend in dedicated + general):
+            dedicated = [backend for backend in dedicated if backend.holds(tokens)]
+            general = [backend for backend in general if backend.holds(tokens)]
+        # When nothing is large enough, the request is left for the API to reject
+        return dedicated, general
+
+    def fits(self, stage: str, tokens: int) -> bool:
+        """Return whether any endpoint that may serve ``stage`` holds a ``tokens``-token request."""
+        return any(backend.holds(tokens) for backend in self.candidates(stage))
+
+    def candidates(self, stage: str, tokens: int = 0) -> list[Backend]:
+        """Return the endpoints that may serve ``stage``, dedicated ones first."""
+        dedicated, general = self._pools(stage, tokens)
+        return dedicated + general
+
+    def model(self, stage: str, tokens: int = 0) -> str:
+        """
+        Return the model name that stands for ``stage`` in cache keys and fingerprints.
+
+        Args:
+            stage: Pipeline stage (empty for unlabelled calls)
+            tokens: Only consider endpoints whose context holds this many tokens
+
+        Returns:
+            The model of the stage's preferred endpoints, ``|``-joined when
+            they serve different models
+        """
+        dedicated, general = self._pools(stage, tokens)
+        return "|".join(sorted({backend.model for backend in dedicated or general}))
+
+    def context(self, stage: str) -> int | None:
+        """Return the smallest known context window among the preferred endpoints of ``stage``."""
+        dedicated, general = self._pools(stage)
+        windows = [
+            backend.context for backend in dedicated or general if backend.context is not None
+        ]
+        return min(windows) if windows else None
+
+    def choose(self, stage: str, exclude: Iterable[Backend] = (), tokens: int = 0) -> Backend:
+        """
+        Pick the endpoint for the next request of ``stage`` and count it as outstanding.
+
+        Dedicated endpoints are preferred over general ones, endpoints with an
+        open circuit and those in ``exclude`` are skipped, and among the rest
+        the one with the fewest outstanding requests per weight wins. When
+        nothing is left, the excluded endpoints are considered again, then the
+        endpoint whose circuit closes soonest.
+
+        Args:
+            stage: Pipeline stage
+            exclude: Endpoints already tried for this request
+            tokens: Only consider endpoints whose context holds this many tokens
+
+        Returns:
+            Backend; pass it to :meth:`finished` when the request ends
+        """
+        exclude = set(exclude)
+        dedicated, general = self._pools(stage, tokens)
+        with self._lock:
+            backend = None
+            for pool, skip in (
+                (dedicated, exclude),
+                (general, exclude),
+                (dedicated + general, set()),
+            ):
+                ready = [item for item in pool if item.available() and item not in skip]
+                if ready:
+                    backend = min(
+                        ready,
+                        key=lambda item: ((item.outstanding + 1) / item.weight, random.random()),
+                    )
+                    break
+            if backend is None:
+                backend = min(dedicated + general, key=lambda item: item.opened_until or 0.0)
+            if backend.state == "half-open":
+                backend._probing = True
+            backend.outstanding += 1
+            backend.requests += 1
+            return backend
+
+    def hedge_delay(self, backend: Backend, stage: str) -> float | None:
+        """
+        Return how long to wait for ``backend`` before hedging a request of ``stage``.
+
+        Args:
+            backend: Endpoint the request was sent to
+            stage: Pipeline stage
+
+        Returns:
+            Seconds, or None when the request should not be hedged (hedging
+            disabled, a single endpoint, too few samples, budget spent)
+        """
+        if self.hedge_percentile is None or len(self.backends) < 2:
+            return None
+        with self._lock:
+            requests = sum(item.requests for item in self.backends)
+            hedges = sum(item.hedges for item in self.backends)
+            if hedges >= self.hedge_budget * requests:
+                return None
+            delay, samples = backend.latency(stage, self.hedge_percentile)
+        return delay if samples >= self.hedge_min_samples else None
+
+    def hedge(self, primary: Backend, stage: str, tokens: int = 0) -> Backend | None:
+        """
+        Pick a second endpoint for a request ``primary`` is slow to answer.
+
+        Args:
+            primary: Endpoint the request was sent to
+            stage: Pipeline stage
+            tokens: Only consider endpoints whose context holds this many tokens
+
+        Returns:
+            Backend counted as outstanding, or None when no other endpoint is
+            available
+        """
+        dedicated, general = self._pools(stage, tokens)
+        with self._lock:
+            ready = [
+                item for item in dedicated + general if item is not primary and item.available()
+            ]
+            if not ready:
+                return None
+            backend = min(
+                ready, key=lambda item: ((item.outstanding + 1) / item.weight, random.random())
+            )
+            if backend.state == "half-open":
+                backend._probing = True
+            backend.outstanding += 1
+            backend.requests += 1
+            backend.hedges += 1
+            return backend
+
+    def finished(
+        self, backend: Backend, stage: str, latency: float | None = None, failed: bool = False
+    ) -> None:
+        """
+        Record the end of a request sent to ``backend``.
+
+        Args:
+            backend: Endpoint from :meth:`choose` or :meth:`hedge`
+            stage: Pipeline stage
+            latency: Seconds to the answer, when it succeeded
+            failed: Whether it failed with a retryable error (counts towards
+                opening the circuit); neither means it was cancelled or
+                rejected as a bad request
+        """
+        with self._lock:
+            backend.outstanding -= 1
+            backend._probing = False
+            if failed:
+                backend.failures += 1
+                backend._consecutive += 1
+                if (
+                    backend.opened_until is not None
+                    or backend._consecutive >= self.breaker_failures
+                ):
+                    reopened = backend.opened_until is not None
+                    backend.opened_until = time.monotonic() + self.breaker_cooldown
+                    if not reopened:
+                        print(
+                            f"Circuit open for {backend.name} after {backend._consecutive} failures "
+                            f"(probing again in {self.breaker_cooldown:g}s)"
+                        )
+            elif latency is not None:
+                if backend.opened_until is not None:
+                    print(f"Circuit closed for {backend.name}")
+                backend.opened_until = None
+                backend._consecutive = 0
+                backend._latencies.setdefault(stage, deque(maxlen=LATENCY_WINDOW)).append(latency)
+
+    def stats(self) -> list[dict[str, Any]]:
+        """Return each endpoint's counters, circuit state and p50/p95 latency over all stages."""
+        rows = []
+        with self._lock:
+            for backend in self.backends:
+                samples = sorted(
+                    value for window in backend._latencies.values() for value in window
+                )
+
+                def percentile(share: float, samples: list[float] = samples) -> float | None:
+                    if not samples:
+                        return None
+                    return samples[
+                        min(len(samples) - 1, max(0, math.ceil(share * len(samples)) - 1))
+                    ]
+
+                rows.append(
+                    {
+                        "name": backend.name,
+                        "model": backend.model,
+                        "state": backend.state,
+                        "outstanding": backend.outstanding,
+                        "requests": backend.requests,
+                        "failures": backend.failures,
+                        "hedges": backend.hedges,
+                        "p50": percentile(0.5),
+                        "p95": percentile(0.95),
+                    }
+                )
+        return rows
+
+    def render(self) -> str:
+        """
+        Return the endpoint counters in the Prometheus text exposition format.
+
+        Returns:
+            Text to append to a ``/metrics`` response
+        """
+        rows = self.stats()
+        lines: list[str] = []
+        for name, kind, help_text, column in (
+            (
+                "kgai_endpoint_requests_total",
+                "counter",
+                "Requests sent to the endpoint, hedges included.",
+                "requests",
+            ),
+            (
+                "kgai_endpoint_failures_total",
+                "counter",
+                "Requests failed with 429/5xx/connection errors.",
+                "failures",
+            ),
+            (
+                "kgai_endpoint_hedges_total",
+                "counter",
+                "Hedge requests sent to the endpoint.",
+                "hedges",
+            ),
+            ("kgai_endpoint_outstanding", "gauge", "Requests in flight.", "outstanding"),
+        ):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for row in rows:
+                lines.append(f'{name}{{endpoint={json.dumps(row["name"])}}} {row[column]}')
+        lines.append("# HELP kgai_endpoint_circuit_open Whether the endpoint's circuit is open.")
+        lines.append("# TYPE kgai_endpoint_circuit_open gauge")
+        for row in rows:
+            lines.append(
+                f'kgai_endpoint_circuit_open{{endpoint={json.dumps(row["name"])}}} '
+                f'{int(row["state"] == "open")}'
+            )
+        return "\n".join(lines) + "\n"
+
+
+_router: Router | None = None
+_router_loaded = False
+_router_lock = threading.Lock()
+
+
+def get_router() -> Router | None:
+    """Return the process-wide router loaded from OPENAI_ROUTER, or None when unset."""
+    global _router, _router_loaded
+    with _router_lock:
+        if not _router_loaded:
+            path = os.getenv("OPENAI_ROUTER")
+            _router = Router.load(path) if path else None
+            _router_loaded = True
+        return _router
+
+
+def use_router(router: Router | None) -> None:
+    """
+    Replace the process-wide router (None routes to the single endpoint again).
+
+    Args:
+        router: Router to use for every following request
+    """
+    global _router, _router_loaded
+    with _router_lock:
+        _router = router
+        _router_loaded = True
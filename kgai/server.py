@@ -0,0 +1,508 @@
+"""
+Asynchronous JSON API for the analysis pipeline.
+
+Endpoints:
+    POST /analyze         Queue one article; ``?wait=true`` answers with the result
+    POST /analyze/batch   Queue several articles at once
+    GET  /jobs/{id}       Job status, and the result once finished
+    GET  /health          Queue and worker state
+    GET  /metrics         Prometheus metrics (:mod:`kgai.metrics`)
+
+Jobs go through one shared queue. A dispatcher takes them in micro-batches
+(up to API_BATCH_SIZE jobs, waiting at most API_BATCH_WAIT seconds to fill
+one) and starts each batch's analyses together, so their identical LLM
+requests (the same article asked for twice, or the same subject in copies
+of a story) reach :func:`kgai.client.submit_async` while the first one is in
+flight and share its answer. A request for an article that is already
+queued or running is merged into the existing job.
+
+Backpressure: at most API_MAX_QUEUE jobs may be waiting; beyond that
+submissions get ``429`` with ``Retry-After``. On shutdown the server stops
+accepting jobs (``503``) and lets queued and running jobs finish for up to
+API_SHUTDOWN_TIMEOUT seconds before cancelling them.
+
+Environment variables:
+    API_HOST: Bind address (default: 127.0.0.1)
+    API_PORT: Port (default: 8000)
+    API_WORKERS: Articles analyzed at the same time (default: 8)
+    API_MAX_QUEUE: Jobs allowed to wait (default: 100)
+    API_BATCH_SIZE: Jobs dispatched together (default: 16)
+    API_BATCH_WAIT: Seconds the dispatcher waits to fill a batch (default: 0.02)
+    API_JOB_TTL: Seconds finished jobs stay queryable (default: 3600)
+    API_SHUTDOWN_TIMEOUT: Seconds to drain jobs on shutdown (default: 60)
+
+Usage:
+    ./prompt.py serve --port 8000
+    curl -X POST localhost:8000/analyze?wait=true -d '{"content": "..."}'
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any
+
+from aiohttp import web
+
+from kgai import pipeline
+from kgai.dedup import analysis_key
+from kgai.metrics import get_metrics
+from kgai.registry import get_registry
+from kgai.router import get_router
+
+DEFAULT_EXTRACTOR = "extractor_v1-2.json"
+DEFAULT_INFERENCER = "inferencer_v8-1.json"
+
+
+class QueueFull(Exception):
+    """Raised when accepting a job would exceed API_MAX_QUEUE."""
+
+
+class Draining(Exception):
+    """Raised when a job is submitted while the server shuts down."""
+
+
+@dataclass
+class Job:
+    """
+    One article analysis requested through the API.
+
+    Attributes:
+        id: Job id
+        key: Article + prompt key; requests with the same key share the job
+        article: Request fields (content, title, configs, keyword files, id)
+        status: ``queued``, ``running``, ``done`` or ``failed``
+        result: Pipeline result once done (records as dictionaries)
+        error: Error message once failed
+        requests: Submissions merged into this job
+    """
+
+    id: str
+    key: str
+    article: dict[str, Any]
+    status: str = "queued"
+    result: dict[str, Any] | None = None
+    error: str | None = None
+    requests: int = 1
+    created: float = field(default_factory=time.time)
+    started: float | None = None
+    finished: float | None = None
+    done: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+    def to_dict(self) -> dict[str, Any]:
+        """Return the JSON shape served by ``GET /jobs/{id}``."""
+        body = {
+            "id": self.id,
+            "article_id": self.article.get("id"),
+            "status": self.status,
+            "requests": self.requests,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+        }
+        if self.status == "done":
+            body["result"] = self.result
+        if self.status == "failed":
+            body["error"] = self.error
+        return body
+
+
+class Scheduler:
+    """
+    Shared job queue with merging, micro-batched dispatch and draining.
+
+    Attributes:
+        workers: Articles analyzed at the same time
+        max_queue: Jobs allowed to wait before submissions are refused
+        batch_size: Jobs dispatched together
+        batch_wait: Seconds to wait for a batch to fill
+        job_ttl: Seconds finished jobs are kept
+    """
+
+    def __init__(
+        self,
+        workers: int = 8,
+        max_queue: int = 100,
+        batch_size: int = 16,
+        batch_wait: float = 0.02,
+        job_ttl: float = 3600,
+    ):
+        self.workers = max(1, workers)
+        self.max_queue = max_queue
+        self.batch_size = max(1, batch_size)
+        self.batch_wait = batch_wait
+        self.job_ttl = job_ttl
+        self.jobs: dict[str, Job] = {}
+        self.draining = False
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._active: dict[str, Job] = {}
+        self._slots = asyncio.Semaphore(self.workers)
+        self._tasks: set = set()
+        self._dispatcher: asyncio.Task | None = None
+
+    @property
+    def queued(self) -> int:
+        """Jobs waiting for a worker."""
+        return sum(1 for job in self._active.values() if job.status == "queued")
+
+    @property
+    def running(self) -> int:
+        """Jobs being analyzed."""
+        return sum(1 for job in self._active.values() if job.status == "running")
+
+    def start(self) -> None:
+        """Start the dispatcher on the running loop."""
+        self._dispatcher = asyncio.ensure_future(self._dispatch())
+
+    def submit_many(self, articles: list[dict[str, Any]]) -> list[Job]:
+        """
+        Queue articles, merging those already queued or running.
+
+        All or none are accepted, so a batch is never half-queued.
+
+        Args:
+            articles: Validated request fields (see :func:`parse_article`)
+
+        Returns:
+            Job per article, in order
+
+        Raises:
+            Draining: If the server is shutting down
+            QueueFull: If the new jobs would exceed ``max_queue``
+        """
+        if self.draining:
+            raise Draining("Server is shutting down")
+        self._expire()
+        keys = [article_key(article) for article in articles]
+        new = len({key for key in keys if key not in self._active})
+        if self.queued + new > self.max_queue:
+            raise QueueFull(f"{self.queued} jobs waiting, limit {self.max_queue}")
+        jobs = []
+        for key, article in zip(keys, articles, strict=True):
+            job = self._active.get(key)
+            if job is not None:
+                job.requests += 1
+            else:
+                job = Job(id=uuid.uuid4().hex, key=key, article=article)
+                self.jobs[job.id] = job
+                self._active[key] = job
+                self._queue.put_nowait(job)
+            jobs.append(job)
+        return jobs
+
+    def _expire(self) -> None:
+        """Forget finished jobs older than ``job_ttl``."""
+        cutoff = time.time() - self.job_ttl
+        for job_id in [
+            job_id for job_id, job in self.jobs.items() if job.finished and job.finished < cutoff
+        ]:
+            del self.jobs[job_id]
+
+    async def _dispatch(self) -> None:
+        """Take jobs in micro-batches and start each batch together."""
+        while True:
+            batch = [await self._queue.get()]
+            deadline = time.monotonic() + self.batch_wait
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except TimeoutError:
+                    break
+            for job in batch:
+                # Waiting for a worker slot here is what pushes back on the queue
+                await self._slots.acquire()
+                task = asyncio.ensure_future(self._run(job))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, job: Job) -> None:
+        article = job.article
+        job.status = "running"
+        job.started = time.time()
+        try:
+            result = await pipeline.analyze_async(
+                article["extractor"],
+                article["inferencer"],
+                article["crime_keywords"],
+                article["judge_keywords"],
+                article["content"],
+                article.get("title"),
+                article_id=article.get("id") or job.id,
+            )
+            job.result = {**result, "records": [record.to_dict() for record in result["records"]]}
+            job.status = "done"
+        except asyncio.CancelledError:
+            job.error = "Cancelled at shutdown"
+            job.status = "failed"
+            raise
+        except Exception as error:
+            job.error = f"{type(error).__name__}: {error}"
+            job.status = "failed"
+            print(f"Job {job.id} failed: {job.error}")
+        finally:
+            job.finished = time.time()
+            self._active.pop(job.key, None)
+            self._slots.release()
+            job.done.set()
+
+    async def drain(self, timeout: float) -> None:
+        """
+        Refuse new jobs and wait for queued and running ones to finish.
+
+        Jobs still unfinished after ``timeout`` seconds are cancelled and
+        marked failed.
+
+        Args:
+            timeout: Seconds to wait
+        """
+        self.draining = True
+        pending = list(self._active.values())
+        print(f"Draining {len(pending)} job(s)...")
+        if pending:
+            waits = [asyncio.ensure_future(job.done.wait()) for job in pending]
+            _, late = await asyncio.wait(waits, timeout=timeout)
+            for wait in late:
+                wait.cancel()
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+        for task in list(self._tasks):
+            task.cancel()
+        for job in self._active.values():
+            if job.status == "queued":
+                job.status, job.error, job.finished = "failed", "Cancelled at shutdown", time.time()
+                job.done.set()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        cancelled = sum(1 for job in pending if job.error == "Cancelled at shutdown")
+        print(f"Drained: {len(pending) - cancelled} job(s) finished, {cancelled} cancelled")
+
+
+def article_key(article: dict[str, Any]) -> str:
+    """Key identifying the same analysis of the same article."""
+    return analysis_key(
+        article["extractor"],
+        article["inferencer"],
+        article["crime_keywords"],
+        article["judge_keywords"],
+        article.get("title") or "",
+        article["content"],
+    )
+
+
+def _keywords(name: str | None, default: str) -> str:
+    """Read a keyword file from samples/ by name (never an arbitrary path)."""
+    name = name or default
+    if name not in os.listdir(pipeline.SAMPLES_DIR) or not name.endswith(".txt"):
+        raise ValueError(f"Unknown keyword file {name!r}")
+    with open(os.path.join(pipeline.SAMPLES_DIR, name), encoding="utf-8") as file:
+        return file.read()
+
+
+def parse_article(body: Any, defaults: dict[str, Any] | None = None) -> dict[str, Any]:
+    """
+    Validate one article from a request body.
+
+    Args:
+        body: JSON object with ``content`` and optionally ``title``, ``id``,
+            ``extractor``, ``inferencer`` (configs from prompts/) and
+            ``crime_keywords``, ``judge_keywords`` (keyword files from samples/)
+        defaults: Values used for fields the article leaves out
+
+    Returns:
+        Article fields with configs checked and keyword files read
+
+    Raises:
+        ValueError: If a field is missing or refers to an unknown file
+    """
+    if not isinstance(body, dict):
+        raise ValueError("Each article must be a JSON object")
+    body = {**(defaults or {}), **body}
+    content = body.get("content")
+    if not isinstance(content, str) or not content.strip():
+        raise ValueError('"content" must be a non-empty string')
+    configs = get_registry(pipeline.PROMPTS_DIR).names()
+    extractor = body.get("extractor") or DEFAULT_EXTRACTOR
+    inferencer = body.get("inferencer") or DEFAULT_INFERENCER
+    for name in (extractor, inferencer):
+        if name not in configs:
+            raise ValueError(f"Unknown prompt config {name!r}")
+    return {
+        "id": body.get("id"),
+        "title": body.get("title"),
+        "content": content,
+        "extractor": extractor,
+        "inferencer": inferencer,
+        "crime_keywords": _keywords(body.get("crime_keywords"), "crime_keywords.txt"),
+        "judge_keywords": _keywords(body.get("judge_keywords"), "judge_keywords.txt"),
+    }
+
+
+def _error(status: int, message: str) -> web.Response:
+    return web.json_response({"error": message}, status=status)
+
+
+async def _read_json(request: web.Request) -> Any:
+    try:
+        return await request.json()
+    except ValueError as error:
+        raise web.HTTPBadRequest(
+            text=json.dumps({"error": "Body must be JSON"}), content_type="application/json"
+        ) from error
+
+
+def _submit(scheduler: Scheduler, articles: list[dict[str, Any]]) -> list[Job]:
+    try:
+        return scheduler.submit_many(articles)
+    except QueueFull as error:
+        raise web.HTTPTooManyRequests(
+            text=json.dumps({"error": str(error)}),
+            content_type="application/json",
+            headers={"Retry-After": "1"},
+        ) from error
+    except Draining as error:
+        raise web.HTTPServiceUnavailable(
+            text=json.dumps({"error": str(error)}), content_type="application/json"
+        ) from error
+
+
+async def analyze(request: web.Request) -> web.Response:
+    """``POST /analyze``: queue one article."""
+    scheduler: Scheduler = request.app["scheduler"]
+    try:
+        article = parse_article(await _read_json(request))
+    except ValueError as error:
+        return _error(400, str(error))
+    job = _submit(scheduler, [article])[0]
+    if request.query.get("wait", "").lower() in ("1", "true", "yes"):
+        await job.done.wait()
+        return web.json_response(job.to_dict(), status=200 if job.status == "done" else 500)
+    return web.json_response(job.to_dict(), status=202, headers={"Location": f"/jobs/{job.id}"})
+
+
+async def analyze_batch(request: web.Request) -> web.Response:
+    """``POST /analyze/batch``: queue ``{"articles": [...]}``; other keys are defaults."""
+    scheduler: Scheduler = request.app["scheduler"]
+    body = await _read_json(request)
+    if (
+        not isinstance(body, dict)
+        or not isinstance(body.get("articles"), list)
+        or not body["articles"]
+    ):
+        return _error(400, '"articles" must be a non-empty list')
+    defaults = {name: value for name, value in body.items() if name != "articles"}
+    try:
+        articles = [parse_article(article, defaults) for article in body["articles"]]
+    except ValueError as error:
+        return _error(400, str(error))
+    jobs = _submit(scheduler, articles)
+    return web.json_response({"jobs": [job.to_dict() for job in jobs]}, status=202)
+
+
+async def get_job(request: web.Request) -> web.Response:
+    """``GET /jobs/{id}``: job status and result."""
+    job = request.app["scheduler"].jobs.get(request.match_info["id"])
+    if job is None:
+        return _error(404, "Unknown job")
+    return web.json_response(job.to_dict())
+
+
+async def health(request: web.Request) -> web.Response:
+    """``GET /health``: queue state."""
+    scheduler: Scheduler = request.app["scheduler"]
+    return web.json_response(
+        {
+            "status": "draining" if scheduler.draining else "ok",
+            "queued": scheduler.queued,
+            "running": scheduler.running,
+            "workers": scheduler.workers,
+            "max_queue": scheduler.max_queue,
+        }
+    )
+
+
+async def metrics(request: web.Request) -> web.Response:
+    """``GET /metrics``: Prometheus text, with the endpoint counters when routing."""
+    text = get_metrics().render()
+    router = get_router()
+    if router is not None:
+        text += router.render()
+    return web.Response(text=text, content_type="text/plain", charset="utf-8")
+
+
+def create_app(
+    scheduler: Scheduler | None = None, shutdown_timeout: float | None = None
+) -> web.Application:
+    """
+    Build the API application.
+
+    Args:
+        scheduler: Job scheduler (default: configured from the environment)
+        shutdown_timeout: Seconds to drain jobs on shutdown
+            (default: API_SHUTDOWN_TIMEOUT or 60)
+
+    Returns:
+        aiohttp application; the scheduler starts with it and drains on shutdown
+    """
+    app = web.Application(client_max_size=16 * 1024 * 1024)
+    app["scheduler"] = scheduler or Scheduler(
+        workers=int(os.getenv("API_WORKERS", "8")),
+        max_queue=int(os.getenv("API_MAX_QUEUE", "100")),
+        batch_size=int(os.getenv("API_BATCH_SIZE", "16")),
+        batch_wait=float(os.getenv("API_BATCH_WAIT", "0.02")),
+        job_ttl=float(os.getenv("API_JOB_TTL", "3600")),
+    )
+    if shutdown_timeout is None:
+        shutdown_timeout = float(os.getenv("API_SHUTDOWN_TIMEOUT", "60"))
+
+    async def on_startup(app: web.Application) -> None:
+        app["scheduler"].start()
+
+    async def on_shutdown(app: web.Application) -> None:
+        await app["scheduler"].drain(shutdown_timeout)
+
+    app.on_startup.append(on_startup)
+    app.on_shutdown.append(on_shutdown)
+    app.router.add_post("/analyze", analyze)
+    app.router.add_post("/analyze/batch", analyze_batch)
+    app.router.add_get("/jobs/{id}", get_job)
+    app.router.add_get("/health", health)
+    app.router.add_get("/metrics", metrics)
+    return app
+
+
+def main(argv: list[str] | None = None) -> int:
+    """
+    Command-line entry point for ``prompt.py serve``.
+
+    Args:
+        argv: Arguments after ``serve`` (defaults to sys.argv)
+
+    Returns:
+        Process exit code
+    """
+    parser = argparse.ArgumentParser(
+        prog="prompt.py serve",
+        description="Serve the analysis pipeline as a JSON API",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument("--host", default=os.getenv("API_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("API_PORT", "8000")))
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Articles analyzed at once (overrides API_WORKERS)",
+    )
+    args = parser.parse_args(argv)
+
+    if args.workers is not None:
+        os.environ["API_WORKERS"] = str(args.workers)
+    # SIGINT/SIGTERM run the shutdown hooks, which drain the queue
+    web.run_app(create_app(), host=args.host, port=args.port, access_log=None)
+    return 0
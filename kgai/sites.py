@@ -0,0 +1,361 @@
+"""
+Config-driven article extraction.
+
+Site configurations follow the ``concept.py`` shape: one entry per host with
+``title``, ``content``, ``reporter`` and any number of ``extra_*`` fields. Each
+field holds a selector or a list of fallback selectors; a selector starting
+with ``/`` or ``(`` is XPath, anything else is CSS. Selectors are compiled to
+``lxml`` XPath objects once when the configuration is loaded, and a page is
+parsed once with ``lxml.html`` no matter how many fields are extracted.
+
+The ``"*"`` entry holds defaults for fields a host does not configure (e.g. a
+generic ``og:title`` fallback for the title).
+
+Parsing is CPU-bound and holds the GIL for most of its time, so it cannot
+scale past one core inside the crawler's process. :class:`ExtractPool` runs
+it in worker processes instead. Each worker compiles the configuration once
+at start-up, receives the raw page bytes, and sends back only the extracted
+text fields. The parsed DOM never crosses the process boundary.
+
+Example:
+    >>> sites = get_sites()
+    >>> article = sites.extract(url, html)
+    >>> article['content']
+
+    >>> with ExtractPool(processes=4) as pool:
+    ...     article = await pool.extract(url, html)
+
+Environment variables:
+    CRAWLER_SITES: Site configuration file (default: sites.json)
+    CRAWLER_PARSE_PROCESSES: Worker processes of :class:`ExtractPool`
+        (default: one per CPU; 0 parses in a thread of the calling process)
+"""
+
+import asyncio
+import codecs
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from urllib.parse import urlparse
+
+from lxml import etree
+from lxml import html as lxml_html
+from lxml.cssselect import CSSSelector
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_SITES = os.path.join(ROOT_DIR, "sites.json")
+DEFAULT_HOST = "*"
+REQUIRED_FIELDS = ["content"]
+
+
+class Selector:
+    """
+    A compiled XPath or CSS selector.
+
+    Attributes:
+        expression: Selector text as written in the configuration
+        kind: ``xpath`` or ``css``
+    """
+
+    def __init__(self, expression: str):
+        self.expression = expression
+        if expression.startswith(("/", "(")):
+            self.kind = "xpath"
+            self._compiled = etree.XPath(expression)
+        else:
+            self.kind = "css"
+            self._compiled = CSSSelector(expression, translator="html")
+
+    def select(self, root: etree._Element) -> list[str]:
+        """
+        Return the non-empty text of every match.
+
+        Elements yield their stripped ``text_content()``; XPath attribute or
+        text results yield the stripped string.
+
+        Args:
+            root: Parsed document
+
+        Returns:
+            Matched text in document order
+        """
+        found = self._compiled(root)
+        if not isinstance(found, list):
+            found = [found]
+        texts = []
+        for item in found:
+            text = item.text_content() if isinstance(item, etree._Element) else str(item)
+            text = text.strip()
+            if text:
+                texts.append(text)
+        return texts
+
+
+@dataclass
+class SiteConfig:
+    """
+    Compiled extraction rules for one host.
+
+    Attributes:
+        host: Host the rules apply to (``netloc`` of the article URL)
+        fields: Fallback selectors per field, tried in order
+    """
+
+    host: str
+    fields: dict[str, list[Selector]] = field(default_factory=dict)
+
+    def extract_tree(self, root: etree._Element) -> dict[str, str | None]:
+        """
+        Extract every configured field from a parsed document.
+
+        The first selector with a non-empty match wins; several matches of
+        that selector (e.g. one per paragraph) are joined with newlines.
+
+        Args:
+            root: Document parsed with ``lxml.html``
+
+        Returns:
+            Text per field, None when no selector matched
+        """
+        result: dict[str, str | None] = {}
+        for name, selectors in self.fields.items():
+            result[name] = None
+            for selector in selectors:
+                texts = selector.select(root)
+                if texts:
+                    result[name] = "\n".join(texts)
+                    break
+        return result
+
+    def extract(self, html: str | bytes, encoding: str | None = None) -> dict[str, str | None]:
+        """
+        Parse ``html`` once and extract every configured field.
+
+        Args:
+            html: Page source; bytes let lxml honour the page's declared charset
+            encoding: Charset from the response's Content-Type, which takes
+                precedence over the page's own declaration (pages served as
+                ``text/html; charset=utf-8`` often declare nothing, and lxml
+                would read them as Latin-1)
+
+        Returns:
+            Text per field, None when no selector matched (every field is
+            None for an empty or blank page)
+        """
+        try:
+            root = lxml_html.fromstring(
+                html, parser=_parser(encoding) if isinstance(html, bytes) else None
+            )
+        except etree.ParserError:
+            # "Document is empty": a 200 response with a blank body
+            return dict.fromkeys(self.fields)
+        return self.extract_tree(root)
+
+
+def _parser(encoding: str | None) -> lxml_html.HTMLParser | None:
+    """HTML parser decoding with ``encoding``; None (the page's own declaration) when unknown."""
+    if not encoding:
+        return None
+    try:
+        return lxml_html.HTMLParser(encoding=codecs.lookup(encoding).name)
+    except LookupError:
+        return None
+
+
+def _compile_field(host: str, name: str, value: None | str | list[str]) -> list[Selector]:
+    if value is None:
+        return []
+    expressions = [value] if isinstance(value, str) else list(value)
+    selectors = []
+    for expression in expressions:
+        try:
+            selectors.append(Selector(expression))
+        except Exception as error:
+            # lxml/cssselect raise several unrelated error types for bad syntax
+            raise ValueError(f"{host}.{name}: invalid selector {expression!r}: {error}") from error
+    return selectors
+
+
+class SiteRegistry:
+    """
+    Compiled site configurations keyed by host.
+
+    Attributes:
+        path: Configuration file the registry was loaded from
+        sites: SiteConfig per host, including the ``"*"`` defaults
+    """
+
+    def __init__(
+        self, config: dict[str, dict[str, None | str | list[str]]], path: str | None = None
+    ):
+        self.path = path
+        defaults = config.get(DEFAULT_HOST, {})
+        self.sites: dict[str, SiteConfig] = {}
+        for host, fields in config.items():
+            merged = {**defaults, **fields}
+            site = SiteConfig(
+                host, {name: _compile_field(host, name, value) for name, value in merged.items()}
+            )
+            if host != DEFAULT_HOST:
+                missing = [name for name in REQUIRED_FIELDS if not site.fields.get(name)]
+                if missing:
+                    raise ValueError(f'{host}: missing required field(s) {", ".join(missing)}')
+            self.sites[host] = site
+
+    def hosts(self) -> list[str]:
+        """Return the configured hosts (without the ``"*"`` defaults)."""
+        return sorted(host for host in self.sites if host != DEFAULT_HOST)
+
+    def for_url(self, url: str) -> SiteConfig | None:
+        """
+        Return the configuration for a URL's host.
+
+        ``netloc`` is matched first (so ports can be configured), then the
+        hostname, then the hostname without a leading ``www.``.
+
+        Args:
+            url: Article URL
+
+        Returns:
+            SiteConfig, or None when the host is not configured
+        """
+        parsed = urlparse(url)
+        hostname = parsed.hostname or ""
+        for key in (parsed.netloc, hostname, hostname.removeprefix("www.")):
+            if key in self.sites and key != DEFAULT_HOST:
+                return self.sites[key]
+        return None
+
+    def extract(
+        self, url: str, html: str | bytes, encoding: str | None = None
+    ) -> dict[str, str | None] | None:
+        """
+        Extract an article with the configuration of its host.
+
+        Args:
+            url: Article URL (selects the site configuration)
+            html: Page source
+            encoding: Charset declared by the response, if any
+
+        Returns:
+            Text per field, or None when the host is not configured
+        """
+        site = self.for_url(url)
+        if site is None:
+            return None
+        return site.extract(html, encoding)
+
+
+def load_sites(path: str) -> SiteRegistry:
+    """
+    Load and compile a site configuration file.
+
+    Args:
+        path: JSON file mapping host to field selectors
+
+    Returns:
+        Compiled SiteRegistry
+
+    Raises:
+        ValueError: If a selector is invalid or a required field is missing
+        OSError: If the file cannot be read
+    """
+    with open(path, encoding="utf-8") as file:
+        return SiteRegistry(json.load(file), path)
+
+
+_sites: dict[str, SiteRegistry] = {}
+
+
+def get_sites(path: str | None = None) -> SiteRegistry:
+    """
+    Return the shared registry for ``path``, compiling it on first use.
+
+    Args:
+        path: Configuration file (default: ``CRAWLER_SITES`` or ``sites.json``
+            in the repository root)
+
+    Returns:
+        SiteRegistry for that file
+    """
+    path = os.path.abspath(path or os.getenv("CRAWLER_SITES") or DEFAULT_SITES)
+    if path not in _sites:
+        _sites[path] = load_sites(path)
+    return _sites[path]
+
+
+# Registry of a pool worker process, loaded by its initializer
+_worker_sites: SiteRegistry | None = None
+
+
+def _init_worker(path: str) -> None:
+    """Compile the site configuration once in a new worker process."""
+    global _worker_sites
+    _worker_sites = get_sites(path)
+
+
+def _extract_in_worker(
+    url: str, html: bytes, encoding: str | None = None
+) -> dict[str, str | None] | None:
+    """Extract one page in a worker process; only the text fields are sent back."""
+    return _worker_sites.extract(url, html, encoding)
+
+
+class ExtractPool:
+    """
+    Extract articles in a pool of worker processes.
+
+    With ``processes=0`` pages are extracted in a thread of the calling
+    process instead, which is what small runs and single-core hosts want.
+
+    Attributes:
+        path: Site configuration file every worker loads
+        processes: Worker processes (0: no pool)
+    """
+
+    def __init__(self, processes: int | None = None, path: str | None = None):
+        self.path = os.path.abspath(path or os.getenv("CRAWLER_SITES") or DEFAULT_SITES)
+        if processes is None:
+            processes = int(os.getenv("CRAWLER_PARSE_PROCESSES", str(os.cpu_count() or 1)))
+        self.processes = max(0, processes)
+        # Fail on a bad configuration here, not in every worker
+        self._sites = get_sites(self.path)
+        self._executor: ProcessPoolExecutor | None = None
+        if self.processes:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.processes,
+                initializer=_init_worker,
+                initargs=(self.path,),
+            )
+
+    def __enter__(self) -> "ExtractPool":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    async def extract(
+        self, url: str, html: bytes, encoding: str | None = None
+    ) -> dict[str, str | None] | None:
+        """
+        Extract an article without blocking the event loop.
+
+        Args:
+            url: Article URL (selects the site configuration)
+            html: Raw page bytes
+            encoding: Charset declared by the response, if any
+
+        Returns:
+            Text per field, or None when the host is not configured
+        """
+        if self._executor is None:
+            return await asyncio.to_thread(self._sites.extract, url, html, encoding)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, _extract_in_worker, url, html, encoding)
+
+    def close(self) -> None:
+        """Stop the worker processes."""
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
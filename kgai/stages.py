@@ -0,0 +1,225 @@
+"""
+Stage outputs stored under a fingerprint of their inputs.
+
+Each pipeline stage output (the extractor's subject list for an article, the
+inferencer's answer for one subject) is stored with the inputs that produced
+it: the article text hash, the prompt template hash, the keywords put into
+the prompt, the model settings and, for the inferencer, the subject and how
+the article was passed. A re-run looks the output up by article, stage and
+item, and reuses it when the fingerprint of the new inputs is unchanged, so
+switching the inferencer prompt re-runs only the inferencer and a new keyword
+list re-runs only the articles whose prompts it changes.
+
+Unlike the completion cache, entries do not depend on the exact rendered
+messages, are never evicted, and keep their inputs, so a planned re-run can
+tell which input made an output stale (:meth:`StageStore.lookup`).
+
+Environment variables:
+    STAGE_STORE_PATH: SQLite file (default: .cache/stages.sqlite3)
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outputs (
+    article TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    item TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    inputs TEXT NOT NULL,
+    output TEXT NOT NULL,
+    created REAL NOT NULL,
+    PRIMARY KEY (article, stage, item)
+) WITHOUT ROWID;
+"""
+
+
+def text_hash(*parts: str | None) -> str:
+    """
+    Return a short hash of some text, for use as a fingerprint input.
+
+    Args:
+        parts: Text pieces (None is hashed as an absent piece)
+
+    Returns:
+        First 16 hex digits of the SHA-256 of the pieces
+    """
+    payload = json.dumps(parts, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def fingerprint(inputs: dict[str, Any]) -> str:
+    """
+    Return the fingerprint of a stage's inputs.
+
+    Args:
+        inputs: JSON-serializable inputs
+
+    Returns:
+        Hex SHA-256 digest
+    """
+    payload = json.dumps(inputs, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def changed_inputs(old: dict[str, Any] | None, new: dict[str, Any]) -> list[str]:
+    """
+    Name the inputs that differ between two runs of a stage.
+
+    Args:
+        old: Inputs of the stored output (None when there is none)
+        new: Inputs of the planned run
+
+    Returns:
+        ``['new']`` without a stored output, otherwise the names of the
+        changed inputs (empty when the output is current)
+    """
+    if old is None:
+        return ["new"]
+    return sorted(name for name in set(old) | set(new) if old.get(name) != new.get(name))
+
+
+@dataclass
+class StoredOutput:
+    """
+    A stage output with the inputs it was computed from.
+
+    Attributes:
+        fingerprint: Fingerprint of ``inputs``
+        inputs: Stage inputs
+        output: Stage output
+    """
+
+    fingerprint: str
+    inputs: dict[str, Any]
+    output: Any
+
+
+class StageStore:
+    """
+    SQLite store of stage outputs, one per (article, stage, item).
+
+    Safe to share between threads; access is serialized with a lock.
+
+    Attributes:
+        path: SQLite database file
+        reused: Outputs returned by :meth:`get` since creation
+        stored: Outputs written by :meth:`put` since creation
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.reused = 0
+        self.stored = 0
+        self._lock = threading.Lock()
+
+        dirname = os.path.dirname(path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def lookup(self, article: str, stage: str, item: str = "") -> StoredOutput | None:
+        """
+        Return the stored output of a stage, current or not.
+
+        Args:
+            article: Article key
+            stage: Stage name (``extract``, ``infer``)
+            item: Item within the stage (the subject for ``infer``)
+
+        Returns:
+            StoredOutput, or None when the stage never ran for this item
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT fingerprint, inputs, output FROM outputs WHERE article = ? AND stage = ? AND item = ?",
+                (article, stage, item),
+            ).fetchone()
+        if row is None:
+            return None
+        return StoredOutput(row[0], json.loads(row[1]), json.loads(row[2]))
+
+    def get(self, article: str, stage: str, item: str, inputs: dict[str, Any]) -> Any | None:
+        """
+        Return the stored output if it was computed from ``inputs``.
+
+        Args:
+            article: Article key
+            stage: Stage name
+            item: Item within the stage
+            inputs: Inputs of the planned run
+
+        Returns:
+            The output, or None when it is missing or stale
+        """
+        stored = self.lookup(article, stage, item)
+        if stored is None or stored.fingerprint != fingerprint(inputs):
+            return None
+        self.reused += 1
+        return stored.output
+
+    def put(self, article: str, stage: str, item: str, inputs: dict[str, Any], output: Any) -> None:
+        """
+        Store a stage output, replacing the previous one for the same item.
+
+        Args:
+            article: Article key
+            stage: Stage name
+            item: Item within the stage
+            inputs: Inputs the output was computed from
+            output: JSON-serializable output
+        """
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO outputs (article, stage, item, fingerprint, inputs, output, created) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    article,
+                    stage,
+                    item,
+                    fingerprint(inputs),
+                    json.dumps(inputs, ensure_ascii=False),
+                    json.dumps(output, ensure_ascii=False),
+                    time.time(),
+                ),
+            )
+            self._conn.commit()
+            self.stored += 1
+
+    def stats(self) -> dict[str, int]:
+        """Return the number of stored outputs per stage."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT stage, COUNT(*) FROM outputs GROUP BY stage"
+            ).fetchall()
+        return {"extract": 0, "infer": 0, **dict(rows)}
+
+    def close(self) -> None:
+        """Close the database."""
+        with self._lock:
+            self._conn.close()
+
+
+def get_stage_store(path: str | None = None) -> StageStore:
+    """
+    Open the stage store configured from the environment.
+
+    Args:
+        path: SQLite file (default: STAGE_STORE_PATH or .cache/stages.sqlite3)
+
+    Returns:
+        StageStore
+    """
+    return StageStore(
+        path or os.getenv("STAGE_STORE_PATH", os.path.join(".cache", "stages.sqlite3"))
+    )
@@ -0,0 +1,619 @@
+"""
+Persistent, queryable store for analysis results.
+
+Every analyzed article is kept in SQLite with its extracted subjects and the
+parsed inferencer fields, indexed for the lookups reviewers make:
+
+- articles about a person or company (exact subject match, or the name
+  anywhere in the title/content through an FTS5 trigram index, which also
+  works for Chinese text without a word segmenter; names and search terms
+  shorter than three characters are found by scanning the articles instead)
+- subjects by crime keyword and/or legal proceeding stage
+  (``洗錢`` at ``起訴``), each kept in its own table with a
+  ``(keyword, subject)`` primary key
+
+- every mention of the same entity across articles: each subject is stored
+  with its :mod:`kgai.entities` key, so ``厲害科技`` in one article and
+  ``厲害科技股份有限公司`` in another are found together
+
+Queries walk those indexes newest-first and stop at ``limit``, so they do not
+slow down as the store grows. Writes are buffered and inserted in one
+transaction per batch of articles; re-adding an article replaces its
+previous analysis.
+
+Environment variables:
+    RESULTS_STORE_PATH: SQLite file (default: outputs/results.sqlite3)
+    RESULTS_STORE_BATCH: Articles buffered before a write (default: 200)
+    RESULTS_STORE_FLUSH_INTERVAL: Seconds a buffered article may wait
+        (default: 5)
+
+Example:
+    >>> store = ResultStore('outputs/results.sqlite3')
+    >>> store.add(article, result)
+    >>> store.flush()
+    >>> store.articles_mentioning('陳柏宽')
+    >>> store.find_subjects(crime='洗錢', progress='起訴')
+    >>> store.entity_names('厲害科技')
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections.abc import Callable
+from typing import Any
+
+from kgai.entities import AliasIndex, get_alias_index
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS articles (
+    rowid INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    url TEXT,
+    title TEXT,
+    content TEXT NOT NULL,
+    extractor TEXT,
+    inferencer TEXT,
+    analyzed REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS subjects (
+    rowid INTEGER PRIMARY KEY,
+    article INTEGER NOT NULL,
+    subject TEXT NOT NULL,
+    entity TEXT,
+    suspected INTEGER,
+    summary TEXT NOT NULL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS subjects_subject ON subjects (subject, article);
+CREATE INDEX IF NOT EXISTS subjects_article ON subjects (article);
+CREATE TABLE IF NOT EXISTS crimes (
+    crime TEXT NOT NULL,
+    subject INTEGER NOT NULL,
+    PRIMARY KEY (crime, subject)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS crimes_subject ON crimes (subject);
+CREATE TABLE IF NOT EXISTS progress (
+    stage TEXT NOT NULL,
+    subject INTEGER NOT NULL,
+    PRIMARY KEY (stage, subject)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS progress_subject ON progress (subject);
+CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5(
+    title, content, content='articles', content_rowid='rowid', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS articles_insert AFTER INSERT ON articles BEGIN
+    INSERT INTO articles_fts (rowid, title, content) VALUES (new.rowid, new.title, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS articles_delete AFTER DELETE ON articles BEGIN
+    INSERT INTO articles_fts (articles_fts, rowid, title, content)
+    VALUES ('delete', old.rowid, old.title, old.content);
+END;
+"""
+
+_ARTICLE_COLUMNS = "a.id, a.url, a.title, a.extractor, a.inferencer, a.analyzed"
+
+# The trigram tokenizer cannot match shorter strings through the index
+_MIN_FTS_LENGTH = 3
+
+
+def _phrase(text: str) -> str:
+    """Quote ``text`` as an FTS5 phrase."""
+    return '"' + text.replace('"', '""') + '"'
+
+
+def _contains(text: str) -> tuple[str, list[Any]]:
+    """
+    Return a condition on articles ``a`` whose title or content contains ``text``.
+
+    Args:
+        text: Substring to find
+
+    Returns:
+        (SQL condition, parameters); the trigram index for three characters
+        or more, a newest-first scan of the articles for shorter text
+    """
+    if len(text) >= _MIN_FTS_LENGTH:
+        return "a.rowid IN (SELECT rowid FROM articles_fts WHERE articles_fts MATCH ?)", [
+            _phrase(text)
+        ]
+    pattern = "%" + text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    return "(a.title LIKE ? ESCAPE '\\' OR a.content LIKE ? ESCAPE '\\')", [pattern, pattern]
+
+
+class ResultStore:
+    """
+    SQLite store of analyzed articles, subjects, crimes and proceeding stages.
+
+    Safe to share between threads; access is serialized with a lock.
+
+    Attributes:
+        path: SQLite database file
+        batch_size: Articles buffered before they are written
+        flush_interval: Seconds after which buffered articles are written on
+            the next :meth:`add`
+        entities: Resolves subject names to entity keys
+        on_write: Called with the ids of the articles of each batch once the
+            batch is committed (e.g. to mark them analyzed elsewhere)
+    """
+
+    def __init__(
+        self,
+        path: str,
+        batch_size: int = 200,
+        flush_interval: float = 5.0,
+        entities: AliasIndex | None = None,
+    ):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.entities = entities or get_alias_index()
+        self._lock = threading.Lock()
+        self._pending: list[tuple[dict[str, Any], dict[str, Any], float]] = []
+        self.on_write: list[Callable[[list[str]], None]] = []
+
+        dirname = os.path.dirname(path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._migrate()
+
+    def _migrate(self) -> None:
+        """Add the entity column to stores created before it existed."""
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(subjects)")]
+        if "entity" not in columns:
+            with self._conn:
+                self._conn.execute("ALTER TABLE subjects ADD COLUMN entity TEXT")
+            self.relink()
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS subjects_entity ON subjects (entity, article)"
+        )
+
+    def relink(self) -> int:
+        """
+        Recompute every subject's entity key, e.g. after the alias file changed.
+
+        Returns:
+            Number of subjects whose key changed
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT rowid, subject, entity FROM subjects").fetchall()
+            changes = [
+                (key, rowid)
+                for rowid, subject, entity in rows
+                for key in (self.entities.resolve(subject),)
+                if key != entity
+            ]
+            with self._conn:
+                self._conn.executemany("UPDATE subjects SET entity = ? WHERE rowid = ?", changes)
+        return len(changes)
+
+    def add(
+        self,
+        article: dict[str, Any],
+        result: dict[str, Any],
+        extractor: str | None = None,
+        inferencer: str | None = None,
+    ) -> bool:
+        """
+        Queue one article's analysis for writing.
+
+        Args:
+            article: Article with ``id``, ``content`` and optional ``url`` and
+                ``title``
+            result: Result of :func:`kgai.pipeline.analyze_async`; records may
+                be :class:`kgai.parser.InferenceRecord` objects or their dicts,
+                and are stored under the matching name of ``subjects``
+            extractor: Extractor configuration the result came from
+            inferencer: Inferencer configuration the result came from
+
+        Returns:
+            True when this call wrote the buffered batch to disk
+        """
+        records = [
+            dict(record) if isinstance(record, dict) else record.to_dict()
+            for record in result["records"]
+        ]
+        # A record belongs to the subject it was requested for, whatever name
+        # the model echoed (that stays in its raw fields)
+        for subject, record in zip(result.get("subjects") or [], records, strict=False):
+            record["subject"] = subject
+        entry = {
+            "id": article["id"],
+            "url": article.get("url"),
+            "title": article.get("title"),
+            "content": article["content"],
+            "extractor": extractor,
+            "inferencer": inferencer,
+        }
+        with self._lock:
+            self._pending.append((entry, {"records": records}, time.time()))
+            due = (
+                len(self._pending) >= self.batch_size
+                or time.time() - self._pending[0][2] >= self.flush_interval
+            )
+            if due:
+                self._write()
+        return due
+
+    def flush(self) -> int:
+        """
+        Write buffered articles now.
+
+        Returns:
+            Number of articles written
+        """
+        with self._lock:
+            return self._write()
+
+    def _write(self) -> int:
+        """Insert the buffered articles in one transaction. Caller holds the lock."""
+        pending, self._pending = self._pending, []
+        if not pending:
+            return 0
+        with self._conn:
+            cursor = self._conn.cursor()
+            for entry, result, added in pending:
+                row = cursor.execute(
+                    "SELECT rowid FROM articles WHERE id = ?", (entry["id"],)
+                ).fetchone()
+                if row is not None:
+                    self._delete(cursor, row[0])
+                cursor.execute(
+                    "INSERT INTO articles (id, url, title, content, extractor, inferencer, analyzed) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        entry["id"],
+                        entry["url"],
+                        entry["title"],
+                        entry["content"],
+                        entry["extractor"],
+                        entry["inferencer"],
+                        added,
+                    ),
+                )
+                article = cursor.lastrowid
+                crimes: list[tuple[str, int]] = []
+                stages: list[tuple[str, int]] = []
+                for record in result["records"]:
+                    suspected = record.get("suspected")
+                    cursor.execute(
+                        "INSERT INTO subjects (article, subject, entity, suspected, summary, error) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (
+                            article,
+                            record["subject"],
+                            self.entities.resolve(record["subject"]),
+                            None if suspected is None else int(suspected),
+                            record.get("summary") or "",
+                            record.get("error"),
+                        ),
+                    )
+                    subject = cursor.lastrowid
+                    crimes.extend(
+                        (crime, subject) for crime in dict.fromkeys(record.get("crimes") or [])
+                    )
+                    stages.extend(
+                        (stage, subject) for stage in dict.fromkeys(record.get("progress") or [])
+                    )
+                cursor.executemany("INSERT INTO crimes (crime, subject) VALUES (?, ?)", crimes)
+                cursor.executemany("INSERT INTO progress (stage, subject) VALUES (?, ?)", stages)
+        for callback in self.on_write:
+            callback([entry["id"] for entry, _, _ in pending])
+        return len(pending)
+
+    @staticmethod
+    def _delete(cursor: sqlite3.Cursor, article: int) -> None:
+        """Remove an article and everything recorded for it."""
+        subjects = "SELECT rowid FROM subjects WHERE article = ?"
+        cursor.execute(f"DELETE FROM crimes WHERE subject IN ({subjects})", (article,))
+        cursor.execute(f"DELETE FROM progress WHERE subject IN ({subjects})", (article,))
+        cursor.execute("DELETE FROM subjects WHERE article = ?", (article,))
+        cursor.execute("DELETE FROM articles WHERE rowid = ?", (article,))
+
+    def get(self, article_id: str) -> dict[str, Any] | None:
+        """
+        Return one stored article with its subjects.
+
+        Args:
+            article_id: Article id
+
+        Returns:
+            Article dictionary with ``content`` and ``subjects``, or None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT a.rowid, {_ARTICLE_COLUMNS}, a.content FROM articles a WHERE a.id = ?",
+                (article_id,),
+            ).fetchone()
+            if row is None:
+                return None
+            subjects = self._subjects("s.article = ?", (row[0],), None)
+        article = self._article(row[1:7])
+        article["content"] = row[7]
+        article["subjects"] = subjects
+        return article
+
+    def articles_mentioning(self, name: str, limit: int = 100) -> list[dict[str, Any]]:
+        """
+        Return articles about ``name`` or mentioning it in the text.
+
+        An article is about ``name`` when one of its subjects is the same
+        entity (``厲害科技`` finds articles about ``厲害科技股份有限公司``).
+        Names shorter than three characters, which the trigram index cannot
+        look up, are found in the text by scanning the articles.
+
+        Args:
+            name: Person or company name
+            limit: Maximum number of articles
+
+        Returns:
+            Article dictionaries, most recently stored first, each with its
+            ``subjects`` that are the same entity as ``name``
+        """
+        entity = self.entities.resolve(name)
+        by_subject = (
+            "SELECT article FROM subjects WHERE subject = ? "
+            "UNION SELECT article FROM subjects WHERE entity = ?"
+        )
+        in_text, params = _contains(name)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT a.rowid, {_ARTICLE_COLUMNS} FROM articles a "
+                f"WHERE a.rowid IN ({by_subject}) OR {in_text} ORDER BY a.rowid DESC LIMIT ?",
+                (name, entity, *params, limit),
+            ).fetchall()
+            articles = []
+            for row in rows:
+                article = self._article(row[1:])
+                article["subjects"] = self._subjects(
+                    "s.article = ? AND (s.subject = ? OR s.entity = ?)",
+                    (row[0], name, entity),
+                    None,
+                )
+                articles.append(article)
+        return articles
+
+    def search(self, text: str, limit: int = 100) -> list[dict[str, Any]]:
+        """
+        Full-text search over article titles and content.
+
+        Args:
+            text: Substring to find; text shorter than three characters (most
+                Chinese crime terms) is found by scanning the articles
+            limit: Maximum number of articles
+
+        Returns:
+            Article dictionaries, most recently stored first
+        """
+        in_text, params = _contains(text)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {_ARTICLE_COLUMNS} FROM articles a WHERE {in_text} ORDER BY a.rowid DESC LIMIT ?",
+                (*params, limit),
+            ).fetchall()
+        return [self._article(row) for row in rows]
+
+    def find_subjects(
+        self,
+        subject: str | None = None,
+        crime: str | None = None,
+        progress: str | None = None,
+        suspected: bool | None = None,
+        limit: int = 100,
+        entity: str | None = None,
+    ) -> list[dict[str, Any]]:
+        """
+        Return subjects matching all the given filters.
+
+        Args:
+            subject: Exact subject name
+            crime: Crime keyword (e.g. ``洗錢``)
+            progress: Legal proceeding keyword (e.g. ``起訴``)
+            suspected: Inferencer verdict
+            limit: Maximum number of subjects
+            entity: Any name of the entity (every variant is matched)
+
+        Returns:
+            Subject dictionaries (subject, entity, suspected, crimes,
+            progress, summary, error and the article's id, url and title),
+            most recently stored first
+        """
+        joins: list[str] = []
+        conditions: list[str] = []
+        params: list[Any] = []
+        if crime is not None:
+            joins.append("JOIN crimes c ON c.subject = s.rowid AND c.crime = ?")
+            params.append(crime)
+        if progress is not None:
+            joins.append("JOIN progress p ON p.subject = s.rowid AND p.stage = ?")
+            params.append(progress)
+        if subject is not None:
+            conditions.append("s.subject = ?")
+            params.append(subject)
+        if entity is not None:
+            conditions.append("s.entity = ?")
+            params.append(self.entities.resolve(entity))
+        if suspected is not None:
+            conditions.append("s.suspected = ?")
+            params.append(int(suspected))
+        # Ordering by the indexed column of the first filter lets SQLite walk
+        # that index newest-first and stop at ``limit`` instead of sorting
+        order = (
+            "c.subject" if crime is not None else "p.subject" if progress is not None else "s.rowid"
+        )
+        with self._lock:
+            return self._subjects(
+                " AND ".join(conditions) or "1", tuple(params), limit, " ".join(joins), order
+            )
+
+    def entity_names(self, name: str) -> list[dict[str, Any]]:
+        """
+        Return the names stored for the entity ``name`` belongs to.
+
+        Args:
+            name: Any name of the entity
+
+        Returns:
+            ``{'subject', 'articles'}`` per stored name, most articles first
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT subject, COUNT(DISTINCT article) FROM subjects WHERE entity = ? "
+                "GROUP BY subject ORDER BY 2 DESC, subject",
+                (self.entities.resolve(name),),
+            ).fetchall()
+        return [{"subject": subject, "articles": articles} for subject, articles in rows]
+
+    def stats(self) -> dict[str, int]:
+        """Return the number of stored articles and subjects."""
+        with self._lock:
+            articles = self._conn.execute("SELECT COUNT(*) FROM articles").fetchone()[0]
+            subjects = self._conn.execute("SELECT COUNT(*) FROM subjects").fetchone()[0]
+        return {"articles": articles, "subjects": subjects, "pending": len(self._pending)}
+
+    @staticmethod
+    def _article(row: tuple[Any, ...]) -> dict[str, Any]:
+        return dict(
+            zip(("id", "url", "title", "extractor", "inferencer", "analyzed"), row, strict=True)
+        )
+
+    def _subjects(
+        self,
+        where: str,
+        params: tuple[Any, ...],
+        limit: int | None,
+        joins: str = "",
+        order: str = "s.rowid",
+    ) -> list[dict[str, Any]]:
+        """Select subjects with their crimes, stages and article. Caller holds the lock."""
+        sql = (
+            "SELECT s.rowid, s.subject, s.suspected, s.summary, s.error, a.id, a.url, a.title, s.entity "
+            f"FROM subjects s {joins} JOIN articles a ON a.rowid = s.article "
+            f"WHERE {where} ORDER BY {order} DESC"
+        )
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        rows = self._conn.execute(sql, params).fetchall()
+        if not rows:
+            return []
+        ids = [row[0] for row in rows]
+        marks = ",".join("?" * len(ids))
+        crimes: dict[int, list[str]] = {}
+        stages: dict[int, list[str]] = {}
+        for rowid, crime in self._conn.execute(
+            f"SELECT subject, crime FROM crimes WHERE subject IN ({marks})", ids
+        ):
+            crimes.setdefault(rowid, []).append(crime)
+        for rowid, stage in self._conn.execute(
+            f"SELECT subject, stage FROM progress WHERE subject IN ({marks})", ids
+        ):
+            stages.setdefault(rowid, []).append(stage)
+        return [
+            {
+                "subject": row[1],
+                "entity": row[8],
+                "suspected": None if row[2] is None else bool(row[2]),
+                "crimes": crimes.get(row[0], []),
+                "progress": stages.get(row[0], []),
+                "summary": row[3],
+                "error": row[4],
+                "article": {"id": row[5], "url": row[6], "title": row[7]},
+            }
+            for row in rows
+        ]
+
+    def close(self) -> None:
+        """Write buffered articles and close the database."""
+        with self._lock:
+            self._write()
+            self._conn.close()
+
+
+def get_store(path: str | None = None) -> ResultStore:
+    """
+    Open the results store configured from the environment.
+
+    Args:
+        path: SQLite file (default: RESULTS_STORE_PATH or outputs/results.sqlite3)
+
+    Returns:
+        ResultStore
+    """
+    return ResultStore(
+        path=path or os.getenv("RESULTS_STORE_PATH", os.path.join("outputs", "results.sqlite3")),
+        batch_size=int(os.getenv("RESULTS_STORE_BATCH", "200")),
+        flush_interval=float(os.getenv("RESULTS_STORE_FLUSH_INTERVAL", "5")),
+    )
+
+
+def main(argv: list[str] | None = None) -> int:
+    """
+    Command-line entry point for ``prompt.py results``.
+
+    Args:
+        argv: Arguments after ``results`` (defaults to sys.argv)
+
+    Returns:
+        Process exit code
+    """
+    parser = argparse.ArgumentParser(
+        prog="prompt.py results",
+        description="Query stored analysis results",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument("--store", default=None, help="Results store (default: RESULTS_STORE_PATH)")
+    parser.add_argument(
+        "--mentioning", help="Articles with this subject or mentioning it in the text"
+    )
+    parser.add_argument("--search", help="Articles containing this text")
+    parser.add_argument(
+        "--names", help="Names stored for the entity of this name, with article counts"
+    )
+    parser.add_argument("--entity", help="Subjects that are the same entity as this name")
+    parser.add_argument("--subject", help="Subjects with this exact name")
+    parser.add_argument("--crime", help="Subjects with this crime keyword")
+    parser.add_argument("--progress", help="Subjects at this legal proceeding stage")
+    parser.add_argument("--suspected", choices=("yes", "no"), help="Subjects with this verdict")
+    parser.add_argument("--limit", type=int, default=20, help="Maximum rows")
+    parser.add_argument(
+        "--relink", action="store_true", help="Recompute entity keys (after ENTITY_ALIASES changed)"
+    )
+    args = parser.parse_args(argv)
+
+    store = get_store(args.store)
+    try:
+        if args.relink:
+            print(f"Relinked {store.relink()} subject(s)")
+        start = time.perf_counter()
+        if args.names:
+            rows = store.entity_names(args.names)
+        elif args.mentioning:
+            rows = store.articles_mentioning(args.mentioning, limit=args.limit)
+        elif args.search:
+            rows = store.search(args.search, limit=args.limit)
+        elif args.subject or args.entity or args.crime or args.progress or args.suspected:
+            suspected = None if args.suspected is None else args.suspected == "yes"
+            rows = store.find_subjects(
+                args.subject,
+                args.crime,
+                args.progress,
+                suspected,
+                limit=args.limit,
+                entity=args.entity,
+            )
+        else:
+            print(json.dumps(store.stats(), ensure_ascii=False))
+            return 0
+        elapsed = time.perf_counter() - start
+    finally:
+        store.close()
+    for row in rows:
+        print(json.dumps(row, ensure_ascii=False))
+    print(f"{len(rows)} row(s) in {elapsed * 1000:.1f} ms")
+    return 0
@@ -0,0 +1,301 @@
+"""
+Local token counting and per-model context limits.
+
+Prompts are measured before they are sent, so an article that would push a
+prompt past the model's context window is handled (see TOKEN_BUDGET_STRATEGY
+in :mod:`kgai.pipeline`) instead of failing at the API after the request was
+queued and paid for in latency.
+
+Counting uses ``tiktoken`` when it is installed and its encoding can be
+loaded (the BPE file is downloaded once and cached; point TIKTOKEN_CACHE_DIR
+at a copy for offline hosts). Otherwise an estimate is used: one token per
+CJK or other non-ASCII character, and one per four characters of ASCII
+words. :func:`count_tokens` keeps counts in an LRU cache for the texts that
+recur in every prompt (the keyword lists and the static parts of the prompt
+templates), so they are only counted once; article text is counted with
+:func:`measure_tokens`, which does not fill the cache.
+
+Environment variables:
+    TOKENIZER: tiktoken encoding (default: cl100k_base), or ``estimate``
+    TOKEN_CACHE_SIZE: Texts whose counts are cached (default: 1024)
+    TOKEN_CONTEXT_LIMIT: Context window of models not listed below
+        (default: none; prompts for unknown models are not checked)
+    TOKEN_CONTEXT_LIMITS: JSON object of model name (or name prefix) to
+        context window, added to the built-in table. Names match without
+        regard to case or to an organization prefix (``Qwen/``)
+    TOKEN_RESERVE: Tokens kept free for the answer (default: 1024)
+
+Example:
+    >>> count_tokens('檢方依詐欺罪嫌起訴')
+    >>> context_limit('gpt-4o-mini')
+    128000
+"""
+
+import json
+import math
+import os
+import re
+import threading
+from functools import lru_cache
+from typing import Any
+
+# Context windows of common models; the longest matching prefix of the
+# lowercased name after its last "/" wins
+CONTEXT_LIMITS = {
+    "gpt-3.5-turbo": 16385,
+    "gpt-35-turbo": 16385,
+    "gpt-4": 8192,
+    "gpt-4-32k": 32768,
+    "gpt-4-turbo": 128000,
+    "gpt-4o": 128000,
+    "gpt-4.1": 1047576,
+    "o1": 200000,
+    "o3": 200000,
+    "o4-mini": 200000,
+    "qwen2.5": 32768,
+    "llama-3.1": 131072,
+    "meta-llama-3.1": 131072,
+}
+
+# Tokens the chat format adds per message and per request
+MESSAGE_OVERHEAD = 4
+REQUEST_OVERHEAD = 3
+
+_ASCII_WORD = re.compile(r"[A-Za-z0-9]+")
+_ASCII_OTHER = re.compile(r"[!-/:-@\[-`{-~]")
+
+
+def _estimate(text: str) -> int:
+    """Token estimate without a tokenizer (CJK text: about one token per character)."""
+    non_ascii = sum(1 for char in text if ord(char) > 127)
+    words = sum(math.ceil(len(word) / 4) for word in _ASCII_WORD.findall(text))
+    return non_ascii + words + len(_ASCII_OTHER.findall(text))
+
+
+class Tokenizer:
+    """
+    Token counter; :meth:`count` caches counts, :meth:`measure` does not.
+
+    Attributes:
+        name: tiktoken encoding name, or ``estimate``
+        exact: True when counting with tiktoken
+    """
+
+    def __init__(self, encoding: str = "cl100k_base", cache_size: int = 1024):
+        self._encoding: Any = None
+        if encoding != "estimate":
+            try:
+                import tiktoken
+
+                self._encoding = tiktoken.get_encoding(encoding)
+            except ImportError:
+                pass
+            except Exception as error:
+                # e.g. the BPE file is not cached and there is no network
+                print(
+                    f"Tokenizer {encoding} unavailable ({type(error).__name__}: {error}); "
+                    f"estimating token counts"
+                )
+        self.name = encoding if self._encoding is not None else "estimate"
+        self.exact = self._encoding is not None
+        self.count = lru_cache(maxsize=cache_size)(self.measure)
+
+    def measure(self, text: str) -> int:
+        """Count the tokens of a text without the cache."""
+        if self._encoding is None:
+            return _estimate(text)
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text: str, tokens: int) -> str:
+        """
+        Return the longest prefix of ``text`` that fits in ``tokens``.
+
+        Args:
+            text: Text to shorten
+            tokens: Token budget
+
+        Returns:
+            ``text`` itself when it fits
+        """
+        if tokens <= 0:
+            return ""
+        if self.measure(text) <= tokens:
+            return text
+        if self._encoding is not None:
+            encoded = self._encoding.encode(text, disallowed_special=())
+            # A multi-byte character cut in half decodes to U+FFFD
+            return self._encoding.decode(encoded[:tokens]).rstrip("\ufffd")
+        low, high = 0, len(text)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if _estimate(text[:middle]) <= tokens:
+                low = middle
+            else:
+                high = middle - 1
+        return text[:low]
+
+    def stats(self) -> dict[str, int]:
+        """Return the count cache's hits, misses and size."""
+        info = self.count.cache_info()
+        return {"hits": info.hits, "misses": info.misses, "size": info.currsize}
+
+
+_tokenizer: Tokenizer | None = None
+_lock = threading.Lock()
+
+
+def get_tokenizer() -> Tokenizer:
+    """Return the shared tokenizer configured by TOKENIZER and TOKEN_CACHE_SIZE."""
+    global _tokenizer
+    if _tokenizer is None:
+        with _lock:
+            if _tokenizer is None:
+                _tokenizer = Tokenizer(
+                    os.getenv("TOKENIZER", "cl100k_base"),
+                    int(os.getenv("TOKEN_CACHE_SIZE", "1024")),
+                )
+    return _tokenizer
+
+
+def count_tokens(text: str) -> int:
+    """
+    Count the tokens of a recurring text (template part, keyword list), cached.
+
+    Args:
+        text: Text to count
+
+    Returns:
+        Number of tokens (estimated when tiktoken is unavailable)
+    """
+    return get_tokenizer().count(text)
+
+
+def measure_tokens(text: str) -> int:
+    """
+    Count the tokens of a one-off text (an article, a rendered prompt), uncached.
+
+    Args:
+        text: Text to count
+
+    Returns:
+        Number of tokens (estimated when tiktoken is unavailable)
+    """
+    return get_tokenizer().measure(text)
+
+
+def prompt_tokens(*messages: str) -> int:
+    """
+    Count the prompt tokens of a request's messages, chat format included, cached.
+
+    Meant for the parts of a prompt that recur (templates with the keywords
+    bound); measure article text separately with :func:`measure_tokens`.
+
+    Args:
+        messages: Message contents (system prompt, user prompt)
+
+    Returns:
+        Number of prompt tokens
+    """
+    return (
+        sum(count_tokens(message) for message in messages)
+        + len(messages) * MESSAGE_OVERHEAD
+        + REQUEST_OVERHEAD
+    )
+
+
+def split_tokens(text: str, tokens: int, sentences: list[str] | None = None) -> list[str]:
+    """
+    Split a text into consecutive pieces of at most ``tokens`` tokens.
+
+    Pieces end at sentence boundaries; a sentence longer than the budget is
+    cut on its own.
+
+    Args:
+        text: Text to split
+        tokens: Token budget per piece
+        sentences: ``text`` already split into sentences (default: split
+            with :func:`kgai.context.split_sentences`)
+
+    Returns:
+        Pieces in order; joined, they give back ``text``
+    """
+    if sentences is None:
+        from kgai.context import split_sentences
+
+        sentences = split_sentences(text)
+    tokenizer = get_tokenizer()
+    pieces: list[str] = []
+    current = ""
+    used = 0
+    for sentence in sentences:
+        cost = tokenizer.measure(sentence)
+        while cost > tokens:
+            head = tokenizer.truncate(sentence, tokens) or sentence[0]
+            if current:
+                pieces.append(current)
+                current, used = "", 0
+            pieces.append(head)
+            sentence = sentence[len(head) :]
+            cost = tokenizer.measure(sentence)
+        if current and used + cost > tokens:
+            pieces.append(current)
+            current, used = "", 0
+        current += sentence
+        used += cost
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def _model_key(name: str) -> str:
+    """Lookup form of a model name: ``Qwen/Qwen2.5-72B-Instruct`` -> ``qwen2.5-72b-instruct``."""
+    return name.strip().rsplit("/", 1)[-1].lower()
+
+
+def _limits() -> dict[str, int]:
+    limits = dict(CONTEXT_LIMITS)
+    extra = os.getenv("TOKEN_CONTEXT_LIMITS")
+    if extra:
+        limits.update({_model_key(name): int(value) for name, value in json.loads(extra).items()})
+    return limits
+
+
+_unknown: set[str] = set()
+
+
+def context_limit(model: str) -> int | None:
+    """
+    Return the context window of a model, in tokens.
+
+    Args:
+        model: Model name (``gpt-35-turbo``, ``Qwen/Qwen2.5-72B-Instruct``);
+            ``|``-joined names (a router stage served by several models)
+            give the smallest of their windows
+
+    Returns:
+        The window of the longest matching name in TOKEN_CONTEXT_LIMITS or
+        the built-in table, TOKEN_CONTEXT_LIMIT for unknown models, None
+        when that is not set either (a warning is printed once per model)
+    """
+    limits = _limits()
+    default = os.getenv("TOKEN_CONTEXT_LIMIT")
+    windows = []
+    for name in model.split("|"):
+        key = _model_key(name)
+        matches = [prefix for prefix in limits if key.startswith(prefix)]
+        if matches:
+            windows.append(limits[max(matches, key=len)])
+        elif default:
+            windows.append(int(default))
+        elif name not in _unknown:
+            _unknown.add(name)
+            print(
+                f"Context window of model {name!r} is unknown; its prompts are sent without a "
+                f"token budget (set TOKEN_CONTEXT_LIMITS or TOKEN_CONTEXT_LIMIT)"
+            )
+    return min(windows) if windows else None
+
+
+def token_reserve() -> int:
+    """Return the tokens kept free for the answer (TOKEN_RESERVE)."""
+    return int(os.getenv("TOKEN_RESERVE", "1024"))
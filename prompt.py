@@ -2,30 +2,50 @@
 """
 News Inferencer - AI-powered legal liability analysis for news articles.
 
-This module provides the command-line interface and core API client for
-interacting with OpenAI's GPT models to perform legal analysis on news content.
+This module provides the command-line interface and the ``submit`` entry points
+for interacting with OpenAI's GPT models to perform legal analysis on news content.
+The client itself is implemented in :mod:`kgai.client`.
 
 Supports custom OpenAI-compatible API endpoints via environment variables.
 """
 
-import os
 import argparse
+import sys
+
 from dotenv import load_dotenv
-import json
-from typing import Dict, List, Any, Optional
-from openai import OpenAI
 
 # Load from .env
 load_dotenv()
 
-# Initialize OpenAI client with support for custom base URL
-client = OpenAI(
-    api_key=os.getenv('OPENAI_API_KEY'),
-    base_url=os.getenv('OPENAI_BASE_URL')  # None defaults to official API
-)
+# The API client lives in kgai.client (async, connection-pooled); re-export the
+# entry points so existing callers keep using prompt.submit()
+from kgai.client import submit, submit_async, submit_many  # noqa: E402,F401
+from kgai.registry import Template, load_config  # noqa: E402
 
 
-def prompt_conversion(prompt: str, keys: List[str], inputs: Dict[str, str]) -> str:
+def read_inputs(keys: list[str], inputs: dict[str, str | None]) -> dict[str, str]:
+    """
+    Read each input file once.
+
+    Args:
+        keys: Variable names declared by the prompt configuration
+        inputs: Dictionary mapping variable names to file paths (None if not given)
+
+    Returns:
+        Dictionary mapping variable names to file contents; variables without
+        a file are left out and stay as ``$name`` in the rendered prompt
+    """
+    contents = {}
+    for key in keys:
+        if inputs.get(key) is None:
+            print("Can not find the key: ", key)
+            continue
+        with open(inputs[key], encoding='utf-8') as file:
+            contents[key] = file.read()
+    return contents
+
+
+def prompt_conversion(prompt: str, keys: list[str], inputs: dict[str, str]) -> str:
     """
     Replace placeholder variables in prompt template with actual content from files.
     
@@ -43,61 +63,25 @@ def prompt_conversion(prompt: str, keys: List[str], inputs: Dict[str, str]) -> s
         >>> inputs = {'news_content': 'samples/news.txt'}
         >>> result = prompt_conversion(template, keys, inputs)
     """
-    final_prompt = prompt
-    for key in keys:
-        with open(inputs[key]) as file:
-            c = file.read()  # content
-        final_prompt = final_prompt.replace(f'${key}', c)
-    return final_prompt
-
-
-def submit(system_content: str, user_content: str) -> Dict[str, Any]:
-    """
-    Send prompts to OpenAI API and get completion response.
-    
-    Uses the ChatCompletion API with temperature=0.0 for deterministic output,
-    which is ideal for legal analysis requiring consistent results.
-    
-    Supports custom API endpoints via OPENAI_BASE_URL environment variable,
-    allowing integration with Azure OpenAI, LocalAI, and other compatible services.
-    
-    Args:
-        system_content: System role prompt defining AI behavior and expertise
-        user_content: User prompt containing the specific task and input data
-        
-    Returns:
-        Dictionary containing OpenAI API response with structure:
-            - choices: List of completion choices with messages
-            - usage: Token usage statistics
-            - model: Model used for completion
-            
-    Example:
-        >>> response = submit(
-        ...     system_content="You are a legal analyst.",
-        ...     user_content="Analyze this article..."
-        ... )
-        >>> result = response['choices'][0]['message']['content']
-    """
-    # Get model and temperature from environment or use defaults
-    model = os.getenv('OPENAI_MODEL', 'gpt-3.5-turbo')
-    temperature = float(os.getenv('OPENAI_TEMPERATURE', '0.0'))
-    
-    response = client.chat.completions.create(
-        model=model,
-        messages=[
-            {"role": "system", "content": system_content},
-            {"role": "user", "content": user_content},
-        ],
-        temperature=temperature
-    )
-    
-    # Convert response to dictionary for backward compatibility
-    return response.model_dump()
+    return Template(prompt, set(keys)).render(read_inputs(keys, inputs))
 
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == 'batch':
+        from kgai.batch import main as batch_main
+        sys.exit(batch_main(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == 'serve':
+        from kgai.server import main as serve_main
+        sys.exit(serve_main(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == 'results':
+        from kgai.store import main as results_main
+        sys.exit(results_main(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == 'crawl':
+        from kgai.flow import main as crawl_main
+        sys.exit(crawl_main(sys.argv[2:]))
+
     print("Program start")
-    
+
     # Parse the arguments
     parser = argparse.ArgumentParser(
         description='OpenAI News Inferencer - AI-powered legal analysis for news articles',
@@ -109,7 +93,7 @@ if __name__ == "__main__":
         required=True,
         help='Path to prompt configuration JSON file (ex. --config prompts/inferencer_v8.json)'
     )
-    
+
     # Input arguments
     parser.add_argument('--target', type=str, default=None, help="Target subject to analyze")
     parser.add_argument('--news-title', type=str, default=None, help="Path to news title file")
@@ -118,48 +102,16 @@ if __name__ == "__main__":
     parser.add_argument('--judge-keywords', type=str, default=None, help="Path to legal proceeding keywords file")
     args = parser.parse_args()
 
-    dirname = os.path.dirname(args.config)
-    
-    # args = parser.parse_args(args=[]) # Jupyter
-    # Load configurations
-    with open(args.config) as file:
-        prompt_config = json.load(file)
-    print(f"You're using '{prompt_config['name']}'")
-
-
-    # Define the prompt for generating text
-    prompt_mode = 0
-    if 'file' in prompt_config:
-        mode = 1
-        prompt_file = os.path.join(dirname, prompt_config['file'])
-        with open(prompt_file, encoding='utf-8') as file:
-            prompt = file.read()
-        # print(prompt)
-    elif 'files' in prompt_config:
-        mode = 2
-        prompt_files = dict()
-        files = prompt_config['files']
-        for key in files:
-            pfile = os.path.join(dirname, files[key])
-            with open(pfile, encoding='utf8') as file:
-                prompt_files[key] = file.read()
-    else:
-        print("=== Cannot get the prompt file(s) ===")
-        exit(1)
-
-
-    if mode == 1:
-        prompt_conversion(prompt=prompt, keys=prompt_config['inputs'], inputs=vars(args))
-    elif mode == 2:
-        for key in prompt_files:
-            p = prompt_files[key]
-            # print(key, p)
-            prompt_files[key] = prompt_conversion(
-                prompt=p,
-                keys=prompt_config['inputs'],
-                inputs=vars(args)
-            )
-        # print(prompt_files)
+    # Load configurations; templates are validated and pre-split once
+    prompt_config = load_config(args.config)
+    print(f"You're using '{prompt_config.name}'")
+    for problem in prompt_config.problems:
+        print(f"Warning: {problem}")
+
+    # Each input file is read once and shared by every template
+    prompt_files = prompt_config.render(read_inputs(list(prompt_config.inputs), vars(args)))
+
+    if 'system' in prompt_files and 'user' in prompt_files:
         result = submit(
             system_content=prompt_files['system'],
             user_content=prompt_files['user']
@@ -170,4 +122,3 @@ if __name__ == "__main__":
         print("=" * 20)
     else:
         print("Not Ready")
-    # exit()
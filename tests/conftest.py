@@ -0,0 +1,134 @@
+"""Shared fixtures: local aiohttp servers standing in for news sites and API endpoints."""
+
+import asyncio
+import os
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+import pytest_asyncio
+from aiohttp import web
+
+from kgai import cache, client, router
+
+
+@pytest_asyncio.fixture
+async def serve() -> Callable[[web.Application], Awaitable[str]]:
+    """Start aiohttp applications on free local ports; returns their base URLs."""
+    runners: list[web.AppRunner] = []
+
+    async def start(app: web.Application) -> str:
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", 0).start()
+        runners.append(runner)
+        host, port = runner.addresses[0][:2]
+        return f"http://{host}:{port}"
+
+    yield start
+    for runner in runners:
+        await runner.cleanup()
+
+
+class ChatAPI:
+    """
+    Fake OpenAI-compatible chat completion endpoint.
+
+    Answers ``answer: <user prompt>`` after ``delay`` seconds. The first
+    ``failures`` requests get ``status`` instead, with a ``Retry-After``
+    header when ``retry_after`` is set.
+
+    Attributes:
+        url: Base URL to configure the client with (set once started)
+        requests: Request bodies received, in order
+        peak: Most requests handled at the same time
+    """
+
+    def __init__(
+        self,
+        delay: float = 0.0,
+        failures: int = 0,
+        status: int = 503,
+        retry_after: str | None = None,
+    ):
+        self.delay = delay
+        self.failures = failures
+        self.status = status
+        self.retry_after = retry_after
+        self.url = ""
+        self.requests: list[dict[str, Any]] = []
+        self.peak = 0
+        self._active = 0
+
+    @property
+    def models(self) -> dict[str, int]:
+        """Requests received per model."""
+        counts: dict[str, int] = {}
+        for body in self.requests:
+            counts[body["model"]] = counts.get(body["model"], 0) + 1
+        return counts
+
+    async def chat(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        self.requests.append(body)
+        if self.failures:
+            self.failures -= 1
+            headers = {"Retry-After": self.retry_after} if self.retry_after else None
+            return web.json_response(
+                {"error": {"message": "fake failure"}}, status=self.status, headers=headers
+            )
+        self._active += 1
+        self.peak = max(self.peak, self._active)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self._active -= 1
+        return web.json_response(
+            {
+                "id": f"fake-{len(self.requests)}",
+                "object": "chat.completion",
+                "created": 0,
+                "model": body["model"],
+                "choices": [
+                    {
+                        "index": 0,
+                        "finish_reason": "stop",
+                        "message": {
+                            "role": "assistant",
+                            "content": "answer: " + body["messages"][-1]["content"],
+                        },
+                    }
+                ],
+                "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+            }
+        )
+
+
+@pytest_asyncio.fixture
+async def chat_api(serve, monkeypatch, tmp_path) -> Callable[..., Awaitable[ChatAPI]]:
+    """
+    Start fake chat completion endpoints; the first one started is OPENAI_BASE_URL.
+
+    The completion cache is off (OPENAI_CACHE=1 turns on a fresh one under
+    ``tmp_path``), no router is set, and the pooled clients of the test's
+    event loop are closed afterwards.
+    """
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv("OPENAI_MODEL", "test-model")
+    monkeypatch.setenv("OPENAI_CACHE", "0")
+    monkeypatch.setenv("OPENAI_CACHE_PATH", str(tmp_path / "completions.sqlite3"))
+    monkeypatch.delenv("OPENAI_BASE_URL", raising=False)
+    monkeypatch.setattr(cache, "_default_cache", None)
+    monkeypatch.setattr(router, "_router", None)
+    monkeypatch.setattr(router, "_router_loaded", True)
+
+    async def start(**behavior: Any) -> ChatAPI:
+        api = ChatAPI(**behavior)
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", api.chat)
+        api.url = await serve(app) + "/v1"
+        monkeypatch.setenv("OPENAI_BASE_URL", os.environ.get("OPENAI_BASE_URL") or api.url)
+        return api
+
+    yield start
+    for endpoint in client._endpoints.pop(asyncio.get_running_loop(), {}).values():
+        await endpoint.aclose()
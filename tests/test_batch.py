@@ -0,0 +1,124 @@
+"""Tests for batch analysis."""
+
+import asyncio
+import csv
+import json
+import os
+
+from kgai import pipeline, router
+from kgai.batch import ResultWriter, main, read_checkpoint, run_batch
+from kgai.dedup import DuplicateIndex
+from kgai.parser import InferenceRecord
+
+ARTICLE = {"id": "a1", "url": "https://news.example/a1", "title": "標題", "content": "內容"}
+SAMPLE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "samples", "case1"
+)
+
+
+def _result():
+    # The model echoed a paraphrased name; the requested subject is 王大明
+    record = InferenceRecord(
+        "X", suspected=True, crimes=["詐欺"], raw={"subject": "X", "suspected": "是"}
+    )
+    return {"subjects": ["王大明"], "records": [record], "inferences": ["..."]}
+
+
+def test_writer_uses_the_requested_subjects(tmp_path):
+    for name in ("results.jsonl", "results.csv"):
+        writer = ResultWriter(str(tmp_path / name), str(tmp_path / f"{name}.done"))
+        writer.write(ARTICLE, _result())
+        writer.close()
+    line = json.loads((tmp_path / "results.jsonl").read_text(encoding="utf-8"))
+    assert line["records"][0]["subject"] == "王大明"
+    assert line["records"][0]["raw"]["subject"] == "X"
+    with open(tmp_path / "results.csv", encoding="utf-8") as file:
+        rows = list(csv.reader(file))
+    assert rows[1][:3] == [ARTICLE["url"], "王大明", "是"]
+
+
+def _analyzed(monkeypatch):
+    """Replace the pipeline with a stub; returns the ids it analyzed, in order."""
+    calls = []
+
+    async def analyze_async(*args, article_id=None, stages=None):
+        calls.append(article_id)
+        return _result()
+
+    monkeypatch.setattr(pipeline, "analyze_async", analyze_async)
+    return calls
+
+
+def _run(tmp_path, articles, index):
+    writer = ResultWriter(str(tmp_path / "results.jsonl"), str(tmp_path / "results.checkpoint"))
+    try:
+        return asyncio.run(
+            run_batch(
+                articles, writer, "extractor.json", "inferencer.json", "詐欺", "起訴", dedup=index
+            )
+        )
+    finally:
+        writer.close()
+
+
+def test_duplicates_reuse_only_analyses_made_with_the_same_model(tmp_path, monkeypatch):
+    monkeypatch.setattr(router, "_router", None)
+    monkeypatch.setattr(router, "_router_loaded", True)
+    calls = _analyzed(monkeypatch)
+    with open(os.path.join(SAMPLE, "news_content.txt"), encoding="utf-8") as file:
+        content = file.read()
+    copies = [{**ARTICLE, "id": f"a{number}", "content": content} for number in range(4)]
+    index = DuplicateIndex(str(tmp_path / "dedup.sqlite3"))
+    try:
+        monkeypatch.setenv("OPENAI_MODEL", "model-a")
+        assert _run(tmp_path, copies[:2], index)["duplicates"] == 1
+        monkeypatch.setenv("OPENAI_MODEL", "model-b")
+        assert _run(tmp_path, copies[2:3], index)["duplicates"] == 0
+        monkeypatch.setenv("OPENAI_TEMPERATURE", "0.7")
+        assert _run(tmp_path, copies[3:], index)["duplicates"] == 0
+    finally:
+        index.close()
+    assert calls == ["a0", "a2", "a3"]
+
+
+def _main(tmp_path, *extra):
+    inputs = tmp_path / "articles.jsonl"
+    if not inputs.exists():
+        inputs.write_text(
+            "".join(
+                json.dumps({**ARTICLE, "id": f"a{number}"}, ensure_ascii=False) + "\n"
+                for number in range(3)
+            ),
+            encoding="utf-8",
+        )
+    output = str(tmp_path / "results.jsonl")
+    return main([str(inputs), "--output", output, "--no-dedup", *extra])
+
+
+def test_rerun_skips_checkpointed_articles_and_retries_failures(tmp_path, monkeypatch):
+    monkeypatch.setattr(router, "_router", None)
+    monkeypatch.setattr(router, "_router_loaded", True)
+    calls = _analyzed(monkeypatch)
+    analyze = pipeline.analyze_async
+
+    async def flaky(*args, article_id=None, stages=None):
+        if article_id == "a1" and calls.count("a1") == 0:
+            calls.append(article_id)
+            raise RuntimeError("model unavailable")
+        return await analyze(*args, article_id=article_id, stages=stages)
+
+    monkeypatch.setattr(pipeline, "analyze_async", flaky)
+    assert _main(tmp_path) == 1
+    assert read_checkpoint(str(tmp_path / "results.jsonl.checkpoint")) == {"a0", "a2"}
+
+    # Only the failed article is analyzed again
+    assert _main(tmp_path) == 0
+    assert sorted(calls) == ["a0", "a1", "a1", "a2"]
+    assert _main(tmp_path) == 0
+    assert len(calls) == 4
+    lines = (tmp_path / "results.jsonl").read_text(encoding="utf-8").splitlines()
+    assert sorted(json.loads(line)["id"] for line in lines) == ["a0", "a1", "a2"]
+
+    # --no-resume analyzes everything again
+    assert _main(tmp_path, "--no-resume") == 0
+    assert len(calls) == 7
@@ -0,0 +1,44 @@
+"""Tests for the completion cache."""
+
+from kgai import cache
+from kgai.cache import ResponseCache
+
+RESPONSE = {"choices": [{"message": {"content": "主體: 無"}}]}
+
+
+def _accessed(responses, key):
+    return responses._conn.execute(
+        "SELECT accessed FROM completions WHERE key = ?", (key,)
+    ).fetchone()[0]
+
+
+def test_replacing_a_key_does_not_count_twice(tmp_path):
+    responses = ResponseCache(str(tmp_path / "cache.db"))
+    responses.put("a", RESPONSE)
+    responses.put("a", RESPONSE)
+    responses.put("b", RESPONSE)
+    assert responses.stats()["entries"] == 2
+
+
+def test_eviction_keeps_max_entries(tmp_path):
+    responses = ResponseCache(str(tmp_path / "cache.db"), max_entries=10)
+    for number in range(12):
+        responses.put(str(number), RESPONSE)
+        responses.put(str(number), RESPONSE)
+    assert responses.stats()["entries"] == 10
+
+
+def test_hits_refresh_the_access_time_at_most_once_per_interval(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "time", lambda: now[0])
+    responses = ResponseCache(str(tmp_path / "cache.db"))
+    responses.put("a", RESPONSE)
+
+    now[0] += cache.ACCESS_INTERVAL / 2
+    assert responses.get("a") == RESPONSE
+    assert _accessed(responses, "a") == 1000.0
+
+    now[0] += cache.ACCESS_INTERVAL
+    assert responses.get("a") == RESPONSE
+    assert _accessed(responses, "a") == now[0]
+    assert responses.stats()["hits"] == 2
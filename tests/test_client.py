@@ -0,0 +1,109 @@
+"""Tests for the pooled completion client, against a local fake endpoint."""
+
+import asyncio
+import time
+
+import openai
+import pytest
+
+from kgai import client
+
+
+def _content(response):
+    return response["choices"][0]["message"]["content"]
+
+
+@pytest.mark.asyncio
+async def test_submit_async(chat_api):
+    api = await chat_api()
+    response = await client.submit_async("system", "hello")
+    assert _content(response) == "answer: hello"
+    assert response["usage"]["total_tokens"] == 15
+    assert api.requests[0]["model"] == "test-model"
+    assert [message["role"] for message in api.requests[0]["messages"]] == ["system", "user"]
+
+
+@pytest.mark.asyncio
+async def test_submit_from_a_thread(chat_api):
+    api = await chat_api()
+    # submit() blocks, so it is called from a worker thread as a synchronous caller would
+    response = await asyncio.to_thread(client.submit, "system", "hello")
+    assert _content(response) == "answer: hello"
+    assert len(api.requests) == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrency_is_capped_per_endpoint(chat_api, monkeypatch):
+    monkeypatch.setenv("OPENAI_MAX_CONCURRENCY", "2")
+    api = await chat_api(delay=0.05)
+    responses = await client.submit_many_async(
+        [("system", f"prompt {index}") for index in range(6)]
+    )
+    assert [_content(response) for response in responses] == [
+        f"answer: prompt {index}" for index in range(6)
+    ]
+    assert api.peak == 2
+
+
+@pytest.mark.asyncio
+async def test_retry_honors_retry_after(chat_api, monkeypatch):
+    monkeypatch.setenv("OPENAI_MAX_RETRIES", "2")
+    api = await chat_api(failures=2, status=429, retry_after="0.2")
+    start = time.monotonic()
+    response = await client.submit_async("system", "hello")
+    assert _content(response) == "answer: hello"
+    assert len(api.requests) == 3
+    assert time.monotonic() - start >= 0.4
+
+
+@pytest.mark.asyncio
+async def test_retries_give_up(chat_api, monkeypatch):
+    monkeypatch.setenv("OPENAI_MAX_RETRIES", "1")
+    api = await chat_api(failures=5, status=503, retry_after="0")
+    with pytest.raises(openai.InternalServerError):
+        await client.submit_async("system", "hello")
+    assert len(api.requests) == 2
+
+
+@pytest.mark.asyncio
+async def test_bad_request_is_not_retried(chat_api):
+    api = await chat_api(failures=1, status=400)
+    with pytest.raises(openai.BadRequestError):
+        await client.submit_async("system", "hello")
+    assert len(api.requests) == 1
+
+
+@pytest.mark.asyncio
+async def test_identical_requests_in_flight_are_coalesced(chat_api):
+    api = await chat_api(delay=0.1)
+    responses = await asyncio.gather(*(client.submit_async("system", "hello") for _ in range(5)))
+    assert len(api.requests) == 1
+    assert all(response == responses[0] for response in responses)
+
+    # use_cache=False asks for fresh answers
+    await asyncio.gather(
+        *(client.submit_async("system", "hello", use_cache=False) for _ in range(3))
+    )
+    assert len(api.requests) == 4
+
+
+@pytest.mark.asyncio
+async def test_cached_answers_are_not_sent_again(chat_api, monkeypatch):
+    monkeypatch.setenv("OPENAI_CACHE", "1")
+    api = await chat_api()
+    first = await client.submit_async("system", "hello")
+    second = await client.submit_async("system", "hello")
+    assert first == second
+    assert len(api.requests) == 1
+    assert client.get_cache().stats()["hits"] == 1
+
+
+def test_retry_delay():
+    class Response:
+        headers = {"retry-after": "3"}
+
+    class Error(Exception):
+        response = Response()
+
+    assert client.retry_delay(0, Error()) == 3.0
+    assert 0 <= client.retry_delay(10, ValueError()) <= 60.0
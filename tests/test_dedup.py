@@ -0,0 +1,68 @@
+"""Tests for the near-duplicate index."""
+
+import os
+
+import pytest
+
+from kgai.dedup import DuplicateIndex, choose_bands
+
+SAMPLES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "samples")
+
+
+def _read(case):
+    with open(os.path.join(SAMPLES, case, "news_content.txt"), encoding="utf-8") as file:
+        return file.read()
+
+
+@pytest.fixture
+def index(tmp_path):
+    duplicates = DuplicateIndex(str(tmp_path / "dedup.sqlite3"))
+    yield duplicates
+    duplicates.close()
+
+
+def test_syndicated_copy_is_a_near_duplicate(index):
+    original = _read("case1")
+    index.add("udn-1", index.signature(original))
+    # Another outlet: own byline, full-width punctuation, last sentence cut
+    copy = "（中央社記者台北報導）" + original.replace("，", ",")[: int(len(original) * 0.95)]
+    match = index.query(index.signature(copy))
+    assert match is not None
+    assert match[0] == "udn-1"
+    assert match[1] >= index.threshold
+
+
+def test_different_article_is_not_a_duplicate(index):
+    index.add("udn-1", index.signature(_read("case1")))
+    assert index.query(index.signature(_read("case2"))) is None
+
+
+def test_article_is_not_its_own_duplicate(index):
+    signature = index.signature(_read("case1"))
+    index.add("udn-1", signature)
+    assert index.query(signature, exclude="udn-1") is None
+    assert index.query(signature) == ("udn-1", 1.0)
+
+
+def test_index_and_analyses_persist(tmp_path):
+    path = str(tmp_path / "dedup.sqlite3")
+    first = DuplicateIndex(path)
+    first.add("udn-1", first.signature(_read("case1")))
+    first.put_analysis("udn-1", "key-a", {"subjects": []})
+    first.close()
+
+    reopened = DuplicateIndex(path, threshold=0.5)
+    try:
+        assert reopened.query(reopened.signature(_read("case1")))[0] == "udn-1"
+        assert reopened.get_analysis("udn-1", "key-a") == {"subjects": []}
+        assert reopened.get_analysis("udn-1", "key-b") is None
+    finally:
+        reopened.close()
+    with pytest.raises(ValueError):
+        DuplicateIndex(path, num_perm=64)
+
+
+def test_bands_put_the_threshold_on_the_steep_part_of_the_curve():
+    bands, rows = choose_bands(128, 0.8)
+    assert bands * rows == 128
+    assert (1 / bands) ** (1 / rows) <= 0.8
@@ -0,0 +1,33 @@
+"""Tests for subject name resolution and merging."""
+
+from kgai.entities import AliasIndex, entity_key, merge_subjects
+
+
+def test_legal_forms_share_a_key():
+    assert entity_key("厲害科技股份有限公司") == entity_key("厲害科技 (股)公司") == "厲害科技"
+    assert entity_key("ＡＣＭＥ Co., Ltd.") == entity_key("acme")
+
+
+def test_business_words_are_kept():
+    subjects = ["中華電子", "中華工業股份有限公司", "王大明", "台灣科技", "台灣電子"]
+    assert merge_subjects(subjects, AliasIndex()) == (subjects, {})
+
+
+def test_short_form_merges_into_the_name_containing_it():
+    merged, aliases = merge_subjects(
+        ["厲害公司", "王大明", "厲害科技股份有限公司", "厲害科技"], AliasIndex()
+    )
+    assert merged == ["厲害科技股份有限公司", "王大明"]
+    assert aliases == {"厲害科技股份有限公司": ["厲害公司", "厲害科技"]}
+
+
+def test_short_form_of_two_companies_is_left_alone():
+    subjects = ["台灣", "台灣科技", "台灣電子"]
+    assert merge_subjects(subjects, AliasIndex()) == (subjects, {})
+
+
+def test_curated_alias():
+    index = AliasIndex({"台灣積體電路製造股份有限公司": ["台積電"]})
+    merged, aliases = merge_subjects(["台積電", "台灣積體電路製造股份有限公司"], index)
+    assert merged == ["台灣積體電路製造股份有限公司"]
+    assert aliases == {"台灣積體電路製造股份有限公司": ["台積電"]}
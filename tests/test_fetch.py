@@ -0,0 +1,128 @@
+"""Tests for the crawler's fetch engine, against local aiohttp sites."""
+
+import asyncio
+import gzip
+import time
+
+import pytest
+from aiohttp import web
+
+from kgai.fetch import Fetcher
+
+PAGE = "<html><body><p>新聞內容</p></body></html>".encode()
+
+
+def _site(**routes):
+    app = web.Application()
+    for name, handler in routes.items():
+        app.router.add_get(f"/{name}", handler)
+    return app
+
+
+@pytest.mark.asyncio
+async def test_conditional_get_revalidates(serve):
+    conditions = []
+
+    async def page(request):
+        conditions.append(request.headers.get("If-None-Match"))
+        if request.headers.get("If-None-Match") == '"v1"':
+            return web.Response(status=304)
+        return web.Response(
+            body=PAGE,
+            content_type="text/html",
+            charset="utf-8",
+            headers={"ETag": '"v1"', "Last-Modified": "Mon, 06 Jan 2025 00:00:00 GMT"},
+        )
+
+    url = await serve(_site(page=page)) + "/page"
+    async with Fetcher(delay=0) as fetcher:
+        first = await fetcher.fetch(url)
+        assert first.ok and first.body == PAGE and first.encoding == "utf-8"
+        assert fetcher.validators[url] == ('"v1"', "Mon, 06 Jan 2025 00:00:00 GMT")
+
+        second = await fetcher.fetch(url)
+    assert second.not_modified and second.body is None and second.error is None
+    assert second.etag == '"v1"'
+    assert conditions == [None, '"v1"']
+
+
+@pytest.mark.asyncio
+async def test_gzip_bodies_are_decompressed(serve):
+    async def page(request):
+        assert "gzip" in request.headers["Accept-Encoding"]
+        return web.Response(
+            body=gzip.compress(PAGE),
+            content_type="text/html",
+            charset="utf-8",
+            headers={"Content-Encoding": "gzip"},
+        )
+
+    url = await serve(_site(page=page)) + "/page"
+    async with Fetcher(delay=0) as fetcher:
+        result = await fetcher.fetch(url)
+    assert result.ok and result.body == PAGE
+    assert result.text == PAGE.decode("utf-8")
+
+
+@pytest.mark.asyncio
+async def test_503_is_retried_after_retry_after(serve):
+    attempts = []
+
+    async def page(request):
+        attempts.append(request)
+        if len(attempts) < 3:
+            return web.Response(status=503, headers={"Retry-After": "0"})
+        return web.Response(body=PAGE, content_type="text/html")
+
+    url = await serve(_site(page=page)) + "/page"
+    async with Fetcher(delay=0, retries=3) as fetcher:
+        result = await fetcher.fetch(url)
+    assert result.ok and result.attempts == 3 and result.error is None
+
+
+@pytest.mark.asyncio
+async def test_retries_give_up(serve):
+    async def page(request):
+        return web.Response(status=503, headers={"Retry-After": "0"})
+
+    url = await serve(_site(page=page)) + "/page"
+    async with Fetcher(delay=0, retries=2) as fetcher:
+        result = await fetcher.fetch(url)
+    assert not result.ok
+    assert (result.status, result.attempts, result.error) == (503, 3, "HTTP 503")
+
+
+@pytest.mark.asyncio
+async def test_slow_host_does_not_hold_up_others(serve):
+    async def slow(request):
+        await asyncio.sleep(0.5)
+        return web.Response(body=PAGE, content_type="text/html")
+
+    async def fast(request):
+        return web.Response(body=PAGE, content_type="text/html")
+
+    slow_site = await serve(_site(page=slow))
+    fast_site = await serve(_site(page=fast))
+    urls = [f"{slow_site}/page?{index}" for index in range(2)] + [
+        f"{fast_site}/page?{index}" for index in range(5)
+    ]
+    async with Fetcher(per_host=1, delay=0) as fetcher:
+        order = [result.url async for result in fetcher.fetch_all(urls)]
+    assert len(order) == 7
+    assert all(url.startswith(fast_site) for url in order[:5])
+
+
+@pytest.mark.asyncio
+async def test_requests_to_one_host_are_spaced(serve):
+    async def page(request):
+        return web.Response(body=PAGE, content_type="text/html")
+
+    site = await serve(_site(page=page))
+    start = time.monotonic()
+    async with Fetcher(per_host=4, delay=0.1) as fetcher:
+        results = [
+            result
+            async for result in fetcher.fetch_all(f"{site}/page?{index}" for index in range(4))
+        ]
+    assert all(result.ok for result in results)
+    assert time.monotonic() - start >= 0.3
@@ -0,0 +1,78 @@
+"""Tests for the streaming crawl -> analysis -> store flow."""
+
+import json
+import sqlite3
+
+import pytest
+from aiohttp import web
+
+from kgai import pipeline
+from kgai.fetch import Fetcher
+from kgai.flow import crawl_flow
+from kgai.frontier import Frontier
+from kgai.parser import InferenceRecord
+from kgai.store import ResultStore
+
+
+async def page(request):
+    number = request.match_info["number"]
+    text = "王大明涉嫌詐欺遭起訴。" if number != "broken" else "王大明的答案無法解析。"
+    return web.Response(
+        text=f'<html><body><div class="story">{text}第{number}篇</div></body></html>',
+        content_type="text/html",
+    )
+
+
+async def run_extractor(analysis, extractor_conf, stages=None):
+    analysis.subjects = ["王大明"]
+
+
+async def run_inferencer(analysis, inferencer_conf, stages=None):
+    error = "unparseable" if "無法解析" in analysis.news_content else None
+    analysis.answers = [
+        ("answer", InferenceRecord(subject="王大明", suspected=not error, error=error))
+    ]
+
+
+def hashes(path):
+    with sqlite3.connect(path) as conn:
+        return dict(conn.execute("SELECT url, content_hash FROM urls"))
+
+
+@pytest.mark.asyncio
+async def test_frontier_marks_pages_once_stored_without_errors(serve, tmp_path, monkeypatch):
+    app = web.Application()
+    app.router.add_get("/a/{number}", page)
+    base = await serve(app)
+    sites = tmp_path / "sites.json"
+    sites.write_text(json.dumps({base.split("//")[1]: {"content": "div.story"}}))
+    monkeypatch.setenv("CRAWLER_SITES", str(sites))
+    monkeypatch.setattr(pipeline, "run_extractor", run_extractor)
+    monkeypatch.setattr(pipeline, "run_inferencer", run_inferencer)
+
+    urls = [f"{base}/a/1", f"{base}/a/2", f"{base}/a/broken"]
+    frontier = Frontier(str(tmp_path / "frontier.sqlite3"))
+    frontier.add(urls)
+    store = ResultStore(str(tmp_path / "results.sqlite3"), batch_size=100, flush_interval=3600)
+    async with Fetcher(delay=0, retries=0) as fetcher:
+        flow = crawl_flow(
+            fetcher,
+            store,
+            "extractor_v1-2.json",
+            "inferencer_v8-1.json",
+            "詐欺",
+            "起訴",
+            frontier=frontier,
+            report_interval=0,
+        )
+        finished = []
+        await flow.run(({"url": url} for url in urls), sink=finished.append)
+    assert len(finished) == 3
+
+    # The articles are still buffered in the store: nothing is marked analyzed
+    assert not any(hashes(frontier.path).values())
+    store.close()
+    marked = hashes(frontier.path)
+    assert marked[urls[0]] and marked[urls[1]]
+    assert marked[urls[2]] is None
+    frontier.close()
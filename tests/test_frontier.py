@@ -0,0 +1,129 @@
+"""Tests for the crawl frontier: due times, backoff and conditional GETs."""
+
+import time
+
+import pytest
+from aiohttp import web
+
+from kgai.fetch import Fetcher, FetchResult
+from kgai.frontier import Frontier
+
+HOUR = 3600
+DAY = 24 * HOUR
+
+
+@pytest.fixture
+def frontier(tmp_path):
+    urls = Frontier(
+        str(tmp_path / "frontier.sqlite3"),
+        recrawl=DAY,
+        max_recrawl=4 * DAY,
+        backoff=HOUR,
+        max_backoff=3 * HOUR,
+    )
+    yield urls
+    urls.close()
+
+
+def _later(seconds):
+    return time.time() + seconds
+
+
+def test_new_urls_are_due_by_priority_with_hosts_interleaved(frontier):
+    assert frontier.add(["https://a.example/1", "https://a.example/2", "https://b.example/1"]) == 3
+    assert frontier.add(["https://a.example/3"], priority=1) == 1
+    assert frontier.add(["https://a.example/1"]) == 0
+    assert frontier.due() == [
+        "https://a.example/3",
+        "https://b.example/1",
+        "https://a.example/1",
+        "https://a.example/2",
+    ]
+    assert len(frontier.due(limit=2)) == 2
+
+
+def test_fetched_url_is_due_after_its_recrawl_interval(frontier):
+    url = "https://a.example/1"
+    frontier.add([url])
+    assert frontier.record_fetch(FetchResult(url, 200, b"<html></html>")) == "fetched"
+    assert frontier.due() == []
+    assert frontier.due(now=_later(DAY - 60)) == []
+    assert frontier.due(now=_later(DAY + 60)) == [url]
+
+
+def test_failures_back_off_exponentially_up_to_the_limit(frontier):
+    url = "https://a.example/1"
+    frontier.add([url])
+    for delay in (HOUR, 2 * HOUR, 3 * HOUR, 3 * HOUR):
+        assert frontier.record_fetch(FetchResult(url, 503, error="HTTP 503")) == "failed"
+        assert frontier.due(now=_later(delay - 60)) == []
+        assert frontier.due(now=_later(delay + 60)) == [url]
+
+    # A success resets the failure count
+    frontier.record_fetch(FetchResult(url, 200, b"<html></html>"))
+    frontier.record_fetch(FetchResult(url, 0, error="ClientError"))
+    assert frontier.due(now=_later(HOUR + 60)) == [url]
+    assert frontier.stats()["failed"] == 1
+
+
+def test_gone_urls_wait_for_the_longest_backoff(frontier):
+    url = "https://a.example/missing"
+    frontier.add([url])
+    assert frontier.record_fetch(FetchResult(url, 404)) == "gone"
+    assert frontier.due(now=_later(3 * HOUR - 60)) == []
+    assert frontier.due(now=_later(3 * HOUR + 60)) == [url]
+    assert frontier.counts["gone"] == 1
+
+
+def test_unchanged_content_doubles_the_interval_and_changes_reset_it(frontier):
+    url = "https://a.example/1"
+    frontier.add([url])
+    frontier.record_fetch(FetchResult(url, 200, b"<html></html>"))
+    digest = frontier.changed(url, "王大明涉嫌詐欺。")
+    assert digest is not None
+    # Not marked until analyzed, so a failed analysis is retried
+    assert frontier.changed(url, "王大明涉嫌詐欺。") == digest
+    frontier.analyzed(url, digest)
+
+    for interval in (2 * DAY, 4 * DAY, 4 * DAY):
+        assert frontier.changed(url, "  王大明涉嫌詐欺。\n") is None
+        assert frontier.due(now=_later(interval - 60)) == []
+        assert frontier.due(now=_later(interval + 60)) == [url]
+
+    changed = frontier.changed(url, "王大明遭起訴。")
+    assert changed not in (None, digest)
+    frontier.analyzed(url, changed)
+    assert frontier.due(now=_later(DAY + 60)) == [url]
+    counts = frontier.counts
+    assert (counts["new"], counts["changed"], counts["unchanged"]) == (2, 1, 3)
+
+
+@pytest.mark.asyncio
+async def test_not_modified_pages_are_revalidated_with_stored_validators(serve, frontier):
+    conditions = []
+
+    async def page(request):
+        conditions.append(request.headers.get("If-None-Match"))
+        if request.headers.get("If-None-Match") == '"v1"':
+            return web.Response(status=304)
+        return web.Response(
+            body=b"<html></html>", content_type="text/html", headers={"ETag": '"v1"'}
+        )
+
+    app = web.Application()
+    app.router.add_get("/page", page)
+    url = await serve(app) + "/page"
+    frontier.add([url])
+
+    async with Fetcher(delay=0) as fetcher:
+        assert frontier.record_fetch(await fetcher.fetch(url)) == "fetched"
+    assert frontier.validators([url, "https://a.example/unknown"]) == {url: ('"v1"', None)}
+
+    # A later run starts with a fresh fetcher and the frontier's validators
+    async with Fetcher(delay=0, validators=frontier.validators([url])) as fetcher:
+        assert frontier.record_fetch(await fetcher.fetch(url)) == "not_modified"
+    assert conditions == [None, '"v1"']
+    assert frontier.counts["not_modified"] == 1
+    # A 304 counts as unchanged: the interval doubles
+    assert frontier.due(now=_later(2 * DAY - 60)) == []
+    assert frontier.due(now=_later(2 * DAY + 60)) == [url]
@@ -0,0 +1,62 @@
+"""Tests for multi-pattern keyword matching."""
+
+import random
+
+from kgai.keywords import KeywordMatcher, format_keywords, get_matcher, parse_keywords
+
+
+def _find_loop(keywords, text):
+    """One str.find pass per keyword, ordered like KeywordMatcher.find."""
+    matches = []
+    for keyword in keywords:
+        offset = text.find(keyword)
+        while offset != -1:
+            matches.append((keyword, offset))
+            offset = text.find(keyword, offset + 1)
+    return sorted(matches, key=lambda match: (match[1], -len(match[0])))
+
+
+def test_nested_keywords_all_match():
+    matcher = KeywordMatcher(["詐騙", "詐騙集團", "集團", "騙"])
+    assert matcher.find("加入詐騙集團") == [
+        ("詐騙集團", 2),
+        ("詐騙", 2),
+        ("騙", 3),
+        ("集團", 4),
+    ]
+
+
+def test_overlapping_keywords_all_match():
+    matcher = KeywordMatcher(["偽造文書", "文書詐欺", "詐欺"])
+    assert matcher.find("涉嫌偽造文書詐欺") == [("偽造文書", 2), ("文書詐欺", 4), ("詐欺", 6)]
+
+
+def test_repeated_and_self_overlapping_occurrences():
+    matcher = KeywordMatcher(["aa", "aaa"])
+    assert matcher.find("aaaa") == [("aaa", 0), ("aa", 0), ("aaa", 1), ("aa", 1), ("aa", 2)]
+
+
+def test_matches_a_find_per_keyword():
+    generator = random.Random(0)
+    for _ in range(500):
+        keywords = [
+            "".join(generator.choice("abc") for _ in range(generator.randint(1, 4)))
+            for _ in range(6)
+        ]
+        text = "".join(generator.choice("abcd") for _ in range(40))
+        matcher = KeywordMatcher(keywords)
+        assert matcher.find(text) == _find_loop(matcher.keywords, text)
+
+
+def test_search_and_matched():
+    matcher = get_matcher("詐欺 |洗錢 |詐騙")
+    assert matcher.search("涉嫌洗錢")
+    assert not matcher.search("今日天氣晴")
+    assert matcher.matched("詐欺、洗錢又詐欺") == ["詐欺", "洗錢"]
+    assert KeywordMatcher([]).find("詐欺") == []
+
+
+def test_keyword_files_round_trip():
+    keywords = parse_keywords("詐欺 |洗錢｜\n詐欺| 背信 ")
+    assert keywords == ["詐欺", "洗錢", "背信"]
+    assert parse_keywords(format_keywords(keywords)) == keywords
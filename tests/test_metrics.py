@@ -0,0 +1,118 @@
+"""Tests for LLM call accounting, its JSONL trace and Prometheus output."""
+
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+from kgai import client, metrics
+from kgai.metrics import CallRecord, Metrics, current_labels, labels, track_article
+
+
+@pytest.fixture
+def recorded(tmp_path, monkeypatch):
+    """Fresh process-wide metrics with a trace file and a price for test-model."""
+    fresh = Metrics(trace_path=str(tmp_path / "trace.jsonl"), prices={"test-model": (1.0, 2.0)})
+    monkeypatch.setattr(metrics, "_default_metrics", fresh)
+    yield fresh
+    fresh.close()
+
+
+def _trace(recorded):
+    with open(recorded.trace_path, encoding="utf-8") as file:
+        return [json.loads(line) for line in file]
+
+
+@pytest.mark.asyncio
+async def test_calls_are_traced_with_labels_and_rolled_up_per_article(chat_api, recorded):
+    await chat_api()
+    with track_article("udn-1", extractor="e.json", inferencer="i.json") as usage:
+        with labels(stage="extractor", config="e.json"):
+            await client.submit_async("system", "subjects?")
+        with labels(stage="inferencer", config="i.json"):
+            for subject in ("王大明", "華公行"):
+                await client.submit_async("system", subject)
+
+    # The fake endpoint bills 10 prompt and 5 completion tokens per request
+    assert (usage.calls, usage.prompt_tokens, usage.completion_tokens) == (3, 30, 15)
+    assert usage.cost == pytest.approx((30 * 1.0 + 15 * 2.0) / 1e6)
+
+    calls = [entry for entry in _trace(recorded) if entry["type"] == "call"]
+    assert [(entry["stage"], entry["config"]) for entry in calls] == [
+        ("extractor", "e.json"),
+        ("inferencer", "i.json"),
+        ("inferencer", "i.json"),
+    ]
+    assert {entry["article"] for entry in calls} == {"udn-1"}
+    assert all(entry["model"] == "test-model" and not entry["cache_hit"] for entry in calls)
+    (article,) = [entry for entry in _trace(recorded) if entry["type"] == "article"]
+    assert article["article"] == "udn-1"
+    assert article["labels"] == {"extractor": "e.json", "inferencer": "i.json"}
+    assert article["prompt_tokens"] == 30
+
+    assert recorded.summary() == [
+        {
+            "extractor": "e.json",
+            "inferencer": "i.json",
+            "articles": 1,
+            "tokens_per_article": 45.0,
+            "cost_per_article": pytest.approx(60 / 1e6),
+        }
+    ]
+
+
+def test_prometheus_text(recorded):
+    for latency in (0.3, 1.5, 90.0):
+        recorded.record(
+            CallRecord(
+                "test-model",
+                stage="inferencer",
+                config='v"8',
+                prompt_tokens=100,
+                completion_tokens=10,
+                latency=latency,
+            )
+        )
+    recorded.record(CallRecord("test-model", stage="inferencer", config='v"8', cache_hit=True))
+    lines = recorded.render().splitlines()
+    labelled = '{stage="inferencer",config="v\\"8",model="test-model"'
+
+    assert "# TYPE kgai_llm_requests_total counter" in lines
+    assert f"kgai_llm_requests_total{labelled}}} 4" in lines
+    assert f"kgai_llm_cache_hits_total{labelled}}} 1" in lines
+    assert f"kgai_llm_prompt_tokens_total{labelled}}} 300" in lines
+    # Cache hits stay out of the latency histogram; buckets are cumulative
+    assert f'kgai_llm_request_duration_seconds_bucket{labelled},le="0.5"}} 1' in lines
+    assert f'kgai_llm_request_duration_seconds_bucket{labelled},le="2"}} 2' in lines
+    assert f'kgai_llm_request_duration_seconds_bucket{labelled},le="60"}} 2' in lines
+    assert f'kgai_llm_request_duration_seconds_bucket{labelled},le="+Inf"}} 3' in lines
+    assert f"kgai_llm_request_duration_seconds_count{labelled}}} 3" in lines
+    assert f"kgai_llm_request_duration_seconds_sum{labelled}}} 91.8" in lines
+
+
+def test_metrics_are_served_over_http(recorded):
+    recorded.record(CallRecord("test-model", stage="extractor"))
+    server = metrics.serve_metrics(0)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        with urllib.request.urlopen(url + "/metrics") as response:
+            body = response.read().decode("utf-8")
+            assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+        assert 'kgai_llm_requests_total{stage="extractor",config="",model="test-model"} 1' in body
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(url + "/other")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_labels_nest_and_do_not_leak():
+    # Changing the labels returned outside any block must not label later calls
+    current_labels()["stage"] = "leaked"
+    assert current_labels() == {}
+    with labels(stage="inferencer"):
+        with labels(config="i.json"):
+            assert current_labels() == {"stage": "inferencer", "config": "i.json"}
+        assert current_labels() == {"stage": "inferencer"}
+    assert current_labels() == {}
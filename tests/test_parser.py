@@ -0,0 +1,76 @@
+"""Tests for the extractor and inferencer answer parsers."""
+
+import pytest
+
+from kgai.parser import ParseError, parse_inference, parse_inference_batch, parse_subjects
+
+V8_BLOCK = """### 輸出格式
+ - 討論的主體(target): 王俊雄
+ - 是否涉及任何刑責關鍵字(是或否): 是
+ - 涉及刑責關鍵字(逗號分割): 詐欺, 洗錢
+ - 涉及刑責進度關鍵字(逗號分割): 起訴
+ - 事件摘要(50字): 王俊雄涉嫌詐貸遭起訴
+"""
+
+
+def test_subjects_from_text_and_json():
+    assert parse_subjects("文章提起的主體: 王俊雄, 仙宗興業公司、洪姓會計, 王俊雄") == [
+        "王俊雄",
+        "仙宗興業公司",
+        "洪姓會計",
+    ]
+    assert parse_subjects('{"subjects": ["王俊雄", "洪姓會計"]}') == ["王俊雄", "洪姓會計"]
+
+
+@pytest.mark.parametrize(
+    "content", ["文章提起的主體: 無", "主體：無。", '{"subjects": []}', "犯罪主體: none"]
+)
+def test_no_subjects_is_an_empty_list(content):
+    assert parse_subjects(content) == []
+
+
+@pytest.mark.parametrize("content", ["我不確定", "文章提起的主體:"])
+def test_missing_subject_list_raises(content):
+    with pytest.raises(ParseError):
+        parse_subjects(content)
+
+
+def test_inference_from_text():
+    record = parse_inference(V8_BLOCK, "王俊雄")
+    assert record.suspected is True
+    assert record.crimes == ["詐欺", "洗錢"]
+    assert record.progress == ["起訴"]
+
+
+def test_inference_from_json():
+    record = parse_inference(
+        '{"subject": "王俊雄", "suspected": "否", "crimes": [], "progress": [], "summary": "無"}',
+        "王俊雄",
+    )
+    assert record.suspected is False
+    assert record.crimes == []
+
+
+def test_unrelated_json_in_reasoning_falls_back_to_fields():
+    content = '推論: 模型內部狀態為 {"x": 1}，依下列格式作答。\n' + V8_BLOCK
+    record = parse_inference(content, "王俊雄")
+    assert record.suspected is True
+    assert record.summary == "王俊雄涉嫌詐貸遭起訴"
+
+
+def test_record_keeps_the_requested_subject():
+    record = parse_inference(V8_BLOCK.replace("王俊雄", "X"), "王俊雄")
+    assert record.subject == "王俊雄"
+    assert record.raw["subject"] == "X"
+
+
+def test_incomplete_answer_raises():
+    with pytest.raises(ParseError):
+        parse_inference(" - 討論的主體(target): 王俊雄\n - 事件摘要(50字): 摘要", "王俊雄")
+
+
+def test_batch_answer_is_split_per_target():
+    second = V8_BLOCK.replace("王俊雄", "洪姓會計").replace("### 輸出格式\n", "")
+    results = parse_inference_batch(V8_BLOCK + "\n" + second, ["王俊雄", "洪姓會計"])
+    assert results["洪姓會計"][1].subject == "洪姓會計"
+    assert results["王俊雄"][1].crimes == ["詐欺", "洗錢"]
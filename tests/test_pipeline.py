@@ -0,0 +1,117 @@
+"""Tests for the extractor -> inferencer pipeline."""
+
+import asyncio
+import os
+
+import pytest
+
+from kgai import pipeline
+from kgai.parser import ParseError, parse_subjects
+from kgai.stages import StageStore
+
+SAMPLES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "samples")
+
+
+def _read(*parts):
+    with open(os.path.join(SAMPLES, *parts), encoding="utf-8") as file:
+        return file.read()
+
+
+@pytest.fixture
+def long_article(monkeypatch):
+    """Three sample articles in a row, extracted in chunks."""
+    monkeypatch.setenv("EXTRACTOR_CHUNK_TOKENS", "600")
+    monkeypatch.setenv("EXTRACTOR_CHUNK_OVERLAP", "50")
+    return "".join(_read(f"case{number}", "news_content.txt") for number in (3, 1, 2))
+
+
+def _stub(answer):
+    """Stand-in for extract_subjects that answers from the chunk's user prompt."""
+
+    async def extract_subjects(extractor):
+        return answer(extractor["files"]["user"])
+
+    return extract_subjects
+
+
+def _extract(long_article):
+    failed = []
+    subjects = asyncio.run(
+        pipeline.extract_article(
+            "extractor_v1-2.json",
+            _read("crime_keywords.txt"),
+            _read("judge_keywords.txt"),
+            long_article,
+            None,
+            failed,
+        )
+    )
+    return subjects, failed
+
+
+def test_chunks_merge_in_order_of_first_appearance(monkeypatch, long_article):
+    names = ["華公行", "王俊雄", "洪姓會計", "徐明賢"]
+
+    def answer(prompt):
+        found = sorted((name for name in names if name in prompt), key=prompt.index)
+        return parse_subjects("文章提起的主體: " + (", ".join(found) or "無"))
+
+    monkeypatch.setattr(pipeline, "extract_subjects", _stub(answer))
+    subjects, failed = _extract(long_article)
+    assert subjects == names
+    assert failed == []
+
+
+def test_failed_chunk_is_skipped(monkeypatch, long_article):
+    def answer(prompt):
+        if "華公行" in prompt:
+            raise ParseError("unparseable")
+        return ["王俊雄"] if "王俊雄" in prompt else []
+
+    monkeypatch.setattr(pipeline, "extract_subjects", _stub(answer))
+    subjects, failed = _extract(long_article)
+    assert subjects == ["王俊雄"]
+    assert failed and all(isinstance(error, ParseError) for error in failed)
+
+
+def test_article_fails_when_every_chunk_fails(monkeypatch, long_article):
+    def answer(prompt):
+        raise ParseError("unparseable")
+
+    monkeypatch.setattr(pipeline, "extract_subjects", _stub(answer))
+    with pytest.raises(ParseError):
+        _extract(long_article)
+
+
+def _analysis():
+    return pipeline.Analysis(
+        _read("case1", "news_content.txt"),
+        None,
+        None,
+        _read("crime_keywords.txt"),
+        _read("judge_keywords.txt"),
+        {},
+        "off",
+    )
+
+
+def test_extractor_fingerprints_only_with_a_stage_store(monkeypatch, tmp_path):
+    calls = []
+    fingerprint = pipeline._extract_inputs
+
+    def _extract_inputs(*args, **kwargs):
+        calls.append(args)
+        return fingerprint(*args, **kwargs)
+
+    monkeypatch.setattr(pipeline, "_extract_inputs", _extract_inputs)
+    monkeypatch.setattr(pipeline, "extract_subjects", _stub(lambda prompt: ["王俊雄"]))
+    asyncio.run(pipeline.run_extractor(_analysis(), "extractor_v1-2.json"))
+    assert calls == []
+
+    stages = StageStore(str(tmp_path / "stages.db"))
+    for _ in range(2):
+        analysis = _analysis()
+        asyncio.run(pipeline.run_extractor(analysis, "extractor_v1-2.json", stages))
+        assert analysis.subjects == ["王俊雄"]
+    assert len(calls) == 2
+    assert (stages.stored, stages.reused) == (1, 1)
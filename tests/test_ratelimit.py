@@ -0,0 +1,72 @@
+"""Tests for the token-bucket rate limiter."""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from kgai import ratelimit
+from kgai.ratelimit import TokenBucket
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Fake monotonic clock that only advances when the bucket sleeps."""
+    fake = SimpleNamespace(now=0.0, slept=[])
+
+    async def sleep(seconds):
+        fake.slept.append(seconds)
+        fake.now += seconds
+
+    monkeypatch.setattr(ratelimit, "time", SimpleNamespace(monotonic=lambda: fake.now))
+    monkeypatch.setattr(ratelimit, "asyncio", SimpleNamespace(Lock=asyncio.Lock, sleep=sleep))
+    return fake
+
+
+def _acquire(bucket, *amounts):
+    async def run():
+        for amount in amounts:
+            await bucket.acquire(amount)
+
+    asyncio.run(run())
+
+
+def test_burst_then_paced_at_the_rate(clock):
+    bucket = TokenBucket(60, capacity=2)
+    _acquire(bucket, 1, 1, 1, 1, 1)
+    # Two requests fit the burst, the other three wait a second each
+    assert clock.now == pytest.approx(3.0)
+    assert clock.slept == pytest.approx([1.0, 1.0, 1.0])
+
+
+def test_concurrent_requests_share_the_rate(clock):
+    bucket = TokenBucket(120, capacity=1)
+
+    async def run():
+        await asyncio.gather(*(bucket.acquire() for _ in range(5)))
+
+    asyncio.run(run())
+    assert clock.now == pytest.approx(2.0)
+
+
+def test_debt_from_adjust_delays_the_next_request(clock):
+    bucket = TokenBucket(60, capacity=1)
+    _acquire(bucket, 1)
+    # The request cost three tokens more than estimated
+    bucket.adjust(3)
+    _acquire(bucket, 1)
+    assert clock.now == pytest.approx(4.0)
+
+
+def test_oversized_request_waits_for_a_full_bucket(clock):
+    bucket = TokenBucket(60, capacity=2)
+    _acquire(bucket, 2, 10)
+    assert clock.now == pytest.approx(2.0)
+
+
+def test_disabled_bucket_never_waits(clock):
+    bucket = TokenBucket(None)
+    _acquire(bucket, 1, 1000)
+    bucket.adjust(5)
+    assert not bucket.enabled
+    assert clock.slept == []
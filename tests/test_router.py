@@ -0,0 +1,149 @@
+"""Tests for routing completions across endpoints, against local fake endpoints."""
+
+import asyncio
+import time
+
+import pytest
+
+from kgai import client
+from kgai.metrics import labels
+from kgai.router import Router, use_router
+
+
+def _endpoint(name, api, model="large", **options):
+    return {
+        "name": name,
+        "base_url": api.url,
+        "api_key": "test",
+        "model": model,
+        "context": 8192,
+        **options,
+    }
+
+
+async def _run(requests, concurrency=8, stage="inferencer"):
+    """Send ``requests`` distinct requests, ``concurrency`` at a time; returns their answers."""
+    limit = asyncio.Semaphore(concurrency)
+
+    async def one(index):
+        async with limit:
+            with labels(stage=stage):
+                response = await client.submit_async("system", f"{stage} {index}")
+        return response["choices"][0]["message"]["content"]
+
+    return await asyncio.gather(*(one(index) for index in range(requests)))
+
+
+@pytest.fixture
+def router():
+    """Install a router for the test; no router afterwards."""
+
+    def install(config):
+        installed = Router(config)
+        use_router(installed)
+        return installed
+
+    yield install
+    use_router(None)
+
+
+@pytest.mark.asyncio
+async def test_requests_spread_by_weight(chat_api, router):
+    apis = [await chat_api(delay=0.05) for _ in range(3)]
+    routed = router(
+        {
+            "endpoints": [
+                _endpoint("a", apis[0]),
+                _endpoint("b", apis[1]),
+                _endpoint("c", apis[2], weight=2),
+            ],
+            "hedge": False,
+        }
+    )
+    await _run(40)
+    counts = [row["requests"] for row in routed.stats()]
+    assert counts == [len(api.requests) for api in apis]
+    assert sum(counts) == 40
+    assert 0.35 <= counts[2] / 40 <= 0.65
+
+
+@pytest.mark.asyncio
+async def test_failing_endpoint_opens_its_circuit(chat_api, router):
+    down, up = await chat_api(failures=1000, status=503), await chat_api()
+    # The heavier weight makes 'down' the first choice whenever it is available
+    routed = router(
+        {
+            "endpoints": [_endpoint("down", down, weight=2), _endpoint("up", up)],
+            "hedge": False,
+            "breaker": {"failures": 3, "cooldown": 60},
+        }
+    )
+    answers = await _run(20, concurrency=1)
+    assert answers == [f"answer: inferencer {index}" for index in range(20)]
+    assert routed.stats()[0]["state"] == "open"
+    assert len(down.requests) == 3
+
+    # Once the cooldown is over one probe is let through; its success closes the circuit
+    down.failures = 0
+    routed.backends[0].opened_until = time.monotonic()
+    assert routed.stats()[0]["state"] == "half-open"
+    await _run(1, concurrency=1)
+    assert routed.stats()[0]["state"] == "closed"
+    assert len(down.requests) == 4
+
+
+@pytest.mark.asyncio
+async def test_slow_request_is_hedged(chat_api, router):
+    slow, fast = await chat_api(delay=0.01), await chat_api(delay=0.01)
+    routed = router(
+        {
+            "endpoints": [_endpoint("slow", slow, weight=100), _endpoint("fast", fast)],
+            "hedge": {"percentile": 50, "min_samples": 1, "budget": 1.0},
+        }
+    )
+    await _run(1)
+    assert (len(slow.requests), len(fast.requests)) == (1, 0)
+
+    slow.delay = 1.0
+    start = time.monotonic()
+    assert await _run(1) == ["answer: inferencer 0"]
+    assert time.monotonic() - start < 0.5
+    assert len(fast.requests) == 1
+    assert routed.stats()[1]["hedges"] == 1
+
+
+@pytest.mark.asyncio
+async def test_stages_go_to_their_dedicated_endpoints(chat_api, router):
+    large, small = await chat_api(), await chat_api()
+    router(
+        {
+            "endpoints": [
+                _endpoint("large", large),
+                _endpoint("small", small, model="small", stages=["extractor"]),
+            ],
+            "hedge": False,
+        }
+    )
+    await _run(6, stage="extractor")
+    await _run(4, stage="inferencer")
+    assert small.models == {"small": 6}
+    assert large.models == {"large": 4}
+
+
+@pytest.mark.asyncio
+async def test_dedicated_endpoint_falls_back_to_general(chat_api, router):
+    large, small = await chat_api(), await chat_api(failures=1000, status=503)
+    router(
+        {
+            "endpoints": [
+                _endpoint("large", large),
+                _endpoint("small", small, model="small", stages=["extractor"]),
+            ],
+            "hedge": False,
+            "breaker": {"failures": 1, "cooldown": 60},
+        }
+    )
+    answers = await _run(5, concurrency=1, stage="extractor")
+    assert answers == [f"answer: extractor {index}" for index in range(5)]
+    assert len(small.requests) == 1
+    assert large.models == {"large": 5}
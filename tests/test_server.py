@@ -0,0 +1,107 @@
+"""Tests for the JSON API: job merging, backpressure and request validation."""
+
+import asyncio
+
+import aiohttp
+import pytest
+
+from kgai import pipeline, server
+from kgai.parser import InferenceRecord
+from kgai.server import Scheduler, create_app
+
+ARTICLE = {"title": "標題", "content": "王大明涉嫌詐欺遭起訴。"}
+
+
+@pytest.fixture
+def analyzed(monkeypatch):
+    """Stub pipeline that holds every analysis until ``release`` is set."""
+    calls = []
+    release = asyncio.Event()
+
+    async def analyze_async(extractor, inferencer, crime, judge, content, title, article_id=None):
+        calls.append(content)
+        await release.wait()
+        record = InferenceRecord("王大明", suspected=True, crimes=["詐欺"])
+        return {"subjects": ["王大明"], "records": [record], "inferences": ["..."]}
+
+    monkeypatch.setattr(pipeline, "analyze_async", analyze_async)
+    return calls, release
+
+
+async def _start(serve, **scheduler):
+    app = create_app(Scheduler(batch_wait=0, **scheduler), shutdown_timeout=1)
+    return await serve(app)
+
+
+@pytest.mark.asyncio
+async def test_identical_articles_share_one_job(serve, analyzed):
+    calls, release = analyzed
+    url = await _start(serve)
+    other = {**ARTICLE, "content": "另一篇報導。"}
+    async with aiohttp.ClientSession() as session:
+        async with session.post(
+            url + "/analyze/batch", json={"articles": [ARTICLE, ARTICLE, other]}
+        ) as response:
+            assert response.status == 202
+            jobs = (await response.json())["jobs"]
+        assert jobs[0]["id"] == jobs[1]["id"] != jobs[2]["id"]
+        # A later request for a running article joins its job too
+        async with session.post(url + "/analyze", json=ARTICLE) as response:
+            assert (await response.json())["id"] == jobs[0]["id"]
+        release.set()
+        for _ in range(100):
+            async with session.get(url + f"/jobs/{jobs[0]['id']}") as response:
+                job = await response.json()
+            if job["status"] == "done":
+                break
+            await asyncio.sleep(0.01)
+        assert sorted(calls) == sorted([ARTICLE["content"], other["content"]])
+        # Once finished, the same article is analyzed again
+        async with session.post(url + "/analyze?wait=true", json=ARTICLE) as response:
+            again = await response.json()
+
+    assert job["requests"] == 3
+    assert job["result"]["records"][0]["subject"] == "王大明"
+    assert again["status"] == "done"
+    assert again["id"] != job["id"]
+    assert len(calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_full_queue_refuses_with_retry_after(serve, analyzed):
+    _, release = analyzed
+    url = await _start(serve, workers=1, max_queue=1)
+    articles = [{**ARTICLE, "content": f"報導{number}"} for number in range(3)]
+    async with aiohttp.ClientSession() as session:
+        # The first one is taken by the only worker, the second one waits
+        for article in articles[:2]:
+            async with session.post(url + "/analyze", json=article) as response:
+                assert response.status == 202
+            await asyncio.sleep(0.05)
+        async with session.post(url + "/analyze", json=articles[2]) as response:
+            assert response.status == 429
+            assert response.headers["Retry-After"] == "1"
+        release.set()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "name",
+    ["../requirements.txt", "/etc/hostname", "missing.txt", "case1", "case1/news_content.txt"],
+)
+async def test_keyword_files_outside_samples_are_refused(serve, analyzed, name):
+    url = await _start(serve)
+    async with aiohttp.ClientSession() as session:
+        async with session.post(
+            url + "/analyze", json={**ARTICLE, "crime_keywords": name}
+        ) as response:
+            assert response.status == 400
+            assert "Unknown keyword file" in (await response.json())["error"]
+    assert analyzed[0] == []
+
+
+def test_keyword_files_are_read_from_samples():
+    with open(f"{pipeline.SAMPLES_DIR}/judge_keywords.txt", encoding="utf-8") as file:
+        assert server._keywords("judge_keywords.txt", "crime_keywords.txt") == file.read()
+    with open(f"{pipeline.SAMPLES_DIR}/crime_keywords.txt", encoding="utf-8") as file:
+        assert server._keywords(None, "crime_keywords.txt") == file.read()
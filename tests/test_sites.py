@@ -0,0 +1,49 @@
+"""Tests for config-driven article extraction."""
+
+import pytest
+
+from kgai.sites import SiteRegistry
+
+CONFIG = {
+    "*": {"title": '//meta[@property="og:title"]/@content'},
+    "news.example": {"content": ["div.story p", "//article//p"]},
+}
+
+
+@pytest.fixture
+def sites():
+    return SiteRegistry(CONFIG)
+
+
+def test_fields_use_fallback_selectors(sites):
+    page = (
+        '<html><head><meta charset="utf-8"><meta property="og:title" content="標題"></head>'
+        "<body><article><p>第一段</p><p>第二段</p></article></body></html>"
+    )
+    article = sites.extract("https://news.example/a/1", page.encode("utf-8"))
+    assert article["title"] == "標題"
+    assert article["content"] == "第一段\n第二段"
+
+
+def test_unknown_host(sites):
+    assert sites.extract("https://other.example/a/1", b"<p>x</p>") is None
+
+
+@pytest.mark.parametrize("page", [b"", b"  \n\t", ""])
+def test_blank_page_has_no_content(sites, page):
+    article = sites.extract("https://news.example/a/1", page)
+    assert article == {"title": None, "content": None}
+
+
+@pytest.mark.parametrize("encoding", ["utf-8", "big5"])
+def test_response_charset_is_used_without_a_meta_declaration(sites, encoding):
+    page = '<html><body><div class="story"><p>檢方起訴</p></div></body></html>'.encode(encoding)
+    assert sites.extract("https://news.example/a/1", page, encoding)["content"] == "檢方起訴"
+
+
+def test_unknown_charset_falls_back_to_the_page_declaration(sites):
+    page = '<html><head><meta charset="utf-8"></head><body><div class="story"><p>檢方起訴</p></div></body></html>'
+    assert (
+        sites.extract("https://news.example/a/1", page.encode("utf-8"), "x-unknown")["content"]
+        == "檢方起訴"
+    )
@@ -0,0 +1,89 @@
+"""Tests for stage outputs stored under a fingerprint of their inputs."""
+
+import asyncio
+import os
+
+import pytest
+
+from kgai import pipeline, router
+from kgai.stages import StageStore, changed_inputs
+
+SAMPLES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "samples")
+INPUTS = {"article": "a1b2", "prompt": "c3d4", "model": "model-a", "temperature": 0.0}
+
+
+def _read(*parts):
+    with open(os.path.join(SAMPLES, *parts), encoding="utf-8") as file:
+        return file.read()
+
+
+@pytest.fixture
+def stages(tmp_path):
+    store = StageStore(str(tmp_path / "stages.sqlite3"))
+    yield store
+    store.close()
+
+
+def test_changed_inputs_are_named():
+    assert changed_inputs(None, INPUTS) == ["new"]
+    assert changed_inputs(INPUTS, dict(INPUTS)) == []
+    changed = {**INPUTS, "prompt": "e5f6", "model": "model-b", "json": True}
+    assert changed_inputs(INPUTS, changed) == ["json", "model", "prompt"]
+
+
+def test_only_current_outputs_are_reused(stages, tmp_path):
+    stages.put("udn-1", "extract", "", INPUTS, [["王大明"]])
+    assert stages.get("udn-1", "extract", "", dict(INPUTS)) == [["王大明"]]
+    assert stages.get("udn-1", "extract", "", {**INPUTS, "model": "model-b"}) is None
+    assert stages.get("udn-1", "infer", "王大明", INPUTS) is None
+    assert (stages.stored, stages.reused) == (1, 1)
+
+    # A stale output keeps the inputs it was computed from
+    stored = stages.lookup("udn-1", "extract")
+    assert changed_inputs(stored.inputs, {**INPUTS, "model": "model-b"}) == ["model"]
+
+    stages.put("udn-1", "extract", "", {**INPUTS, "model": "model-b"}, [["華公行"]])
+    assert stages.get("udn-1", "extract", "", INPUTS) is None
+    assert stages.stats() == {"extract": 1, "infer": 0}
+
+    reopened = StageStore(stages.path)
+    try:
+        assert reopened.get("udn-1", "extract", "", {**INPUTS, "model": "model-b"}) == [["華公行"]]
+    finally:
+        reopened.close()
+
+
+def test_plan_names_the_inputs_that_made_outputs_stale(stages, monkeypatch):
+    monkeypatch.setattr(router, "_router", None)
+    monkeypatch.setattr(router, "_router_loaded", True)
+    monkeypatch.setenv("OPENAI_MODEL", "model-a")
+
+    async def extract_subjects(extractor):
+        return ["王俊雄"]
+
+    monkeypatch.setattr(pipeline, "extract_subjects", extract_subjects)
+    crime, judge, content = (
+        _read("crime_keywords.txt"),
+        _read("judge_keywords.txt"),
+        _read("case1", "news_content.txt"),
+    )
+    analysis = pipeline.prepare(crime, judge, content, None, "udn-1")
+    asyncio.run(pipeline.run_extractor(analysis, "extractor_v1-2.json", stages))
+
+    def plan(extractor_conf="extractor_v1-2.json"):
+        return pipeline.plan(
+            extractor_conf, "inferencer_v8-1.json", crime, judge, content, None, "udn-1", stages
+        )
+
+    # The subject list is current; its one subject was never inferred
+    current = plan()
+    assert (current["extractor"], current["inferencer"]) == (0, 1)
+    assert current["reasons"] == {"infer: new": 1}
+
+    monkeypatch.setenv("OPENAI_MODEL", "model-b")
+    assert plan()["reasons"] == {"extract: model": 1, "infer: new": 1}
+    monkeypatch.setenv("OPENAI_MODEL", "model-a")
+
+    other_prompt = plan("extractor_v1.json")
+    assert other_prompt["extractor"] >= 1
+    assert "extract: prompt" in other_prompt["reasons"]
@@ -0,0 +1,78 @@
+"""Tests for the SQLite results store."""
+
+import pytest
+
+from kgai import store as results
+from kgai.store import ResultStore
+
+ARTICLES = [
+    {"id": "a1", "title": "地下錢莊案", "content": "王大明涉嫌詐欺，檢方起訴。"},
+    {"id": "a2", "title": "公司新聞", "content": "厲害科技股份有限公司公布財報。"},
+    {"id": "a3", "title": "洗錢案", "content": "李小華涉嫌洗錢_100%遭到羈押。"},
+]
+
+
+def _record(subject, **fields):
+    return {
+        "subject": subject,
+        "suspected": True,
+        "summary": "",
+        "crimes": [],
+        "progress": [],
+        **fields,
+    }
+
+
+@pytest.fixture
+def store(tmp_path):
+    opened = ResultStore(str(tmp_path / "results.sqlite3"))
+    opened.add(ARTICLES[0], {"records": [_record("王大明", crimes=["詐欺"], progress=["起訴"])]})
+    opened.add(ARTICLES[1], {"records": [_record("厲害科技股份有限公司", suspected=False)]})
+    opened.add(ARTICLES[2], {"records": [_record("李小華", crimes=["洗錢"])]})
+    opened.flush()
+    yield opened
+    opened.close()
+
+
+def _ids(rows):
+    return [row["id"] for row in rows]
+
+
+def test_search_uses_the_index_for_three_characters(store):
+    assert _ids(store.search("地下錢莊")) == ["a1"]
+    assert _ids(store.search("涉嫌洗錢")) == ["a3"]
+
+
+def test_search_scans_for_shorter_text(store):
+    assert _ids(store.search("詐欺")) == ["a1"]
+    assert _ids(store.search("涉嫌")) == ["a3", "a1"]
+    assert _ids(store.search("財")) == ["a2"]
+    # LIKE wildcards are taken literally
+    assert _ids(store.search("_1")) == ["a3"]
+    assert _ids(store.search("%")) == ["a3"]
+    assert store.search("%%") == []
+
+
+def test_search_limit(store):
+    assert _ids(store.search("涉嫌", limit=1)) == ["a3"]
+
+
+def test_mentioning_short_names(store):
+    assert _ids(store.articles_mentioning("大明")) == ["a1"]
+    assert _ids(store.articles_mentioning("厲害科技")) == ["a2"]
+
+
+def test_results_cli_searches_short_terms(store, capsys):
+    store.close()
+    assert results.main(["--store", store.path, "--search", "詐欺"]) == 0
+    out = capsys.readouterr().out
+    assert '"a1"' in out and "1 row(s)" in out
+
+
+def test_records_are_stored_under_the_requested_subject(tmp_path):
+    opened = ResultStore(str(tmp_path / "results.sqlite3"))
+    opened.add(ARTICLES[0], {"subjects": ["王大明"], "records": [_record("X", crimes=["詐欺"])]})
+    opened.flush()
+    assert [row["subject"] for row in opened.find_subjects(crime="詐欺")] == ["王大明"]
+    assert _ids(opened.articles_mentioning("王大明")) == ["a1"]
+    opened.close()
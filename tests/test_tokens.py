@@ -0,0 +1,39 @@
+"""Tests for model context windows."""
+
+import pytest
+
+from kgai.tokens import context_limit
+
+
+@pytest.fixture(autouse=True)
+def _limits(monkeypatch):
+    monkeypatch.delenv("TOKEN_CONTEXT_LIMIT", raising=False)
+    monkeypatch.delenv("TOKEN_CONTEXT_LIMITS", raising=False)
+
+
+@pytest.mark.parametrize(
+    "model, window",
+    [
+        ("gpt-4o-mini", 128000),
+        ("gpt-35-turbo", 16385),
+        ("Qwen/Qwen2.5-72B-Instruct", 32768),
+        ("qwen2.5-72b-instruct", 32768),
+        ("meta-llama/Llama-3.1-70B-Instruct", 131072),
+        ("meta-llama/Meta-Llama-3.1-8B-Instruct", 131072),
+    ],
+)
+def test_known_models(model, window):
+    assert context_limit(model) == window
+
+
+def test_unknown_model_is_not_limited(capsys):
+    assert context_limit("my-local-model") is None
+    assert "my-local-model" in capsys.readouterr().out
+    assert context_limit("gpt-4o|my-local-model") == 128000
+
+
+def test_configured_limits(monkeypatch):
+    monkeypatch.setenv("TOKEN_CONTEXT_LIMITS", '{"Org/My-Local-Model": 4096}')
+    assert context_limit("my-local-model-v2") == 4096
+    monkeypatch.setenv("TOKEN_CONTEXT_LIMIT", "2048")
+    assert context_limit("other-model") == 2048